@@ -8,13 +8,18 @@ This provides comprehensive admin queries to monitor:
 4. Transaction volumes
 5. Growth metrics
 6. User engagement stats
+
+Figures come from the rollups kept by admin_metrics_rollup.sql (see
+utils/admin_metrics.py), so a report costs a few small reads however many
+users and transactions there are. Days are UTC.
 """
 
 import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List
 import logging
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
+from utils.admin_metrics import admin_metrics, summarize, today
 import os
 from dotenv import load_dotenv
 
@@ -27,39 +32,22 @@ class SofiAdminDashboard:
     """Comprehensive admin dashboard for Sofi AI business metrics"""
     
     def __init__(self):
-        self.client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        self.client = get_supabase_client()
+        self.metrics = admin_metrics
     
     async def get_total_profits(self) -> Dict:
         """Get total profits from all revenue streams"""
         try:
+            totals = self.metrics.totals()
             profits = {
-                "transfer_fees": 0.0,
-                "airtime_profits": 0.0,
-                "crypto_profits": 0.0,
-                "data_profits": 0.0,
-                "total_profit": 0.0
+                # Transfer fees from transfer_charges table
+                "transfer_fees": summarize(totals, "transfers", ["completed"])["revenue"],
+                "airtime_profits": summarize(totals, "airtime", ["success"])["revenue"],
+                # Crypto trading profits (crypto_profits table)
+                "crypto_profits": summarize(totals, "crypto_profits")["revenue"],
+                "data_profits": summarize(totals, "data", ["success"])["revenue"],
             }
             
-            # Transfer fees from transfer_charges table
-            result = self.client.table("transfer_charges").select("fee_charged").eq("status", "completed").execute()
-            if result.data:
-                profits["transfer_fees"] = sum(float(row.get("fee_charged", 0)) for row in result.data)
-            
-            # Airtime profits
-            result = self.client.table("airtime_transactions").select("profit_amount").eq("status", "success").execute()
-            if result.data:
-                profits["airtime_profits"] = sum(float(row.get("profit_amount", 0)) for row in result.data)
-            
-            # Crypto trading profits
-            result = self.client.table("crypto_profits").select("profit_amount").execute()
-            if result.data:
-                profits["crypto_profits"] = sum(float(row.get("profit_amount", 0)) for row in result.data)
-            
-            # Data purchase profits
-            result = self.client.table("data_transactions").select("profit_amount").eq("status", "success").execute()
-            if result.data:
-                profits["data_profits"] = sum(float(row.get("profit_amount", 0)) for row in result.data)
-            
             # Calculate total
             profits["total_profit"] = sum([
                 profits["transfer_fees"],
@@ -77,18 +65,12 @@ class SofiAdminDashboard:
     async def get_new_users_count(self, days: int = 30) -> Dict:
         """Get new user registrations for specified period"""
         try:
-            # Calculate date range
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=days)
+            # Calculate date range (rollup days, today included)
+            end_date = today()
+            start_date = end_date - timedelta(days=days - 1)
             
-            # Get new users
-            result = self.client.table("users").select("id, first_name, created_at").gte("created_at", start_date.isoformat()).execute()
-            
-            new_users = len(result.data) if result.data else 0
-            
-            # Get total users
-            total_result = self.client.table("users").select("id").execute()
-            total_users = len(total_result.data) if total_result.data else 0
+            new_users = summarize(self.metrics.daily(start_date, end_date), "signups")["transaction_count"]
+            total_users = summarize(self.metrics.totals(), "signups")["transaction_count"]
             
             return {
                 "new_users_last_30_days": new_users,
@@ -105,55 +87,45 @@ class SofiAdminDashboard:
         """Get detailed revenue breakdown by feature"""
         try:
             revenue_breakdown = {}
+            totals = self.metrics.totals()
             
             # Transfer fees breakdown
-            result = self.client.table("transfer_charges").select("fee_charged, created_at").eq("status", "completed").execute()
-            if result.data:
-                transfer_count = len(result.data)
-                transfer_revenue = sum(float(row.get("fee_charged", 0)) for row in result.data)
+            transfers = summarize(totals, "transfers", ["completed"])
+            if transfers["transaction_count"]:
                 revenue_breakdown["transfers"] = {
-                    "transaction_count": transfer_count,
-                    "total_revenue": transfer_revenue,
-                    "average_fee": transfer_revenue / max(transfer_count, 1)
+                    "transaction_count": transfers["transaction_count"],
+                    "total_revenue": transfers["revenue"],
+                    "average_fee": transfers["revenue"] / max(transfers["transaction_count"], 1)
                 }
             
             # Airtime revenue breakdown
-            result = self.client.table("airtime_transactions").select("amount, profit_amount, created_at").eq("status", "success").execute()
-            if result.data:
-                airtime_count = len(result.data)
-                airtime_volume = sum(float(row.get("amount", 0)) for row in result.data)
-                airtime_profit = sum(float(row.get("profit_amount", 0)) for row in result.data)
+            airtime = summarize(totals, "airtime", ["success"])
+            if airtime["transaction_count"]:
                 revenue_breakdown["airtime"] = {
-                    "transaction_count": airtime_count,
-                    "total_volume": airtime_volume,
-                    "total_profit": airtime_profit,
-                    "profit_margin": (airtime_profit / max(airtime_volume, 1)) * 100
+                    "transaction_count": airtime["transaction_count"],
+                    "total_volume": airtime["volume"],
+                    "total_profit": airtime["revenue"],
+                    "profit_margin": (airtime["revenue"] / max(airtime["volume"], 1)) * 100
                 }
             
-            # Crypto revenue breakdown
-            result = self.client.table("crypto_transactions").select("crypto_amount, ngn_amount, profit_amount, created_at").execute()
-            if result.data:
-                crypto_count = len(result.data)
-                crypto_volume = sum(float(row.get("ngn_amount", 0)) for row in result.data)
-                crypto_profit = sum(float(row.get("profit_amount", 0)) for row in result.data)
+            # Crypto revenue breakdown (volume in NGN)
+            crypto = summarize(totals, "crypto")
+            if crypto["transaction_count"]:
                 revenue_breakdown["crypto"] = {
-                    "transaction_count": crypto_count,
-                    "total_volume_ngn": crypto_volume,
-                    "total_profit": crypto_profit,
-                    "profit_margin": (crypto_profit / max(crypto_volume, 1)) * 100
+                    "transaction_count": crypto["transaction_count"],
+                    "total_volume_ngn": crypto["volume"],
+                    "total_profit": crypto["revenue"],
+                    "profit_margin": (crypto["revenue"] / max(crypto["volume"], 1)) * 100
                 }
             
             # Data purchase revenue breakdown
-            result = self.client.table("data_transactions").select("amount, profit_amount, created_at").eq("status", "success").execute()
-            if result.data:
-                data_count = len(result.data)
-                data_volume = sum(float(row.get("amount", 0)) for row in result.data)
-                data_profit = sum(float(row.get("profit_amount", 0)) for row in result.data)
+            data = summarize(totals, "data", ["success"])
+            if data["transaction_count"]:
                 revenue_breakdown["data"] = {
-                    "transaction_count": data_count,
-                    "total_volume": data_volume,
-                    "total_profit": data_profit,
-                    "profit_margin": (data_profit / max(data_volume, 1)) * 100
+                    "transaction_count": data["transaction_count"],
+                    "total_volume": data["volume"],
+                    "total_profit": data["revenue"],
+                    "profit_margin": (data["revenue"] / max(data["volume"], 1)) * 100
                 }
             
             return revenue_breakdown
@@ -167,39 +139,20 @@ class SofiAdminDashboard:
         try:
             stats = {}
             
-            # Active users (users with transactions in last 30 days)
-            thirty_days_ago = (datetime.now() - timedelta(days=30)).isoformat()
-            
-            # Get active users from various transaction tables
-            active_users = set()
-            
-            # From transfers
-            result = self.client.table("bank_transactions").select("user_id").gte("created_at", thirty_days_ago).execute()
-            if result.data:
-                active_users.update(row["user_id"] for row in result.data if row.get("user_id"))
-            
-            # From airtime
-            result = self.client.table("airtime_transactions").select("user_id").gte("created_at", thirty_days_ago).execute()
-            if result.data:
-                active_users.update(row["user_id"] for row in result.data if row.get("user_id"))
-            
-            # From crypto
-            result = self.client.table("crypto_transactions").select("user_id").gte("created_at", thirty_days_ago).execute()
-            if result.data:
-                active_users.update(row["user_id"] for row in result.data if row.get("user_id"))
-            
-            stats["active_users_30_days"] = len(active_users)
+            # Active users (distinct users with a transaction in the last 30 days),
+            # estimated from the daily HyperLogLog sketches
+            active_users = self.metrics.active_users(today() - timedelta(days=29), today())
+            stats["active_users_30_days"] = active_users
             
             # Total users
-            result = self.client.table("users").select("id").execute()
-            total_users = len(result.data) if result.data else 0
+            totals = self.metrics.totals()
+            total_users = summarize(totals, "signups")["transaction_count"]
             
             stats["total_users"] = total_users
-            stats["engagement_rate"] = (len(active_users) / max(total_users, 1)) * 100
+            stats["engagement_rate"] = (active_users / max(total_users, 1)) * 100
             
             # Average transactions per user
-            result = self.client.table("bank_transactions").select("user_id").execute()
-            total_transactions = len(result.data) if result.data else 0
+            total_transactions = summarize(totals, "bank")["transaction_count"]
             stats["avg_transactions_per_user"] = total_transactions / max(total_users, 1)
             
             return stats
@@ -212,33 +165,26 @@ class SofiAdminDashboard:
         """Get daily growth metrics for the last N days"""
         try:
             daily_metrics = []
+            end_day = today()
+            
+            # One read for the whole range, grouped by day here
+            rows_by_day = {}
+            for row in self.metrics.daily(end_day - timedelta(days=days - 1), end_day):
+                rows_by_day.setdefault(row["day"], []).append(row)
             
             for i in range(days):
-                date = datetime.now() - timedelta(days=i)
-                start_of_day = date.replace(hour=0, minute=0, second=0, microsecond=0)
-                end_of_day = start_of_day + timedelta(days=1)
-                
-                day_data = {
-                    "date": start_of_day.strftime("%Y-%m-%d"),
-                    "new_users": 0,
-                    "transactions": 0,
-                    "revenue": 0.0
-                }
-                
-                # New users for this day
-                result = self.client.table("users").select("id").gte("created_at", start_of_day.isoformat()).lt("created_at", end_of_day.isoformat()).execute()
-                day_data["new_users"] = len(result.data) if result.data else 0
-                
-                # Transactions for this day
-                result = self.client.table("bank_transactions").select("id").gte("created_at", start_of_day.isoformat()).lt("created_at", end_of_day.isoformat()).execute()
-                day_data["transactions"] = len(result.data) if result.data else 0
-                
-                # Revenue for this day (transfer fees)
-                result = self.client.table("transfer_charges").select("fee_charged").gte("created_at", start_of_day.isoformat()).lt("created_at", end_of_day.isoformat()).execute()
-                if result.data:
-                    day_data["revenue"] = sum(float(row.get("fee_charged", 0)) for row in result.data)
+                day = (end_day - timedelta(days=i)).isoformat()
+                rows = rows_by_day.get(day, [])
                 
-                daily_metrics.append(day_data)
+                daily_metrics.append({
+                    "date": day,
+                    # New users for this day
+                    "new_users": summarize(rows, "signups")["transaction_count"],
+                    # Transactions for this day
+                    "transactions": summarize(rows, "bank")["transaction_count"],
+                    # Revenue for this day (transfer fees)
+                    "revenue": summarize(rows, "transfers")["revenue"]
+                })
             
             return {"daily_metrics": daily_metrics}
             
@@ -0,0 +1,318 @@
+-- Admin metrics rollups: per-day and per-feature aggregates
+-- Run this in your Supabase SQL editor
+
+-- admin_dashboard.py and utils/admin_dashboard_live.py used to download whole
+-- tables (users, bank_transactions, transfer_charges, airtime_transactions, ...)
+-- and add them up in Python. Triggers on those tables now record what every
+-- write contributes, whichever code path writes it, so a report reads a few
+-- rollup rows however large the history grows:
+--   admin_metrics_daily         one row per (UTC day, feature, status)
+--   admin_metrics_totals        the same aggregates over all time
+--   admin_metrics_active_users  a HyperLogLog sketch of the users seen each day
+--
+-- The trigger only appends to admin_metrics_queue. Upserting the rollups from
+-- the trigger would make every concurrent money write wait on the same totals
+-- row; instead drain_admin_metrics_queue() folds queued rows into the rollups
+-- in batches, one drainer at a time. utils/admin_metrics.py drains before it
+-- reads; to keep the rollups current between reports, also schedule it:
+--   SELECT cron.schedule('admin-metrics-drain', '* * * * *', 'SELECT drain_admin_metrics_queue()');
+--
+-- Active users are counted from bank_transactions, airtime_transactions and
+-- crypto_transactions, as the dashboard always counted them.
+--
+-- After installing, load the existing history once (and again whenever the
+-- rollups need rebuilding; writes to the source tables wait while it runs):
+--   SELECT backfill_admin_metrics();
+
+CREATE TABLE IF NOT EXISTS public.admin_metrics_daily (
+    day DATE NOT NULL,
+    feature TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT '',
+    transaction_count BIGINT NOT NULL DEFAULT 0,
+    volume NUMERIC NOT NULL DEFAULT 0,
+    revenue NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, feature, status)
+);
+
+CREATE TABLE IF NOT EXISTS public.admin_metrics_totals (
+    feature TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT '',
+    transaction_count BIGINT NOT NULL DEFAULT 0,
+    volume NUMERIC NOT NULL DEFAULT 0,
+    revenue NUMERIC NOT NULL DEFAULT 0,
+    PRIMARY KEY (feature, status)
+);
+
+-- What each source write contributes, until drained into the tables above
+CREATE TABLE IF NOT EXISTS public.admin_metrics_queue (
+    id BIGSERIAL PRIMARY KEY,
+    day DATE NOT NULL,
+    feature TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT '',
+    sign SMALLINT NOT NULL,
+    volume NUMERIC NOT NULL DEFAULT 0,
+    revenue NUMERIC NOT NULL DEFAULT 0,
+    user_id TEXT
+);
+
+-- 4096 one-byte registers per day (precision 12, about 1.6% standard error).
+-- utils/admin_metrics.py merges the days of a range and estimates the count.
+CREATE TABLE IF NOT EXISTS public.admin_metrics_active_users (
+    day DATE PRIMARY KEY,
+    registers BYTEA NOT NULL
+);
+
+-- Tables the rollups are built from
+CREATE OR REPLACE FUNCTION public.admin_metrics_sources()
+RETURNS TEXT[] AS $$
+    SELECT ARRAY['users', 'bank_transactions', 'transfer_charges', 'airtime_transactions',
+                 'data_transactions', 'crypto_transactions', 'crypto_profits'];
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Source tables whose users count as active
+CREATE OR REPLACE FUNCTION public.admin_metrics_user_sources()
+RETURNS TEXT[] AS $$
+    SELECT ARRAY['bank_transactions', 'airtime_transactions', 'crypto_transactions'];
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Text to NUMERIC, 0 for anything that is not a number, so a malformed
+-- amount can never make the trigger (and with it the write) fail
+CREATE OR REPLACE FUNCTION public.admin_metrics_numeric(p_value TEXT)
+RETURNS NUMERIC AS $$
+    SELECT CASE WHEN p_value ~ '^\s*[-+]?([0-9]+\.?[0-9]*|\.[0-9]+)([eE][-+]?[0-9]+)?\s*$'
+                THEN p_value::NUMERIC ELSE 0 END;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- What one source row contributes. Columns are read from JSON so that older
+-- table layouts (no status column, no transaction_fee, ...) still work.
+-- bank_transactions are split by type: feature 'bank:<transaction_type>'.
+CREATE OR REPLACE FUNCTION public.admin_metrics_row(p_source TEXT, r JSONB)
+RETURNS TABLE (day DATE, feature TEXT, status TEXT, volume NUMERIC, revenue NUMERIC, user_id TEXT) AS $$
+    SELECT
+        (COALESCE((r->>'created_at')::TIMESTAMPTZ, NOW()) AT TIME ZONE 'UTC')::DATE,
+        CASE p_source
+            WHEN 'users' THEN 'signups'
+            WHEN 'bank_transactions' THEN 'bank:' || COALESCE(r->>'transaction_type', 'unknown')
+            WHEN 'transfer_charges' THEN 'transfers'
+            WHEN 'airtime_transactions' THEN 'airtime'
+            WHEN 'data_transactions' THEN 'data'
+            WHEN 'crypto_transactions' THEN 'crypto'
+            ELSE p_source
+        END,
+        CASE p_source
+            WHEN 'users' THEN ''
+            WHEN 'transfer_charges' THEN COALESCE(r->>'status', 'completed')
+            ELSE COALESCE(r->>'status', '')
+        END,
+        public.admin_metrics_numeric(CASE p_source
+            WHEN 'transfer_charges' THEN r->>'transfer_amount'
+            WHEN 'crypto_transactions' THEN r->>'ngn_amount'
+            WHEN 'users' THEN NULL
+            WHEN 'crypto_profits' THEN NULL
+            ELSE r->>'amount'
+        END),
+        public.admin_metrics_numeric(CASE p_source
+            WHEN 'transfer_charges' THEN r->>'fee_charged'
+            WHEN 'bank_transactions' THEN COALESCE(r->>'transaction_fee', r->>'fee')
+            WHEN 'users' THEN NULL
+            ELSE r->>'profit_amount'
+        END),
+        CASE WHEN p_source = ANY(public.admin_metrics_user_sources()) THEN NULLIF(r->>'user_id', '') END;
+$$ LANGUAGE sql STABLE;
+
+DROP FUNCTION IF EXISTS public.admin_metrics_add(DATE, TEXT, TEXT, NUMERIC, NUMERIC, INT);
+
+-- HyperLogLog slot of a user id: the first 64 bits of its md5, the top 12
+-- bits pick the register and the rank is the position of the first 1 in the
+-- other 52 (53 when they are all zero). utils/admin_metrics.py hashes the same way.
+CREATE OR REPLACE FUNCTION public.admin_metrics_hll_slot(p_user_id TEXT)
+RETURNS TABLE (slot INT, rank INT) AS $$
+    SELECT
+        substring(h FROM 1 FOR 12)::BIT(12)::INT,
+        COALESCE(NULLIF(position(B'1' IN substring(h FROM 13)), 0), 53)
+    FROM (SELECT ('x' || left(md5(p_user_id), 16))::BIT(64) AS h) hashed;
+$$ LANGUAGE sql IMMUTABLE;
+
+DROP FUNCTION IF EXISTS public.admin_metrics_see_user(DATE, TEXT);
+
+-- Raise one register of a day's sketch (registers only ever grow)
+CREATE OR REPLACE FUNCTION public.admin_metrics_raise_register(p_day DATE, p_slot INT, p_rank INT)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE public.admin_metrics_active_users
+    SET registers = set_byte(registers, p_slot, p_rank)
+    WHERE day = p_day AND get_byte(registers, p_slot) < p_rank;
+
+    IF NOT FOUND THEN
+        INSERT INTO public.admin_metrics_active_users AS a (day, registers)
+        VALUES (p_day, set_byte(decode(repeat('00', 4096), 'hex'), p_slot, p_rank))
+        ON CONFLICT (day) DO UPDATE SET
+            registers = set_byte(a.registers, p_slot, GREATEST(get_byte(a.registers, p_slot), p_rank));
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Row trigger: one queue row per side of the change. Inserts add, deletes
+-- subtract, updates (e.g. pending -> success) move the row between buckets.
+-- Plain appends only: no shared row is touched and nothing here can fail on
+-- the row's contents, so the trigger needs no exception block.
+CREATE OR REPLACE FUNCTION public.admin_metrics_track()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_old RECORD;
+    v_new RECORD;
+BEGIN
+    IF TG_OP <> 'INSERT' THEN
+        SELECT * INTO v_old FROM public.admin_metrics_row(TG_TABLE_NAME, to_jsonb(OLD));
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        SELECT * INTO v_new FROM public.admin_metrics_row(TG_TABLE_NAME, to_jsonb(NEW));
+    END IF;
+
+    IF TG_OP = 'UPDATE' AND v_old::TEXT = v_new::TEXT THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP <> 'INSERT' THEN
+        INSERT INTO public.admin_metrics_queue (day, feature, status, sign, volume, revenue)
+        VALUES (v_old.day, v_old.feature, v_old.status, -1, v_old.volume, v_old.revenue);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        INSERT INTO public.admin_metrics_queue (day, feature, status, sign, volume, revenue, user_id)
+        VALUES (v_new.day, v_new.feature, v_new.status, 1, v_new.volume, v_new.revenue,
+                CASE WHEN TG_OP = 'INSERT' THEN v_new.user_id END);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Fold queued rows into the rollups, p_batch rows per transaction step, until
+-- the queue is empty. Only one drainer runs at a time (others return 0 at
+-- once), so the rollup rows are only ever written by that one session.
+-- Returns how many queue rows were applied.
+CREATE OR REPLACE FUNCTION public.drain_admin_metrics_queue(p_batch INT DEFAULT 10000)
+RETURNS BIGINT AS $$
+DECLARE
+    v_drained BIGINT := 0;
+    v_count BIGINT;
+    v_slot RECORD;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('admin_metrics_queue')) THEN
+        RETURN 0;
+    END IF;
+    CREATE TEMP TABLE IF NOT EXISTS admin_metrics_drain_batch (
+        day DATE, feature TEXT, status TEXT, sign SMALLINT, volume NUMERIC, revenue NUMERIC, user_id TEXT
+    ) ON COMMIT DROP;
+
+    LOOP
+        TRUNCATE admin_metrics_drain_batch;
+        WITH taken AS (
+            DELETE FROM public.admin_metrics_queue q
+            WHERE q.id IN (SELECT id FROM public.admin_metrics_queue ORDER BY id LIMIT p_batch)
+            RETURNING q.day, q.feature, q.status, q.sign, q.volume, q.revenue, q.user_id
+        )
+        INSERT INTO admin_metrics_drain_batch SELECT * FROM taken;
+        GET DIAGNOSTICS v_count = ROW_COUNT;
+        EXIT WHEN v_count = 0;
+        v_drained := v_drained + v_count;
+
+        INSERT INTO public.admin_metrics_daily AS d (day, feature, status, transaction_count, volume, revenue)
+        SELECT b.day, b.feature, b.status, SUM(b.sign), SUM(b.sign * b.volume), SUM(b.sign * b.revenue)
+        FROM admin_metrics_drain_batch b
+        GROUP BY b.day, b.feature, b.status
+        ON CONFLICT (day, feature, status) DO UPDATE SET
+            transaction_count = d.transaction_count + EXCLUDED.transaction_count,
+            volume = d.volume + EXCLUDED.volume,
+            revenue = d.revenue + EXCLUDED.revenue;
+
+        INSERT INTO public.admin_metrics_totals AS t (feature, status, transaction_count, volume, revenue)
+        SELECT b.feature, b.status, SUM(b.sign), SUM(b.sign * b.volume), SUM(b.sign * b.revenue)
+        FROM admin_metrics_drain_batch b
+        GROUP BY b.feature, b.status
+        ON CONFLICT (feature, status) DO UPDATE SET
+            transaction_count = t.transaction_count + EXCLUDED.transaction_count,
+            volume = t.volume + EXCLUDED.volume,
+            revenue = t.revenue + EXCLUDED.revenue;
+
+        FOR v_slot IN
+            SELECT b.day, s.slot, MAX(s.rank) AS rank
+            FROM admin_metrics_drain_batch b, LATERAL public.admin_metrics_hll_slot(b.user_id) s
+            WHERE b.user_id IS NOT NULL
+            GROUP BY b.day, s.slot
+        LOOP
+            PERFORM public.admin_metrics_raise_register(v_slot.day, v_slot.slot, v_slot.rank);
+        END LOOP;
+    END LOOP;
+    RETURN v_drained;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Rebuild every rollup from the source tables (one grouped scan per table)
+CREATE OR REPLACE FUNCTION public.backfill_admin_metrics()
+RETURNS VOID AS $$
+DECLARE
+    v_source TEXT;
+BEGIN
+    -- Writers and drainers wait until the rebuild commits, so no row is counted twice or missed
+    PERFORM pg_advisory_xact_lock(hashtext('admin_metrics_queue'));
+    FOREACH v_source IN ARRAY public.admin_metrics_sources() LOOP
+        IF to_regclass('public.' || v_source) IS NOT NULL THEN
+            EXECUTE format('LOCK TABLE public.%I IN SHARE MODE', v_source);
+        END IF;
+    END LOOP;
+
+    -- Queued changes are part of the history being rescanned
+    TRUNCATE public.admin_metrics_daily, public.admin_metrics_totals, public.admin_metrics_active_users,
+             public.admin_metrics_queue;
+    CREATE TEMP TABLE admin_metrics_backfill_slots (day DATE, slot INT, rank INT) ON COMMIT DROP;
+
+    FOREACH v_source IN ARRAY public.admin_metrics_sources() LOOP
+        CONTINUE WHEN to_regclass('public.' || v_source) IS NULL;
+
+        EXECUTE format($q$
+            INSERT INTO public.admin_metrics_daily (day, feature, status, transaction_count, volume, revenue)
+            SELECT m.day, m.feature, m.status, COUNT(*), SUM(m.volume), SUM(m.revenue)
+            FROM public.%I t, LATERAL public.admin_metrics_row(%L, to_jsonb(t)) m
+            GROUP BY m.day, m.feature, m.status
+        $q$, v_source, v_source);
+
+        EXECUTE format($q$
+            INSERT INTO admin_metrics_backfill_slots (day, slot, rank)
+            SELECT m.day, s.slot, MAX(s.rank)
+            FROM public.%I t,
+                 LATERAL public.admin_metrics_row(%L, to_jsonb(t)) m,
+                 LATERAL public.admin_metrics_hll_slot(m.user_id) s
+            WHERE m.user_id IS NOT NULL
+            GROUP BY m.day, s.slot
+        $q$, v_source, v_source);
+    END LOOP;
+
+    INSERT INTO public.admin_metrics_totals (feature, status, transaction_count, volume, revenue)
+    SELECT feature, status, SUM(transaction_count), SUM(volume), SUM(revenue)
+    FROM public.admin_metrics_daily
+    GROUP BY feature, status;
+
+    INSERT INTO public.admin_metrics_active_users (day, registers)
+    SELECT days.day,
+           decode(string_agg(lpad(to_hex(COALESCE(r.rank, 0)), 2, '0'), '' ORDER BY i.slot), 'hex')
+    FROM (SELECT DISTINCT day FROM admin_metrics_backfill_slots) days
+    CROSS JOIN generate_series(0, 4095) AS i(slot)
+    LEFT JOIN (
+        SELECT day, slot, MAX(rank) AS rank FROM admin_metrics_backfill_slots GROUP BY day, slot
+    ) r ON r.day = days.day AND r.slot = i.slot
+    GROUP BY days.day;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Attach the trigger to every source table that exists in this project
+DO $$
+DECLARE
+    v_source TEXT;
+BEGIN
+    FOREACH v_source IN ARRAY public.admin_metrics_sources() LOOP
+        CONTINUE WHEN to_regclass('public.' || v_source) IS NULL;
+        EXECUTE format('DROP TRIGGER IF EXISTS admin_metrics_rollup ON public.%I', v_source);
+        EXECUTE format('CREATE TRIGGER admin_metrics_rollup AFTER INSERT OR UPDATE OR DELETE ON public.%I '
+                       'FOR EACH ROW EXECUTE FUNCTION public.admin_metrics_track()', v_source);
+    END LOOP;
+END $$;
@@ -5,18 +5,21 @@ OpenAI Assistant integration with WhatsApp and money transfer capabilities
 """
 
 import os
-import json
 import logging
 import asyncio
 import time
 import threading
 from typing import Dict, Any, Optional, Tuple
-from datetime import datetime
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, NotFoundError
 from sofi_money_functions import SofiMoneyTransferService
 from sofi_whatsapp_functions import SOFI_MONEY_FUNCTIONS, SOFI_WHATSAPP_INSTRUCTIONS
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
+from utils.user_resolver import resolve_whatsapp_user
+from utils.user_mailbox import user_mailbox
+from utils.assistant_run_driver import run_driver
+from utils.thread_store import thread_store
+from utils.async_bridge import run_blocking, run_isolated
 from concurrent.futures import ThreadPoolExecutor
 
 load_dotenv()
@@ -27,11 +30,10 @@ class BackgroundTaskManager:
     """High-performance background task manager for OpenAI operations"""
     
     def __init__(self):
-        self.active_tasks = {}
         self.executor = ThreadPoolExecutor(max_workers=50)  # Handle 50+ concurrent users
         self.whatsapp_access_token = os.getenv("WHATSAPP_ACCESS_TOKEN")
         self.whatsapp_phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
-        self.supabase = create_client(
+        self.supabase = get_supabase_client(
             os.getenv("SUPABASE_URL"),
             os.getenv("SUPABASE_KEY")
         )
@@ -70,118 +72,49 @@ class BackgroundTaskManager:
         except Exception as e:
             logger.error(f"❌ Failed to send WhatsApp message: {e}")
     
-    async def process_openai_run_background(self, run, thread_id: str, phone_number: str, 
-                                          assistant_client, money_service):
-        """Process OpenAI run in background without blocking"""
+    async def process_openai_run_background(self, thread_id: str, phone_number: str,
+                                          assistant_id: str, money_service):
+        """Drive an OpenAI run from its stream events and reply when it finishes"""
         try:
             logger.info(f"🚀 Starting background processing for WhatsApp {phone_number}")
-            start_time = time.time()
             
-            function_data = {}
-            max_iterations = 30  # 30 seconds max
-            iteration = 0
+            # Tool calls run the moment the stream reports requires_action
+            result = await run_driver.run(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                tool_executor=lambda name, args: run_isolated(
+                    self._execute_function_background, name, args, phone_number, money_service),
+            )
             
-            while iteration < max_iterations:
-                iteration += 1
-                
-                # Check run status (non-blocking)
-                try:
-                    run = assistant_client.beta.threads.runs.retrieve(
-                        thread_id=thread_id,
-                        run_id=run.id
-                    )
-                except Exception as e:
-                    logger.error(f"❌ OpenAI API error: {e}")
-                    await self._send_platform_message(phone_number, "whatsapp",
-                        "❌ Sorry, I encountered a technical issue. Please try again.")
-                    return
-                
-                if run.status == "completed":
-                    # Get the response
-                    messages = assistant_client.beta.threads.messages.list(thread_id=thread_id)
-                    response_text = None
-                    
-                    if messages.data and messages.data[0].content:
-                        response = messages.data[0].content[0].text.value
-                        if response and response.strip() and response.strip().lower() not in ["null", "none", ""]:
-                            response_text = response
-                    
-                    # Generate response from function data if needed
-                    if not response_text and function_data:
-                        response_text = self._generate_completion_message(function_data)
-                    
-                    if response_text:
-                        elapsed = time.time() - start_time
-                        logger.info(f"⚡ Background processing completed in {elapsed:.2f}s for WhatsApp {phone_number}")
-                        await self._send_platform_message(phone_number, "whatsapp", response_text)
-                    
-                    # Clean up
-                    self.active_tasks.pop(phone_number, None)
-                    return
-                
-                elif run.status == "requires_action":
-                    # Handle function calls in background
-                    tool_calls = run.required_action.submit_tool_outputs.tool_calls
-                    tool_outputs = []
-                    
-                    for tool_call in tool_calls:
-                        function_name = tool_call.function.name
-                        function_args = json.loads(tool_call.function.arguments)
-                        
-                        logger.info(f"🔧 Background function execution: {function_name}")
-                        
-                        try:
-                            # Execute function in background
-                            result = await self._execute_function_background(
-                                function_name, function_args, phone_number, money_service)
-                            function_data[function_name] = result
-                            
-                            tool_outputs.append({
-                                "tool_call_id": tool_call.id,
-                                "output": json.dumps(result)
-                            })
-                        except Exception as e:
-                            logger.error(f"❌ Background function error: {e}")
-                            tool_outputs.append({
-                                "tool_call_id": tool_call.id,
-                                "output": json.dumps({"error": str(e)})
-                            })
-                    
-                    # Submit tool outputs
-                    try:
-                        run = assistant_client.beta.threads.runs.submit_tool_outputs(
-                            thread_id=thread_id,
-                            run_id=run.id,
-                            tool_outputs=tool_outputs
-                        )
-                    except Exception as e:
-                        logger.error(f"❌ Failed to submit tool outputs: {e}")
-                        await self._send_platform_message(phone_number, "whatsapp",
-                            "❌ Sorry, I encountered an issue processing your request.")
-                        return
-                
-                elif run.status in ["failed", "cancelled", "expired"]:
-                    logger.error(f"❌ Background run failed with status: {run.status}")
-                    await self._send_platform_message(phone_number, "whatsapp",
-                        f"❌ Sorry, I encountered an error: {run.status}")
-                    self.active_tasks.pop(phone_number, None)
-                    return
-                
-                # Non-blocking wait
-                await asyncio.sleep(0.5)  # Check every 500ms instead of 1s
+            if result.status == "timeout":
+                logger.warning(f"⏰ Background processing timeout for WhatsApp {phone_number}")
+                await self._send_platform_message(phone_number, "whatsapp",
+                    "⏰ Your request is taking longer than expected. I'll continue processing and update you shortly.")
+                return
             
-            # Timeout fallback
-            logger.warning(f"⏰ Background processing timeout for WhatsApp {phone_number}")
-            await self._send_platform_message(phone_number, "whatsapp",
-                "⏰ Your request is taking longer than expected. I'll continue processing and update you shortly.")
+            if not result.completed:
+                logger.error(f"❌ Background run failed with status: {result.status}")
+                await self._send_platform_message(phone_number, "whatsapp",
+                    f"❌ Sorry, I encountered an error: {result.status}")
+                return
+            
+            response_text = None
+            if result.text and result.text.strip() and result.text.strip().lower() not in ["null", "none"]:
+                response_text = result.text
+            
+            # Generate response from function data if needed
+            if not response_text and result.function_results:
+                response_text = self._generate_completion_message(result.function_results)
+            
+            if response_text:
+                logger.info(f"⚡ Background processing completed in {result.timings.total_ms / 1000:.2f}s "
+                            f"for WhatsApp {phone_number} ({result.timings.to_dict()})")
+                await self._send_platform_message(phone_number, "whatsapp", response_text)
             
         except Exception as e:
             logger.error(f"❌ Background processing error for WhatsApp {phone_number}: {e}")
             await self._send_platform_message(phone_number, "whatsapp",
                 "❌ Sorry, I encountered an unexpected error. Please try again.")
-        finally:
-            # Always clean up
-            self.active_tasks.pop(phone_number, None)
     
     def _generate_completion_message(self, function_data: Dict) -> str:
         """Generate completion message from function results"""
@@ -260,6 +193,14 @@ class BackgroundTaskManager:
                 
                 return result
             
+            elif function_name == "send_group_payout":
+                from functions.transfer_functions import send_group_payout
+                return await send_group_payout(
+                    chat_id=phone_number,
+                    payouts=function_args.get("payouts") or [],
+                    narration=function_args.get("narration")
+                )
+            
             elif function_name == "get_user_beneficiaries":
                 # Get user's integer ID from phone_number
                 user_id = await self._get_user_id_from_phone_number(phone_number)
@@ -351,10 +292,8 @@ class BackgroundTaskManager:
     async def _get_user_uuid_from_phone_number(self, phone_number: str) -> Optional[str]:
         """Get user's UUID from WhatsApp phone number"""
         try:
-            result = self.supabase.table("users").select("id").eq("whatsapp_number", str(phone_number)).execute()
-            if result.data:
-                return result.data[0]["id"]
-            return None
+            user = await run_blocking(resolve_whatsapp_user, str(phone_number))
+            return user["id"] if user else None
         except Exception as e:
             logger.error(f"❌ Error getting user UUID: {e}")
             return None
@@ -363,9 +302,9 @@ class BackgroundTaskManager:
         """Get user's integer ID from WhatsApp phone number (for beneficiary service compatibility)"""
         try:
             # First try to get from the users table (if it has integer IDs)
-            result = self.supabase.table("users").select("id").eq("whatsapp_number", str(phone_number)).execute()
-            if result.data:
-                user_id = result.data[0]["id"]
+            user = await run_blocking(resolve_whatsapp_user, str(phone_number))
+            if user:
+                user_id = user["id"]
                 # Convert to int if it's a string
                 if isinstance(user_id, str):
                     return int(user_id)
@@ -392,7 +331,7 @@ class SofiAssistant:
     def __init__(self):
         self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
         self.money_service = SofiMoneyTransferService()
-        self.supabase = create_client(
+        self.supabase = get_supabase_client(
             os.getenv("SUPABASE_URL"),
             os.getenv("SUPABASE_KEY")
         )
@@ -505,9 +444,9 @@ class SofiAssistant:
         if any(pattern in message_lower for pattern in pin_check_patterns):
             try:
                 # WhatsApp user lookup for PIN check
-                result = self.supabase.table("users").select("pin_hash").eq("whatsapp_number", phone_number).execute()
+                user = await run_blocking(resolve_whatsapp_user, phone_number)
                 
-                if result.data and result.data[0].get("pin_hash"):
+                if user and user.get("pin_hash"):
                     return "🔐 Your transaction PIN is already set and secure."
                 else:
                     return "🔓 You haven't set a transaction PIN yet. Would you like to create one?"
@@ -534,16 +473,6 @@ class SofiAssistant:
                 logger.error(f"❌ Instant account check error: {e}")
                 return "❌ Unable to fetch account details right now."
         
-        # No instant execution available
-        return None
-                    return f"🏦 Your virtual account:\n📞 {account_number}\n🏛️ {bank_name}"
-                else:
-                    return "❌ Unable to fetch account details. Please complete onboarding first."
-                    
-            except Exception as e:
-                logger.error(f"❌ Instant account check error: {e}")
-                return "❌ Unable to fetch account details right now."
-        
         # No instant execution available
         return None
     
@@ -587,153 +516,78 @@ class SofiAssistant:
             return f"🤖 Processing your request, {user_name}..."
     
     async def _start_background_processing(self, phone_number: str, message: str, user_data: Dict = None):
-        """Start the actual OpenAI processing in background"""
+        """Queue the message on the user's mailbox - runs are serialized per user"""
         try:
-            # 🚀 ENHANCED FIX: Prevent duplicate processing with better user-level locking
-            if phone_number in background_manager.active_tasks:
-                logger.info(f"🔄 Background task already running for {phone_number} - sending duplicate message response")
-                # For double messages, send the same type of response instead of ignoring
-                await background_manager._send_platform_message(phone_number, "whatsapp",
-                    "Hi there! How can I help you today? 😊")
-                return
-            
-            background_manager.active_tasks[phone_number] = time.time()
-            
-            # Get or create thread (fast)
-            thread_id = await self._get_or_create_thread(phone_number)
-            
-            # 🚀 ENHANCED FIX: Better active run detection with cancellation
-            active_run_id = self._check_active_run(thread_id)
-            
-            if active_run_id:
-                logger.info(f"⏳ Thread {thread_id} has active run {active_run_id}")
-                
-                # Try to cancel the active run if it's stuck
-                try:
-                    self.client.beta.threads.runs.cancel(
-                        thread_id=thread_id,
-                        run_id=active_run_id
-                    )
-                    logger.info(f"🛑 Cancelled active run {active_run_id}")
-                    # Wait a moment for cancellation to take effect
-                    await asyncio.sleep(0.5)
-                except Exception as cancel_error:
-                    logger.warning(f"⚠️ Could not cancel run {active_run_id}: {cancel_error}")
-                
-                # Try to wait for completion (short timeout)
-                completed = await self._wait_for_run_completion(thread_id, active_run_id, max_wait_seconds=2)
-                
-                if not completed:
-                    # Run is still active, send friendly duplicate response for double messages
-                    user_name = user_data.get('first_name', 'there') if user_data else 'there'
-                    await background_manager._send_platform_message(phone_number, "whatsapp",
-                        f"Hi {user_name}! I'm still working on your previous message. How can I help you today? 😊")
-                    # Clean up our task
-                    if phone_number in background_manager.active_tasks:
-                        del background_manager.active_tasks[phone_number]
-                    return
-                
-                logger.info(f"✅ Previous run completed, proceeding with new message")
-            
-            # Add small delay to prevent race conditions with rapid double messages
-            await asyncio.sleep(0.1)
-            
-            # Double-check for active runs one more time after delay
-            active_run_id_recheck = self._check_active_run(thread_id)
-            if active_run_id_recheck:
-                logger.info(f"⏳ Race condition detected: Found active run {active_run_id_recheck} after delay")
-                user_name = user_data.get('first_name', 'there') if user_data else 'there'
-                await background_manager._send_platform_message(phone_number, "whatsapp",
-                    f"Hi {user_name}! How can I help you today? 😊")
-                if phone_number in background_manager.active_tasks:
-                    del background_manager.active_tasks[phone_number]
-                return
-            
-            # Add user context to the message
+            await user_mailbox.submit(phone_number, (message, user_data), self._process_message_batch)
+        except Exception as e:
+            logger.error(f"❌ Background processing setup error: {e}")
+            await background_manager._send_platform_message(phone_number, "whatsapp",
+                "❌ Sorry, I encountered an issue. Please try again.")
+    
+    async def _process_message_batch(self, phone_number: str, batch: list):
+        """Add queued messages to the thread in arrival order and answer them with one run"""
+        # Latest context wins when several messages were coalesced
+        user_data = next((data for _, data in reversed(batch) if data), None)
+        
+        # Get or create thread (fast)
+        thread_id = await self._get_or_create_thread(phone_number)
+        
+        for index, (message, _) in enumerate(batch):
             context_message = self._prepare_context_message(message, phone_number, user_data)
-            
-            # 🚀 ENHANCED FIX: Safe message creation with better double message handling
             try:
-                self.client.beta.threads.messages.create(
-                    thread_id=thread_id,
-                    role="user",
-                    content=context_message
-                )
-            except Exception as msg_error:
-                if "while a run" in str(msg_error) and "is active" in str(msg_error):
-                    logger.warning(f"⚠️ Message creation failed due to active run: {msg_error}")
-                    user_name = user_data.get('first_name', 'there') if user_data else 'there'
-                    await background_manager._send_platform_message(phone_number, "whatsapp",
-                        f"Hi {user_name}! How can I help you today? 😊")
-                    # Clean up our task
-                    if phone_number in background_manager.active_tasks:
-                        del background_manager.active_tasks[phone_number]
-                    return
-                else:
-                    raise msg_error
+                await self._add_thread_message(thread_id, context_message)
+            except NotFoundError:
+                if index:
+                    raise
+                # Stored thread was deleted by OpenAI - start a new conversation
+                thread_store.discard(phone_number, thread_id)
+                thread_id = await self._get_or_create_thread(phone_number)
+                await self._add_thread_message(thread_id, context_message)
+        
+        # Run and drive to completion from the stream
+        await background_manager.process_openai_run_background(
+            thread_id, phone_number, self.assistant_id, self.money_service
+        )
+    
+    async def _add_thread_message(self, thread_id: str, content: str):
+        """Add a user message, waiting out a run started by another worker process"""
+        # The sync client blocks, so its calls run off the event loop
+        try:
+            await run_blocking(
+                self.client.beta.threads.messages.create,
+                thread_id=thread_id,
+                role="user",
+                content=content
+            )
+        except Exception as msg_error:
+            if not ("while a run" in str(msg_error) and "is active" in str(msg_error)):
+                raise
             
-            # 🚀 ENHANCED FIX: Safe run creation with better double message handling
-            try:
-                run = self.client.beta.threads.runs.create(
-                    thread_id=thread_id,
-                    assistant_id=self.assistant_id
-                )
-            except Exception as run_error:
-                if "while a run" in str(run_error) and "is active" in str(run_error):
-                    logger.warning(f"⚠️ Run creation failed due to active run: {run_error}")
-                    user_name = user_data.get('first_name', 'there') if user_data else 'there'
-                    await background_manager._send_platform_message(phone_number, "whatsapp",
-                        f"Hi {user_name}! How can I help you today? 😊")
-                    # Clean up our task
-                    if phone_number in background_manager.active_tasks:
-                        del background_manager.active_tasks[phone_number]
-                    return
-                else:
-                    raise run_error
+            # The mailbox serializes runs within this process; another worker
+            # may still own a run on the same thread, so wait for it instead
+            active_run_id = await run_blocking(self._check_active_run, thread_id)
+            if active_run_id:
+                logger.info(f"⏳ Waiting for run {active_run_id} started elsewhere on {thread_id}")
+                await self._wait_for_run_completion(thread_id, active_run_id, max_wait_seconds=30)
             
-            # Start background completion processing
-            await background_manager.process_openai_run_background(
-                run, thread_id, phone_number, self.client, self.money_service
+            await run_blocking(
+                self.client.beta.threads.messages.create,
+                thread_id=thread_id,
+                role="user",
+                content=content
             )
-            
-        except Exception as e:
-            logger.error(f"❌ Background processing setup error: {e}")
-            await background_manager._send_platform_message(phone_number, "whatsapp",
-                "❌ Sorry, I encountered an issue. Please try again.")
-            # Clean up our task
-            if phone_number in background_manager.active_tasks:
-                del background_manager.active_tasks[phone_number]
-        finally:
-            # Ensure we clean up the task tracking
-            if phone_number in background_manager.active_tasks:
-                del background_manager.active_tasks[phone_number]
     
     async def _get_or_create_thread(self, phone_number: str) -> str:
         """Get existing thread or create new one for user"""
         try:
-            # Check if user has existing thread in database based on WhatsApp number
-            result = self.supabase.table("users").select("assistant_thread_id").eq("whatsapp_number", phone_number).execute()
-            
-            if result.data and result.data[0].get("assistant_thread_id"):
-                logger.info(f"🔍 Found existing thread for WhatsApp {phone_number}: {result.data[0]['assistant_thread_id']}")
-                return result.data[0]["assistant_thread_id"]
-            
-            # Create new thread
-            thread = self.client.beta.threads.create()
-            
-            # Update user record with thread ID based on WhatsApp number
-            self.supabase.table("users").update({
-                "assistant_thread_id": thread.id,
-                "updated_at": datetime.utcnow().isoformat()
-            }).eq("whatsapp_number", phone_number).execute()
-            
-            logger.info(f"✅ Created new thread {thread.id} for WhatsApp user {phone_number}")
-            return thread.id
-            
+            # Store reads and thread creation both block
+            return await run_blocking(
+                thread_store.get_or_create, phone_number, lambda: self.client.beta.threads.create().id
+            )
         except Exception as e:
             logger.error(f"❌ Error managing thread for WhatsApp {phone_number}: {e}")
             # Fallback: create temporary thread
-            thread = self.client.beta.threads.create()
+            thread = await run_blocking(self.client.beta.threads.create)
             return thread.id
     
     def _prepare_context_message(self, message: str, phone_number: str, user_data: Dict = None) -> str:
@@ -770,23 +624,14 @@ class SofiAssistant:
             return None
     
     async def _wait_for_run_completion(self, thread_id: str, run_id: str, max_wait_seconds: int = 3) -> bool:
-        """Wait for run to complete with timeout"""
+        """Wait for run to complete with timeout (adaptive async polling)"""
         try:
-            start_time = time.time()
-            
-            while time.time() - start_time < max_wait_seconds:
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run_id
-                )
-                
-                if run.status in ["completed", "failed", "cancelled", "expired"]:
-                    logger.info(f"✅ Run {run_id} completed with status {run.status}")
-                    return True
-                
-                # Short wait before checking again
-                await asyncio.sleep(0.5)
-            
+            run = await asyncio.wait_for(
+                run_driver.wait_for_run(thread_id, run_id), timeout=max_wait_seconds
+            )
+            logger.info(f"✅ Run {run_id} completed with status {run.status}")
+            return run.status not in ("timeout", "error")
+        except asyncio.TimeoutError:
             logger.info(f"⏰ Run {run_id} still active after {max_wait_seconds}s timeout")
             return False
         except Exception as e:
@@ -4,11 +4,13 @@ Handles function calling and thread management for each user
 """
 
 import os
-import json
 import logging
 from typing import Dict, Any, Optional, Tuple
-from openai import OpenAI
 from dotenv import load_dotenv
+from utils.user_mailbox import user_mailbox
+from utils.assistant_run_driver import run_driver
+from utils.thread_store import thread_store
+from utils.async_bridge import run_blocking, run_isolated
 
 load_dotenv()
 
@@ -19,35 +21,32 @@ class SofiAssistant:
     
     def __init__(self):
         """Initialize the OpenAI Assistant with v2 API"""
+        self.assistant_id = os.getenv("OPENAI_ASSISTANT_ID")
+        
+        if not self.assistant_id:
+            raise ValueError("OPENAI_ASSISTANT_ID not found in environment variables")
+        
+        # Imported here so importing the package (e.g. for security alerts) stays cheap
+        from openai import OpenAI
         self.client = OpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
             default_headers={
                 "OpenAI-Beta": "assistants=v2"  # Fix deprecated v1 API
             }
         )
-        self.assistant_id = os.getenv("OPENAI_ASSISTANT_ID")
-        
-        if not self.assistant_id:
-            raise ValueError("OPENAI_ASSISTANT_ID not found in environment variables")
-        
-        # Store user threads in memory (in production, store in database)
-        self.user_threads: Dict[str, str] = {}
         
         logger.info(f"✅ Sofi Assistant initialized with ID: {self.assistant_id}")
     
     def get_or_create_thread(self, chat_id: str) -> str:
         """Get existing thread or create new one for user with v2 API"""
-        if chat_id not in self.user_threads:
-            try:
-                thread = self.client.beta.threads.create()
-                self.user_threads[chat_id] = thread.id
-                logger.info(f"📧 Created new thread for user {chat_id}: {thread.id}")
-            except Exception as e:
-                logger.error(f"Error creating thread: {e}")
-                # Fallback - disable assistant for now
-                return None
-        
-        return self.user_threads[chat_id]
+        try:
+            return thread_store.get_or_create(
+                chat_id, lambda: self.client.beta.threads.create().id
+            )
+        except Exception as e:
+            logger.error(f"Error creating thread: {e}")
+            # Fallback - disable assistant for now
+            return None
     
     async def process_message(self, chat_id: str, message: str, user_data: Dict = None) -> Tuple[str, Optional[Dict]]:
         """
@@ -55,9 +54,6 @@ class SofiAssistant:
         Returns: (response_text, function_call_data)
         """
         try:
-            # Get or create thread for this user
-            thread_id = self.get_or_create_thread(chat_id)
-            
             # Add user context to the message if available
             enhanced_message = message
             if user_data:
@@ -69,118 +65,53 @@ class SofiAssistant:
                 user_context += f"] {message}"
                 enhanced_message = user_context
             
-            # Add message to thread
-            self.client.beta.threads.messages.create(
-                thread_id=thread_id,
-                role="user",
-                content=enhanced_message
-            )
-            
-            # Run the assistant
-            run = self.client.beta.threads.runs.create(
-                thread_id=thread_id,
-                assistant_id=self.assistant_id
-            )
-            
-            # Wait for completion and handle function calls
-            return await self._handle_run_completion(thread_id, run.id, chat_id)
+            # Serialize runs per user; a coalesced message gets no reply of its own
+            result = await user_mailbox.submit(chat_id, enhanced_message, self._run_message_batch)
+            return result if result is not None else ("", None)
             
         except Exception as e:
             logger.error(f"❌ Error processing message with assistant: {str(e)}")
             return f"Sorry, I encountered an error processing your request: {str(e)}", None
     
-    async def _handle_run_completion(self, thread_id: str, run_id: str, chat_id: str) -> Tuple[str, Optional[Dict]]:
-        """Handle run completion and function calls"""
-        try:
-            while True:
-                # Check run status
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run_id
-                )
-                
-                if run.status == "completed":
-                    # Get the assistant's response
-                    messages = self.client.beta.threads.messages.list(thread_id=thread_id)
-                    latest_message = messages.data[0]
-                    
-                    if latest_message.role == "assistant":
-                        response_text = latest_message.content[0].text.value
-                        return response_text, None
-                    
-                elif run.status == "requires_action":
-                    # Handle function calls
-                    required_action = run.required_action
-                    if required_action.type == "submit_tool_outputs":
-                        return await self._handle_function_calls(
-                            thread_id, run_id, required_action.submit_tool_outputs.tool_calls, chat_id
-                        )
-                
-                elif run.status in ["failed", "cancelled", "expired"]:
-                    logger.error(f"❌ Assistant run failed with status: {run.status}")
-                    return "Sorry, I encountered an error processing your request.", None
-                
-                # Wait a bit before checking again
-                import asyncio
-                await asyncio.sleep(1)
-                
-        except Exception as e:
-            logger.error(f"❌ Error handling run completion: {str(e)}")
-            return f"Sorry, I encountered an error: {str(e)}", None
+    async def _run_message_batch(self, chat_id: str, messages: list) -> Tuple[str, Optional[Dict]]:
+        """Answer the queued messages with one streamed run on the user's thread"""
+        # Get or create thread for this user (a store read and maybe an API call)
+        thread_id = await run_blocking(self.get_or_create_thread, chat_id)
+        
+        # Messages are added with the run; tool calls execute as soon as requested
+        run_kwargs = dict(
+            assistant_id=self.assistant_id,
+            tool_executor=lambda name, args: run_isolated(self._execute_tool_call, chat_id, name, args),
+            additional_messages=[{"role": "user", "content": content} for content in messages],
+        )
+        result = await run_driver.run(thread_id=thread_id, **run_kwargs)
+        
+        if result.status == "thread_not_found":
+            # Stored thread was deleted by OpenAI - start a new conversation
+            thread_store.discard(chat_id, thread_id)
+            thread_id = await run_blocking(self.get_or_create_thread, chat_id)
+            result = await run_driver.run(thread_id=thread_id, **run_kwargs)
+        
+        if not result.completed:
+            logger.error(f"❌ Assistant run failed with status: {result.status}")
+            return "Sorry, I encountered an error processing your request.", None
+        
+        return result.text or "", result.function_results or None
     
-    async def _handle_function_calls(self, thread_id: str, run_id: str, tool_calls: list, chat_id: str) -> Tuple[str, Optional[Dict]]:
-        """Handle function calls from the assistant"""
-        try:
-            tool_outputs = []
-            function_results = {}  # Track function results
-            
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_args = json.loads(tool_call.function.arguments)
-                
-                logger.info(f"🔧 Function called: {function_name} with args: {function_args}")
-                
-                # Add chat_id to function arguments
-                function_args['chat_id'] = chat_id
-                
-                # Execute the function
-                try:
-                    result = await self._execute_function(function_name, function_args)
-                    function_results[function_name] = result  # Store function result
-                    
-                    tool_outputs.append({
-                        "tool_call_id": tool_call.id,
-                        "output": json.dumps(result)
-                    })
-                except Exception as e:
-                    logger.error(f"❌ Error executing function {function_name}: {str(e)}")
-                    tool_outputs.append({
-                        "tool_call_id": tool_call.id,
-                        "output": json.dumps({"error": str(e)})
-                    })
-            
-            # Submit tool outputs
-            self.client.beta.threads.runs.submit_tool_outputs(
-                thread_id=thread_id,
-                run_id=run_id,
-                tool_outputs=tool_outputs
-            )
-            
-            # Continue waiting for completion, but pass function results
-            response, _ = await self._handle_run_completion(thread_id, run_id, chat_id)
-            return response, function_results  # Return function results
-            
-        except Exception as e:
-            logger.error(f"❌ Error handling function calls: {str(e)}")
-            return f"Sorry, I encountered an error executing functions: {str(e)}", None
-            return f"Sorry, I encountered an error executing functions: {str(e)}", None
+    async def _execute_tool_call(self, chat_id: str, function_name: str, function_args: Dict[str, Any]) -> Dict[str, Any]:
+        """Execute one function call on behalf of a user"""
+        logger.info(f"🔧 Function called: {function_name} with args: {function_args}")
+        
+        # Add chat_id to function arguments
+        function_args['chat_id'] = chat_id
+        return await self._execute_function(function_name, function_args)
     
     async def _execute_function(self, function_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
         """Execute the requested function"""
         
         # Import function handlers
         from functions.balance_functions import check_balance
-        from functions.transfer_functions import send_money, calculate_transfer_fee
+        from functions.transfer_functions import send_money, send_group_payout, calculate_transfer_fee
         from functions.transaction_functions import record_deposit, get_transfer_history, get_wallet_statement
         from functions.security_functions import verify_pin
         from functions.notification_functions import send_receipt, send_alert, update_transaction_status
@@ -194,6 +125,7 @@ class SofiAssistant:
         function_map = {
             'check_balance': check_balance,
             'send_money': send_money,
+            'send_group_payout': send_group_payout,
             'record_deposit': record_deposit,
             'send_receipt': send_receipt,
             'send_alert': send_alert,
@@ -0,0 +1,15 @@
+-- Assistant thread store columns
+-- Run this in your Supabase SQL editor
+
+-- users.assistant_thread_id holds each user's OpenAI Assistant thread;
+-- assistant_thread_used_at records when it was last used so idle threads
+-- (which OpenAI deletes) expire after a restart too. utils/thread_store.py
+-- refreshes it at most once per THREAD_STORE_TOUCH_INTERVAL.
+ALTER TABLE public.users ADD COLUMN IF NOT EXISTS assistant_thread_id TEXT;
+ALTER TABLE public.users ADD COLUMN IF NOT EXISTS assistant_thread_used_at TIMESTAMPTZ;
+
+-- Threads stored before last use was tracked start from the row's last update
+UPDATE public.users
+SET assistant_thread_used_at = updated_at
+WHERE assistant_thread_id IS NOT NULL
+  AND assistant_thread_used_at IS NULL;
@@ -0,0 +1,16 @@
+-- Server-assigned insert time for the balance ledger watermark
+-- Run this in your Supabase SQL editor
+
+-- created_at is set by whoever writes the row (a redelivered webhook keeps
+-- Paystack's original payment time), so it cannot tell a reader which rows
+-- are new. inserted_at is always the database's own clock.
+ALTER TABLE public.bank_transactions
+    ADD COLUMN IF NOT EXISTS inserted_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+-- Existing rows were inserted at (about) their created_at
+UPDATE public.bank_transactions
+SET inserted_at = created_at
+WHERE created_at IS NOT NULL AND created_at < inserted_at;
+
+CREATE INDEX IF NOT EXISTS idx_bank_transactions_user_inserted_at
+    ON public.bank_transactions(user_id, inserted_at);
@@ -0,0 +1,113 @@
+"""
+Endpoint selection benchmark for airtime and data purchases
+
+Runs local stub Clubkonnect providers in place of the real mirrors: one that
+refuses connections, one behind a failing gateway (503), a slow one and a
+healthy one, listed in that order. It times purchases through the previous
+selection (DNS lookup + HEAD per endpoint, in order, before every purchase)
+and through utils/airtime_endpoints.py, whose background probes rank the
+healthy stub first. Finally the healthy stub is stopped mid-run to show a
+purchase failing over to the next endpoint within the same request.
+
+Usage:
+    python benchmark_airtime_endpoints.py [purchases] [slow_seconds]
+"""
+
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+SLOW_SECONDS = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+
+def stub_provider(status: int = 200, delay: float = 0.0) -> ThreadingHTTPServer:
+    """A Clubkonnect stand-in answering HEAD probes and *_api.php purchases"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, body: bytes):
+            time.sleep(delay)
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def do_HEAD(self):
+            self._reply(b"")
+
+        def do_GET(self):
+            self._reply(b"ORDER_RECEIVED - transaction successful" if status == 200 else b"Bad Gateway")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+refused = f"http://127.0.0.1:{free_port()}"
+gateway, slow, healthy = stub_provider(503), stub_provider(delay=SLOW_SECONDS), stub_provider()
+os.environ["AIRTIME_ENDPOINTS"] = ",".join(
+    [refused] + [f"http://127.0.0.1:{server.server_address[1]}" for server in (gateway, slow, healthy)]
+)
+os.environ.setdefault("NELLOBYTES_USERID", "bench")
+os.environ.setdefault("NELLOBYTES_APIKEY", "bench")
+
+# Imported after the stubs are up: the monitor reads AIRTIME_ENDPOINTS at import
+from utils.airtime_api import AirtimeAPI
+from utils.airtime_endpoints import airtime_endpoints
+
+
+def legacy_purchase(api: AirtimeAPI):
+    """The replaced flow: probe endpoints in order, then buy on the first that answers"""
+    for endpoint in airtime_endpoints.endpoints:
+        host = endpoint.split("://", 1)[1].split(":")[0]
+        if not api.test_dns_resolution(host) or not api.test_connection(endpoint):
+            continue
+        return requests.get(f"{endpoint}/airtime_api.php", params={"amount": 100}, timeout=30)
+    raise RuntimeError("no endpoint")
+
+
+def measure(label: str, purchase, count: int):
+    timings = []
+    for _ in range(count):
+        started = time.perf_counter()
+        purchase()
+        timings.append((time.perf_counter() - started) * 1000)
+    print(f"  {label:26}: p50 {statistics.median(timings):8.1f} ms, max {max(timings):8.1f} ms")
+
+
+def main(count: int):
+    api = AirtimeAPI()
+    print(f"📶 {count} airtime purchases; endpoints: refused, 503 gateway, "
+          f"slow ({SLOW_SECONDS:.1f}s), healthy")
+    measure("probe before each (before)", lambda: legacy_purchase(api), count)
+
+    airtime_endpoints.probe_all()  # what the background thread does on start
+    print(f"  ranking: {[e.rsplit(':', 1)[1] for e in airtime_endpoints.ranked()]}")
+    measure("health monitor", lambda: api.buy_airtime(100, "08012345678", "mtn"), count)
+
+    healthy.shutdown()
+    healthy.server_close()
+    started = time.perf_counter()
+    result = api.buy_airtime(100, "08012345678", "mtn")
+    print(f"  healthy stub stopped      : failed over in {(time.perf_counter() - started) * 1000:.1f} ms "
+          f"(success={result['success']})")
+    print(f"  stats: { {k: v for k, v in airtime_endpoints.get_stats().items() if k != 'endpoints'} }")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
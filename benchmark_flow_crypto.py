@@ -0,0 +1,95 @@
+"""
+Round-trip latency benchmark for WhatsApp Flow encryption
+
+Builds Flow requests the way Meta does (a fresh AES-128 key wrapped with
+RSA-OAEP-SHA256, the payload under AES-GCM) and times decrypt + reply
+encrypt per request. The previous handler was rebuilt per request and
+re-parsed the PEM private key inside every decrypt; utils/flow_encryption.py
+parses it once per process and reuses each request's AES-GCM context for the
+reply. Meta gives a Flow endpoint a few seconds to answer; the crypto share
+of that should be negligible even when requests queue behind each other.
+
+Usage:
+    python benchmark_flow_crypto.py [requests]
+"""
+
+import base64
+import json
+import os
+import statistics
+import sys
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from utils.flow_encryption import OAEP_SHA256, FlowCryptoEngine, FlowEncryption
+
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+PRIVATE_KEY_B64 = base64.b64encode(PRIVATE_KEY.private_bytes(
+    serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+)).decode()
+REPLY = {"screen": "SUCCESS", "data": {"extension_message_response": {"params": {"flow_token": "tok"}}}}
+
+
+def meta_request(index: int) -> dict:
+    aes_key, iv = os.urandom(16), os.urandom(16)
+    payload = {"action": "data_exchange", "screen": "screen_oxjvpn", "flow_token": f"tok{index}",
+               "data": {"first_name": "Ada", "phone": "2348012345678", "pin": "1234"}}
+    return {
+        "encrypted_flow_data": base64.b64encode(AESGCM(aes_key).encrypt(iv, json.dumps(payload).encode(), None)).decode(),
+        "encrypted_aes_key": base64.b64encode(PRIVATE_KEY.public_key().encrypt(aes_key, OAEP_SHA256)).decode(),
+        "initial_vector": base64.b64encode(iv).decode(),
+    }
+
+
+def reparse_round_trip(body: dict) -> str:
+    """The replaced approach: parse the PEM key on every request"""
+    pem = base64.b64decode(PRIVATE_KEY_B64)
+    key = serialization.load_pem_private_key(pem, password=None)
+    aes_key = key.decrypt(base64.b64decode(body["encrypted_aes_key"]), OAEP_SHA256)
+    iv = base64.b64decode(body["initial_vector"])
+    json.loads(AESGCM(aes_key).decrypt(iv, base64.b64decode(body["encrypted_flow_data"]), None))
+    flipped = bytes(b ^ 0xFF for b in iv)
+    return base64.b64encode(AESGCM(aes_key).encrypt(flipped, json.dumps(REPLY).encode(), None)).decode()
+
+
+def engine_round_trip(engine: FlowCryptoEngine):
+    def round_trip(body: dict) -> str:
+        handle = FlowEncryption(engine)
+        handle.decrypt_request(body["encrypted_flow_data"], body["encrypted_aes_key"], body["initial_vector"])
+        return handle.encrypt_response(REPLY)
+    return round_trip
+
+
+def measure(label: str, round_trip, bodies):
+    timings = []
+    for body in bodies:
+        started = time.perf_counter()
+        assert round_trip(body)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"  {label:22}: p50 {statistics.median(timings):7.3f} ms, p99 {p99:7.3f} ms, "
+          f"{len(timings) / (sum(timings) / 1000):8.0f} round trips/s")
+
+
+def main(count: int):
+    bodies = [meta_request(i) for i in range(count)]
+    engine = FlowCryptoEngine(PRIVATE_KEY_B64)
+    engine.ready  # load the key outside the timed loop, as the worker does once
+    print(f"🔐 {count} Flow round trips (RSA-2048 OAEP unwrap + AES-GCM decrypt/encrypt)")
+    measure("re-parse key (before)", reparse_round_trip, bodies)
+    measure("flow_crypto engine", engine_round_trip(engine), bodies)
+
+    started = time.perf_counter()
+    decrypted = engine.decrypt_batch(bodies)
+    engine.encrypt_batch((REPLY, context) for _, context in decrypted)
+    elapsed = (time.perf_counter() - started) * 1000
+    print(f"  batch API             : {elapsed:8.1f} ms for {count} ({elapsed / count:.3f} ms each)")
+    print(f"  stats: {engine.get_stats()}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
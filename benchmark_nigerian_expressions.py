@@ -0,0 +1,91 @@
+"""
+Microbenchmark for the Nigerian expression rewriter
+
+Compares the compiled single-pass rewriter in utils/nigerian_expressions.py
+with the previous approach (one re.search/re.sub per amount pattern, then one
+str.replace per expression) over a corpus of typical WhatsApp message shapes.
+
+Usage:
+    python benchmark_nigerian_expressions.py [iterations]
+"""
+
+import re
+import sys
+import time
+
+from utils.nigerian_expressions import NigerianExpressionsDatabase
+
+CORPUS = [
+    "Abeg send 5k give my guy sharp sharp",
+    "My account don empty, wetin remain?",
+    "I wan buy credit for my phone",
+    "Transfer 50k give my mama for village now now",
+    "How much ego I get for my wallet?",
+    "send 2.5k to 0123456789 gtbank",
+    "hi",
+    "balance",
+    "Oya dash am 10k, na my padi",
+    "pls transfer 1.2m to my brother access bank 0987654321 urgent",
+    "wetin dey my account",
+    "I need to buy data for 08012345678 make e fast",
+    "Credit am 20k for opay, na emergency",
+    "good morning sofi, how far? I wan check account",
+    "settle her 15k abeg, she dey wait since",
+    "my paddy need 3k for transport, send give am now now",
+    "Top up my airtime 500 naira",
+    "money don finish for my side o, I broke",
+    "zipu 4k to my sister",
+    "aika kudi 7k zuwa ga abokina",
+]
+
+
+def legacy_enhance(db: NigerianExpressionsDatabase, message: str) -> str:
+    """The replaced implementation, kept here for comparison only"""
+    enhanced = message.lower()
+    for patterns in db.amount_patterns.values():
+        for pattern, replacement_func in patterns.items():
+            if re.search(pattern, enhanced):
+                enhanced = re.sub(pattern, replacement_func, enhanced)
+    for expressions in db.expressions.values():
+        for nigerian_expr, english_expr in expressions.items():
+            if nigerian_expr in enhanced:
+                enhanced = enhanced.replace(nigerian_expr, english_expr)
+    return enhanced
+
+
+def run_benchmark(iterations: int = 2000):
+    db = NigerianExpressionsDatabase()
+    messages = CORPUS * iterations
+
+    start = time.perf_counter()
+    for message in messages:
+        legacy_enhance(db, message)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for message in messages:
+        db.enhance_message(message)
+    compiled_seconds = time.perf_counter() - start
+
+    # enhance_message also runs urgency/relationship detection; time the rewrite alone too
+    start = time.perf_counter()
+    for message in messages:
+        db._rewriter.sub(lambda m: "", message.lower())
+    rewrite_seconds = time.perf_counter() - start
+
+    per_message = lambda seconds: seconds / len(messages) * 1e6
+    print(f"🇳🇬 {len(messages)} messages ({len(CORPUS)} shapes x {iterations})")
+    print(f"  legacy replace loop : {per_message(legacy_seconds):7.2f} µs/message")
+    print(f"  enhance_message     : {per_message(compiled_seconds):7.2f} µs/message (incl. context detection)")
+    print(f"  single-pass rewrite : {per_message(rewrite_seconds):7.2f} µs/message")
+
+    print("\nOutput differences (legacy rewrites inside words and re-rewrites replacements):")
+    for message in CORPUS:
+        old = legacy_enhance(db, message)
+        new = db.enhance_message(message)["enhanced_message"]
+        if old != new:
+            print(f"  '{message}'\n    legacy  : '{old}'\n    compiled: '{new}'")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
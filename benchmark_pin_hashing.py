@@ -0,0 +1,72 @@
+"""
+Event-loop stall benchmark for PIN hashing
+
+Submits many PIN verifications concurrently on one event loop while a
+heartbeat coroutine ticks every millisecond, and reports how late the
+heartbeat ran. Hashing inline (the previous code) freezes the loop for the
+full PBKDF2 cost of each attempt; utils/pin_hasher.py runs it on a bounded
+thread pool so the loop keeps serving other requests.
+
+Usage:
+    python benchmark_pin_hashing.py [concurrent_submissions]
+"""
+
+import asyncio
+import hashlib
+import sys
+import time
+
+from utils.pin_hasher import PinHasher, hash_pin
+
+SALT = "2348012345678"
+PIN = "4821"
+STORED_HASH = hash_pin(PIN, SALT)
+
+
+async def inline_verify(user_key: str, pin: str) -> bool:
+    """The replaced approach: PBKDF2 directly inside the coroutine"""
+    pin_hash = hashlib.pbkdf2_hmac('sha256', pin.encode('utf-8'), SALT.encode('utf-8'), 100000).hex()
+    return pin_hash == STORED_HASH
+
+
+async def measure(label: str, verify, submissions: int):
+    lags = []
+    done = asyncio.Event()
+
+    async def heartbeat():
+        while not done.is_set():
+            expected = time.perf_counter() + 0.001
+            await asyncio.sleep(0.001)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    ticker = asyncio.create_task(heartbeat())
+    await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    # Distinct users with wrong PINs except the first: no cache hits, no lockouts
+    results = await asyncio.gather(*(
+        verify(f"user{i}", PIN if i == 0 else f"{i % 10000:04d}") for i in range(submissions)
+    ))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await ticker
+
+    lags.sort()
+    print(f"  {label:22}: {elapsed * 1000:8.1f} ms total, "
+          f"heartbeat lag p50 {lags[len(lags) // 2] * 1000:6.2f} ms, "
+          f"max {lags[-1] * 1000:7.2f} ms, {sum(results)} valid")
+
+
+async def main(submissions: int):
+    hasher = PinHasher(max_failures=10 ** 6)
+    print(f"🔐 {submissions} concurrent PIN submissions (PBKDF2-SHA256, 100k iterations)")
+    await measure("inline (before)", inline_verify, submissions)
+    await measure("pin_hasher pool", lambda user, pin: hasher.verify(user, pin, SALT, STORED_HASH), submissions)
+
+    started = time.perf_counter()
+    await hasher.verify("user0", PIN, SALT, STORED_HASH)
+    print(f"  repeat correct PIN    : {(time.perf_counter() - started) * 1e6:8.1f} µs (verified cache)")
+    print(f"  stats: {hasher.get_stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
@@ -0,0 +1,109 @@
+"""
+Benchmark for the rate limiting engine
+
+Simulates traffic from many distinct IPs (10k by default) against the
+sliding-window counters in utils/rate_limit_engine.py and the previous
+approach (a deque of up to 24 hours of timestamps per IP, scanned once per
+rule on every request), reporting time per check and memory per IP.
+
+Usage:
+    python benchmark_rate_limiter.py [ips] [requests_per_ip]
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+from collections import defaultdict, deque
+
+from utils.rate_limit_engine import RateLimitEngine, RateLimitRule
+
+RULES = [
+    RateLimitRule('burst_requests', 10, 10, '10 seconds'),
+    RateLimitRule('requests_per_minute', 60, 60, '1 minute'),
+    RateLimitRule('requests_per_hour', 1000, 3600, '1 hour'),
+    RateLimitRule('requests_per_day', 10000, 86400, '1 day'),
+]
+
+
+class LegacyRateLimiter:
+    """The replaced deque-scanning limiter, kept here for comparison only"""
+
+    def __init__(self):
+        self.requests = defaultdict(deque)
+
+    def hit(self, ip: str, now: float):
+        queue = self.requests[ip]
+        while queue and queue[0] < now - 86400:
+            queue.popleft()
+        queue.append(now)
+        for rule in RULES:
+            count = sum(1 for t in queue if t > now - rule.window)
+            if count > rule.limit:
+                return {'violated': True, 'rule': rule.name, 'actual': count}
+        return None
+
+
+def make_traffic(ips: int, requests_per_ip: int, seed: int = 7):
+    """Interleaved (ip, timestamp) pairs spread over an hour of simulated time"""
+    rng = random.Random(seed)
+    addresses = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(ips)]
+    start = time.time()  # Real clock, so the background sweeper agrees with the simulation
+    traffic = [(ip, start + rng.uniform(0, 3600)) for ip in addresses for _ in range(requests_per_ip)]
+    traffic.sort(key=lambda item: item[1])
+    return traffic
+
+
+def measure(make_limiter, traffic):
+    """Time a fresh limiter over the traffic, then replay it under tracemalloc for memory"""
+    limiter = make_limiter()
+    started = time.perf_counter()
+    limited = sum(1 for ip, now in traffic if limiter.hit(ip, now))
+    seconds = time.perf_counter() - started
+
+    tracemalloc.start()
+    limiter = make_limiter()
+    for ip, now in traffic:
+        limiter.hit(ip, now)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return seconds, size, limited, limiter
+
+
+def run_benchmark(ips: int = 10000, requests_per_ip: int = 50):
+    traffic = make_traffic(ips, requests_per_ip)
+
+    results = {
+        "legacy deque scan": measure(LegacyRateLimiter, traffic),
+        "sliding-window counters": measure(lambda: RateLimitEngine(RULES, idle_ttl=86400, max_keys=ips * 2), traffic),
+    }
+    engine = results["sliding-window counters"][3]
+
+    print(f"🚦 {len(traffic)} requests from {ips} IPs ({requests_per_ip} each, over 1 simulated hour)")
+    for name, (seconds, size, limited, _) in results.items():
+        print(f"  {name:24}: {seconds / len(traffic) * 1e6:7.2f} µs/check, "
+              f"{size / ips:7.0f} bytes/IP retained, {limited} limited")
+
+    # Hot IP: cost per check must not grow with the requests it has already made
+    hot = RateLimitEngine(RULES, idle_ttl=86400)
+    legacy = LegacyRateLimiter()
+    now = time.time()
+    for label, limiter in (("legacy", legacy), ("engine", hot)):
+        timings = []
+        for batch in range(3):
+            started = time.perf_counter()
+            for i in range(2000):
+                limiter.hit("203.0.113.9", now + batch * 2000 + i)
+            timings.append((time.perf_counter() - started) / 2000 * 1e6)
+        print(f"  hot IP {label:7}: " + " -> ".join(f"{t:.2f} µs" for t in timings)
+              + " per check after 0 / 2k / 4k requests")
+
+    expired = engine.expire(now=traffic[-1][1] + 86401)
+    print(f"  idle eviction after a day: {expired} keys expired, {engine.get_stats()['tracked_keys']} left")
+
+
+if __name__ == "__main__":
+    run_benchmark(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 10000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+    )
@@ -0,0 +1,106 @@
+"""
+Microbenchmark for the request threat classifier
+
+Compares utils/threat_classifier.py with the previous per-request approach
+(pattern lists rebuilt inside each method, then one uncompiled re.search per
+pattern) over typical traffic: WhatsApp/Meta webhooks, monitoring agents,
+browsers on the PIN page and scanners probing WordPress and config files.
+Every verdict is checked against the legacy decision before timing.
+
+Usage:
+    python benchmark_threat_classifier.py [iterations]
+"""
+
+import re
+import sys
+import time
+
+from utils.threat_classifier import (
+    ThreatClassifier, GOOD_BOT_AGENTS, MALICIOUS_BOT_AGENTS, SUSPICIOUS_CLIENT_AGENTS,
+    SUSPICIOUS_PATHS, TRUSTED_BOT_AGENTS, SUSPICIOUS_AGENTS, CMS_ATTACK_PATHS,
+    DANGEROUS_PATHS, WEBHOOK_PATH_PREFIXES,
+)
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Linux; Android 13; SM-A546E) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0 Mobile Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 Version/17.5 Mobile/15E148 Safari/604.1",
+    "facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)",
+    "WhatsApp/2.24.10.85 A",
+    "TelegramBot (like TwitterBot)",
+    "Go-http-client/1.1",
+    "Render/1.0",
+    "python-requests/2.31.0",
+    "curl/8.4.0",
+    "Mozilla/5.0 zgrab/0.x",
+    "sqlmap/1.7.2#stable (https://sqlmap.org)",
+    "Nikto/2.5.0",
+    "okhttp/4.12.0",
+    "",
+]
+
+PATHS = [
+    "/whatsapp-webhook", "/whatsapp-flow-webhook", "/api/paystack/webhook",
+    "/verify-pin", "/api/verify-pin", "/health", "/", "/onboard",
+    "/wp-login.php", "/wp-admin/setup-config.php", "/.env", "/.git/config",
+    "/phpmyadmin/index.php", "/admin/login", "/backup.sql", "/api/create_virtual_account",
+]
+
+
+def legacy_classify(user_agent: str, path: str) -> tuple:
+    """The replaced per-pattern loops, kept here for comparison only"""
+    def first(patterns, text, flags=0):
+        for pattern in list(patterns):
+            if re.search(pattern, text, flags):
+                return pattern
+        return None
+
+    agent_lower = user_agent.lower()
+    trusted = first(TRUSTED_BOT_AGENTS, user_agent, re.IGNORECASE) is not None
+    return (
+        first(GOOD_BOT_AGENTS, agent_lower),
+        first(MALICIOUS_BOT_AGENTS, agent_lower),
+        first(SUSPICIOUS_CLIENT_AGENTS, agent_lower),
+        first(SUSPICIOUS_PATHS, path, re.IGNORECASE) is not None,
+        any(path.startswith(prefix) for prefix in WEBHOOK_PATH_PREFIXES),
+        trusted,
+        None if trusted else first(SUSPICIOUS_AGENTS, user_agent, re.IGNORECASE),
+        first(CMS_ATTACK_PATHS, path, re.IGNORECASE),
+        first(DANGEROUS_PATHS, path, re.IGNORECASE),
+    )
+
+
+def run_benchmark(iterations: int = 200):
+    requests = [(agent, path) for agent in USER_AGENTS for path in PATHS]
+
+    classifier = ThreatClassifier()
+    mismatches = [(a, p) for a, p in requests if tuple(classifier._classify(a, p)) != legacy_classify(a, p)]
+    print(f"🛡️ {len(requests)} distinct (user agent, path) pairs, {len(mismatches)} verdict mismatches")
+    for agent, path in mismatches:
+        print(f"  ❌ {agent!r} {path!r}")
+
+    traffic = requests * iterations
+
+    start = time.perf_counter()
+    for agent, path in traffic:
+        legacy_classify(agent, path)
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for agent, path in requests:
+        classifier._classify(agent, path)
+    compiled_seconds = (time.perf_counter() - start) * iterations
+
+    start = time.perf_counter()
+    for agent, path in traffic:
+        classifier.classify(agent, path)
+    cached_seconds = time.perf_counter() - start
+
+    per_request = lambda seconds: seconds / len(traffic) * 1e6
+    print(f"  legacy re.search loops : {per_request(legacy_seconds):7.2f} µs/request")
+    print(f"  compiled, uncached     : {per_request(compiled_seconds):7.2f} µs/request")
+    print(f"  compiled + verdict LRU : {per_request(cached_seconds):7.2f} µs/request")
+    print(f"  stats: {classifier.get_stats()}")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
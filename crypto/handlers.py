@@ -19,7 +19,7 @@ class CryptoCommandHandler:
         try:
             # Import the existing crypto modules
             from crypto.wallet import create_bitnob_wallet, create_real_wallet, get_supabase_client
-            from crypto.rates import get_multiple_crypto_rates
+            from crypto.rates import get_rate_snapshot
             
             # Check for crypto keywords
             crypto_keywords = ['wallet', 'bitcoin', 'btc', 'ethereum', 'eth', 'usdt', 'crypto', 'cryptocurrency']
@@ -73,7 +73,8 @@ class CryptoCommandHandler:
             
             # Handle crypto rates requests
             elif any(phrase in message_lower for phrase in ['crypto rates', 'bitcoin price', 'eth price', 'usdt price', 'rates']):
-                rates = get_multiple_crypto_rates(["BTC", "ETH", "USDT"])
+                snapshot = get_rate_snapshot(["BTC", "ETH", "USDT"])
+                rates = snapshot["rates"]
                 if rates:
                     response = "💹 **Current Crypto Rates (NGN)**\n\n"
                     if rates.get('BTC'):
@@ -82,8 +83,11 @@ class CryptoCommandHandler:
                         response += f"⟠ **Ethereum:** ₦{rates['ETH']:,.2f}\n"
                     if rates.get('USDT'):
                         response += f"₮ **USDT:** ₦{rates['USDT']:,.2f}\n"
-                    from datetime import datetime
-                    response += f"\n🕐 **Updated:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+                    if snapshot["as_of"]:
+                        from datetime import datetime
+                        response += f"\n🕐 **Updated:** {datetime.fromisoformat(snapshot['as_of']).strftime('%Y-%m-%d %H:%M:%S')}\n"
+                    if snapshot["stale"]:
+                        response += "\n⚠️ Rates may be delayed - live prices are being refreshed.\n"
                     response += "\n💡 Send crypto to your Sofi wallet for instant conversion!"
                     return response
                 else:
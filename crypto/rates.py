@@ -1,17 +1,33 @@
 # crypto/rates.py
+"""
+Crypto-to-NGN rates from a background feed
 
+A refresher thread keeps one snapshot of every CRYPTO_MAPPING rate, fetched
+in a single provider call every CRYPTO_RATE_REFRESH seconds (backing off when
+CoinGecko rate-limits us). Readers never wait on the network: they get the
+current snapshot, and a snapshot older than CRYPTO_RATE_MAX_AGE is served as
+is, flagged stale, while the refresher is woken to revalidate it.
+
+The provider is pluggable: set CRYPTO_RATE_FEED_URL to point the CoinGecko
+provider at a local stub feed, or call rate_feed.set_provider() with any
+object that has fetch(crypto_ids) -> {crypto_id: ngn_rate}.
+"""
+
+import os
 import requests
 import logging
 import time
-from typing import Dict, Optional
+import threading
+from typing import Dict, Iterable, NamedTuple, Optional
 from datetime import datetime, timedelta
 
 logger = logging.getLogger(__name__)
 
-# Rate limiting and caching
-_last_request_time = 0
-_rate_cache = {}
-_cache_duration = 300  # 5 minutes cache
+CRYPTO_RATE_REFRESH = float(os.getenv("CRYPTO_RATE_REFRESH", "60"))
+CRYPTO_RATE_MAX_AGE = float(os.getenv("CRYPTO_RATE_MAX_AGE", "300"))
+CRYPTO_RATE_FEED_URL = os.getenv("CRYPTO_RATE_FEED_URL", "https://api.coingecko.com/api/v3")
+MIN_REQUEST_INTERVAL = 2  # seconds between provider calls (CoinGecko free tier)
+MAX_BACKOFF = 300
 
 # Cryptocurrency mapping for CoinGecko API
 CRYPTO_MAPPING = {
@@ -25,101 +41,227 @@ CRYPTO_MAPPING = {
     "LINK": "chainlink"
 }
 
-def get_crypto_to_ngn_rate(crypto: str = "BTC") -> float:
+# Served (flagged stale) until the first successful fetch
+FALLBACK_RATES = {
+    'BTC': 120000000.0,  # ~₦120M (approximate)
+    'ETH': 8500000.0,    # ~₦8.5M
+    'USDT': 1800.0,      # ~₦1,800
+    'USDC': 1800.0       # ~₦1,800
+}
+
+
+class RateLimited(Exception):
+    """The provider asked us to slow down"""
+
+
+class CoinGeckoProvider:
+    """simple/price lookups against CoinGecko (or a compatible stub feed)"""
+
+    def __init__(self, base_url: str = CRYPTO_RATE_FEED_URL, timeout: float = 15):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def fetch(self, crypto_ids: Iterable[str]) -> Dict[str, float]:
+        response = self.session.get(
+            f"{self.base_url}/simple/price",
+            params={"ids": ",".join(crypto_ids), "vs_currencies": "ngn"},
+            timeout=self.timeout
+        )
+        if response.status_code == 429:
+            raise RateLimited("Rate limited by CoinGecko API")
+        response.raise_for_status()
+        return {
+            crypto_id: float(price["ngn"])
+            for crypto_id, price in response.json().items()
+            if isinstance(price, dict) and price.get("ngn")
+        }
+
+
+class RateSnapshot(NamedTuple):
+    rates: Dict[str, float]  # symbol -> NGN
+    fetched_at: float  # epoch seconds, 0 for fallback rates
+    source: str  # "live" or "fallback"
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.fetched_at if self.fetched_at else float("inf")
+
+    @property
+    def stale(self) -> bool:
+        return self.source != "live" or self.age > CRYPTO_RATE_MAX_AGE
+
+
+class CryptoRateFeed:
+    """Background refresher holding the latest snapshot of all supported rates"""
+
+    def __init__(self, provider=None, refresh_interval: float = CRYPTO_RATE_REFRESH):
+        self.provider = provider or CoinGeckoProvider()
+        self.refresh_interval = refresh_interval
+        self._snapshot = RateSnapshot(dict(FALLBACK_RATES), 0.0, "fallback")
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._live = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._backoff = 0.0
+        self._last_request = 0.0
+        self._stats = {"refreshes": 0, "failures": 0, "rate_limited": 0,
+                       "reads": 0, "stale_reads": 0, "revalidations": 0}
+
+    # =================== READERS ===================
+
+    def snapshot(self, wait: float = 0) -> RateSnapshot:
+        """
+        The current snapshot, without touching the network
+
+        Args:
+            wait: Seconds to wait for the first live snapshot if there is
+                none yet (0 = never block)
+        """
+        self._ensure_running()
+        if wait and not self._live.is_set():
+            self._live.wait(wait)
+        snapshot = self._snapshot
+        with self._lock:
+            self._stats["reads"] += 1
+            if snapshot.stale:
+                self._stats["stale_reads"] += 1
+        # Stale-while-revalidate: serve it, refresh in the background (unless backing off)
+        if snapshot.stale and not self._backoff and not self._wakeup.is_set():
+            with self._lock:
+                self._stats["revalidations"] += 1
+            self._wakeup.set()
+        return snapshot
+
+    def set_provider(self, provider):
+        """Swap the rate source (e.g. a stub feed in tests) and refresh now"""
+        self.provider = provider
+        self._backoff = 0.0
+        self._wakeup.set()
+
+    # =================== REFRESHER ===================
+
+    def _ensure_running(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            # A forked worker inherits the snapshot but not the thread
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="crypto-rate-feed", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            self._wakeup.wait(self.refresh_interval + self._backoff)
+            self._wakeup.clear()
+
+    def refresh(self) -> bool:
+        """Fetch every supported rate in one provider call"""
+        pause = MIN_REQUEST_INTERVAL - (time.time() - self._last_request)
+        if pause > 0:
+            time.sleep(pause)
+        self._last_request = time.time()
+        ids_to_symbol = {crypto_id: symbol for symbol, crypto_id in CRYPTO_MAPPING.items()}
+        try:
+            fetched = self.provider.fetch(list(ids_to_symbol))
+        except RateLimited as e:
+            self._failed(e, "rate_limited")
+            return False
+        except Exception as e:
+            self._failed(e, "failures")
+            return False
+
+        rates = {ids_to_symbol[crypto_id]: rate for crypto_id, rate in fetched.items() if crypto_id in ids_to_symbol}
+        if not rates:
+            self._failed(ValueError("empty rate response"), "failures")
+            return False
+        if self._snapshot.source == "live":
+            # Keep last known rates for coins this response left out
+            rates = {**self._snapshot.rates, **rates}
+        self._snapshot = RateSnapshot(rates, time.time(), "live")
+        self._backoff = 0.0
+        self._live.set()
+        with self._lock:
+            self._stats["refreshes"] += 1
+        logger.info(f"Refreshed {len(rates)} crypto rates")
+        return True
+
+    def _failed(self, error: Exception, counter: str):
+        self._backoff = min(MAX_BACKOFF, max(self.refresh_interval, self._backoff * 2))
+        with self._lock:
+            self._stats[counter] += 1
+        logger.warning(f"Crypto rate refresh failed ({error}); serving snapshot aged "
+                       f"{self._snapshot.age:.0f}s, next attempt in {self.refresh_interval + self._backoff:.0f}s")
+
+    def get_stats(self) -> Dict:
+        snapshot = self._snapshot
+        with self._lock:
+            return {**self._stats, "source": snapshot.source, "stale": snapshot.stale,
+                    "age_seconds": round(snapshot.age, 1) if snapshot.fetched_at else None,
+                    "backoff_seconds": self._backoff}
+
+
+# Global feed (the refresher starts on first read)
+rate_feed = CryptoRateFeed()
+
+
+def get_rate_snapshot(cryptos: list = None) -> Dict:
     """
-    Fetch live conversion rate for cryptocurrency to Nigerian Naira with caching and rate limiting
+    Rates with their freshness, for callers that show or act on staleness
+
+    Returns:
+        dict: {"rates": {symbol: ngn}, "as_of": iso time or None,
+               "age_seconds": float or None, "stale": bool, "source": str}
+    """
+    snapshot = rate_feed.snapshot()
+    rates = snapshot.rates
+    if cryptos is not None:
+        rates = {c.upper(): rates[c.upper()] for c in cryptos if c.upper() in rates}
+    return {
+        "rates": dict(rates),
+        "as_of": datetime.fromtimestamp(snapshot.fetched_at).isoformat() if snapshot.fetched_at else None,
+        "age_seconds": round(snapshot.age, 1) if snapshot.fetched_at else None,
+        "stale": snapshot.stale,
+        "source": snapshot.source
+    }
+
+
+def get_crypto_to_ngn_rate(crypto: str = "BTC", live_only: bool = False, wait: float = 0,
+                           max_age: Optional[float] = None) -> float:
+    """
+    Conversion rate for cryptocurrency to Nigerian Naira from the rate feed
     
     Args:
         crypto: Cryptocurrency symbol (BTC, ETH, USDT, etc.)
+        live_only: Return 0 instead of a fallback rate when no live rate
+            has been fetched yet (use when money is credited at this rate)
+        wait: Seconds to wait for the first live snapshot (0 = never block)
+        max_age: Return 0 if the live rate is older than this many seconds
+            (e.g. CRYPTO_RATE_MAX_AGE while the provider is failing)
     
     Returns:
-        float: Current rate in NGN, returns cached or fallback if error
+        float: Current rate in NGN, 0 if unsupported or unavailable
     """
-    global _last_request_time, _rate_cache
+    crypto_upper = crypto.upper()
+    if crypto_upper not in CRYPTO_MAPPING:
+        logger.error(f"Unsupported cryptocurrency: {crypto}")
+        return 0
     
-    try:
-        crypto_upper = crypto.upper()
-        crypto_id = CRYPTO_MAPPING.get(crypto_upper)
-        
-        if not crypto_id:
-            logger.error(f"Unsupported cryptocurrency: {crypto}")
-            return 0
-        
-        # Check cache first
-        cache_key = f"{crypto_upper}_rate"
-        now = time.time()
-        
-        if cache_key in _rate_cache:
-            cached_data = _rate_cache[cache_key]
-            if now - cached_data['timestamp'] < _cache_duration:
-                logger.info(f"Using cached {crypto_upper} rate: ₦{cached_data['rate']:,.2f}")
-                return cached_data['rate']
-        
-        # Rate limiting: minimum 2 seconds between requests
-        if now - _last_request_time < 2:
-            time.sleep(2 - (now - _last_request_time))
-        
-        url = f"https://api.coingecko.com/api/v3/simple/price?ids={crypto_id}&vs_currencies=ngn"
-        response = requests.get(url, timeout=10)
-        _last_request_time = time.time()
-        
-        if response.status_code == 200:
-            data = response.json()
-            rate = data.get(crypto_id, {}).get('ngn', 0)
-            
-            # Cache the result
-            _rate_cache[cache_key] = {
-                'rate': float(rate),
-                'timestamp': now
-            }
-            
-            logger.info(f"Fetched {crypto_upper} rate: ₦{rate:,.2f}")
-            return float(rate)
-        elif response.status_code == 429:
-            logger.warning(f"Rate limited by CoinGecko API. Using cached or fallback rate for {crypto_upper}")
-            
-            # Return cached rate if available
-            if cache_key in _rate_cache:
-                cached_rate = _rate_cache[cache_key]['rate']
-                logger.info(f"Using cached {crypto_upper} rate due to rate limit: ₦{cached_rate:,.2f}")
-                return cached_rate
-            
-            # Fallback rates if no cache available
-            fallback_rates = {
-                'BTC': 120000000.0,  # ~₦120M (approximate)
-                'ETH': 8500000.0,    # ~₦8.5M
-                'USDT': 1800.0,      # ~₦1,800
-                'USDC': 1800.0       # ~₦1,800
-            }
-            fallback_rate = fallback_rates.get(crypto_upper, 0)
-            if fallback_rate > 0:
-                logger.info(f"Using fallback {crypto_upper} rate: ₦{fallback_rate:,.2f}")
-                # Cache fallback rate temporarily
-                _rate_cache[cache_key] = {
-                    'rate': fallback_rate,
-                    'timestamp': now
-                }
-            return fallback_rate
-        else:
-            logger.error(f"CoinGecko API error: {response.status_code}")
-            
-            # Return cached rate if available
-            if cache_key in _rate_cache:
-                cached_rate = _rate_cache[cache_key]['rate']
-                logger.info(f"Using cached {crypto_upper} rate due to API error: ₦{cached_rate:,.2f}")
-                return cached_rate
-            return 0
-            
-    except requests.exceptions.Timeout:
-        logger.error("CoinGecko API request timed out")
+    snapshot = rate_feed.snapshot(wait=wait)
+    if live_only and snapshot.source != "live":
         return 0
-    except Exception as e:
-        logger.error(f"Error fetching crypto rate: {str(e)}")
+    if max_age is not None and snapshot.age > max_age:
+        logger.warning(f"{crypto_upper} rate is {snapshot.age:.0f}s old (limit {max_age:.0f}s); not using it")
         return 0
+    return snapshot.rates.get(crypto_upper, 0)
 
 def get_multiple_crypto_rates(cryptos: list = None) -> Dict[str, float]:
     """
-    Fetch rates for multiple cryptocurrencies at once with caching and rate limiting
+    Rates for multiple cryptocurrencies from the rate feed (never blocks)
     
     Args:
         cryptos: List of cryptocurrency symbols
@@ -127,110 +269,10 @@ def get_multiple_crypto_rates(cryptos: list = None) -> Dict[str, float]:
     Returns:
         dict: Dictionary with crypto symbols as keys and NGN rates as values
     """
-    global _last_request_time, _rate_cache
-    
     if cryptos is None:
         cryptos = ["BTC", "ETH", "USDT", "USDC"]
     
-    try:
-        # Check if we have cached rates for all requested cryptos
-        now = time.time()
-        cached_rates = {}
-        missing_cryptos = []
-        
-        for crypto in cryptos:
-            crypto_upper = crypto.upper()
-            cache_key = f"{crypto_upper}_rate"
-            
-            if cache_key in _rate_cache:
-                cached_data = _rate_cache[cache_key]
-                if now - cached_data['timestamp'] < _cache_duration:
-                    cached_rates[crypto_upper] = cached_data['rate']
-                else:
-                    missing_cryptos.append(crypto_upper)
-            else:
-                missing_cryptos.append(crypto_upper)
-        
-        # If all rates are cached, return them
-        if not missing_cryptos:
-            logger.info(f"Using cached rates for all {len(cached_rates)} cryptocurrencies")
-            return cached_rates
-        
-        # Map crypto symbols to CoinGecko IDs for missing rates
-        crypto_ids = []
-        symbol_to_id = {}
-        
-        for crypto in missing_cryptos:
-            crypto_id = CRYPTO_MAPPING.get(crypto)
-            if crypto_id:
-                crypto_ids.append(crypto_id)
-                symbol_to_id[crypto_id] = crypto
-        
-        if not crypto_ids:
-            return cached_rates
-        
-        # Rate limiting: minimum 2 seconds between requests
-        if now - _last_request_time < 2:
-            time.sleep(2 - (now - _last_request_time))
-        
-        # Make single API call for missing cryptocurrencies
-        ids_string = ",".join(crypto_ids)
-        url = f"https://api.coingecko.com/api/v3/simple/price?ids={ids_string}&vs_currencies=ngn"
-        response = requests.get(url, timeout=15)
-        _last_request_time = time.time()
-        
-        if response.status_code == 200:
-            data = response.json()
-            new_rates = {}
-            
-            for crypto_id, price_data in data.items():
-                symbol = symbol_to_id.get(crypto_id)
-                ngn_rate = price_data.get('ngn', 0)
-                if symbol and ngn_rate:
-                    new_rates[symbol] = float(ngn_rate)
-                    
-                    # Cache the new rate
-                    cache_key = f"{symbol}_rate"
-                    _rate_cache[cache_key] = {
-                        'rate': float(ngn_rate),
-                        'timestamp': now
-                    }
-            
-            # Combine cached and new rates
-            all_rates = {**cached_rates, **new_rates}
-            logger.info(f"Fetched rates for {len(new_rates)} new cryptocurrencies, {len(cached_rates)} from cache")
-            return all_rates
-            
-        elif response.status_code == 429:
-            logger.warning("Rate limited by CoinGecko API. Using cached and fallback rates")
-            
-            # Use cached rates plus fallback for missing ones
-            fallback_rates = {
-                'BTC': 120000000.0,
-                'ETH': 8500000.0,
-                'USDT': 1800.0,
-                'USDC': 1800.0
-            }
-            
-            for crypto in missing_cryptos:
-                if crypto not in cached_rates and crypto in fallback_rates:
-                    cached_rates[crypto] = fallback_rates[crypto]
-                    
-                    # Cache fallback rate temporarily
-                    cache_key = f"{crypto}_rate"
-                    _rate_cache[cache_key] = {
-                        'rate': fallback_rates[crypto],
-                        'timestamp': now
-                    }
-            
-            return cached_rates
-        else:
-            logger.error(f"CoinGecko API error: {response.status_code}")
-            return cached_rates
-            
-    except Exception as e:
-        logger.error(f"Error fetching multiple crypto rates: {str(e)}")
-        return cached_rates if 'cached_rates' in locals() else {}
+    return get_rate_snapshot(cryptos)["rates"]
 
 def calculate_ngn_equivalent(crypto_amount: float, crypto_symbol: str) -> Optional[float]:
     """
@@ -254,12 +296,15 @@ def calculate_ngn_equivalent(crypto_amount: float, crypto_symbol: str) -> Option
         logger.error(f"Error calculating NGN equivalent: {str(e)}")
         return None
 
-def format_crypto_rates_message(rates: Dict[str, float]) -> str:
+def format_crypto_rates_message(rates: Dict[str, float], as_of: Optional[str] = None,
+                                stale: bool = False) -> str:
     """
     Format cryptocurrency rates into a user-friendly message
     
     Args:
         rates: Dictionary of crypto rates
+        as_of: When the rates were fetched (ISO time, from get_rate_snapshot)
+        stale: Mark the rates as possibly out of date
     
     Returns:
         str: Formatted message with current rates
@@ -275,9 +320,11 @@ def format_crypto_rates_message(rates: Dict[str, float]) -> str:
             formatted_rate = f"₦{rate:,.2f}"
             message_lines.append(f"🪙 **{crypto}**: {formatted_rate}")
     
-    from datetime import datetime
-    current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    message_lines.append(f"\n📊 Rates updated: {current_time}")
-    message_lines.append("💡 *Rates are live and may fluctuate*")
+    updated = datetime.fromisoformat(as_of) if as_of else datetime.now()
+    message_lines.append(f"\n📊 Rates updated: {updated.strftime('%Y-%m-%d %H:%M:%S')}")
+    if stale:
+        message_lines.append("⚠️ *Rates may be delayed - live prices are being refreshed*")
+    else:
+        message_lines.append("💡 *Rates are live and may fluctuate*")
     
     return "\n".join(message_lines)
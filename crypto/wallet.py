@@ -3,7 +3,7 @@
 import requests
 import os
 import logging
-from supabase import create_client
+from utils.supabase_client import get_supabase_client as get_shared_supabase_client
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -27,7 +27,7 @@ supabase = None
 def get_supabase_client():
     global supabase
     if supabase is None and SUPABASE_URL and SUPABASE_KEY:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        supabase = get_shared_supabase_client(SUPABASE_URL, SUPABASE_KEY)
     return supabase
 
 def create_bitnob_wallet(user_id: str, email: str = None):
@@ -1,9 +1,9 @@
 # crypto/webhook.py
 
 from flask import request, jsonify
-from .rates import get_crypto_to_ngn_rate, calculate_ngn_equivalent
+from .rates import get_crypto_to_ngn_rate, calculate_ngn_equivalent, CRYPTO_RATE_MAX_AGE
 from .wallet import update_user_ngn_balance, get_user_ngn_balance
-from supabase import create_client
+from utils.supabase_client import get_supabase_client as get_shared_supabase_client
 import os
 import logging
 from datetime import datetime
@@ -24,7 +24,7 @@ supabase = None
 def get_supabase_client():
     global supabase
     if supabase is None and SUPABASE_URL and SUPABASE_KEY:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        supabase = get_shared_supabase_client(SUPABASE_URL, SUPABASE_KEY)
     return supabase
 
 def handle_crypto_webhook():
@@ -79,11 +79,12 @@ def handle_successful_deposit(data):
         
         user_id = customer_email.split('@')[0]
         
-        # Get current NGN rate for the cryptocurrency
-        ngn_rate = get_crypto_to_ngn_rate(currency)
+        # Get current NGN rate for the cryptocurrency (never credit at a fallback or stale rate)
+        ngn_rate = get_crypto_to_ngn_rate(currency, live_only=True, wait=10, max_age=CRYPTO_RATE_MAX_AGE)
         if ngn_rate == 0:
-            logger.error(f"Could not fetch rate for {currency}")
-            return jsonify({"error": f"Rate not available for {currency}"}), 400
+            logger.error(f"Could not fetch a current rate for {currency}")
+            # Retryable: the provider redelivers once the rate feed has caught up
+            return jsonify({"error": f"Rate not available for {currency}"}), 503
         
         # Calculate NGN equivalent
         credited_ngn = amount * ngn_rate
@@ -4,7 +4,7 @@ Contains all function implementations for OpenAI Assistant function calling
 """
 
 from .balance_functions import check_balance
-from .transfer_functions import send_money, calculate_transfer_fee
+from .transfer_functions import send_money, send_group_payout, calculate_transfer_fee
 from .transaction_functions import record_deposit, get_transfer_history, get_wallet_statement
 from .security_functions import verify_pin, set_pin
 from .notification_functions import send_receipt, send_alert, update_transaction_status
@@ -12,6 +12,7 @@ from .notification_functions import send_receipt, send_alert, update_transaction
 __all__ = [
     'check_balance',
     'send_money',
+    'send_group_payout',
     'calculate_transfer_fee',
     'record_deposit',
     'get_transfer_history',
@@ -5,7 +5,7 @@ Fixed to use proper WhatsApp field mapping and automatic onboarding
 
 import logging
 from typing import Dict, Any
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 import os
 from utils.fixed_balance_manager import balance_manager, handle_whatsapp_user_auto_onboard
 from flask import current_app as app
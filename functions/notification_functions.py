@@ -5,7 +5,7 @@ Handles receipts, alerts, and status updates
 
 import logging
 from typing import Dict, Any
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 import os
 from datetime import datetime
 import requests
@@ -26,7 +26,7 @@ async def send_receipt(chat_id: str, transaction_id: str, **kwargs) -> Dict[str,
     try:
         logger.info(f"🧾 Sending receipt for transaction {transaction_id} to user {chat_id}")
         
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        supabase = get_supabase_client()
         
         # 🔧 RESOLVE TELEGRAM ID TO UUID FIRST
         # Find the user UUID from Telegram chat ID
@@ -119,7 +119,7 @@ async def send_alert(chat_id: str, alert_type: str, message: str, **kwargs) -> D
         
         if success:
             # Log alert in database
-            supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+            supabase = get_supabase_client()
             
             alert_data = {
                 "user_id": chat_id,
@@ -164,7 +164,7 @@ async def update_transaction_status(chat_id: str, transaction_id: str, status: s
     try:
         logger.info(f"📊 Updating transaction {transaction_id} status to {status}")
         
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        supabase = get_supabase_client()
         
         # 🔧 RESOLVE TELEGRAM ID TO UUID FIRST
         # Find the user UUID from Telegram chat ID
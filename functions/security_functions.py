@@ -5,9 +5,10 @@ Handles PIN verification and security operations
 
 import logging
 from typing import Dict, Any
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
+from utils.user_resolver import invalidate_user
+from utils.pin_hasher import pin_hasher
 import os
-import hashlib
 
 logger = logging.getLogger(__name__)
 
@@ -31,7 +32,15 @@ async def verify_pin(chat_id: str, pin: str, **kwargs) -> Dict[str, Any]:
                 "error": "PIN must be exactly 4 digits"
             }
         
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        # Reject locked-out users before touching the database or hashing
+        locked_for = pin_hasher.locked_for(chat_id)
+        if locked_for:
+            return {
+                "valid": False,
+                "error": f"Too many failed attempts. Try again in {(locked_for + 59) // 60} minutes."
+            }
+        
+        supabase = get_supabase_client()
         
         # Get user data
         user_result = supabase.table("users").select("*").eq("telegram_chat_id", str(chat_id)).execute()
@@ -50,14 +59,8 @@ async def verify_pin(chat_id: str, pin: str, **kwargs) -> Dict[str, Any]:
                 "error": "No PIN set. Please set up your transaction PIN first."
             }
         
-        # Hash the provided PIN using the same method as onboarding (pbkdf2_hmac with chat_id as salt)
-        pin_hash = hashlib.pbkdf2_hmac('sha256', 
-                                     pin.encode('utf-8'), 
-                                     str(chat_id).encode('utf-8'), 
-                                     100000)  # 100,000 iterations
-        pin_hash = pin_hash.hex()
-        
-        if pin_hash == stored_pin_hash:
+        # Hash the provided PIN off the event loop (pbkdf2_hmac with chat_id as salt, as onboarding)
+        if await pin_hasher.verify(chat_id, pin, chat_id, stored_pin_hash):
             return {
                 "valid": True,
                 "message": "PIN verified successfully"
@@ -97,7 +100,7 @@ async def set_pin(chat_id: str, pin: str, **kwargs) -> Dict[str, Any]:
                 "error": "PIN must be exactly 4 digits"
             }
         
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        supabase = get_supabase_client()
         
         # Check if user exists
         user_result = supabase.table("users").select("*").eq("telegram_chat_id", str(chat_id)).execute()
@@ -107,12 +110,8 @@ async def set_pin(chat_id: str, pin: str, **kwargs) -> Dict[str, Any]:
                 "error": "User not found"
             }
         
-        # Hash the PIN using the same method as onboarding (pbkdf2_hmac with chat_id as salt)
-        pin_hash = hashlib.pbkdf2_hmac('sha256', 
-                                     pin.encode('utf-8'), 
-                                     str(chat_id).encode('utf-8'), 
-                                     100000)  # 100,000 iterations
-        pin_hash = pin_hash.hex()
+        # Hash the PIN off the event loop (pbkdf2_hmac with chat_id as salt, as onboarding)
+        pin_hash = await pin_hasher.hash(pin, chat_id)
         
         # Update user record with correct column name
         update_result = supabase.table("users")\
@@ -123,6 +122,8 @@ async def set_pin(chat_id: str, pin: str, **kwargs) -> Dict[str, Any]:
             })\
             .eq("telegram_chat_id", str(chat_id))\
             .execute()
+        invalidate_user(user_id=user_result.data[0].get("id"))
+        pin_hasher.forget(chat_id)
         
         if update_result.data:
             return {
@@ -5,7 +5,7 @@ Handles transaction recording, history, and statements
 
 import logging
 from typing import Dict, Any, List
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 import os
 from datetime import datetime, timedelta
 
@@ -33,7 +33,7 @@ async def record_deposit(chat_id: str, amount: float, reference: str = None, sou
                 "error": "Invalid deposit amount"
             }
         
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        supabase = get_supabase_client()
         
         # Check if user exists
         user_result = supabase.table("users").select("*").eq("telegram_chat_id", str(chat_id)).execute()
@@ -95,7 +95,7 @@ async def get_transfer_history(chat_id: str, limit: int = 10, **kwargs) -> Dict[
     try:
         logger.info(f"📄 Getting transfer history for user {chat_id}")
         
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        supabase = get_supabase_client()
         
         # 🔧 RESOLVE TELEGRAM ID TO UUID FIRST
         # Find the user UUID from Telegram chat ID
@@ -170,7 +170,7 @@ async def get_wallet_statement(chat_id: str, days: int = 30, **kwargs) -> Dict[s
     try:
         logger.info(f"📊 Getting wallet statement for user {chat_id} ({days} days)")
         
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        supabase = get_supabase_client()
         
         # 🔧 RESOLVE TELEGRAM ID TO UUID FIRST
         # Find the user UUID from Telegram chat ID
@@ -212,7 +212,7 @@ async def get_wallet_statement(chat_id: str, days: int = 30, **kwargs) -> Dict[s
             tx_type = tx.get("transaction_type", "")  # Fixed: use transaction_type
             
             # Categorize transaction
-            if tx_type in ["credit", "deposit", "transfer_in", "airtime_refund"]:
+            if tx_type in ["credit", "deposit", "transfer_in", "airtime_refund", "transfer_refund"]:
                 total_inflow += tx_amount
             elif tx_type in ["transfer_out", "airtime_purchase", "data_purchase"]:
                 total_outflow += tx_amount
@@ -285,6 +285,9 @@ def _get_transaction_description(tx_type: str, amount: float, tx_data: dict) ->
     elif tx_type == "airtime_refund":
         return f"Airtime Refund: ₦{amount:,.0f}"
     
+    elif tx_type == "transfer_refund":
+        return f"Transfer Refund: ₦{amount:,.0f}"
+    
     elif tx_type == "transfer_in":
         return f"Transfer Received: ₦{amount:,.0f}"
     
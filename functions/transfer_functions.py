@@ -3,11 +3,15 @@ Transfer-related functions for Sofi AI Assistant
 Handles money transfers using Paystack
 """
 
+import asyncio
 import logging
-from typing import Dict, Any, Optional
-from supabase import create_client
+from typing import Dict, Any, List, Optional
+from utils.supabase_client import get_supabase_client
+from utils.bank_index import bank_index
 import os
 from paystack.paystack_service import get_paystack_service
+from paystack.account_resolver import account_resolver
+from paystack.bulk_payouts import bulk_payouts, PayoutItem, PAYSTACK_BULK_LIMIT
 from utils.secure_transfer_handler import SecureTransferHandler
 from datetime import datetime
 import uuid
@@ -15,84 +19,6 @@ from flask import current_app as app
 
 logger = logging.getLogger(__name__)
 
-# Bank code to name mapping for user-friendly display
-BANK_CODE_TO_NAME = {
-    # Major Commercial Banks
-    "044": "Access Bank",
-    "063": "Access Bank (Diamond)",
-    "023": "Citibank",
-    "050": "Ecobank",
-    "070": "Fidelity Bank",
-    "011": "First Bank",
-    "214": "FCMB",
-    "058": "GTBank",
-    "030": "Heritage Bank",
-    "082": "Keystone Bank",
-    "076": "Polaris Bank",
-    "221": "Stanbic IBTC",
-    "232": "Sterling Bank",
-    "033": "UBA",
-    "032": "Union Bank",
-    "215": "Unity Bank",
-    "035": "Wema Bank",
-    "035A": "Alat by Wema",
-    "057": "Zenith Bank",
-    
-    # Digital/Fintech Banks
-    "999992": "OPay",
-    "50515": "Moniepoint",
-    "999991": "PalmPay",
-    "50211": "Kuda Bank",
-    "565": "Carbon",
-    "51318": "FairMoney",
-    "100022": "GoMoney",
-    "566": "VFD",
-    "125": "Rubies Bank",
-    "51310": "Sparkle",
-    "50304": "Mint",
-    "50126": "Eyowo",
-    "50315": "Aella MFB",
-    "50645": "BuyPower MFB",
-    "120001": "9PSB",  # 9mobile 9Payment Service Bank
-    "120004": "Airtel SmartCash PSB",
-    
-    # More Microfinance Banks
-    "51204": "AB Microfinance Bank",
-    "602": "Accion MFB",
-    "51336": "Aku MFB",
-    "50926": "Amju Unique MFB",
-    "50083": "Aramoko MFB",
-    "50092": "Assets MFB",
-    "51229": "BainesCredit MFB",
-    "50117": "Banc Corp MFB",
-    "MFB50992": "Baobab MFB",
-    "51100": "BellBank MFB",
-    "50123": "BestStar MFB",
-    "50931": "Bowen MFB",
-    "50823": "CEMCS MFB",
-    "50910": "Consumer MFB",
-    "50204": "CoreStep MFB",
-    
-    # Specialized Banks
-    "301": "Jaiz Bank",
-    "101": "Providus Bank",
-    "100": "SunTrust Bank",
-    "302": "TAJ Bank",
-    "303": "Lotus Bank",
-    "559": "Coronation Bank",
-    "108": "Alpha Morgan Bank",
-    
-    # Mortgage Banks
-    "90077": "AG Mortgage Bank",
-    "404": "Abbey Mortgage Bank",
-    "401": "ASO Savings & Loans",
-    
-    # Development Finance Institutions
-    "304": "NEXIM Bank",
-    "413": "Federal Mortgage Bank",
-    "070": "Bank of Industry",
-}
-
 async def send_money(chat_id: str, amount: float, narration: str = None, pin: str = None, 
                     recipient_account: str = None, recipient_bank: str = None,
                     account_number: str = None, bank_name: str = None, **kwargs) -> Dict[str, Any]:
@@ -179,7 +105,7 @@ async def _send_money_internal(chat_id: str, amount: float, narration: str = Non
             }
         
         # Check if user exists
-        supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        supabase = get_supabase_client()
         user_result = supabase.table("users").select("*").eq("whatsapp_number", str(chat_id)).execute()
         
         if not user_result.data:
@@ -258,7 +184,7 @@ async def _send_money_internal(chat_id: str, amount: float, narration: str = Non
             
             # Return web PIN entry response with keyboard
             # Convert bank code to friendly name for display
-            bank_display_name = BANK_CODE_TO_NAME.get(recipient_bank, recipient_bank)
+            bank_display_name = get_bank_name_from_code(recipient_bank)
             
             return {
                 "success": False,
@@ -495,6 +421,153 @@ async def _send_money_internal(chat_id: str, amount: float, narration: str = Non
         }
 
 
+async def send_group_payout(chat_id: str, payouts: List[Dict[str, Any]], narration: str = None,
+                            **kwargs) -> Dict[str, Any]:
+    """
+    Pay several bank accounts in one go through the bulk payout pipeline
+    
+    Nothing is sent here: recipients are verified, fees priced and the batch
+    stored for web PIN entry. Once the PIN is verified the whole batch goes
+    out through paystack.bulk_payouts (see SecurePinVerification).
+    
+    Args:
+        chat_id (str): Sender's WhatsApp chat ID
+        payouts (list): One {"account_number", "bank_name", "amount"} per recipient
+        narration (str, optional): Transfer description for every payout
+        
+    Returns:
+        Dict containing the web PIN prompt or an error
+    """
+    try:
+        if not payouts:
+            return {"success": False, "error": "No recipients given"}
+        if len(payouts) > PAYSTACK_BULK_LIMIT:
+            return {"success": False, "error": f"A group payout can have at most {PAYSTACK_BULK_LIMIT} recipients"}
+        
+        items = []
+        for index, payout in enumerate(payouts, 1):
+            account_number = str(payout.get("account_number") or "").strip()
+            bank = payout.get("bank_name") or payout.get("bank_code")
+            try:
+                amount = float(payout.get("amount") or 0)
+            except (TypeError, ValueError):
+                amount = 0
+            if not account_number or not bank:
+                return {"success": False, "error": f"Recipient {index}: account number and bank are required"}
+            if amount < 100:  # Paystack minimum
+                return {"success": False, "error": f"Recipient {index}: minimum transfer amount is ₦100."}
+            items.append({
+                "account_number": account_number,
+                "bank_code": get_bank_code_from_name(bank) or bank,
+                "amount": amount,
+            })
+        
+        supabase = get_supabase_client()
+        user_result = supabase.table("users").select("*").eq("whatsapp_number", str(chat_id)).execute()
+        if not user_result.data:
+            return {
+                "success": False,
+                "error": "User not found. Please complete registration first."
+            }
+        user_data = user_result.data[0]
+        
+        # The fees the pipeline will hold, one lookup per distinct amount
+        fees = {}
+        for item in items:
+            if item["amount"] not in fees:
+                fees[item["amount"]] = bulk_payouts.fee_for(item["amount"])
+            if fees[item["amount"]] is None:
+                return {"success": False, "error": "Transfer fees are unavailable right now. Please try again."}
+            item["fee"] = fees[item["amount"]]
+        total_amount = sum(item["amount"] for item in items)
+        total_fees = sum(item["fee"] for item in items)
+        
+        # Checked again atomically when the funds are reserved
+        current_balance = user_data.get("wallet_balance", 0)
+        if current_balance < total_amount + total_fees:
+            return {
+                "success": False,
+                "error": f"Insufficient balance. You need ₦{total_amount + total_fees:,.2f} (₦{total_amount:,.2f} + ₦{total_fees:,.2f} fees) but have ₦{current_balance:,.2f}."
+            }
+        
+        # Recipients are shown by name before the PIN is asked for
+        resolutions = await asyncio.gather(*(
+            account_resolver.aresolve(item["account_number"], item["bank_code"]) for item in items
+        ))
+        for index, (item, resolution) in enumerate(zip(items, resolutions), 1):
+            if not resolution.get("success"):
+                return {
+                    "success": False,
+                    "error": f"Could not verify recipient {index} ({item['account_number']}): {resolution.get('error', 'Invalid account details')}"
+                }
+            item["recipient_name"] = resolution["data"].get("account_name")
+            # Fixed now so a repeated submission is refused by Paystack as a duplicate
+            item["reference"] = PayoutItem(user_id=str(user_data.get("id")), account_number=item["account_number"],
+                                           bank_code=item["bank_code"], amount=item["amount"]).reference
+        
+        transaction_id = f"payout_{chat_id}_{int(datetime.now().timestamp())}"
+        from utils.secure_pin_verification import secure_pin_verification
+        secure_token = secure_pin_verification.store_pending_transaction(transaction_id, {
+            'type': 'bulk_payout',
+            'chat_id': chat_id,
+            'user_data': user_data,
+            'payouts': items,
+            'narration': narration or f"Transfer from {user_data.get('full_name', 'Sofi User')}",
+            'amount': total_amount,
+            # Summary for the PIN entry page
+            'transfer_data': {
+                "amount": total_amount,
+                "recipient_name": f"{len(items)} recipients",
+                "bank": "Group payout",
+                "account_number": ", ".join(item["account_number"] for item in items[:3]) + ("..." if len(items) > 3 else ""),
+                "fee": total_fees,
+                "narration": narration or "Group payout via Sofi AI",
+            },
+        })
+        pin_url = f"https://pipinstallsofi.com/verify-pin?token={secure_token}"
+        
+        recipient_lines = "\n".join(
+            f"👤 *{item['recipient_name']}* - ₦{item['amount']:,.0f} ({get_bank_name_from_code(item['bank_code'])} {item['account_number']})"
+            for item in items
+        )
+        return {
+            "success": False,
+            "requires_pin": True,
+            "show_web_pin": True,
+            "message": f"""💸 You're about to pay {len(items)} recipients:
+{recipient_lines}
+💰 Fees: ₦{total_fees:,.0f}
+💵 Total: ₦{total_amount + total_fees:,.0f}
+
+🔐 *Tap the button below to enter your PIN securely*""",
+            "pin_url": pin_url,
+            "keyboard": {
+                "inline_keyboard": [
+                    [
+                        {
+                            "text": "🔐 Enter PIN",
+                            "web_app": {"url": pin_url}
+                        }
+                    ],
+                    [
+                        {
+                            "text": "❌ Cancel Transfer",
+                            "callback_data": f"cancel_transfer_{transaction_id}"
+                        }
+                    ]
+                ]
+            },
+            "payouts": items
+        }
+        
+    except Exception as e:
+        logger.error(f"❌ Group payout error for {chat_id}: {str(e)}")
+        return {
+            "success": False,
+            "error": f"Group payout failed due to system error: {str(e)}"
+        }
+
+
 async def calculate_transfer_fee(amount: float, **kwargs) -> Dict[str, Any]:
     """
     Calculate transfer fee for a given amount
@@ -549,110 +622,13 @@ def get_bank_code_from_name(bank_name: str) -> Optional[str]:
     Get bank code from bank name for API verification
     
     Args:
-        bank_name (str): Bank name to lookup
+        bank_name (str): Bank name, alias, misspelling or code to lookup
         
     Returns:
         str: Bank code if found, None otherwise
     """
-    # Official Paystack bank codes (same as in send_money function)
-    bank_name_to_code = {
-        # Major Commercial Banks
-        "access bank": "044",
-        "access bank plc": "044",
-        "access bank (diamond)": "063",
-        "citibank": "023",
-        "citibank nigeria": "023",
-        "ecobank": "050",
-        "ecobank nigeria": "050",
-        "fidelity bank": "070",
-        "fidelity bank plc": "070",
-        "first bank": "011",
-        "first bank of nigeria": "011",
-        "first bank nigeria": "011",
-        "fcmb": "214",
-        "first city monument bank": "214",
-        "gtbank": "058",
-        "gtb": "058",
-        "guaranty trust bank": "058",
-        "heritage bank": "030",
-        "heritage banking company": "030",
-        "keystone bank": "082",
-        "polaris bank": "076",
-        "polaris bank limited": "076",
-        "stanbic ibtc": "221",
-        "stanbic ibtc bank": "221",
-        "sterling bank": "232",
-        "sterling bank plc": "232",
-        "uba": "033",
-        "united bank for africa": "033",
-        "union bank": "032",
-        "union bank of nigeria": "032",
-        "unity bank": "215",
-        "unity bank plc": "215",
-        "wema bank": "035",
-        "wema bank plc": "035",
-        "alat by wema": "035A",
-        "alat": "035A",
-        "zenith bank": "057",
-        "zenith bank plc": "057",
-        
-        # Digital/Fintech Banks
-        "opay": "999992",
-        "opay digital services": "999992",
-        "opay digital services limited": "999992",
-        "moniepoint": "50515",
-        "moniepoint mfb": "50515",
-        "palmpay": "999991",
-        "palmpay limited": "999991",
-        "kuda": "50211",
-        "kuda bank": "50211",
-        "kuda microfinance bank": "50211",
-        "carbon": "565",
-        "carbon microfinance bank": "565",
-        "fairmoney": "51318",
-        "fairmoney microfinance bank": "51318",
-        "gomoney": "100022",
-        "gomoney nigeria": "100022",
-        "vfd": "566",
-        "vfd microfinance bank": "566",
-        "rubies": "125",
-        "rubies microfinance bank": "125",
-        "sparkle": "51310",
-        "sparkle microfinance bank": "51310",
-        "mint": "50304",
-        "mint fintech": "50304",
-        "eyowo": "50126",
-        "eyowo microfinance bank": "50126",
-        
-        # More banks...
-        "jaiz bank": "301",
-        "providus bank": "101",
-        "suntrust bank": "100",
-        "taj bank": "302",
-        "lotus bank": "303",
-        "coronation bank": "559"
-    }
-    
-    # Convert to lowercase for matching
-    bank_lower = bank_name.lower().strip()
-    
-    # Direct match
-    if bank_lower in bank_name_to_code:
-        return bank_name_to_code[bank_lower]
-    
-    # Partial match for common variations
-    for key in bank_name_to_code:
-        if bank_lower in key or key in bank_lower:
-            return bank_name_to_code[key]
-    
-    return None
+    return bank_index.code_for(bank_name)
 
 def get_bank_name_from_code(bank_code: str) -> str:
     """Return the human-readable bank name for a given code."""
-    code_to_name = {v: k.title() for k, v in bank_name_to_code.items()}
-    # Prefer shortest name for each code
-    shortest = {}
-    for code, name in code_to_name.items():
-        if code not in shortest or len(name) < len(shortest[code]):
-            shortest[code] = name
-    return shortest.get(bank_code, bank_code)
+    return bank_index.display_name(bank_code, default=bank_code)
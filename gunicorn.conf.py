@@ -0,0 +1,14 @@
+"""
+Gunicorn server hooks for Sofi AI
+Command-line flags in the Procfile still control bind address, workers and timeout.
+"""
+
+
+def worker_exit(server, worker):
+    """Drain queued webhook messages, stop the shared event loop, then write buffered revenue rows"""
+    from utils.webhook_queue import webhook_queue
+    from utils.async_bridge import async_bridge
+    from utils.revenue_events import revenue_events
+    webhook_queue.shutdown()
+    async_bridge.shutdown()
+    revenue_events.shutdown()
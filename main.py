@@ -19,7 +19,16 @@ NINEPSB_API_KEY = os.getenv("NINEPSB_API_KEY")
 NINEPSB_SECRET_KEY = os.getenv("NINEPSB_SECRET_KEY")
 NINEPSB_BASE_URL = os.getenv("NINEPSB_BASE_URL")
 
-from supabase import create_client
+from utils.supabase_client import get_supabase_client, get_supabase_registry_stats
+from utils.user_resolver import resolve_whatsapp_user, invalidate_user, user_resolver
+from utils.webhook_queue import enqueue_webhook_message, get_webhook_queue_stats
+from utils.async_bridge import async_bridge, run_async, run_async_isolated, run_blocking
+from utils.assistant_run_driver import run_driver
+from utils.thread_store import thread_store
+from utils.ip_intelligence import rate_limiter
+from utils.threat_classifier import threat_classifier
+from utils.pin_hasher import pin_hasher
+from utils.balance_ledger import balance_ledger
 import openai
 from openai import OpenAI
 from typing import Dict, Optional, Any
@@ -32,7 +41,16 @@ from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import hashes
 # Paystack Integration - Banking Partner
 from paystack import get_paystack_service
-from paystack.paystack_webhook import handle_paystack_webhook
+from paystack.paystack_webhook import handle_paystack_webhook, paystack_webhook_handler
+from paystack.transport import paystack_transport
+from paystack.account_resolver import account_resolver
+from paystack.recipient_registry import recipient_registry
+from utils.flow_encryption import FlowEncryption, flow_crypto
+from crypto.rates import rate_feed
+from paystack.bulk_payouts import bulk_payouts
+from utils.airtime_endpoints import airtime_endpoints
+from utils.revenue_events import revenue_events
+from utils.admin_metrics import admin_metrics
 # AI Assistant Integration - Powered by Pip install AI Technologies
 from assistant import get_assistant
 import random
@@ -84,7 +102,7 @@ print("🚀 Sofi AI started in FAST MODE for optimal response times")
 
 # 🔒 SECURITY ENDPOINTS
 from utils.security_endpoints import init_security_endpoints
-from functions.transfer_functions import BANK_CODE_TO_NAME
+from functions.transfer_functions import get_bank_name_from_code
 
 # Import admin handler AFTER environment loading
 from utils.admin_command_handler import AdminCommandHandler
@@ -178,7 +196,7 @@ if not WHATSAPP_ACCESS_TOKEN or not WHATSAPP_PHONE_NUMBER_ID:
     # Don't exit in production, but log the error clearly
 
 # Initialize Supabase client
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 # Initialize AI client with API key - Powered by Pip install AI Technologies
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
@@ -940,7 +958,7 @@ Is this correct? Reply 'yes' to continue or 'no' to cancel."""
             # Create secure PIN verification message with inline keyboard
             # Convert bank code to user-friendly name
             bank_code = transfer['bank']
-            bank_name = BANK_CODE_TO_NAME.get(bank_code, bank_code)
+            bank_name = get_bank_name_from_code(bank_code)
             
             msg = (
                 f"✅ *Account verified!*\n"
@@ -1243,7 +1261,7 @@ async def handle_balance_inquiry(phone_number: str, message: str, user_data: dic
         # Get recent transactions from Supabase
         recent_transactions = []
         try:
-            supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+            supabase = get_supabase_client()
             
             # First get the user UUID from whatsapp_number
             user_result = supabase.table("users").select("id").eq("whatsapp_number", phone_number).execute()
@@ -1379,6 +1397,26 @@ def performance_status():
     try:
         return jsonify({
             "performance_mode": get_fast_mode_status(),
+            "supabase_pool": get_supabase_registry_stats(),
+            "user_resolver": user_resolver.get_stats(),
+            "webhook_queue": get_webhook_queue_stats(),
+            "event_loop": async_bridge.get_stats(),
+            "assistant_runs": run_driver.get_stats(),
+            "thread_store": thread_store.get_stats(),
+            "rate_limiter": rate_limiter.get_stats(),
+            "threat_classifier": threat_classifier.get_stats(),
+            "pin_hasher": pin_hasher.get_stats(),
+            "balance_ledger": balance_ledger.get_stats(),
+            "paystack_webhook_journal": paystack_webhook_handler.journal.get_stats(),
+            "paystack_transport": paystack_transport.get_stats(),
+            "account_resolver": account_resolver.get_stats(),
+            "recipient_registry": recipient_registry.get_stats(),
+            "flow_crypto": flow_crypto.get_stats(),
+            "crypto_rates": rate_feed.get_stats(),
+            "bulk_payouts": bulk_payouts.get_stats(),
+            "airtime_endpoints": airtime_endpoints.get_stats(),
+            "revenue_events": revenue_events.get_stats(),
+            "admin_metrics": admin_metrics.get_stats(),
             "message": "⚡ FAST MODE active - Security alerts suppressed for speed" if get_fast_mode_status()['fast_mode'] else "🔒 NORMAL MODE active - Full security monitoring"
         })
     except Exception as e:
@@ -1488,6 +1526,7 @@ async def create_whatsapp_user(phone_number: str) -> dict:
         
         # Insert into database
         result = supabase.table("users").insert(user_data).execute()
+        invalidate_user(phone_number)
         
         if result.data:
             logger.info(f"✅ WhatsApp user created successfully: {phone_number}")
@@ -1562,8 +1601,9 @@ def whatsapp_webhook_handler():
                                 # ⚡ INSTANT TYPING INDICATOR - Show typing IMMEDIATELY
                                 send_whatsapp_typing_action(phone_number)
                                 
-                                # Process message in background thread
-                                def process_message_background():
+                                # Process message on a queue worker (values passed explicitly,
+                                # the loop variables change before the worker runs)
+                                def process_message_background(phone_number, message_text):
                                     import asyncio
                                     
                                     # Get or create user data for this WhatsApp number
@@ -1575,7 +1615,7 @@ def whatsapp_webhook_handler():
                                         else:
                                             # Auto-create new WhatsApp user
                                             logger.info(f"🆕 Creating new WhatsApp user: {phone_number}")
-                                            user_data = asyncio.run(create_whatsapp_user(phone_number))
+                                            user_data = run_async_isolated(create_whatsapp_user(phone_number))
                                             
                                     except Exception as e:
                                         logger.error(f"Error getting/creating user data: {e}")
@@ -1586,14 +1626,16 @@ def whatsapp_webhook_handler():
                                         assistant = get_assistant()
                                         
                                         # Process message and get response using asyncio
-                                        response, function_data = asyncio.run(assistant.process_message(
+                                        response, function_data = run_async(assistant.process_message(
                                             phone_number=phone_number,
                                             message=message_text,
                                             user_data=user_data
                                         ))
                                         
-                                        # Send response immediately
-                                        send_whatsapp_message(phone_number, response)
+                                        # Send response immediately (empty when the message was
+                                        # coalesced into a newer message's run)
+                                        if response:
+                                            send_whatsapp_message(phone_number, response)
                                         
                                         # Handle any function data
                                         if function_data:
@@ -1603,8 +1645,10 @@ def whatsapp_webhook_handler():
                                         logger.error(f"Error processing WhatsApp message: {e}")
                                         send_whatsapp_message(phone_number, "Sorry, I encountered an error. Please try again.")
                                 
-                                # Execute in background
-                                background_task(process_message_background)
+                                # Execute on the bounded ingestion queue
+                                if not enqueue_webhook_message(process_message_background, phone_number, message_text,
+                                                               dedupe_key=message.get("id")):
+                                    return jsonify({"error": "Service busy"}), 503
         
         return jsonify({"status": "success"}), 200
         
@@ -1640,7 +1684,7 @@ def whatsapp_webhook_handler():
                 success, response = process_whatsapp_media(message)
                 if success:
                     # Use asyncio.run for the async call
-                    ai_response = asyncio.run(generate_ai_reply(phone_number, response))
+                    ai_response = run_async_isolated(generate_ai_reply(phone_number, response))
                     send_whatsapp_message(phone_number, ai_response)
                 else:
                     send_whatsapp_message(phone_number, response)
@@ -1689,7 +1733,7 @@ def whatsapp_webhook_handler():
                     user_message = response
                     # Fix: Remove await and use synchronous call or asyncio.run
                     import asyncio
-                    ai_response = asyncio.run(handle_message(phone_number, user_message, user_data))
+                    ai_response = run_async(handle_message(phone_number, user_message, user_data))
                     send_whatsapp_message(phone_number, ai_response)
                 else:
                     send_whatsapp_message(phone_number, response)
@@ -1712,7 +1756,7 @@ def whatsapp_webhook_handler():
             def get_virtual_account_async():
                 try:
                     import asyncio
-                    return asyncio.run(check_virtual_account(phone_number))
+                    return run_async_isolated(check_virtual_account(phone_number))
                 except:
                     return None
             
@@ -1823,7 +1867,7 @@ def whatsapp_webhook_handler():
                         
                         # 🎯 PURE ASSISTANT PROCESSING - Single source of truth
                         with app.app_context():  # Fix Flask context issues
-                            response, function_data = asyncio.run(assistant.process_message(phone_number, user_message, context_data))
+                            response, function_data = run_async(assistant.process_message(phone_number, user_message, context_data))
                         
                         # Handle function results first (like PIN keyboards)
                         if function_data:
@@ -2223,24 +2267,17 @@ async def route_whatsapp_message(sender: str, text: str, message_id: str = None)
         from utils.whatsapp_api_fixed import whatsapp_api
         from utils.whatsapp_onboarding import send_whatsapp_onboarding_link, handle_whatsapp_onboarding_response
         
+        # Read receipt + typing indicator go out now, while the reply is prepared
+        whatsapp_api.begin_reply(message_id)
+        
         # 🚨 STEP 1: FORCE CHECK - Does user have ACTUAL Sofi account?
         try:
-            from supabase import create_client
-            supabase_url = os.getenv("SUPABASE_URL")
-            supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
-            supabase = create_client(supabase_url, supabase_key)
-            
             # Check if user has ACTUAL account with account_number (not just user record)
-            # Try to find user by whatsapp_phone, then whatsapp_number, then phone for compatibility
-            user_result = supabase.table("users").select("*").eq("whatsapp_phone", sender).execute()
-            if not user_result.data:
-                user_result = supabase.table("users").select("*").eq("whatsapp_number", sender).execute()
-            if not user_result.data:
-                user_result = supabase.table("users").select("*").eq("phone", sender).execute()
+            # One cached lookup across whatsapp_phone, whatsapp_number and phone
+            user = await run_blocking(resolve_whatsapp_user, sender)
             
             has_sofi_account = False
-            if user_result.data and len(user_result.data) > 0:
-                user = user_result.data[0]
+            if user:
                 # User must have account_number to be considered onboarded
                 has_sofi_account = bool(user.get('account_number') and user.get('customer_code'))
                 
@@ -2269,20 +2306,21 @@ async def route_whatsapp_message(sender: str, text: str, message_id: str = None)
                     "💳 Receive payments\n\n"
                     "Tap below to get started:"
                 )
-                # Use WhatsApp Flow for in-chat onboarding
-                success = send_whatsapp_onboarding_flow(sender)
+                # Use WhatsApp Flow for in-chat onboarding (after the read receipt lands)
+                await whatsapp_api.reply_ready(message_id)
+                success = await run_blocking(send_whatsapp_onboarding_flow, sender)
                 if not success:
                     # Fallback to URL button
                     await whatsapp_api.send_message_with_read_and_typing(
                         phone_number=sender,
                         message=f"{brief_response}\n\n🔗 Complete your setup: https://www.pipinstallsofi.com/whatsapp-onboard?whatsapp={sender}",
-                        message_id_to_read=message_id,
-                        typing_duration=1.0
+                        message_id_to_read=message_id
                     )
                 return "Onboarding Flow sent successfully"
             
             # Send WhatsApp Flow for ANY other message
-            success = send_whatsapp_onboarding_flow(sender)
+            await whatsapp_api.reply_ready(message_id)
+            success = await run_blocking(send_whatsapp_onboarding_flow, sender)
             if success:
                 return f"🚨 WhatsApp Flow onboarding sent to {sender}"
             else:
@@ -2290,8 +2328,7 @@ async def route_whatsapp_message(sender: str, text: str, message_id: str = None)
                 await whatsapp_api.send_message_with_read_and_typing(
                     phone_number=sender,
                     message=f"👋 Welcome to Sofi! Please create your account first: https://www.pipinstallsofi.com/whatsapp-onboard?whatsapp={sender}",
-                    message_id_to_read=message_id,
-                    typing_duration=1.0
+                    message_id_to_read=message_id
                 )
                 return "Fallback onboarding message sent"
         
@@ -2301,20 +2338,22 @@ async def route_whatsapp_message(sender: str, text: str, message_id: str = None)
         from utils.sofi_assistant_api import sofi_assistant
         assistant_response = await sofi_assistant.send_message_to_assistant(sender, text)
         
+        if assistant_response is None:
+            # Coalesced with newer messages - their run sends the combined reply
+            return "Message coalesced into the next Assistant run"
+        
         if assistant_response:
             await whatsapp_api.send_message_with_read_and_typing(
                 phone_number=sender,
                 message=assistant_response,
-                message_id_to_read=message_id,
-                typing_duration=2.0
+                message_id_to_read=message_id
             )
             return "Message processed by Sofi Assistant"
         else:
             await whatsapp_api.send_message_with_read_and_typing(
                 phone_number=sender,
                 message="Sorry, I'm having trouble right now. Please try again.",
-                message_id_to_read=message_id,
-                typing_duration=1.0
+                message_id_to_read=message_id
             )
             return "Assistant error - fallback sent"
             
@@ -2327,8 +2366,7 @@ async def route_whatsapp_message(sender: str, text: str, message_id: str = None)
             await whatsapp_api.send_message_with_read_and_typing(
                 phone_number=sender,
                 message="I'm experiencing technical difficulties. Please try again in a few minutes.",
-                message_id_to_read=message_id,
-                typing_duration=1.0
+                message_id_to_read=message_id
             )
         except:
             pass
@@ -2371,14 +2409,16 @@ def whatsapp_webhook():
             
             logger.info(f"WhatsApp message from {sender}: {text} (ID: {message_id})")
             
-            # Route and process the message with read receipts and typing
-            import asyncio
-            result = asyncio.run(route_whatsapp_message(sender, text, message_id))
-            
-            # The route_whatsapp_message now handles sending messages directly
-            # No need to send response again here
+            # Acknowledge immediately - route_whatsapp_message runs on the
+            # ingestion queue workers and sends its own replies
+            accepted = enqueue_webhook_message(
+                route_whatsapp_message, sender, text, message_id,
+                dedupe_key=message_id
+            )
             
-            logger.info(f"WhatsApp message processed: {result}")
+            if not accepted:
+                # Queue full - ask Meta to redeliver later
+                return "Service Unavailable", 503
             
             return "OK", 200
             
@@ -2448,7 +2488,7 @@ def whatsapp_create_account():
         
         # Create account via simplified WhatsApp manager
         import asyncio
-        result = asyncio.run(whatsapp_account_manager.create_whatsapp_account(data))
+        result = run_async_isolated(whatsapp_account_manager.create_whatsapp_account(data))
         
         if result['success']:
             # Send WhatsApp notification with account details
@@ -2725,16 +2765,18 @@ def verify_pin_api():
         from utils.secure_pin_verification import secure_pin_verification
         
         transaction = None
+        transaction_id = None
         if secure_token:
-            # Use new secure token system
-            transaction = secure_pin_verification.get_pending_transaction_by_token(secure_token)
-            if transaction:
-                # Mark token as used to prevent replay attacks
-                secure_pin_verification.mark_token_as_used(secure_token)
+            # Use new secure token system; consuming is atomic across workers,
+            # so a token can only ever be used once (prevents replay attacks)
+            consumed = secure_pin_verification.consume_token(secure_token)
+            if consumed:
+                transaction_id, transaction = consumed
                 logger.info(f"✅ Secure token verified and marked as used: {secure_token[:10]}...")
         elif legacy_transaction_id:
             # Legacy system for backward compatibility
             transaction = secure_pin_verification.get_pending_transaction(legacy_transaction_id)
+            transaction_id = legacy_transaction_id
             logger.info(f"⚠️ Using legacy transaction ID: {legacy_transaction_id}")
         
         if not transaction:
@@ -2746,43 +2788,10 @@ def verify_pin_api():
                 'success': False,
                 'error': 'Transaction expired, invalid, or already used'
             }), 400
+        
         # Verify PIN and process transfer using the secure PIN verification system
-        from utils.secure_pin_verification import secure_pin_verification
         import asyncio
-        
-        # Get transaction ID properly using the secure token validation
-        if secure_token:
-            # Use proper method to validate token and get transaction data
-            transaction = secure_pin_verification.get_pending_transaction_by_token(secure_token)
-            if not transaction:
-                return jsonify({
-                    'success': False,
-                    'error': 'Invalid, expired, or already used token'
-                }), 400
-            
-            # Extract transaction ID from the validated transaction data
-            # The transaction ID is embedded in the transfer_data
-            transfer_data = transaction.get('transfer_data', {})
-            transaction_id = transfer_data.get('transaction_id')
-            
-            # If not in transfer_data, try to derive from secure token data
-            if not transaction_id:
-                token_data = secure_pin_verification.secure_tokens.get(secure_token)
-                transaction_id = token_data['transaction_id'] if token_data else None
-                
-            logger.info(f"✅ Extracted transaction_id from secure token: {transaction_id}")
-        else:
-            transaction_id = legacy_transaction_id
-            logger.info(f"⚠️ Using legacy transaction_id: {transaction_id}")
-            
-        if not transaction_id:
-            return jsonify({
-                'success': False,
-                'error': 'Transaction ID not found'
-            }), 400
-        
-        # Process PIN verification and transfer
-        pin_result = asyncio.run(secure_pin_verification.verify_pin_and_process_transfer(transaction_id, pin))
+        pin_result = run_async_isolated(secure_pin_verification.verify_pin_and_process_transfer(transaction_id, pin))
         
         # Monitor PIN attempt
         from utils.security_monitor import security_monitor
@@ -2828,10 +2837,9 @@ def verify_pin_api():
 def cancel_transfer_api(transaction_id):
     """API endpoint for cancelling transfer"""
     try:
-        from utils.secure_pin_verification import pending_transactions
+        from utils.secure_pin_verification import secure_pin_verification
         
-        if transaction_id in pending_transactions:
-            del pending_transactions[transaction_id]
+        secure_pin_verification.cancel_pending_transaction(transaction_id)
             
         return jsonify({'success': True}), 200
         
@@ -2867,7 +2875,7 @@ def onboard_user_api():
         
         import asyncio
         # Use asyncio.run to safely run the async onboarding function
-        result = asyncio.run(onboarding_service.create_new_user(user_data))
+        result = run_async_isolated(onboarding_service.create_new_user(user_data))
         
         if result.get('success'):
             logger.info(f"✅ Successfully onboarded WhatsApp user: {user_data.get('full_name')}")
@@ -2877,7 +2885,7 @@ def onboard_user_api():
             if whatsapp_number and not whatsapp_number.startswith('web_user_'):
                 try:
                     # Send welcome message with account details immediately
-                    asyncio.run(send_whatsapp_account_details(whatsapp_number, result))
+                    run_async_isolated(send_whatsapp_account_details(whatsapp_number, result))
                     logger.info(f"🎉 Account details sent to WhatsApp user {whatsapp_number}")
                 except Exception as e:
                     logger.error(f"❌ Failed to send account details to {whatsapp_number}: {e}")
@@ -2941,7 +2949,7 @@ def notify_onboarding_complete():
         if whatsapp_number and not whatsapp_number.startswith('web_user_'):
             # Send account details to the WhatsApp user
             import asyncio
-            asyncio.run(send_whatsapp_account_details(whatsapp_number, onboarding_result))
+            run_async_isolated(send_whatsapp_account_details(whatsapp_number, onboarding_result))
             logger.info(f"✅ Account details sent via notification webhook to {whatsapp_number}")
             
         return jsonify({'success': True}), 200
@@ -3049,9 +3057,8 @@ def get_transaction_details():
         transfer_data = transaction.get('transfer_data', {})
         
         # Convert bank code to friendly name
-        from functions.transfer_functions import BANK_CODE_TO_NAME
         bank_code = transfer_data.get('bank', 'Unknown Bank')
-        bank_name = BANK_CODE_TO_NAME.get(bank_code, bank_code)
+        bank_name = get_bank_name_from_code(bank_code)
         
         # Return safe transaction details for display
         return jsonify({
@@ -3093,7 +3100,6 @@ async def send_beautiful_receipt(phone_number, receipt_data, transfer_result):
         
         # --- Ensure bank_name is always a human-readable name ---
         # If bank_name is a code, resolve it to a name
-        from functions.transfer_functions import get_bank_name_from_code
         if bank_name.isdigit() or bank_name == bank_name.upper():
             resolved_name = get_bank_name_from_code(bank_name)
             if resolved_name:
@@ -3199,6 +3205,7 @@ def register_user():
             }
             
             result = supabase.table("users").update(update_data).eq("id", user_id).execute()
+            invalidate_user(phone, user_id)
             
             if result.data:
                 logger.info(f"✅ Updated existing WhatsApp user: {phone}")
@@ -3231,6 +3238,7 @@ def register_user():
             }
             
             result = supabase.table("users").insert(user_data).execute()
+            invalidate_user(phone)
             
             if result.data:
                 logger.info(f"✅ New user registered: {email}")
@@ -3257,6 +3265,9 @@ def handle_onboarding_completion():
         account_number = data.get('account_number')
         
         if phone_number:
+            # Account details just changed - drop any cached identity lookup
+            invalidate_user(phone_number)
+            
             # Send confirmation message back to WhatsApp like Xara does
             completion_message = (
                 f"🎉 *Welcome to Sofi, {user_name}!*\n\n"
@@ -3475,255 +3486,13 @@ def create_encrypted_health_response():
         return 'Internal Server Error', 500
 
 def get_flow_encryption():
-    """Get Flow encryption handler with actual implementation"""
+    """Per-request Flow encryption handle over the process-wide crypto engine"""
     try:
-        # Import the Flow encryption handler
-        from utils.flow_encryption import FlowEncryption
         return FlowEncryption()
-    except ImportError:
-        # If utils.flow_encryption doesn't exist, return inline implementation
-        return InlineFlowEncryption()
     except Exception as e:
         logger.error(f"❌ Error getting flow encryption: {e}")
         return None
 
-class InlineFlowEncryption:
-    """Inline Flow encryption implementation for WhatsApp Flows"""
-    
-    def __init__(self):
-        import os
-        import base64
-        # Get private key from environment (Base64 encoded)
-        private_key_b64 = os.getenv('WHATSAPP_FLOW_PRIVATE_KEY')
-        if not private_key_b64:
-            logger.warning("⚠️ WHATSAPP_FLOW_PRIVATE_KEY not set - Flow encryption disabled")
-            self.private_key_pem = None
-        else:
-            try:
-                # Decode Base64 to get PEM format
-                self.private_key_pem = base64.b64decode(private_key_b64).decode('utf-8')
-                logger.info("✅ Private key decoded from Base64 successfully")
-            except Exception as e:
-                logger.error(f"❌ Failed to decode private key: {e}")
-                self.private_key_pem = None
-    
-    def decrypt_request(self, encrypted_flow_data, encrypted_aes_key, initial_vector):
-        """Decrypt incoming Flow request from Meta"""
-        try:
-            import base64
-            import json
-            from cryptography.hazmat.primitives.asymmetric import rsa, padding
-            from cryptography.hazmat.primitives import hashes, serialization
-            from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-            
-            if not self.private_key_pem:
-                logger.warning("🔧 Private key not configured - cannot decrypt")
-                return None
-            
-            logger.info(f"🔍 Decryption input lengths:")
-            logger.info(f"   encrypted_flow_data: {len(encrypted_flow_data)} chars")
-            logger.info(f"   encrypted_aes_key: {len(encrypted_aes_key)} chars")
-            logger.info(f"   initial_vector: {len(initial_vector)} chars")
-            
-            # Load private key
-            private_key = serialization.load_pem_private_key(
-                self.private_key_pem.encode(),
-                password=None
-            )
-            
-            # Decode Base64 data with validation
-            try:
-                encrypted_aes_key_bytes = base64.b64decode(encrypted_aes_key)
-                encrypted_flow_data_bytes = base64.b64decode(encrypted_flow_data)
-                iv_bytes = base64.b64decode(initial_vector)
-                
-                logger.info(f"🔍 Decoded data lengths:")
-                logger.info(f"   AES key: {len(encrypted_aes_key_bytes)} bytes")
-                logger.info(f"   Flow data: {len(encrypted_flow_data_bytes)} bytes")
-                logger.info(f"   IV: {len(iv_bytes)} bytes")
-                
-                # Check block alignment
-                is_block_aligned = len(encrypted_flow_data_bytes) % 16 == 0
-                logger.info(f"🔍 Block alignment: {is_block_aligned}")
-                
-                if not is_block_aligned:
-                    logger.warning(f"⚠️ Flow data length {len(encrypted_flow_data_bytes)} is not AES block-aligned")
-                    logger.warning("⚠️ Meta might be using a different encryption mode or data format")
-                    # We'll still try to decrypt, but this might be the issue
-                    
-                if len(iv_bytes) != 16:
-                    logger.error(f"❌ IV length {len(iv_bytes)} is not 16 bytes")
-                    return None
-                    
-            except Exception as decode_error:
-                logger.error(f"❌ Base64 decode error: {decode_error}")
-                return None
-            
-            # Decrypt AES key using RSA private key
-            try:
-                aes_key = private_key.decrypt(
-                    encrypted_aes_key_bytes,
-                    padding.OAEP(
-                        mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                        algorithm=hashes.SHA256(),
-                        label=None
-                    )
-                )
-                logger.info(f"✅ AES key decrypted: {len(aes_key)} bytes")
-            except Exception as rsa_error:
-                logger.error(f"❌ RSA decryption error: {rsa_error}")
-                return None
-            
-            # Try different AES modes if the data isn't block-aligned
-            decrypted_data = None
-            
-            # Method 1: Try GCM mode (no padding required)
-            if len(encrypted_flow_data_bytes) >= 16:  # GCM needs at least 16 bytes for tag
-                try:
-                    logger.info("🔄 Trying AES-GCM decryption...")
-                    # For GCM, the last 16 bytes are usually the authentication tag
-                    if len(encrypted_flow_data_bytes) > 16:
-                        ciphertext = encrypted_flow_data_bytes[:-16]
-                        tag = encrypted_flow_data_bytes[-16:]
-                        
-                        cipher = Cipher(algorithms.AES(aes_key), modes.GCM(iv_bytes, tag))
-                        decryptor = cipher.decryptor()
-                        decrypted_data = decryptor.update(ciphertext) + decryptor.finalize()
-                        logger.info(f"✅ GCM decryption successful: {len(decrypted_data)} bytes")
-                except Exception as gcm_error:
-                    logger.info(f"ℹ️ GCM decryption failed: {gcm_error}")
-                    decrypted_data = None
-            
-            # Method 2: Try CBC mode (original method) if block-aligned
-            if decrypted_data is None and len(encrypted_flow_data_bytes) % 16 == 0:
-                try:
-                    logger.info("🔄 Trying AES-CBC decryption...")
-                    cipher = Cipher(algorithms.AES(aes_key), modes.CBC(iv_bytes))
-                    decryptor = cipher.decryptor()
-                    
-                    decrypted_padded = decryptor.update(encrypted_flow_data_bytes) + decryptor.finalize()
-                    
-                    if len(decrypted_padded) > 0:
-                        # Remove PKCS7 padding
-                        padding_length = decrypted_padded[-1]
-                        if padding_length <= 16 and padding_length <= len(decrypted_padded):
-                            # Verify padding
-                            valid_padding = True
-                            for i in range(padding_length):
-                                if decrypted_padded[-(i+1)] != padding_length:
-                                    valid_padding = False
-                                    break
-                            
-                            if valid_padding:
-                                decrypted_data = decrypted_padded[:-padding_length]
-                                logger.info(f"✅ CBC decryption successful: {len(decrypted_data)} bytes")
-                            else:
-                                logger.warning("⚠️ Invalid PKCS7 padding in CBC mode")
-                        else:
-                            logger.warning(f"⚠️ Invalid padding length: {padding_length}")
-                except Exception as cbc_error:
-                    logger.info(f"ℹ️ CBC decryption failed: {cbc_error}")
-                    decrypted_data = None
-            
-            # Method 3: Try CTR mode (no padding, any length)
-            if decrypted_data is None:
-                try:
-                    logger.info("🔄 Trying AES-CTR decryption...")
-                    cipher = Cipher(algorithms.AES(aes_key), modes.CTR(iv_bytes))
-                    decryptor = cipher.decryptor()
-                    decrypted_data = decryptor.update(encrypted_flow_data_bytes) + decryptor.finalize()
-                    logger.info(f"✅ CTR decryption successful: {len(decrypted_data)} bytes")
-                except Exception as ctr_error:
-                    logger.info(f"ℹ️ CTR decryption failed: {ctr_error}")
-                    decrypted_data = None
-            
-            if decrypted_data is None:
-                logger.error("❌ All decryption methods failed")
-                return None
-            
-            # Parse JSON
-            try:
-                flow_data = json.loads(decrypted_data.decode('utf-8'))
-                logger.info(f"✅ JSON parsed successfully: {list(flow_data.keys())}")
-            except Exception as json_error:
-                logger.error(f"❌ JSON parse error: {json_error}")
-                logger.error(f"Raw decrypted data: {decrypted_data[:100]}...")
-                # Try to decode as plain text to see what we got
-                try:
-                    text_data = decrypted_data.decode('utf-8', errors='replace')
-                    logger.error(f"Decoded text: {text_data[:200]}...")
-                except:
-                    pass
-                return None
-            
-            # Store AES key and IV for response encryption
-            self.response_aes_key = aes_key
-            self.response_iv = iv_bytes
-            
-            logger.info("✅ Flow request decrypted successfully")
-            return flow_data
-            
-        except Exception as e:
-            logger.error(f"❌ Flow decryption error: {e}")
-            import traceback
-            logger.error(f"❌ Decryption traceback: {traceback.format_exc()}")
-            return None
-    
-    def encrypt_response(self, response_data):
-        """Encrypt Flow response for Meta using AES-GCM mode with INVERTED IV"""
-        try:
-            import base64
-            import json
-            import traceback
-            from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-            
-            if not hasattr(self, 'response_aes_key'):
-                logger.error("❌ No AES key available for response encryption")
-                return None
-            
-            # Convert response to JSON
-            response_json = json.dumps(response_data)
-            response_bytes = response_json.encode('utf-8')
-            
-            logger.info(f"🔒 Encrypting response: {len(response_bytes)} bytes")
-            logger.info(f"🔒 Response preview: {response_json[:100]}...")
-            
-            # CRITICAL: Meta requires INVERTED IV for response encryption
-            # Flip all bits of the original IV (XOR with 0xFF)
-            flipped_iv = bytearray()
-            for byte in self.response_iv:
-                flipped_iv.append(byte ^ 0xFF)
-            
-            logger.info(f"🔄 Original IV: {self.response_iv.hex()}")
-            logger.info(f"🔄 Flipped IV: {bytes(flipped_iv).hex()}")
-            
-            # Encrypt using AES-GCM with the FLIPPED IV
-            cipher = Cipher(algorithms.AES(self.response_aes_key), modes.GCM(bytes(flipped_iv)))
-            encryptor = cipher.encryptor()
-            
-            # Encrypt the response bytes
-            encrypted_response = encryptor.update(response_bytes) + encryptor.finalize()
-            
-            # Get the authentication tag
-            auth_tag = encryptor.tag
-            
-            # Combine encrypted data + auth tag (Meta's expected format)
-            final_encrypted_data = encrypted_response + auth_tag
-            
-            # Return Base64 encoded encrypted response
-            encrypted_b64 = base64.b64encode(final_encrypted_data).decode('utf-8')
-            
-            logger.info(f"✅ Response encrypted with FLIPPED IV: {len(final_encrypted_data)} bytes -> {len(encrypted_b64)} chars")
-            logger.info(f"🔒 Auth tag length: {len(auth_tag)} bytes")
-            logger.info(f"🔒 Encrypted response preview: {encrypted_b64[:50]}...")
-            
-            return encrypted_b64
-            
-        except Exception as e:
-            logger.error(f"❌ Flow encryption error: {e}")
-            logger.error(f"❌ Encryption traceback: {traceback.format_exc()}")
-            return None
-
 def handle_encrypted_flow_data(payload):
     """Handle encrypted WhatsApp Flow data exchange"""
     try:
@@ -4324,6 +4093,8 @@ def handle_flow_completion(decrypted_data, flow_token):
             
             logger.info(f"✅ User created successfully: {full_name}")
         
+        invalidate_user(clean_phone, user_id)
+        
         # Create Paystack virtual account with proper WhatsApp phone number
         try:
             from utils.paystack_account_manager import PaystackVirtualAccountManager
@@ -4450,6 +4221,9 @@ def handle_flow_completion(decrypted_data, flow_token):
             except Exception as db_error:
                 logger.error(f"❌ Failed to update user with Paystack error: {db_error}")
         
+        # Paystack details were written to the user row above
+        invalidate_user(clean_phone, user_id)
+        
         # Send WhatsApp confirmation
         try:
             # Get final user data with Paystack info
@@ -4601,6 +4375,7 @@ def handle_onboarding_flow_submission(data, flow_token):
         
         logger.info(f"💾 Creating user in database: {full_name}")
         result = supabase.table("users").insert(user_data).execute()
+        invalidate_user(phone)
         
         if result.data:
             logger.info(f"✅ NEW USER CREATED SUCCESSFULLY: {full_name}")
@@ -4801,6 +4576,7 @@ def handle_onboarding_flow_submission(data, flow_token):
                 }
                 
                 result = supabase.table("users").update(update_data).eq("id", user_id).execute()
+                invalidate_user(phone, user_id)
                 
                 if result.data:
                     logger.info(f"✅ Updated existing WhatsApp user: {phone}")
@@ -4859,6 +4635,7 @@ def handle_onboarding_flow_submission(data, flow_token):
                 
                 # Insert into database
                 result = supabase.table("users").insert(user_data).execute()
+                invalidate_user(phone)
                 
                 if result.data:
                     logger.info(f"✅ New user created successfully: {full_name}")
@@ -4960,6 +4737,7 @@ def handle_onboarding_flow_submission(data, flow_token):
         
         # Insert into database
         result = supabase.table('users').insert(user_data).execute()
+        invalidate_user(clean_phone, user_id)
         
         if result.data:
             logger.info(f"✅ User account created successfully for {full_name}")
@@ -4989,13 +4767,10 @@ def handle_onboarding_flow_submission(data, flow_token):
                 
                 # Create account asynchronously
                 if asyncio.iscoroutinefunction(paystack_manager.create_whatsapp_account):
-                    # Run async function
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    paystack_result = loop.run_until_complete(
+                    # Sync Supabase/Paystack calls inside: keep them off the shared loop
+                    paystack_result = run_async_isolated(
                         paystack_manager.create_whatsapp_account(whatsapp_data)
                     )
-                    loop.close()
                 else:
                     # Run sync function
                     paystack_result = paystack_manager.create_whatsapp_account(whatsapp_data)
@@ -5016,6 +4791,7 @@ def handle_onboarding_flow_submission(data, flow_token):
                     }
                     
                     supabase.table('users').update(update_data).eq('id', user_id).execute()
+                    invalidate_user(clean_phone, user_id)
                     logger.info(f"✅ User updated with Paystack account details")
                     
                 else:
@@ -5274,6 +5050,7 @@ def handle_onboarding_flow_completion(flow_data: dict, flow_token: str) -> tuple
         }
         
         result = supabase.table("users").insert(user_record).execute()
+        invalidate_user(phone)
         
         if result.data:
             # Create virtual account
@@ -5662,8 +5439,7 @@ def sofi_flow_health():
     """WhatsApp Flow encryption health check with detailed status"""
     try:
         # Test encryption system
-        flow_encryption = get_flow_encryption()
-        encryption_ready = flow_encryption is not None
+        encryption_ready = flow_crypto.ready
         
         return jsonify({
             "status": "healthy",
@@ -0,0 +1,271 @@
+"""
+Paystack Account Resolver
+=========================
+Cached account-name resolution (GET /bank/resolve)
+
+Every transfer verifies its recipient, and the assistant's verify_account_name
+tool resolves the same account again moments later. Users send to the same
+few accounts over and over, so resolutions are cached per
+(bank_code, account_number):
+
+- TTL + LRU: names are kept for ACCOUNT_RESOLVE_TTL seconds, and the least
+  recently used entries go first once ACCOUNT_RESOLVE_MAX_ENTRIES is reached.
+- Negative caching: an account Paystack definitively rejects (a 4xx with
+  status false, e.g. "Could not resolve account name") is remembered for
+  ACCOUNT_RESOLVE_NEGATIVE_TTL seconds. Timeouts, 5xx responses and an open
+  circuit breaker are never cached.
+- Single flight: concurrent lookups of the same account share one request.
+- Prefetch: when a user's saved beneficiaries are loaded, their accounts are
+  resolved in the background, so picking one skips the round trip.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import requests
+
+from .transport import paystack_transport
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_RESOLVE_TTL = float(os.getenv("ACCOUNT_RESOLVE_TTL", "3600"))
+ACCOUNT_RESOLVE_NEGATIVE_TTL = float(os.getenv("ACCOUNT_RESOLVE_NEGATIVE_TTL", "300"))
+ACCOUNT_RESOLVE_MAX_ENTRIES = int(os.getenv("ACCOUNT_RESOLVE_MAX_ENTRIES", "5000"))
+ACCOUNT_PREFETCH_LIMIT = int(os.getenv("ACCOUNT_PREFETCH_LIMIT", "5"))
+PREFETCH_WORKERS = 2
+FOLLOWER_TIMEOUT = 30  # seconds a duplicate lookup waits for the one in flight
+
+# 4xx answers that say nothing about the account itself
+TRANSIENT_CLIENT_STATUSES = frozenset({401, 403, 408, 429})
+
+Key = Tuple[str, str]
+
+
+def _key(account_number: str, bank_code: str) -> Key:
+    return str(bank_code).strip(), str(account_number).strip()
+
+
+def _copy(result: Dict) -> Dict:
+    """Callers get their own dicts so nobody mutates a cached answer"""
+    copied = dict(result)
+    if isinstance(copied.get("data"), dict):
+        copied["data"] = dict(copied["data"])
+    return copied
+
+
+class _CachedResolution:
+    __slots__ = ("result", "expires_at")
+
+    def __init__(self, result: Dict, ttl: float):
+        self.result = result
+        self.expires_at = time.time() + ttl
+
+
+class AccountResolver:
+    """TTL/LRU cache with single-flight lookups in front of /bank/resolve"""
+
+    def __init__(self, ttl: float = ACCOUNT_RESOLVE_TTL,
+                 negative_ttl: float = ACCOUNT_RESOLVE_NEGATIVE_TTL,
+                 max_entries: int = ACCOUNT_RESOLVE_MAX_ENTRIES,
+                 prefetch_limit: int = ACCOUNT_PREFETCH_LIMIT):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.prefetch_limit = prefetch_limit
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[Key, _CachedResolution]" = OrderedDict()
+        self._in_flight: Dict[Key, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "coalesced": 0,
+                       "lookups": 0, "errors": 0, "prefetched": 0, "evictions": 0}
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {os.getenv('PAYSTACK_SECRET_KEY')}",
+            "Content-Type": "application/json",
+        }
+
+    # =================== CACHE ===================
+
+    def _cached_locked(self, key: Key) -> Optional[Dict]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at <= time.time():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        self._stats["hits" if entry.result.get("success") else "negative_hits"] += 1
+        return entry.result
+
+    def _store_locked(self, key: Key, result: Dict, ttl: float):
+        self._cache[key] = _CachedResolution(result, ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _begin(self, key: Key) -> Tuple[Optional[Dict], Optional[Future], bool]:
+        """
+        Returns (cached result, future, leader). A leader must call _settle();
+        everyone else waits on the future.
+        """
+        with self._lock:
+            cached = self._cached_locked(key)
+            if cached is not None:
+                return cached, None, False
+            future = self._in_flight.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return None, future, False
+            self._stats["misses"] += 1
+            future = self._in_flight[key] = Future()
+            return None, future, True
+
+    def _settle(self, key: Key, future: Future):
+        try:
+            result, ttl = self._fetch(key)
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            return
+        with self._lock:
+            if ttl:
+                self._store_locked(key, result, ttl)
+            self._in_flight.pop(key, None)
+        future.set_result(result)
+
+    def _fetch(self, key: Key) -> Tuple[Dict, float]:
+        """One /bank/resolve call; returns the result and how long to cache it (0 = not at all)"""
+        bank_code, account_number = key
+        with self._lock:
+            self._stats["lookups"] += 1
+        try:
+            response = paystack_transport.get(
+                "/bank/resolve", headers=self._headers(),
+                params={"account_number": account_number, "bank_code": bank_code},
+            )
+            try:
+                body = response.json()
+            except ValueError:
+                body = {}
+        except requests.RequestException as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            logger.error(f"❌ Error resolving account {account_number}: {e}")
+            return {"success": False, "error": str(e)}, 0
+
+        if response.status_code == 200 and body.get("status") and body.get("data"):
+            return {"success": True, "data": body["data"]}, self.ttl
+
+        message = body.get("message") or f"Account resolution failed (HTTP {response.status_code})"
+        logger.warning(f"❌ Could not resolve account {account_number} at {bank_code}: {message}")
+        definitive = 400 <= response.status_code < 500 and response.status_code not in TRANSIENT_CLIENT_STATUSES
+        if not definitive:
+            with self._lock:
+                self._stats["errors"] += 1
+        return {"success": False, "error": message}, self.negative_ttl if definitive else 0
+
+    # =================== LOOKUPS ===================
+
+    def resolve(self, account_number: str, bank_code: str) -> Dict[str, Any]:
+        """
+        Resolve an account name, from cache when possible
+
+        Returns:
+            {"success": True, "data": {...}} with Paystack's account_name and
+            account_number, or {"success": False, "error": "..."}
+        """
+        key = _key(account_number, bank_code)
+        cached, future, leader = self._begin(key)
+        if cached is not None:
+            return _copy(cached)
+        try:
+            if leader:
+                self._settle(key, future)
+            return _copy(future.result(timeout=FOLLOWER_TIMEOUT))
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    async def aresolve(self, account_number: str, bank_code: str) -> Dict[str, Any]:
+        """resolve() for coroutines: cache hits return immediately, misses run off the loop"""
+        key = _key(account_number, bank_code)
+        cached, future, leader = self._begin(key)
+        if cached is not None:
+            return _copy(cached)
+        try:
+            if leader:
+                asyncio.get_running_loop().run_in_executor(None, self._settle, key, future)
+            return _copy(await asyncio.wait_for(asyncio.wrap_future(future), FOLLOWER_TIMEOUT))
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def prefetch(self, accounts: Iterable[Tuple[str, str]]) -> int:
+        """
+        Resolve (account_number, bank_code) pairs in the background
+
+        Only accounts that are neither cached nor in flight are fetched, at
+        most prefetch_limit per call. Returns how many were scheduled.
+        """
+        scheduled = 0
+        for account_number, bank_code in accounts:
+            if scheduled >= self.prefetch_limit:
+                break
+            if not account_number or not bank_code:
+                continue
+            key = _key(account_number, bank_code)
+            with self._lock:
+                entry = self._cache.get(key)
+                if (entry is not None and entry.expires_at > time.time()) or key in self._in_flight:
+                    continue
+                self._stats["prefetched"] += 1
+                executor = self._executor_locked()
+            executor.submit(self.resolve, account_number, bank_code)
+            scheduled += 1
+        return scheduled
+
+    def prefetch_beneficiaries(self, beneficiaries: Iterable[Dict]) -> int:
+        """prefetch() for beneficiary rows (account_number and bank_code columns)"""
+        return self.prefetch(
+            (b.get("account_number"), b.get("bank_code")) for b in beneficiaries or [] if isinstance(b, dict)
+        )
+
+    def _executor_locked(self) -> ThreadPoolExecutor:
+        # Executor threads do not survive a fork
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS,
+                                                thread_name_prefix="account-prefetch")
+            self._pid = os.getpid()
+        return self._executor
+
+    def invalidate(self, account_number: str, bank_code: str):
+        with self._lock:
+            self._cache.pop(_key(account_number, bank_code), None)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            served = self._stats["hits"] + self._stats["negative_hits"] + self._stats["coalesced"]
+            total = served + self._stats["misses"]
+            return {**self._stats, "entries": len(self._cache), "in_flight": len(self._in_flight),
+                    "hit_rate": round(served / total, 3) if total else 0.0, "ttl": self.ttl}
+
+
+def _after_fork_in_child():
+    # Lookups in flight belong to the parent's threads
+    account_resolver._lock = threading.Lock()
+    account_resolver._in_flight = {}
+
+
+# Global resolver
+account_resolver = AccountResolver()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
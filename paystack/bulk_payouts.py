@@ -0,0 +1,529 @@
+"""
+Paystack Bulk Payouts
+=====================
+Batched payouts through Paystack's bulk recipient and bulk transfer endpoints
+
+Salary runs and group splits used to go out as one POST /transfer (plus a
+POST /transferrecipient) per payee. The pipeline sends a whole batch in a
+handful of requests:
+
+- Validation in bulk: one fee lookup per distinct amount, then one
+  reserve_payout_funds call holds amount + fee on each payer's wallet with
+  a conditional decrement, item by item, while the balance still covers it
+  (paystack_payout_reservations.sql). Nothing is sent without a hold.
+- Recipients: known codes come from the recipient registry; the rest are
+  created with one POST /transferrecipient/bulk per chunk and remembered.
+- Submission: POST /transfer/bulk in chunks of PAYOUT_CHUNK_SIZE (Paystack
+  takes at most 100). Every item carries its own reference, so a chunk is
+  safe to retry. Only a definite 4xx rejection of the chunk refunds it; a
+  chunk that failed ambiguously (timeout, 5xx) is settled item by item
+  through GET /transfer/verify, and items Paystack has no record of yet stay
+  held as unconfirmed rather than being guessed at.
+- Reconciliation: accepted items become transfer_out rows in
+  bank_transactions in a single insert, their holds are settled and the
+  balance ledger is advanced; rejected and failed items are refunded with
+  release_payout_funds. transfer.success / transfer.failed webhooks then
+  settle every item by reference, as for single transfers.
+
+enqueue() collects transfers from anywhere in the worker and a background
+thread flushes them every PAYOUT_FLUSH_INTERVAL seconds, or as soon as a
+chunk is full; run() processes a prepared batch directly. The assistant's
+send_group_payout tool (functions/transfer_functions.py) stores a batch for
+web PIN entry, and SecurePinVerification runs it once the PIN is verified.
+Paystack accepts bulk transfers only while transfer OTP is disabled.
+"""
+
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.balance_ledger import balance_ledger
+from .account_resolver import account_resolver
+from .recipient_registry import recipient_registry, is_stale_recipient_error
+
+logger = logging.getLogger(__name__)
+
+PAYSTACK_BULK_LIMIT = 100  # items per bulk request Paystack accepts
+PAYOUT_CHUNK_SIZE = min(int(os.getenv("PAYOUT_CHUNK_SIZE", "100")), PAYSTACK_BULK_LIMIT)
+PAYOUT_FLUSH_INTERVAL = float(os.getenv("PAYOUT_FLUSH_INTERVAL", "5"))
+RESOLVE_WORKERS = 4
+
+# Per-item Paystack statuses that mean the transfer will not happen
+REJECTED_STATUSES = frozenset({"failed", "reversed", "abandoned", "rejected", "blocked"})
+
+# 4xx answers that do not prove the chunk was turned away
+AMBIGUOUS_CLIENT_ERRORS = frozenset({408, 409, 429})
+
+Key = Tuple[str, str]
+
+
+def _account_key(account_number: str, bank_code: str) -> Key:
+    return str(bank_code).strip(), str(account_number).strip()
+
+
+def _new_reference() -> str:
+    return f"sofi_bulk_{uuid.uuid4().hex[:20]}"
+
+
+def is_definite_rejection(result: Dict[str, Any]) -> bool:
+    """True if Paystack answered a bulk request with a 4xx that means nothing was queued"""
+    status_code = result.get("status_code")
+    if not status_code or not 400 <= status_code < 500 or status_code in AMBIGUOUS_CLIENT_ERRORS:
+        return False
+    # A repeated reference means an earlier attempt got through
+    return "duplicate" not in (result.get("error") or "").lower()
+
+
+def default_transfer_fee(amount: float) -> Optional[float]:
+    """Total transfer fee from the admin-editable fee settings (None if unavailable)"""
+    from utils.fee_calculator import fee_calculator
+    fee = fee_calculator.calculate_transfer_fees(amount).get("total_fee")
+    return float(fee) if fee is not None else None
+
+
+@dataclass
+class PayoutItem:
+    """One payout in a batch; amount and fee are in Naira"""
+    user_id: str  # users.id of the payer
+    account_number: str
+    bank_code: str
+    amount: float
+    name: Optional[str] = None  # resolved through /bank/resolve when missing
+    reason: str = "Payout"
+    reference: str = field(default_factory=_new_reference)
+
+    # Filled in by the pipeline
+    fee: float = 0.0
+    recipient_code: Optional[str] = None
+    cached_recipient: bool = False
+    status: str = "queued"  # -> rejected | failed | submitted | unconfirmed
+    error: Optional[str] = None
+    transfer_code: Optional[str] = None
+    reserved: bool = False  # amount + fee is held on the payer's wallet
+    balance_after: Optional[float] = None  # payer's balance once the hold was taken
+
+    @property
+    def key(self) -> Key:
+        return _account_key(self.account_number, self.bank_code)
+
+    def reject(self, status: str, error: str):
+        self.status, self.error = status, error
+
+    def result(self) -> Dict[str, Any]:
+        return {
+            "reference": self.reference,
+            "user_id": self.user_id,
+            "account_number": self.account_number,
+            "bank_code": self.bank_code,
+            "account_name": self.name,
+            "amount": self.amount,
+            "fee": self.fee,
+            "status": self.status,
+            "transfer_code": self.transfer_code,
+            "error": self.error,
+        }
+
+
+class BulkPayoutPipeline:
+    """Queue, validate, create recipients, submit in chunks, reconcile"""
+
+    def __init__(self, transfer_api=None, supabase=None, chunk_size: int = PAYOUT_CHUNK_SIZE,
+                 flush_interval: float = PAYOUT_FLUSH_INTERVAL,
+                 fee_for: Callable[[float], Optional[float]] = default_transfer_fee):
+        self._transfer_api = transfer_api
+        self._supabase = supabase
+        self.chunk_size = max(1, min(chunk_size, PAYSTACK_BULK_LIMIT))
+        self.flush_interval = flush_interval
+        self.fee_for = fee_for
+        self._lock = threading.Lock()
+        self._queue: List[Tuple[PayoutItem, Future]] = []
+        self._wake = threading.Event()
+        self._flusher_pid = None
+        self._stats = {"batches": 0, "items": 0, "submitted": 0, "rejected": 0, "failed": 0,
+                       "unconfirmed": 0, "refunded": 0, "recipient_requests": 0, "transfer_requests": 0,
+                       "verify_requests": 0, "total_batch_ms": 0.0}
+
+    @property
+    def transfer_api(self):
+        if self._transfer_api is None:
+            from .paystack_transfer_api import PaystackTransferAPI
+            self._transfer_api = PaystackTransferAPI()
+        return self._transfer_api
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            from utils.supabase_client import get_supabase_client
+            self._supabase = get_supabase_client()
+        return self._supabase
+
+    def _count(self, key: str, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _chunks(self, items: List[PayoutItem]):
+        for start in range(0, len(items), self.chunk_size):
+            yield items[start:start + self.chunk_size]
+
+    # =================== QUEUE ===================
+
+    def enqueue(self, item: PayoutItem) -> Future:
+        """
+        Queue a payout for the next flush
+
+        Returns:
+            A future resolving to the item's result dict
+        """
+        future = Future()
+        with self._lock:
+            self._queue.append((item, future))
+            full = len(self._queue) >= self.chunk_size
+            start_flusher = self._flusher_pid != os.getpid()
+            if start_flusher:
+                self._flusher_pid = os.getpid()
+        if start_flusher:
+            threading.Thread(target=self._flush_loop, name="bulk-payout-flusher", daemon=True).start()
+        if full:
+            self._wake.set()
+        return future
+
+    def flush(self) -> List[Dict[str, Any]]:
+        """Process everything queued so far as one batch"""
+        with self._lock:
+            queued, self._queue = self._queue, []
+        if not queued:
+            return []
+        try:
+            results = self.run([item for item, _ in queued])
+        except Exception as e:
+            logger.error(f"❌ Bulk payout flush failed: {e}")
+            for _, future in queued:
+                future.set_exception(e)
+            return []
+        for (_, future), result in zip(queued, results):
+            future.set_result(result)
+        return results
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    # =================== BATCH ===================
+
+    def run(self, items: List[PayoutItem]) -> List[Dict[str, Any]]:
+        """
+        Validate, submit and record a batch of payouts
+
+        Returns:
+            One result dict per item, in order. "submitted" items were accepted
+            by Paystack and debited; "unconfirmed" ones stay held on the wallet
+            and are logged for review; "rejected" and "failed" items are
+            refunded if they were held.
+        """
+        started = time.perf_counter()
+        accepted: List[PayoutItem] = []
+        try:
+            pending = self._validate(items)
+            pending = self._attach_recipients(pending)
+            for chunk in self._chunks(pending):
+                accepted.extend(self._submit(chunk))
+            self._record(accepted)
+        finally:
+            self._release(items)
+        for item in items:
+            if item.status in ("unconfirmed", "queued") and item.reserved:
+                logger.warning(f"⚠️ Bulk payout {item.reference} {item.status} - funds held, needs review")
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["items"] += len(items)
+            self._stats["total_batch_ms"] += (time.perf_counter() - started) * 1000
+            for item in items:
+                if item.status in self._stats:
+                    self._stats[item.status] += 1
+        submitted = sum(item.status == "submitted" for item in items)
+        logger.info(f"💸 Bulk payout: {submitted}/{len(items)} submitted "
+                    f"in {(time.perf_counter() - started):.1f}s")
+        return [item.result() for item in items]
+
+    # =================== VALIDATION ===================
+
+    def _validate(self, items: List[PayoutItem]) -> List[PayoutItem]:
+        """Fees, account names and payer balances for the whole batch"""
+        fees: Dict[float, Optional[float]] = {}
+        valid = []
+        for item in items:
+            if not item.account_number or not item.bank_code or not item.user_id:
+                item.reject("rejected", "Payer, account number and bank code are required")
+                continue
+            if item.amount <= 0:
+                item.reject("rejected", "Amount must be greater than 0")
+                continue
+            if item.amount not in fees:
+                try:
+                    fees[item.amount] = self.fee_for(item.amount)
+                except Exception as e:
+                    logger.error(f"❌ Transfer fee unavailable for ₦{item.amount:,.2f}: {e}")
+                    fees[item.amount] = None
+            if fees[item.amount] is None:
+                item.reject("rejected", "Transfer fee unavailable")
+                continue
+            item.fee = fees[item.amount]
+            valid.append(item)
+
+        valid = self._resolve_names(valid)
+        if not valid:
+            return []
+
+        return self._reserve(valid)
+
+    def _reserve(self, items: List[PayoutItem]) -> List[PayoutItem]:
+        """Hold amount + fee on the payers' wallets; returns the items that are covered"""
+        try:
+            rows = self.supabase.rpc("reserve_payout_funds", {"p_items": [{
+                "reference": item.reference,
+                "user_id": str(item.user_id),
+                "amount": round(item.amount + item.fee, 2),
+            } for item in items]}).execute().data or []
+        except Exception as e:
+            logger.error(f"❌ Could not reserve payer balances: {e}")
+            for item in items:
+                item.reject("rejected", "Could not check wallet balance")
+            return []
+        by_reference = {row.get("reference"): row for row in rows}
+
+        funded = []
+        for item in items:
+            row = by_reference.get(item.reference) or {}
+            if row.get("reserved"):
+                item.reserved, item.balance_after = True, float(row["balance"])
+                funded.append(item)
+            elif row.get("balance") is None:
+                item.reject("rejected", "Payer not found")
+            else:
+                item.reject("rejected", f"Insufficient balance for ₦{item.amount + item.fee:,.2f} "
+                                        f"(₦{float(row['balance']):,.2f} left)")
+        return funded
+
+    def _resolve_names(self, items: List[PayoutItem]) -> List[PayoutItem]:
+        """Look up account names Paystack needs for new recipients (cached, concurrent)"""
+        unnamed = [item for item in items if not item.name]
+        if unnamed:
+            with ThreadPoolExecutor(max_workers=RESOLVE_WORKERS, thread_name_prefix="payout-resolve") as pool:
+                resolutions = pool.map(lambda item: account_resolver.resolve(item.account_number, item.bank_code),
+                                       unnamed)
+                for item, resolution in zip(unnamed, resolutions):
+                    if resolution.get("success"):
+                        item.name = resolution["data"].get("account_name")
+                    else:
+                        item.reject("rejected", f"Could not verify account: {resolution.get('error')}")
+        return [item for item in items if item.status == "queued"]
+
+    # =================== RECIPIENTS ===================
+
+    def _attach_recipients(self, items: List[PayoutItem]) -> List[PayoutItem]:
+        """Known recipient codes from the registry, the rest created in bulk"""
+        recipient_registry.warm_in_background(self.transfer_api)
+        missing: Dict[Key, List[PayoutItem]] = {}
+        for item in items:
+            code = recipient_registry.lookup(item.account_number, item.bank_code, account_name=item.name)
+            if code:
+                item.recipient_code, item.cached_recipient = code, True
+            else:
+                missing.setdefault(item.key, []).append(item)
+
+        keys = list(missing)
+        for start in range(0, len(keys), self.chunk_size):
+            batch = keys[start:start + self.chunk_size]
+            self._count("recipient_requests")
+            result = self.transfer_api.bulk_create_transfer_recipients([{
+                "type": "nuban",
+                "name": missing[key][0].name,
+                "account_number": key[1],
+                "bank_code": key[0],
+                "currency": "NGN",
+            } for key in batch])
+
+            created: Dict[Key, str] = {}
+            if result.get("success"):
+                for recipient in result["data"].get("success") or []:
+                    details = recipient.get("details") or {}
+                    created[_account_key(details.get("account_number", ""), details.get("bank_code", ""))] = \
+                        recipient["recipient_code"]
+            error = result.get("error") or "Recipient could not be created"
+
+            for key in batch:
+                code = created.get(key)
+                if code:
+                    recipient_registry.remember(key[1], key[0], code, missing[key][0].name)
+                for item in missing[key]:
+                    if code:
+                        item.recipient_code, item.cached_recipient = code, False
+                    else:
+                        item.reject("failed", error)
+
+        return [item for item in items if item.recipient_code]
+
+    # =================== SUBMISSION ===================
+
+    def _submit(self, chunk: List[PayoutItem], retry_stale: bool = True) -> List[PayoutItem]:
+        """One POST /transfer/bulk; returns the items Paystack accepted"""
+        self._count("transfer_requests")
+        result = self.transfer_api.initiate_bulk_transfer([{
+            "amount": int(round(item.amount * 100)),  # kobo
+            "recipient": item.recipient_code,
+            "reference": item.reference,
+            "reason": item.reason,
+        } for item in chunk])
+
+        if not result.get("success"):
+            error = result.get("error")
+            cached = [item for item in chunk if item.cached_recipient]
+            if retry_stale and cached and is_stale_recipient_error(error):
+                # Paystack rejects the whole chunk; refresh every cached code in it once
+                for item in cached:
+                    recipient_registry.invalidate(item.account_number, item.bank_code)
+                    item.recipient_code = None
+                self._attach_recipients(cached)
+                return self._submit([item for item in chunk if item.recipient_code], retry_stale=False)
+            if is_definite_rejection(result):
+                logger.error(f"❌ Bulk transfer chunk of {len(chunk)} rejected: {error}")
+                for item in chunk:
+                    item.reject("failed", error or "Bulk transfer rejected")
+                return []
+            return self._settle_unknown(chunk, error)
+
+        by_reference = {entry.get("reference"): entry for entry in result.get("data") or []}
+        accepted = []
+        for item in chunk:
+            entry = by_reference.get(item.reference)
+            if entry is None:
+                entry = self._verify(item)
+            if self._apply_status(item, entry):
+                accepted.append(item)
+        return accepted
+
+    def _settle_unknown(self, chunk: List[PayoutItem], error: str) -> List[PayoutItem]:
+        """
+        A failed bulk call may still have reached Paystack (e.g. a read
+        timeout, or a 5xx after queueing); each item's reference tells
+        whether it did. Paystack may not list an item it is still
+        processing, so "not found" here is not a refund.
+        """
+        logger.warning(f"⚠️ Bulk transfer chunk of {len(chunk)} failed ambiguously ({error}) - verifying each item")
+        accepted = []
+        for item in chunk:
+            if self._apply_status(item, self._verify(item)):
+                accepted.append(item)
+        return accepted
+
+    def _verify(self, item: PayoutItem) -> Optional[Dict]:
+        """Paystack's record of one transfer; None if it has none or is unknown"""
+        self._count("verify_requests")
+        result = self.transfer_api.verify_transfer(item.reference)
+        return result["data"] if result.get("success") else None
+
+    @staticmethod
+    def _apply_status(item: PayoutItem, entry: Optional[Dict]) -> bool:
+        """Record Paystack's answer for one item; True if the transfer is under way"""
+        if entry is None:
+            item.reject("unconfirmed", "Transfer status unknown - check before retrying")
+            return False
+        status = (entry.get("status") or "").lower()
+        if not entry or status in REJECTED_STATUSES:
+            item.reject("failed", entry.get("reason") or entry.get("message") or "Transfer rejected")
+            return False
+        if status == "otp":
+            item.reject("failed", "Transfer OTP is enabled - disable it for bulk payouts")
+            return False
+        item.status, item.transfer_code = "submitted", entry.get("transfer_code")
+        return True
+
+    # =================== RECONCILIATION ===================
+
+    def _record(self, accepted: List[PayoutItem]):
+        """bank_transactions rows, settled holds and ledger updates for the batch"""
+        if not accepted:
+            return
+        now = datetime.now().isoformat()
+        records = [{
+            "user_id": str(item.user_id),
+            "transaction_type": "transfer_out",
+            "amount": item.amount,
+            "fee": item.fee,
+            "reference": item.reference,
+            "status": "success",
+            "description": f"Bulk transfer to {item.name}",
+            "narration": item.reason,
+            "account_number": item.account_number,
+            "recipient_name": item.name,
+            "bank_code": item.bank_code,
+            "paystack_data": {"transfer_code": item.transfer_code, "bulk": True},
+            "wallet_balance_before": item.balance_after + item.amount + item.fee,
+            "wallet_balance_after": item.balance_after,
+            "created_at": now,
+        } for item in accepted]
+        references = [item.reference for item in accepted]
+
+        try:
+            self.supabase.table("bank_transactions").insert(records).execute()
+        except Exception as e:
+            # The money has left Paystack and stays held; the webhook path will still settle statuses
+            logger.error(f"❌ CRITICAL: bulk payout sent but not recorded ({references}): {e}")
+            return
+        try:
+            self.supabase.rpc("settle_payout_funds", {"p_references": references}).execute()
+        except Exception as e:
+            logger.error(f"❌ Bulk payout holds not marked settled ({references}): {e}")
+
+        for item in accepted:
+            balance_ledger.apply(item.user_id, item.reference, item.amount, "transfer_out", item.fee)
+
+    def _release(self, items: List[PayoutItem]):
+        """Refund the holds of items that were rejected or failed after reserving"""
+        held = [item for item in items if item.reserved and item.status in ("rejected", "failed")]
+        if not held:
+            return
+        references = [item.reference for item in held]
+        try:
+            self.supabase.rpc("release_payout_funds", {"p_references": references}).execute()
+        except Exception as e:
+            logger.error(f"❌ CRITICAL: could not refund held payouts ({references}): {e}")
+            return
+        for item in held:
+            item.reserved = False
+        self._count("refunded", len(held))
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            batches = self._stats["batches"]
+            requests = self._stats["recipient_requests"] + self._stats["transfer_requests"]
+            return {
+                **{k: v for k, v in self._stats.items() if not k.startswith("total_")},
+                "queued": len(self._queue),
+                "items_per_request": round(self._stats["items"] / requests, 1) if requests else 0.0,
+                "avg_batch_ms": round(self._stats["total_batch_ms"] / batches, 1) if batches else 0.0,
+                "chunk_size": self.chunk_size,
+            }
+
+
+def _after_fork_in_child():
+    # Queued futures and the flusher thread belong to the parent
+    bulk_payouts._lock = threading.Lock()
+    bulk_payouts._queue = []
+    bulk_payouts._wake = threading.Event()
+
+
+# Global pipeline
+bulk_payouts = BulkPayoutPipeline()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
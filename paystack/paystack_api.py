@@ -10,6 +10,7 @@ import logging
 import json
 from typing import Dict, Any, Optional
 from datetime import datetime
+from .transport import paystack_transport
 
 logger = logging.getLogger(__name__)
 
@@ -38,13 +39,14 @@ class PaystackAPI:
         
         try:
             if method.upper() == "GET":
-                response = requests.get(url, headers=self.headers, params=data)
+                response = paystack_transport.get(url, headers=self.headers, params=data)
             else:
-                response = requests.request(
+                response = paystack_transport.request(
                     method.upper(), 
                     url, 
                     headers=self.headers, 
-                    json=data
+                    json=data,
+                    idempotency_key=(data or {}).get("reference")
                 )
             
             response.raise_for_status()
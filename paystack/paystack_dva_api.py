@@ -6,13 +6,11 @@ Based on official Paystack documentation
 import os
 import requests
 import logging
-import ssl
 import urllib3
 from typing import Dict, Optional, Any
 from datetime import datetime
 from dotenv import load_dotenv
-from requests.adapters import HTTPAdapter
-from urllib3.util.ssl_ import create_urllib3_context
+from .transport import paystack_transport
 
 # Load environment variables
 load_dotenv()
@@ -22,19 +20,6 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 logger = logging.getLogger(__name__)
 
-class SSLContextAdapter(HTTPAdapter):
-    """Custom SSL adapter for Paystack API connections on Windows"""
-    
-    def init_poolmanager(self, *args, **kwargs):
-        # Create a more permissive SSL context for Windows
-        context = create_urllib3_context()
-        context.set_ciphers('DEFAULT@SECLEVEL=1')
-        context.check_hostname = False
-        context.verify_mode = ssl.CERT_OPTIONAL
-        
-        kwargs['ssl_context'] = context
-        return super().init_poolmanager(*args, **kwargs)
-
 class PaystackDVAAPI:
     """Paystack Dedicated Virtual Account API integration"""
     
@@ -51,13 +36,10 @@ class PaystackDVAAPI:
             "Content-Type": "application/json"
         }
         
-        # Create session with SSL fixes for Windows
-        self.session = requests.Session()
-        adapter = SSLContextAdapter()
-        self.session.mount('https://', adapter)
-        self.session.timeout = 30
+        # Shared pooled transport (timeouts, retries, circuit breaker)
+        self.session = paystack_transport
         
-        logger.info("✅ Paystack API initialized with SSL fixes")
+        logger.info("✅ Paystack API initialized")
     
     def create_customer_with_dva(self, user_data: Dict) -> Dict[str, Any]:
         """
@@ -8,6 +8,7 @@ import logging
 from typing import Dict, Optional, Any
 from .paystack_dva_api import PaystackDVAAPI
 from .paystack_transfer_api import PaystackTransferAPI
+from utils.bank_index import bank_index
 
 logger = logging.getLogger(__name__)
 
@@ -323,25 +324,18 @@ class PaystackService:
         Perfect for AI Assistant function calls
         """
         try:
-            # Step 1: Create recipient
-            recipient_result = self.transfer_api.create_transfer_recipient(
+            # Known recipient (or a newly created one), then send money
+            recipient_result, transfer_result = self.transfer_api.initiate_transfer_to_account(
                 account_number=account_number,
                 bank_code=bank_code,
-                name=account_name
-            )
-            
-            if not recipient_result.get("success"):
-                return recipient_result
-            
-            recipient_code = recipient_result["data"]["recipient_code"]
-            
-            # Step 2: Send money
-            transfer_result = self.transfer_api.initiate_transfer(
-                recipient_code=recipient_code,
+                name=account_name,
                 amount=int(amount * 100),  # Convert to kobo
                 reason=reason
             )
             
+            if transfer_result is None:
+                return recipient_result
+            
             return {
                 "success": True,
                 "recipient": recipient_result["data"],
@@ -682,60 +676,7 @@ class PaystackService:
         if bank_name_or_code.isdigit():
             return bank_name_or_code
         
-        # Comprehensive bank name to code mapping
-        bank_mapping = {
-            # Major Commercial Banks
-            "access bank": "044", "access bank plc": "044",
-            "citibank": "023", "citibank nigeria": "023",
-            "ecobank": "050", "ecobank nigeria": "050",
-            "fidelity bank": "070", "fidelity bank plc": "070",
-            "first bank": "011", "first bank of nigeria": "011", "first bank nigeria": "011",
-            "fcmb": "214", "first city monument bank": "214",
-            "gtbank": "058", "gtb": "058", "guaranty trust bank": "058",
-            "heritage bank": "030", "heritage banking company": "030",
-            "keystone bank": "082",
-            "polaris bank": "076", "polaris bank limited": "076",
-            "stanbic ibtc": "221", "stanbic ibtc bank": "221",
-            "sterling bank": "232", "sterling bank plc": "232",
-            "uba": "033", "united bank for africa": "033",
-            "union bank": "032", "union bank of nigeria": "032",
-            "unity bank": "215", "unity bank plc": "215",
-            "wema bank": "035", "wema bank plc": "035",
-            "zenith bank": "057", "zenith bank plc": "057",
-            
-            # Digital/Fintech Banks
-            "opay": "999992", "opay digital services": "999992",
-            "moniepoint": "50515", "moniepoint mfb": "50515",
-            "monie point": "50515", "moniepoint bank": "50515",
-            "moniepoint microfinance bank": "50515",
-            "moniepont": "50515", "moniepiont": "50515",
-            "palmpay": "999991", "palmpay limited": "999991",
-            "kuda": "50211", "kuda bank": "50211", "kuda microfinance bank": "50211",
-            "carbon": "565", "carbon microfinance bank": "565",
-            "fairmoney": "51318", "fairmoney microfinance bank": "51318",
-            "gomoney": "100022", "gomoney nigeria": "100022",
-            "vfd": "566", "vfd microfinance bank": "566",
-            "rubies": "125", "rubies microfinance bank": "125",
-            "sparkle": "51310", "sparkle microfinance bank": "51310",
-            "mint": "50304", "mint fintech": "50304",
-            "9psb": "120001", "9 psb": "120001", "9mobile psb": "120001",
-            "9mobile": "120001", "9payment service bank": "120001",
-            "9mobile 9payment service bank": "120001",
-            "eyowo": "50126", "eyowo microfinance bank": "50126",
-            
-            # Specialized Banks
-            "jaiz bank": "301", "jaiz bank plc": "301",
-            "providus bank": "101", "providus bank limited": "101",
-            "suntrust bank": "100", "suntrust bank nigeria": "100",
-            "taj bank": "302", "taj bank limited": "302",
-            "lotus bank": "303", "lotus bank nigeria": "303",
-            "coronation bank": "559", "coronation merchant bank": "559",
-        }
-        
-        # Convert to lowercase for case-insensitive lookup
-        bank_name_lower = bank_name_or_code.lower().strip()
-        
-        return bank_mapping.get(bank_name_lower, bank_name_or_code)
+        return bank_index.code_for(bank_name_or_code) or bank_name_or_code
     
     @staticmethod
     def get_supported_banks() -> Dict[str, str]:
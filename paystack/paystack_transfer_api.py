@@ -5,10 +5,12 @@ Based on official Paystack documentation
 """
 
 import os
-import requests
 import logging
-from typing import Dict, Optional, Any, List
+from typing import Dict, Optional, Any, List, Tuple
 from datetime import datetime
+from .transport import paystack_transport
+from .account_resolver import account_resolver
+from .recipient_registry import recipient_registry, is_stale_recipient_error
 
 logger = logging.getLogger(__name__)
 
@@ -55,7 +57,9 @@ class PaystackTransferAPI:
                 "currency": currency
             }
             
-            response = requests.post(url, json=payload, headers=self.headers)
+            # Paystack returns the existing recipient for a repeated account, so retrying is safe
+            response = paystack_transport.post(url, json=payload, headers=self.headers,
+                                               idempotency_key=f"recipient:{bank_code}:{account_number}")
             result = response.json()
             
             # Debug logging
@@ -81,6 +85,31 @@ class PaystackTransferAPI:
                 "error": str(e)
             }
     
+    def get_or_create_recipient(self, account_number: str, bank_code: str,
+                                name: str) -> Dict[str, Any]:
+        """
+        Recipient for an account, reusing a known recipient_code when there is one
+        
+        Returns:
+            Same shape as create_transfer_recipient, plus "cached": True when
+            no Paystack call was made
+        """
+        # First transfer in this worker: load known codes (never at import time)
+        recipient_registry.warm_in_background(self)
+        recipient_code = recipient_registry.lookup(account_number, bank_code, account_name=name)
+        if recipient_code:
+            return {
+                "success": True,
+                "cached": True,
+                "data": {"recipient_code": recipient_code, "name": name,
+                         "details": {"account_number": account_number, "bank_code": bank_code}}
+            }
+        
+        result = self.create_transfer_recipient(account_number=account_number, bank_code=bank_code, name=name)
+        if result["success"]:
+            recipient_registry.remember(account_number, bank_code, result["data"]["recipient_code"], name)
+        return result
+    
     def initiate_transfer(self, recipient_code: str, amount: int, 
                          reason: str = "Transfer", reference: str = None) -> Dict[str, Any]:
         """
@@ -108,7 +137,9 @@ class PaystackTransferAPI:
             if reference:
                 payload["reference"] = reference
             
-            response = requests.post(url, json=payload, headers=self.headers)
+            # Paystack rejects a repeated reference, so only referenced transfers are retried
+            response = paystack_transport.post(url, json=payload, headers=self.headers,
+                                               idempotency_key=reference)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
@@ -131,6 +162,44 @@ class PaystackTransferAPI:
                 "error": str(e)
             }
     
+    def initiate_transfer_to_account(self, account_number: str, bank_code: str, name: str,
+                                     amount: int, reason: str = "Transfer",
+                                     reference: str = None) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """
+        Look up (or create) the account's recipient and initiate a transfer to it
+        
+        If Paystack rejects a cached recipient_code, the code is dropped, a
+        fresh recipient is created and the transfer is tried once more.
+        
+        Args:
+            amount: Amount in kobo
+            
+        Returns:
+            (recipient result, transfer result); the transfer result is None
+            when no recipient could be obtained
+        """
+        recipient_result = self.get_or_create_recipient(account_number, bank_code, name)
+        if not recipient_result["success"]:
+            return recipient_result, None
+        
+        transfer_result = self.initiate_transfer(
+            recipient_code=recipient_result["data"]["recipient_code"],
+            amount=amount, reason=reason, reference=reference
+        )
+        
+        if (not transfer_result["success"] and recipient_result.get("cached")
+                and is_stale_recipient_error(transfer_result.get("error"))):
+            recipient_registry.invalidate(account_number, bank_code)
+            recipient_result = self.get_or_create_recipient(account_number, bank_code, name)
+            if not recipient_result["success"]:
+                return recipient_result, None
+            transfer_result = self.initiate_transfer(
+                recipient_code=recipient_result["data"]["recipient_code"],
+                amount=amount, reason=reason, reference=reference
+            )
+        
+        return recipient_result, transfer_result
+    
     def finalize_transfer(self, transfer_code: str, otp: str) -> Dict[str, Any]:
         """
         Finalize a transfer that requires OTP
@@ -150,7 +219,7 @@ class PaystackTransferAPI:
                 "otp": otp
             }
             
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = paystack_transport.post(url, json=payload, headers=self.headers)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
@@ -186,7 +255,7 @@ class PaystackTransferAPI:
         try:
             url = f"{self.base_url}/transfer/verify/{reference}"
             
-            response = requests.get(url, headers=self.headers)
+            response = paystack_transport.get(url, headers=self.headers)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
@@ -222,7 +291,7 @@ class PaystackTransferAPI:
         try:
             url = f"{self.base_url}/transfer/{transfer_id_or_code}"
             
-            response = requests.get(url, headers=self.headers)
+            response = paystack_transport.get(url, headers=self.headers)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
@@ -262,7 +331,7 @@ class PaystackTransferAPI:
                 "perPage": per_page
             }
             
-            response = requests.get(url, headers=self.headers, params=params)
+            response = paystack_transport.get(url, headers=self.headers, params=params)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
@@ -304,25 +373,18 @@ class PaystackTransferAPI:
             # Convert amount to kobo
             amount_kobo = int(amount * 100)
             
-            # Step 1: Create transfer recipient
-            recipient_result = self.create_transfer_recipient(
+            # Known recipient (or a newly created one), then the transfer
+            recipient_result, transfer_result = self.initiate_transfer_to_account(
                 account_number=account_number,
                 bank_code=bank_code,
-                name=account_name
-            )
-            
-            if not recipient_result["success"]:
-                return recipient_result
-            
-            recipient_code = recipient_result["data"]["recipient_code"]
-            
-            # Step 2: Initiate transfer
-            transfer_result = self.initiate_transfer(
-                recipient_code=recipient_code,
+                name=account_name,
                 amount=amount_kobo,
                 reason=reason
             )
             
+            if transfer_result is None:
+                return recipient_result
+            
             if transfer_result["success"]:
                 transfer_data = transfer_result["data"]
                 
@@ -362,7 +424,7 @@ class PaystackTransferAPI:
         try:
             url = f"{self.base_url}/bank"
             
-            response = requests.get(url, headers=self.headers)
+            response = paystack_transport.get(url, headers=self.headers)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
@@ -386,7 +448,7 @@ class PaystackTransferAPI:
     
     def resolve_account(self, account_number: str, bank_code: str) -> Dict[str, Any]:
         """
-        Resolve account number to get account name
+        Resolve account number to get account name (cached, see account_resolver)
         
         Args:
             account_number: Account number to resolve
@@ -395,34 +457,10 @@ class PaystackTransferAPI:
         Returns:
             Dict containing account details
         """
-        try:
-            url = f"{self.base_url}/bank/resolve"
-            params = {
-                "account_number": account_number,
-                "bank_code": bank_code
-            }
-            
-            response = requests.get(url, headers=self.headers, params=params)
-            result = response.json()
-            
-            if response.status_code == 200 and result.get("status"):
-                return {
-                    "success": True,
-                    "data": result["data"]
-                }
-            else:
-                logger.error(f"❌ Failed to resolve account: {result}")
-                return {
-                    "success": False,
-                    "error": result.get("message", "Unknown error")
-                }
-                
-        except Exception as e:
-            logger.error(f"❌ Error resolving account: {str(e)}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+        result = account_resolver.resolve(account_number, bank_code)
+        if not result["success"]:
+            logger.error(f"❌ Failed to resolve account: {result['error']}")
+        return result
     
     def initiate_bulk_transfer(self, transfers: List[Dict], currency: str = "NGN") -> Dict[str, Any]:
         """
@@ -444,7 +482,11 @@ class PaystackTransferAPI:
                 "transfers": transfers
             }
             
-            response = requests.post(url, json=payload, headers=self.headers)
+            # Paystack rejects repeated references, so a fully referenced batch is safe to retry
+            references = [t.get("reference") for t in transfers]
+            idempotency_key = references[0] if references and all(references) else None
+            response = paystack_transport.post(url, json=payload, headers=self.headers,
+                                               idempotency_key=idempotency_key)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
@@ -458,7 +500,8 @@ class PaystackTransferAPI:
                 logger.error(f"❌ Failed to initiate bulk transfer: {result}")
                 return {
                     "success": False,
-                    "error": result.get("message", "Unknown error")
+                    "error": result.get("message", "Unknown error"),
+                    "status_code": response.status_code
                 }
                 
         except Exception as e:
@@ -485,7 +528,7 @@ class PaystackTransferAPI:
                 "batch": recipients
             }
             
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = paystack_transport.post(url, json=payload, headers=self.headers)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
@@ -527,7 +570,7 @@ class PaystackTransferAPI:
                 "perPage": per_page
             }
             
-            response = requests.get(url, params=params, headers=self.headers)
+            response = paystack_transport.get(url, params=params, headers=self.headers)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
@@ -564,7 +607,7 @@ class PaystackTransferAPI:
         try:
             url = f"{self.base_url}/transferrecipient/{recipient_id_or_code}"
             
-            response = requests.get(url, headers=self.headers)
+            response = paystack_transport.get(url, headers=self.headers)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
@@ -615,7 +658,7 @@ class PaystackTransferAPI:
                     "error": "No update data provided"
                 }
             
-            response = requests.put(url, json=payload, headers=self.headers)
+            response = paystack_transport.put(url, json=payload, headers=self.headers)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
@@ -651,11 +694,12 @@ class PaystackTransferAPI:
         try:
             url = f"{self.base_url}/transferrecipient/{recipient_id_or_code}"
             
-            response = requests.delete(url, headers=self.headers)
+            response = paystack_transport.delete(url, headers=self.headers)
             result = response.json()
             
             if response.status_code == 200 and result.get("status"):
                 logger.info(f"✅ Deleted recipient: {recipient_id_or_code}")
+                recipient_registry.forget_code(recipient_id_or_code)
                 return {
                     "success": True,
                     "message": result.get("message")
@@ -682,7 +726,7 @@ class PaystackTransferAPI:
         try:
             url = f"{self.base_url}/balance"
             
-            response = requests.get(url, headers=self.headers)
+            response = paystack_transport.get(url, headers=self.headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -745,7 +789,7 @@ class PaystackTransferAPI:
                 "reason": reason
             }
             
-            response = requests.post(url, json=payload, headers=self.headers)
+            response = paystack_transport.post(url, json=payload, headers=self.headers)
             
             if response.status_code == 200:
                 data = response.json()
@@ -11,7 +11,10 @@ import hashlib
 import hmac
 from datetime import datetime
 from typing import Dict, Any
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
+from utils.balance_ledger import balance_ledger
+from utils.async_bridge import run_async_isolated
+from paystack.webhook_journal import PaystackWebhookJournal, CreditEvent, event_key
 
 logger = logging.getLogger(__name__)
 
@@ -28,10 +31,12 @@ class PaystackWebhookHandler:
             logger.warning("PAYSTACK_WEBHOOK_SECRET not set - webhook verification disabled")
         
         if self.supabase_url and self.supabase_key:
-            self.supabase = create_client(self.supabase_url, self.supabase_key)
+            self.supabase = get_supabase_client(self.supabase_url, self.supabase_key)
         else:
             logger.error("Supabase credentials missing")
             self.supabase = None
+        
+        self.journal = PaystackWebhookJournal(self.supabase)
     
     def verify_signature(self, payload: bytes, signature: str) -> bool:
         """Verify Paystack webhook signature"""
@@ -70,10 +75,8 @@ class PaystackWebhookHandler:
             # Route to appropriate handler
             if event == "charge.success":
                 return await self.handle_charge_success(data_payload)
-            elif event == "transfer.success":
-                return await self.handle_transfer_success(data_payload)
-            elif event == "transfer.failed":
-                return await self.handle_transfer_failed(data_payload)
+            elif event in ("transfer.success", "transfer.failed"):
+                return await self._handle_journaled(event, data_payload)
             elif event == "dedicated_account.assign":
                 return await self.handle_dedicated_account_assign(data_payload)
             else:
@@ -84,6 +87,21 @@ class PaystackWebhookHandler:
             logger.error(f"❌ Webhook processing error: {str(e)}")
             return {"success": False, "error": str(e)}
     
+    async def _handle_journaled(self, event: str, data: Dict) -> Dict:
+        """Run a transfer event handler at most once per reference"""
+        reference = data.get("reference")
+        if not reference or not self.supabase:
+            return {"success": False, "error": "Missing reference" if self.supabase else "Database not configured"}
+        
+        if not self.journal.claim(event, reference):
+            return {"success": True, "message": f"{event} already processed"}
+        
+        handler = self.handle_transfer_success if event == "transfer.success" else self.handle_transfer_failed
+        result = await handler(data)
+        if not result.get("success"):
+            self.journal.release(event, reference)
+        return result
+    
     async def handle_charge_success(self, data: Dict) -> Dict:
         """Handle successful payment to dedicated account"""
         try:
@@ -115,6 +133,14 @@ class PaystackWebhookHandler:
             
             narration = data.get("narration") or data.get("description") or "Money Transfer"
             
+            if not reference:
+                logger.error("❌ charge.success without a reference cannot be journaled")
+                return {"success": False, "error": "Missing reference"}
+            
+            if self.journal.is_known(event_key("charge.success", reference)):
+                logger.info(f"🔁 Duplicate charge.success ignored: {reference}")
+                return {"success": True, "message": "Credit already processed"}
+            
             # Get account details
             dedicated_account = data.get("authorization", {})
             account_number = dedicated_account.get("receiver_bank_account_number")
@@ -159,20 +185,12 @@ class PaystackWebhookHandler:
             user_uuid = user_data["id"]  # This is the actual UUID
             telegram_chat_id = user_data.get("telegram_chat_id")  # Legacy Telegram ID
             whatsapp_number = user_data.get("whatsapp_number")  # WhatsApp number
-            current_balance = float(user_data.get("wallet_balance", 0))
-            new_balance = current_balance + amount
             
-            # Record transaction with correct UUID and all required fields
+            # Deposit details recorded alongside the credit
             transaction_data = {
-                "user_id": user_uuid,  # Use actual UUID from users table
-                "transaction_type": "credit",  # This is a deposit/credit
-                "amount": amount,
-                "reference": reference,
-                "status": "success",
                 "description": f"Deposit from {sender_name} via {sender_bank}",
                 "bank_code": "999999",  # Paystack internal code
                 "bank_name": sender_bank,  # Sender's bank name
-                "account_number": account_number,  # Recipient account number
                 "sender_name": sender_name,  # Store sender name
                 "narration": narration,  # Store narration/description
                 "created_at": data.get("created_at")
@@ -181,22 +199,18 @@ class PaystackWebhookHandler:
             # ✅ DEBUG: Log what sender information we're actually saving
             logger.info(f"💾 SAVING TO DB: sender_name='{sender_name}', sender_bank='{sender_bank}', narration='{narration}'")
             
-            try:
-                self.supabase.table("bank_transactions").insert(transaction_data).execute()
-                logger.info(f"✅ Transaction recorded for user {user_uuid}")
-            except Exception as e:
-                logger.warning(f"Could not record transaction: {e}")
-                # Continue anyway - the balance update is more important
-            
-            # Update user balance using UUID
-            self.supabase.table("users").update({"wallet_balance": new_balance}).eq("id", user_uuid).execute()
+            # Journal, record and increment in one atomic step; a redelivery is a no-op
+            credit = await self.journal.apply_credit(CreditEvent(
+                event_key("charge.success", reference), reference, user_uuid,
+                amount, account_number, transaction_data
+            ))
+            if not credit.applied:
+                logger.info(f"🔁 Duplicate charge.success ignored: {reference}")
+                return {"success": True, "message": "Credit already processed"}
             
-            # ALSO update virtual_accounts balance for consistency
-            try:
-                self.supabase.table("virtual_accounts").update({"balance": new_balance}).eq("account_number", account_number).execute()
-                logger.info(f"✅ Virtual account balance updated: ₦{new_balance:,.2f}")
-            except Exception as e:
-                logger.warning(f"Could not update virtual account balance: {e}")
+            new_balance = credit.new_balance if credit.new_balance is not None else amount
+            balance_ledger.apply(user_uuid, reference, amount, "credit")
+            logger.info(f"✅ Wallet credited atomically: ₦{new_balance:,.2f}")
             
             # Send notification to user via WhatsApp with sender details
             await self.send_credit_notification(
@@ -552,11 +566,16 @@ class PaystackWebhookHandler:
                 
                 # Update user balance using UUID
                 self.supabase.table("users").update({"wallet_balance": new_balance}).eq("id", user_id).execute()
+                # The debit row just changed status, so rebuild this user's ledger entry
+                balance_ledger.forget(user_id)
                 
-                # Record refund transaction
+                # Record refund transaction. Not a ledger credit: the debit it
+                # reverses was just marked failed and so left the ledger's sum
                 refund_data = {
                     "user_id": user_id,
                     "amount": amount,
+                    "transaction_type": "transfer_refund",
+                    "description": f"Refund for failed transfer {reference}",
                     "reference": f"{reference}_refund",
                     "status": "success",
                     "wallet_balance_before": current_balance,
@@ -638,8 +657,8 @@ class PaystackWebhookHandler:
                 return
             
             # Convert bank code to user-friendly name for better UX
-            from functions.transfer_functions import BANK_CODE_TO_NAME  # Import bank mapping
-            display_bank = BANK_CODE_TO_NAME.get(sender_bank, sender_bank)
+            from utils.bank_index import bank_index
+            display_bank = bank_index.display_name(sender_bank, default=sender_bank)
             
             # Enhanced message with better sender info and clearer fallbacks
             if sender_name and sender_name not in ["Unknown", "Bank Transfer"]:
@@ -717,16 +736,9 @@ Say "balance" to check your wallet or "transfer" to send money! 🚀"""
 paystack_webhook_handler = PaystackWebhookHandler()
 
 def handle_paystack_webhook(payload: Dict, signature: str = None) -> Dict:
-    """Handle Paystack webhook (sync wrapper)"""
-    import asyncio
+    """Handle Paystack webhook (sync wrapper; its sync Supabase calls stay off the shared loop)"""
     try:
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        return loop.run_until_complete(
-            paystack_webhook_handler.handle_webhook(payload, signature)
-        )
+        return run_async_isolated(paystack_webhook_handler.handle_webhook(payload, signature))
     except Exception as e:
         logger.error(f"Webhook handling error: {str(e)}")
         return {"success": False, "error": str(e)}
-    finally:
-        loop.close()
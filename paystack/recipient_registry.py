@@ -0,0 +1,256 @@
+"""
+Paystack Recipient Registry
+===========================
+Remembers the Paystack recipient_code of every account we have paid
+
+A transfer needs a recipient_code, and creating one (POST /transferrecipient)
+used to precede every initiate_transfer, even for an account paid yesterday.
+The registry maps (bank_code, account_number) to its recipient_code:
+
+- In memory per worker, backed by the paystack_transfer_recipients table
+  (see paystack_recipient_registry.sql) so codes survive restarts and are
+  shared across workers.
+- Warmed in the background on a worker's first transfer: from that table,
+  from saved beneficiaries that carry a recipient_code and from Paystack's
+  recipient list (GET /transferrecipient). A listed code is only used once
+  its recipient name matches the verified account name of a transfer to
+  that account; until then it is a candidate, not a cache entry.
+- Invalidated when Paystack rejects a cached code (deleted or inactive
+  recipient); the caller then creates a fresh recipient and retries once.
+
+A repeat payee therefore costs a single Paystack call: the transfer itself.
+"""
+
+import os
+import re
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+RECIPIENT_CACHE_MAX = int(os.getenv("RECIPIENT_CACHE_MAX", "20000"))
+RECIPIENT_WARM_PAGES = int(os.getenv("RECIPIENT_WARM_PAGES", "5"))
+WARM_PAGE_SIZE = 100
+TABLE = "paystack_transfer_recipients"
+
+# Fragments of Paystack errors that mean the recipient itself is unusable
+STALE_RECIPIENT_ERRORS = ("recipient not found", "invalid recipient", "recipient specified is invalid",
+                          "recipient is inactive", "recipient is not active", "recipient has been deleted")
+
+Key = Tuple[str, str]
+
+
+def _key(account_number: str, bank_code: str) -> Key:
+    return str(bank_code).strip(), str(account_number).strip()
+
+
+def _name_tokens(name: Optional[str]) -> frozenset:
+    """Account name words, ignoring case, punctuation and word order"""
+    return frozenset(re.sub(r"[^a-z ]+", " ", str(name or "").lower()).split())
+
+
+def names_match(listed_name: Optional[str], account_name: Optional[str]) -> bool:
+    listed, verified = _name_tokens(listed_name), _name_tokens(account_name)
+    return bool(listed) and listed == verified
+
+
+def is_stale_recipient_error(message: Optional[str]) -> bool:
+    message = (message or "").lower()
+    return any(fragment in message for fragment in STALE_RECIPIENT_ERRORS)
+
+
+class RecipientRegistry:
+    """(bank_code, account_number) -> recipient_code, cached and persisted"""
+
+    def __init__(self, supabase=None, max_entries: int = RECIPIENT_CACHE_MAX):
+        self._supabase = supabase
+        self.max_entries = max_entries
+        self._codes: "OrderedDict[Key, str]" = OrderedDict()
+        # Codes from Paystack's recipient list awaiting a name check: key -> (code, listed name)
+        self._listed: "OrderedDict[Key, Tuple[str, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._table_available = True
+        self._warm_pid = None
+        self._stats = {"hits": 0, "table_hits": 0, "listed_hits": 0, "name_mismatches": 0,
+                       "misses": 0, "created": 0, "invalidated": 0, "warmed": 0}
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            from utils.supabase_client import get_supabase_client
+            self._supabase = get_supabase_client()
+        return self._supabase
+
+    def _table_failed(self, action: str, error: Exception):
+        if self._table_available:
+            logger.warning(f"⚠️ Recipient registry table unavailable ({action}: {error}); "
+                           f"run paystack_recipient_registry.sql - caching in memory only")
+        self._table_available = False
+
+    def _cache_locked(self, key: Key, recipient_code: str):
+        self._codes[key] = recipient_code
+        self._codes.move_to_end(key)
+        while len(self._codes) > self.max_entries:
+            self._codes.popitem(last=False)
+
+    # =================== LOOKUPS ===================
+
+    def lookup(self, account_number: str, bank_code: str, account_name: str = None) -> Optional[str]:
+        """
+        The known recipient_code for an account, or None
+
+        Args:
+            account_name: Verified holder name; a code taken from Paystack's
+                recipient list is only returned when its name matches
+        """
+        key = _key(account_number, bank_code)
+        with self._lock:
+            code = self._codes.get(key)
+            if code is not None:
+                self._codes.move_to_end(key)
+                self._stats["hits"] += 1
+                return code
+
+        if self._table_available:
+            try:
+                rows = self.supabase.table(TABLE).select("recipient_code") \
+                    .eq("bank_code", key[0]).eq("account_number", key[1]).limit(1).execute().data
+            except Exception as e:
+                self._table_failed("lookup", e)
+                rows = None
+            if rows:
+                with self._lock:
+                    self._cache_locked(key, rows[0]["recipient_code"])
+                    self._stats["table_hits"] += 1
+                return rows[0]["recipient_code"]
+
+        with self._lock:
+            listed = self._listed.get(key)
+            if listed is not None and not names_match(listed[1], account_name):
+                self._stats["name_mismatches"] += 1
+                listed = None
+            if listed is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["listed_hits"] += 1
+        # Verified now: keep it like a code we created
+        self.remember(key[1], key[0], listed[0], account_name)
+        return listed[0]
+
+    def remember(self, account_number: str, bank_code: str, recipient_code: str,
+                 account_name: str = None):
+        """Record a recipient Paystack just created"""
+        key = _key(account_number, bank_code)
+        with self._lock:
+            self._cache_locked(key, recipient_code)
+            self._listed.pop(key, None)
+            self._stats["created"] += 1
+        if self._table_available:
+            try:
+                self.supabase.table(TABLE).upsert({
+                    "bank_code": key[0], "account_number": key[1],
+                    "recipient_code": recipient_code, "account_name": account_name,
+                }, on_conflict="bank_code,account_number").execute()
+            except Exception as e:
+                self._table_failed("save", e)
+
+    def invalidate(self, account_number: str, bank_code: str):
+        """Forget an account's code after Paystack rejected it"""
+        key = _key(account_number, bank_code)
+        with self._lock:
+            code = self._codes.pop(key, None)
+            self._listed.pop(key, None)
+            self._stats["invalidated"] += 1
+        logger.info(f"♻️ Dropping stale recipient {code or ''} for {key[1]} at {key[0]}")
+        if self._table_available:
+            try:
+                self.supabase.table(TABLE).delete() \
+                    .eq("bank_code", key[0]).eq("account_number", key[1]).execute()
+            except Exception as e:
+                self._table_failed("invalidate", e)
+
+    def forget_code(self, recipient_code: str):
+        """Forget a recipient deleted through the API"""
+        with self._lock:
+            for key in [key for key, code in self._codes.items() if code == recipient_code]:
+                del self._codes[key]
+            for key in [key for key, (code, _) in self._listed.items() if code == recipient_code]:
+                del self._listed[key]
+        if self._table_available:
+            try:
+                self.supabase.table(TABLE).delete().eq("recipient_code", recipient_code).execute()
+            except Exception as e:
+                self._table_failed("forget", e)
+
+    # =================== WARMING ===================
+
+    def warm_in_background(self, transfer_api):
+        """Warm this worker's cache once, without delaying the caller (first transfer)"""
+        with self._lock:
+            if self._warm_pid == os.getpid():
+                return
+            self._warm_pid = os.getpid()
+        threading.Thread(target=self.warm, args=(transfer_api,),
+                         name="recipient-registry-warm", daemon=True).start()
+
+    def warm(self, transfer_api, pages: int = RECIPIENT_WARM_PAGES) -> int:
+        """Load known codes from the registry table and beneficiaries, candidates from Paystack"""
+        found: Dict[Key, str] = {}
+        listed: Dict[Key, Tuple[str, str]] = {}
+
+        if self._table_available:
+            try:
+                rows = self.supabase.table(TABLE).select("bank_code, account_number, recipient_code") \
+                    .order("updated_at", desc=True).limit(self.max_entries).execute().data or []
+                found.update({_key(r["account_number"], r["bank_code"]): r["recipient_code"] for r in rows})
+            except Exception as e:
+                self._table_failed("warm", e)
+
+        try:
+            rows = self.supabase.table("beneficiaries").select("account_number, bank_code, recipient_code") \
+                .not_.is_("recipient_code", "null").limit(self.max_entries).execute().data or []
+            for row in rows:
+                if row.get("account_number") and row.get("bank_code"):
+                    found.setdefault(_key(row["account_number"], row["bank_code"]), row["recipient_code"])
+        except Exception as e:
+            logger.debug(f"Beneficiary recipient codes not available: {e}")
+
+        for page in range(1, pages + 1):
+            result = transfer_api.list_transfer_recipients(page=page, per_page=WARM_PAGE_SIZE)
+            if not result.get("success"):
+                break
+            for recipient in result["data"]:
+                details = recipient.get("details") or {}
+                if recipient.get("active", True) and not recipient.get("is_deleted") \
+                        and details.get("account_number") and details.get("bank_code"):
+                    # Paystack lists newest first; the first code seen for an account wins
+                    listed.setdefault(_key(details["account_number"], details["bank_code"]),
+                                      (recipient["recipient_code"],
+                                       recipient.get("name") or details.get("account_name")))
+            if len(result["data"]) < WARM_PAGE_SIZE:
+                break
+
+        with self._lock:
+            for key, code in found.items():
+                if key not in self._codes:
+                    self._cache_locked(key, code)
+            for key, candidate in listed.items():
+                if key not in self._codes:
+                    self._listed[key] = candidate
+            while len(self._listed) > self.max_entries:
+                self._listed.popitem(last=False)
+            self._stats["warmed"] += len(found)
+        logger.info(f"✅ Recipient registry warmed with {len(found)} accounts "
+                    f"and {len(listed)} Paystack recipients pending a name check")
+        return len(found)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "cached": len(self._codes), "listed": len(self._listed),
+                    "persistent": self._table_available}
+
+
+# Global registry
+recipient_registry = RecipientRegistry()
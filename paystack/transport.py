@@ -0,0 +1,277 @@
+"""
+Paystack HTTP Transport
+=======================
+One pooled, retrying, circuit-broken HTTP client for every Paystack call
+
+- Keep-alive pooling: a single requests.Session per process, so calls reuse
+  TCP/TLS connections instead of paying DNS, TCP and TLS setup every time.
+- Per-endpoint timeouts: (connect, read) pairs sized for each endpoint, so no
+  call can hang a worker indefinitely.
+- Retries with jittered exponential backoff, only where a repeat is safe:
+  idempotent verbs (GET, PUT, DELETE), or a POST the caller marks with an
+  idempotency key (e.g. a transfer reference Paystack deduplicates on).
+  A POST that never reached Paystack (connect timeout) is always retried.
+- Circuit breaker: after PAYSTACK_BREAKER_FAILURES consecutive failures, calls
+  fail fast with PaystackUnavailable for PAYSTACK_BREAKER_COOLDOWN seconds,
+  then a single probe decides whether to close it again.
+- Latency histograms per endpoint template (e.g. GET /transfer/verify/{id}).
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+PAYSTACK_BASE_URL = "https://api.paystack.co"
+POOL_SIZE = int(os.getenv("PAYSTACK_POOL_SIZE", "10"))
+MAX_RETRIES = int(os.getenv("PAYSTACK_MAX_RETRIES", "2"))
+BREAKER_FAILURES = int(os.getenv("PAYSTACK_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("PAYSTACK_BREAKER_COOLDOWN", "30"))
+BACKOFF_BASE = 0.25  # seconds; attempt n sleeps uniform(0, BACKOFF_BASE * 2**n)
+BACKOFF_CAP = 2.0
+
+CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 20
+# Read timeouts by endpoint template
+ENDPOINT_READ_TIMEOUTS = {
+    "GET /bank": 15,
+    "GET /bank/resolve": 10,
+    "GET /balance": 10,
+    "POST /transferrecipient": 15,
+    "POST /transfer": 30,
+    "POST /transfer/finalize_transfer": 30,
+    "POST /transfer/bulk": 60,
+    "POST /transferrecipient/bulk": 60,
+    "POST /customer": 20,
+    "POST /dedicated_account": 30,
+}
+
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+# Path segments that name resources; anything else (IDs, codes, references)
+# is folded into {id} so histograms stay bounded
+RESOURCE_SEGMENTS = frozenset({
+    "transfer", "transferrecipient", "bank", "resolve", "verify", "finalize_transfer",
+    "bulk", "balance", "resend_otp", "disable_otp", "disable_otp_finalize", "enable_otp",
+    "dedicated_account", "requery", "customer", "transaction", "split", "available_providers",
+})
+
+# Histogram bucket upper bounds in milliseconds (last bucket is open-ended)
+LATENCY_BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class PaystackUnavailable(requests.ConnectionError):
+    """Raised without calling Paystack while the circuit breaker is open"""
+
+
+def endpoint_template(method: str, url: str) -> str:
+    path = urlsplit(url).path
+    segments = [s if s in RESOURCE_SEGMENTS else "{id}" for s in path.strip("/").split("/") if s]
+    return f"{method.upper()} /" + "/".join(segments)
+
+
+class _LatencyHistogram:
+    __slots__ = ("buckets", "count", "errors", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, elapsed_ms: float, failed: bool):
+        index = 0
+        while index < len(LATENCY_BUCKETS_MS) and elapsed_ms > LATENCY_BUCKETS_MS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.errors += failed
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-th request (None if open-ended)"""
+        rank, seen = q * self.count, 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self) -> Dict:
+        labels = [f"le_{bound}ms" for bound in LATENCY_BUCKETS_MS] + ["gt_10000ms"]
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.count, 1) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 1),
+            "p50_le_ms": self.quantile(0.5),
+            "p95_le_ms": self.quantile(0.95),
+            "buckets": {label: count for label, count in zip(labels, self.buckets) if count},
+        }
+
+
+class PaystackTransport:
+    """Shared session, timeouts, retries, circuit breaker and latency metrics"""
+
+    def __init__(self, pool_size: int = POOL_SIZE, max_retries: int = MAX_RETRIES,
+                 breaker_failures: int = BREAKER_FAILURES, breaker_cooldown: float = BREAKER_COOLDOWN):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._pid = None
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._probe_in_flight = False
+        self._histograms: Dict[str, _LatencyHistogram] = {}
+        self._stats = {"requests": 0, "retries": 0, "short_circuited": 0, "breaker_trips": 0}
+
+    @property
+    def session(self) -> requests.Session:
+        """Process-wide keep-alive session (rebuilt after fork)"""
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount("https://", adapter)
+                self._session = session
+                self._pid = os.getpid()
+            return self._session
+
+    # =================== CIRCUIT BREAKER ===================
+
+    def _admit(self) -> bool:
+        with self._lock:
+            if self._open_until == 0.0:
+                return True
+            if time.time() < self._open_until or self._probe_in_flight:
+                self._stats["short_circuited"] += 1
+                return False
+            # Cooldown over: let exactly one probe through (half-open)
+            self._probe_in_flight = True
+            return True
+
+    def _record_outcome(self, failed: bool):
+        with self._lock:
+            self._probe_in_flight = False
+            if not failed:
+                if self._open_until:
+                    logger.info("✅ Paystack circuit closed")
+                self._consecutive_failures = 0
+                self._open_until = 0.0
+                return
+            self._consecutive_failures += 1
+            if self._open_until or self._consecutive_failures >= self.breaker_failures:
+                if not self._open_until or time.time() >= self._open_until:
+                    self._stats["breaker_trips"] += 1
+                    logger.error(f"🚨 Paystack circuit open for {self.breaker_cooldown:.0f}s "
+                                 f"after {self._consecutive_failures} consecutive failures")
+                self._open_until = time.time() + self.breaker_cooldown
+
+    # =================== REQUESTS ===================
+
+    def request(self, method: str, url: str, idempotency_key: str = None,
+                timeout: Tuple[float, float] = None, **kwargs) -> requests.Response:
+        """
+        Send a request to Paystack (same arguments as requests.request)
+
+        Args:
+            idempotency_key: Marks a non-idempotent call as safe to repeat,
+                e.g. a transfer reference Paystack rejects duplicates of
+            timeout: Override the endpoint's (connect, read) timeout
+
+        Raises:
+            PaystackUnavailable: The circuit breaker is open
+            requests.RequestException: The request failed after retries
+        """
+        method = method.upper()
+        if not url.startswith("http"):
+            url = f"{PAYSTACK_BASE_URL}{url}"
+        endpoint = endpoint_template(method, url)
+        if timeout is None:
+            timeout = (CONNECT_TIMEOUT, ENDPOINT_READ_TIMEOUTS.get(endpoint, DEFAULT_READ_TIMEOUT))
+        retryable = method in IDEMPOTENT_METHODS or bool(idempotency_key)
+
+        attempt = 0
+        while True:
+            if not self._admit():
+                raise PaystackUnavailable(f"Paystack circuit open - not calling {endpoint}")
+
+            started = time.perf_counter()
+            response, error = None, None
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except requests.RequestException as e:
+                error = e
+            elapsed_ms = (time.perf_counter() - started) * 1000
+
+            failed = error is not None or response.status_code in RETRY_STATUSES
+            self._record_outcome(failed)
+            with self._lock:
+                self._stats["requests"] += 1
+                self._histograms.setdefault(endpoint, _LatencyHistogram()).record(elapsed_ms, failed)
+
+            # A connect timeout means the request never reached Paystack
+            safe_to_repeat = retryable or isinstance(error, requests.ConnectTimeout)
+            if not failed or not safe_to_repeat or attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return response
+
+            attempt += 1
+            delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+            if response is not None and response.status_code == 429:
+                retry_after = response.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    delay = max(delay, min(float(retry_after), BACKOFF_CAP))
+            with self._lock:
+                self._stats["retries"] += 1
+            logger.warning(f"🔁 Retrying {endpoint} in {delay:.2f}s "
+                           f"(attempt {attempt}/{self.max_retries}: {error or response.status_code})")
+            time.sleep(delay)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def delete(self, url: str, **kwargs) -> requests.Response:
+        return self.request("DELETE", url, **kwargs)
+
+    # =================== METRICS ===================
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            if not self._open_until:
+                breaker = "closed"
+            elif time.time() < self._open_until:
+                breaker = "open"
+            else:
+                breaker = "half-open"
+            return {
+                **self._stats,
+                "breaker": breaker,
+                "consecutive_failures": self._consecutive_failures,
+                "endpoints": {name: hist.snapshot() for name, hist in sorted(self._histograms.items())},
+            }
+
+
+# Shared transport for all Paystack API classes
+paystack_transport = PaystackTransport()
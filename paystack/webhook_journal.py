@@ -0,0 +1,267 @@
+"""
+Paystack Webhook Event Journal
+==============================
+Makes webhook reprocessing a no-op and applies credits atomically
+
+Every event is journaled under "<event>:<reference>" in the
+paystack_webhook_events table (see paystack_webhook_journal.sql). A
+charge.success credit goes through the apply_paystack_credit database
+function, which journals the event, records the deposit and increments
+wallet_balance in one transaction, so a Paystack retry or a concurrent
+duplicate delivery can never credit twice, whichever worker receives it.
+
+Credits pass through a small batching stage: deliveries arriving within a few
+milliseconds of each other (a burst of charge.success events) are sent as one
+apply_paystack_credits call, so handlers run concurrently instead of queueing
+behind each other's round trips.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_BATCH_WINDOW = float(os.getenv("WEBHOOK_JOURNAL_BATCH_WINDOW_MS", "20")) / 1000
+JOURNAL_BATCH_MAX = int(os.getenv("WEBHOOK_JOURNAL_BATCH_MAX", "50"))
+KNOWN_EVENTS_WINDOW = 5000  # recently journaled keys answered without a round trip
+
+
+def event_key(event: str, reference: str) -> str:
+    return f"{event}:{reference}"
+
+
+class CreditEvent(NamedTuple):
+    event_key: str
+    reference: str
+    user_id: str
+    amount: float
+    account_number: Optional[str]
+    transaction: Dict  # bank_transactions details (description, sender_name, ...)
+
+
+class CreditResult(NamedTuple):
+    applied: bool  # False when the event had already been processed
+    new_balance: Optional[float]
+
+
+def _is_missing_function(error: Exception) -> bool:
+    message = str(error)
+    return "PGRST202" in message or "Could not find the function" in message
+
+
+class PaystackWebhookJournal:
+    """Event journal and batched credit applier for Paystack webhooks"""
+
+    def __init__(self, supabase=None, batch_window: float = JOURNAL_BATCH_WINDOW,
+                 batch_max: int = JOURNAL_BATCH_MAX):
+        self.supabase = supabase
+        self.batch_window = batch_window
+        self.batch_max = batch_max
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending: List[Tuple[CreditEvent, Future]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._known: "OrderedDict[str, None]" = OrderedDict()
+        self._user_locks: Dict[str, threading.Lock] = {}
+        self._rpc_available = True
+        self._stats = {"credits": 0, "applied": 0, "duplicates": 0, "batches": 0,
+                       "max_batch": 0, "claims": 0, "fallback_credits": 0}
+
+    # =================== JOURNAL ===================
+
+    def is_known(self, key: str) -> bool:
+        """True if this worker already journaled the event (no DB round trip)"""
+        with self._lock:
+            return key in self._known
+
+    def _remember_locked(self, key: str):
+        self._known[key] = None
+        self._known.move_to_end(key)
+        while len(self._known) > KNOWN_EVENTS_WINDOW:
+            self._known.popitem(last=False)
+
+    def claim(self, event: str, reference: str) -> bool:
+        """
+        Journal a non-credit event before handling it
+
+        Returns:
+            True if the caller should process the event, False if it was
+            already processed (here or on another worker)
+        """
+        key = event_key(event, reference)
+        with self._lock:
+            if key in self._known:
+                self._stats["duplicates"] += 1
+                return False
+            self._remember_locked(key)
+            self._stats["claims"] += 1
+
+        try:
+            result = self.supabase.table("paystack_webhook_events").upsert(
+                {"event_key": key, "event": event, "reference": reference},
+                on_conflict="event_key", ignore_duplicates=True
+            ).execute()
+        except Exception as e:
+            # Without the journal table this worker's memory is all we have
+            logger.warning(f"⚠️ Webhook journal unavailable, deduplicating {key} in-process only: {e}")
+            return True
+
+        if not result.data:
+            with self._lock:
+                self._stats["duplicates"] += 1
+            logger.info(f"🔁 Webhook event already processed: {key}")
+            return False
+        return True
+
+    def release(self, event: str, reference: str):
+        """Drop a claim whose processing failed so Paystack's retry is handled"""
+        key = event_key(event, reference)
+        with self._lock:
+            self._known.pop(key, None)
+        try:
+            self.supabase.table("paystack_webhook_events").delete().eq("event_key", key).execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not release webhook claim {key}: {e}")
+
+    # =================== CREDITS ===================
+
+    def submit_credit(self, credit: CreditEvent) -> Future:
+        """Queue a credit for the next batch; the future resolves to a CreditResult"""
+        future = Future()
+        with self._lock:
+            self._stats["credits"] += 1
+            if credit.event_key in self._known:
+                self._stats["duplicates"] += 1
+                future.set_result(CreditResult(False, None))
+                return future
+            self._ensure_worker_locked()
+            self._pending.append((credit, future))
+            self._wakeup.notify()
+        return future
+
+    async def apply_credit(self, credit: CreditEvent) -> CreditResult:
+        """Await a credit from any event loop"""
+        return await asyncio.wrap_future(self.submit_credit(credit))
+
+    def _ensure_worker_locked(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="webhook-journal", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+            # Let the rest of a burst arrive before sending the batch
+            deadline = time.monotonic() + self.batch_window
+            with self._lock:
+                while len(self._pending) < self.batch_max:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._wakeup.wait(remaining)
+                batch, self._pending = self._pending[:self.batch_max], self._pending[self.batch_max:]
+            try:
+                self._apply_batch(batch)
+            except Exception as e:
+                logger.error(f"❌ Webhook credit batch failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _apply_batch(self, batch: List[Tuple[CreditEvent, Future]]):
+        # Deliveries of the same event inside one batch collapse to one credit
+        unique: "OrderedDict[str, CreditEvent]" = OrderedDict()
+        for credit, _ in batch:
+            unique.setdefault(credit.event_key, credit)
+
+        if self._rpc_available:
+            try:
+                results = self._apply_rpc(list(unique.values()))
+            except Exception as e:
+                if not _is_missing_function(e):
+                    raise
+                self._rpc_available = False
+                logger.error("❌ apply_paystack_credits is not installed (run paystack_webhook_journal.sql); "
+                             "falling back to per-worker deduplication")
+                results = self._apply_fallback(unique.values())
+        else:
+            results = self._apply_fallback(unique.values())
+
+        delivered = set()
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["max_batch"] = max(self._stats["max_batch"], len(batch))
+            for credit, future in batch:
+                result = results.get(credit.event_key, CreditResult(False, None))
+                if credit.event_key in delivered:
+                    result = CreditResult(False, result.new_balance)
+                delivered.add(credit.event_key)
+                self._stats["applied" if result.applied else "duplicates"] += 1
+                self._remember_locked(credit.event_key)
+                future.set_result(result)
+
+    def _apply_rpc(self, credits: List[CreditEvent]) -> Dict[str, CreditResult]:
+        payload = [{
+            "event_key": credit.event_key,
+            "reference": credit.reference,
+            "user_id": str(credit.user_id),
+            "amount": round(float(credit.amount), 2),
+            "account_number": credit.account_number,
+            "transaction": credit.transaction,
+        } for credit in credits]
+        rows = self.supabase.rpc("apply_paystack_credits", {"p_credits": payload}).execute().data or []
+        return {
+            row["event_key"]: CreditResult(
+                bool(row["applied"]),
+                float(row["new_balance"]) if row.get("new_balance") is not None else None
+            )
+            for row in rows
+        }
+
+    def _apply_fallback(self, credits) -> Dict[str, CreditResult]:
+        """Read-add-write credit serialized per user (only safe within this worker)"""
+        results = {}
+        for credit in credits:
+            with self._lock:
+                user_lock = self._user_locks.setdefault(str(credit.user_id), threading.Lock())
+                self._stats["fallback_credits"] += 1
+            with user_lock:
+                user = self.supabase.table("users").select("wallet_balance").eq("id", credit.user_id).execute()
+                current_balance = float((user.data[0].get("wallet_balance") if user.data else 0) or 0)
+                new_balance = current_balance + credit.amount
+                try:
+                    self.supabase.table("bank_transactions").insert({
+                        **credit.transaction,
+                        "user_id": credit.user_id,
+                        "transaction_type": "credit",
+                        "amount": credit.amount,
+                        "reference": credit.reference,
+                        "status": "success",
+                        "account_number": credit.account_number,
+                    }).execute()
+                except Exception as e:
+                    logger.warning(f"Could not record transaction: {e}")
+                self.supabase.table("users").update({"wallet_balance": new_balance}).eq("id", credit.user_id).execute()
+                try:
+                    self.supabase.table("virtual_accounts").update({"balance": new_balance}) \
+                        .eq("account_number", credit.account_number).execute()
+                except Exception as e:
+                    logger.warning(f"Could not update virtual account balance: {e}")
+            results[credit.event_key] = CreditResult(True, new_balance)
+        return results
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "pending": len(self._pending), "known_events": len(self._known),
+                    "atomic_rpc": self._rpc_available, "batch_window_ms": self.batch_window * 1000}
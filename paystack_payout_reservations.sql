@@ -0,0 +1,90 @@
+-- Wallet reservations for bulk payouts
+-- Run this in your Supabase SQL editor
+
+-- One row per payout whose amount + fee is held on the payer's wallet.
+-- held -> settled once Paystack accepted the transfer, held -> released
+-- when it was refunded. Only held rows can move, so a reference is never
+-- refunded twice.
+CREATE TABLE IF NOT EXISTS public.payout_reservations (
+    reference TEXT PRIMARY KEY,
+    user_id UUID NOT NULL,
+    amount NUMERIC(15,2) NOT NULL,
+    status TEXT NOT NULL DEFAULT 'held',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_payout_reservations_held
+    ON public.payout_reservations(user_id) WHERE status = 'held';
+
+-- Hold each item's amount + fee with a conditional decrement, in order, in
+-- one transaction. An item is reserved only while the wallet still covers
+-- it, so concurrent payouts and transfers can never overdraw it. Returns the
+-- balance after the hold, or the untouched balance (NULL for an unknown
+-- payer) when the item was not reserved.
+CREATE OR REPLACE FUNCTION reserve_payout_funds(p_items JSONB)
+RETURNS TABLE (reference TEXT, reserved BOOLEAN, balance NUMERIC) AS $$
+DECLARE
+    v_item JSONB;
+    v_user UUID;
+    v_amount NUMERIC;
+    v_balance NUMERIC;
+BEGIN
+    FOR v_item IN SELECT * FROM jsonb_array_elements(p_items) LOOP
+        v_user := (v_item->>'user_id')::UUID;
+        v_amount := (v_item->>'amount')::NUMERIC;
+
+        UPDATE public.users u
+        SET wallet_balance = u.wallet_balance - v_amount
+        WHERE u.id = v_user AND u.wallet_balance >= v_amount
+        RETURNING u.wallet_balance INTO v_balance;
+
+        IF FOUND THEN
+            INSERT INTO public.payout_reservations (reference, user_id, amount)
+            VALUES (v_item->>'reference', v_user, v_amount);
+            RETURN QUERY SELECT v_item->>'reference', TRUE, v_balance;
+        ELSE
+            SELECT COALESCE(u.wallet_balance, 0) INTO v_balance FROM public.users u WHERE u.id = v_user;
+            RETURN QUERY SELECT v_item->>'reference', FALSE, v_balance;
+        END IF;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Refund held items that Paystack rejected or that were never sent.
+-- Returns each refunded reference with the payer's new balance.
+CREATE OR REPLACE FUNCTION release_payout_funds(p_references TEXT[])
+RETURNS TABLE (reference TEXT, balance NUMERIC) AS $$
+BEGIN
+    RETURN QUERY
+    WITH released AS (
+        UPDATE public.payout_reservations r
+        SET status = 'released', updated_at = NOW()
+        WHERE r.reference = ANY(p_references) AND r.status = 'held'
+        RETURNING r.reference, r.user_id, r.amount
+    ), refunds AS (
+        SELECT rl.user_id, SUM(rl.amount) AS amount FROM released rl GROUP BY rl.user_id
+    ), credited AS (
+        UPDATE public.users u
+        SET wallet_balance = COALESCE(u.wallet_balance, 0) + f.amount
+        FROM refunds f
+        WHERE u.id = f.user_id
+        RETURNING u.id, u.wallet_balance
+    )
+    SELECT rl.reference, c.wallet_balance FROM released rl JOIN credited c ON c.id = rl.user_id;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mark held items as sent; their hold becomes the debit.
+CREATE OR REPLACE FUNCTION settle_payout_funds(p_references TEXT[])
+RETURNS INTEGER AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    UPDATE public.payout_reservations r
+    SET status = 'settled', updated_at = NOW()
+    WHERE r.reference = ANY(p_references) AND r.status = 'held';
+    GET DIAGNOSTICS v_count = ROW_COUNT;
+    RETURN v_count;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,21 @@
+-- Paystack transfer recipient registry
+-- Run this in your Supabase SQL editor
+
+-- One Paystack recipient_code per destination account, shared by all users
+-- (recipients belong to our Paystack integration, not to a Sofi user), so a
+-- repeat payee skips POST /transferrecipient.
+CREATE TABLE IF NOT EXISTS public.paystack_transfer_recipients (
+    bank_code TEXT NOT NULL,
+    account_number TEXT NOT NULL,
+    recipient_code TEXT NOT NULL,
+    account_name TEXT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (bank_code, account_number)
+);
+
+CREATE INDEX IF NOT EXISTS idx_paystack_transfer_recipients_code
+    ON public.paystack_transfer_recipients(recipient_code);
+
+-- Saved beneficiaries can carry their recipient code too; the registry
+-- warms itself from both tables at startup.
+ALTER TABLE public.beneficiaries ADD COLUMN IF NOT EXISTS recipient_code TEXT;
@@ -0,0 +1,96 @@
+-- Paystack webhook event journal with atomic, idempotent credits
+-- Run this in your Supabase SQL editor
+
+-- One row per processed webhook event, keyed by "<event>:<reference>".
+-- A redelivered event hits the primary key and is skipped.
+CREATE TABLE IF NOT EXISTS public.paystack_webhook_events (
+    event_key TEXT PRIMARY KEY,
+    event TEXT NOT NULL,
+    reference TEXT NOT NULL,
+    user_id UUID,
+    amount NUMERIC(15,2),
+    new_balance NUMERIC(15,2),
+    status TEXT NOT NULL DEFAULT 'processing',
+    received_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_paystack_webhook_events_received_at
+    ON public.paystack_webhook_events(received_at);
+
+-- Apply one charge.success credit: journal the event, record the deposit and
+-- increment the wallet in a single transaction. Returns applied = false (and
+-- the current balance) when the event was already journaled.
+CREATE OR REPLACE FUNCTION apply_paystack_credit(
+    p_event_key TEXT,
+    p_reference TEXT,
+    p_user_id UUID,
+    p_amount NUMERIC,
+    p_account_number TEXT,
+    p_transaction JSONB
+)
+RETURNS TABLE (event_key TEXT, applied BOOLEAN, new_balance NUMERIC) AS $$
+DECLARE
+    v_balance NUMERIC;
+BEGIN
+    INSERT INTO public.paystack_webhook_events (event_key, event, reference, user_id, amount, status)
+    VALUES (p_event_key, 'charge.success', p_reference, p_user_id, p_amount, 'applied')
+    ON CONFLICT ON CONSTRAINT paystack_webhook_events_pkey DO NOTHING;
+
+    IF NOT FOUND THEN
+        SELECT u.wallet_balance INTO v_balance FROM public.users u WHERE u.id = p_user_id;
+        RETURN QUERY SELECT p_event_key, FALSE, v_balance;
+        RETURN;
+    END IF;
+
+    -- Recording the deposit must never block the credit itself
+    BEGIN
+        INSERT INTO public.bank_transactions (
+            user_id, transaction_type, amount, reference, status, description,
+            bank_code, bank_name, account_number, sender_name, narration, created_at
+        ) VALUES (
+            p_user_id, 'credit', p_amount, p_reference, 'success',
+            p_transaction->>'description', p_transaction->>'bank_code',
+            p_transaction->>'bank_name', p_account_number,
+            p_transaction->>'sender_name', p_transaction->>'narration',
+            COALESCE((p_transaction->>'created_at')::TIMESTAMPTZ, NOW())
+        );
+    EXCEPTION WHEN OTHERS THEN
+        RAISE WARNING 'Could not record transaction %: %', p_reference, SQLERRM;
+    END;
+
+    UPDATE public.users u
+    SET wallet_balance = COALESCE(u.wallet_balance, 0) + p_amount
+    WHERE u.id = p_user_id
+    RETURNING u.wallet_balance INTO v_balance;
+
+    UPDATE public.virtual_accounts va
+    SET balance = v_balance
+    WHERE va.account_number = p_account_number;
+
+    UPDATE public.paystack_webhook_events e
+    SET new_balance = v_balance
+    WHERE e.event_key = p_event_key;
+
+    RETURN QUERY SELECT p_event_key, TRUE, v_balance;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Apply a batch of credits in one round trip. Each element carries the
+-- apply_paystack_credit arguments without the p_ prefix.
+CREATE OR REPLACE FUNCTION apply_paystack_credits(p_credits JSONB)
+RETURNS TABLE (event_key TEXT, applied BOOLEAN, new_balance NUMERIC) AS $$
+DECLARE
+    v_credit JSONB;
+BEGIN
+    FOR v_credit IN SELECT * FROM jsonb_array_elements(p_credits) LOOP
+        RETURN QUERY SELECT * FROM apply_paystack_credit(
+            v_credit->>'event_key',
+            v_credit->>'reference',
+            (v_credit->>'user_id')::UUID,
+            (v_credit->>'amount')::NUMERIC,
+            v_credit->>'account_number',
+            v_credit->'transaction'
+        );
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
@@ -0,0 +1,83 @@
+-- Revenue event log: atomic financial summary increments
+-- Run this in your Supabase SQL editor
+
+-- utils/revenue_events.py batches accounting rows and adds up what each batch
+-- contributes to sofi_financial_summary. This applies those deltas in one
+-- UPDATE, so concurrent workers never overwrite each other's totals.
+-- Keys of the deltas object are column names; unknown keys are ignored.
+CREATE OR REPLACE FUNCTION public.apply_financial_summary_deltas(deltas JSONB)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE public.sofi_financial_summary
+    SET
+        total_revenue = total_revenue + COALESCE((deltas->>'total_revenue')::NUMERIC, 0),
+        total_crypto_received_usdt = total_crypto_received_usdt + COALESCE((deltas->>'total_crypto_received_usdt')::NUMERIC, 0),
+        total_crypto_received_btc = total_crypto_received_btc + COALESCE((deltas->>'total_crypto_received_btc')::NUMERIC, 0),
+        total_crypto_profit = total_crypto_profit + COALESCE((deltas->>'total_crypto_profit')::NUMERIC, 0),
+        total_crypto_naira_paid = total_crypto_naira_paid + COALESCE((deltas->>'total_crypto_naira_paid')::NUMERIC, 0),
+        total_transfer_revenue = total_transfer_revenue + COALESCE((deltas->>'total_transfer_revenue')::NUMERIC, 0),
+        total_transfer_fee_collected = total_transfer_fee_collected + COALESCE((deltas->>'total_transfer_fee_collected')::NUMERIC, 0),
+        total_deposit_fee_collected = total_deposit_fee_collected + COALESCE((deltas->>'total_deposit_fee_collected')::NUMERIC, 0),
+        total_airtime_revenue = total_airtime_revenue + COALESCE((deltas->>'total_airtime_revenue')::NUMERIC, 0),
+        total_airtime_amount_sold = total_airtime_amount_sold + COALESCE((deltas->>'total_airtime_amount_sold')::NUMERIC, 0),
+        total_data_revenue = total_data_revenue + COALESCE((deltas->>'total_data_revenue')::NUMERIC, 0),
+        total_data_amount_sold = total_data_amount_sold + COALESCE((deltas->>'total_data_amount_sold')::NUMERIC, 0),
+        total_personal_withdrawal = total_personal_withdrawal + COALESCE((deltas->>'total_personal_withdrawal')::NUMERIC, 0),
+        last_updated = NOW()
+    WHERE id = (SELECT id FROM public.sofi_financial_summary ORDER BY created_at LIMIT 1);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Idempotent replay. Every event carries an event_id: accounting rows are
+-- upserted on it (ON CONFLICT DO NOTHING), and summary deltas are applied
+-- only for event ids not journaled yet, in the same transaction as the
+-- increment. A spool segment replayed after a crash, or a flush retried
+-- after a write that did commit, therefore counts nothing twice.
+ALTER TABLE public.transfer_charges ADD COLUMN IF NOT EXISTS event_id TEXT;
+ALTER TABLE public.deposit_fees ADD COLUMN IF NOT EXISTS event_id TEXT;
+ALTER TABLE public.crypto_trades ADD COLUMN IF NOT EXISTS event_id TEXT;
+ALTER TABLE public.airtime_sales ADD COLUMN IF NOT EXISTS event_id TEXT;
+ALTER TABLE public.data_sales ADD COLUMN IF NOT EXISTS event_id TEXT;
+ALTER TABLE public.profits ADD COLUMN IF NOT EXISTS event_id TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_transfer_charges_event_id ON public.transfer_charges(event_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_deposit_fees_event_id ON public.deposit_fees(event_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_crypto_trades_event_id ON public.crypto_trades(event_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_airtime_sales_event_id ON public.airtime_sales(event_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_data_sales_event_id ON public.data_sales(event_id);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_profits_event_id ON public.profits(event_id);
+
+CREATE TABLE IF NOT EXISTS public.revenue_summary_events (
+    event_id TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- p_events is [{"event_id": ..., "deltas": {...}}, ...]; events already in
+-- revenue_summary_events are skipped.
+CREATE OR REPLACE FUNCTION public.apply_financial_summary_events(p_events JSONB)
+RETURNS VOID AS $$
+DECLARE
+    v_deltas JSONB;
+BEGIN
+    WITH fresh AS (
+        INSERT INTO public.revenue_summary_events (event_id)
+        SELECT DISTINCT e->>'event_id' FROM jsonb_array_elements(p_events) e
+        ON CONFLICT (event_id) DO NOTHING
+        RETURNING event_id
+    ), events AS (
+        SELECT DISTINCT ON (e->>'event_id') e->>'event_id' AS event_id, e->'deltas' AS deltas
+        FROM jsonb_array_elements(p_events) e
+    ), deltas AS (
+        SELECT d.key AS column_name, SUM(d.value::NUMERIC) AS delta
+        FROM events ev
+        JOIN fresh f ON f.event_id = ev.event_id
+        CROSS JOIN LATERAL jsonb_each_text(ev.deltas) d
+        GROUP BY d.key
+    )
+    SELECT jsonb_object_agg(column_name, delta) INTO v_deltas FROM deltas;
+
+    IF v_deltas IS NOT NULL THEN
+        PERFORM public.apply_financial_summary_deltas(v_deltas);
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
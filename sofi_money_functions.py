@@ -18,8 +18,11 @@ load_dotenv()
 
 try:
     from paystack.paystack_service import PaystackService
-    from supabase import create_client
+    from utils.supabase_client import get_supabase_client
+    from utils.bank_index import bank_index
     from utils.balance_helper import get_user_balance
+    from utils.pin_hasher import pin_hasher
+    from utils.user_resolver import invalidate_user
     import hashlib
     import secrets
 except ImportError as e:
@@ -32,7 +35,7 @@ class SofiMoneyTransferService:
     
     def __init__(self):
         self.paystack = PaystackService()
-        self.supabase = create_client(
+        self.supabase = get_supabase_client(
             os.getenv("SUPABASE_URL"), 
             os.getenv("SUPABASE_KEY")
         )
@@ -94,25 +97,7 @@ class SofiMoneyTransferService:
             else:
                 # Convert bank name to code if necessary
                 if not bank_code.isdigit():
-                    from functions.transfer_functions import send_money  # Import the bank mapping
-                    # Use the same bank mapping from transfer functions
-                    bank_name_to_code = {
-                        "access bank": "044", "gtbank": "058", "uba": "033",
-                        "first bank": "011", "zenith bank": "057", "fidelity bank": "070",
-                        "opay": "999992", "moniepoint": "50515", "palmpay": "999991",
-                        "monie point": "50515", "moniepoint bank": "50515",
-                        "moniepoint microfinance bank": "50515", "moniepoint mfb": "50515",
-                        "kuda bank": "50211", "carbon": "565", "vfd bank": "566",
-                        "fcmb": "214", "sterling bank": "232", "stanbic ibtc": "221",
-                        "union bank": "032", "polaris bank": "076", "wema bank": "035",
-                        "heritage bank": "030", "keystone bank": "082", "unity bank": "215",
-                        "jaiz bank": "301", "providus bank": "101", "taj bank": "302",
-                        "suntrust bank": "100", "ecobank": "050", "citibank": "023",
-                        "9psb": "120001", "9 psb": "120001", "9mobile psb": "120001",
-                        "9mobile 9payment service bank": "120001", "9payment service bank": "120001"
-                    }
-                    
-                    bank_code_converted = bank_name_to_code.get(bank_code.lower(), bank_code)
+                    bank_code_converted = bank_index.code_for(bank_code) or bank_code
                     if bank_code_converted != bank_code:
                         logger.info(f"🔄 Converted '{bank_code}' to '{bank_code_converted}'")
                         bank_code = bank_code_converted
@@ -160,14 +145,8 @@ class SofiMoneyTransferService:
                     "action_required": "set_pin"
                 }
             
-            # Use the same hashing method as onboarding (pbkdf2_hmac with telegram_chat_id as salt)
-            pin_hash = hashlib.pbkdf2_hmac('sha256', 
-                                         pin.encode('utf-8'), 
-                                         str(telegram_chat_id).encode('utf-8'), 
-                                         100000)  # 100,000 iterations
-            pin_hash = pin_hash.hex()
-            
-            if pin_hash == user["pin_hash"]:
+            # Same hashing as onboarding (pbkdf2_hmac with telegram_chat_id as salt), off the event loop
+            if await pin_hasher.verify(telegram_chat_id, pin, telegram_chat_id, user["pin_hash"]):
                 self.supabase.table("users").update({
                     "pin_attempts": 0,
                     "pin_locked_until": None
@@ -375,12 +354,9 @@ Your money has been sent successfully.
             if new_pin != confirm_pin:
                 return {"success": False, "error": "PIN confirmation does not match"}
             
-            # Use the same hashing method as onboarding (pbkdf2_hmac with telegram_chat_id as salt)
-            pin_hash = hashlib.pbkdf2_hmac('sha256', 
-                                         new_pin.encode('utf-8'), 
-                                         str(telegram_chat_id).encode('utf-8'), 
-                                         100000)  # 100,000 iterations
-            pin_hash = pin_hash.hex()
+            # Same hashing as onboarding (pbkdf2_hmac with telegram_chat_id as salt), off the event loop
+            pin_hash = await pin_hasher.hash(new_pin, telegram_chat_id)
+            pin_hasher.forget(telegram_chat_id)
             
             result = self.supabase.table("users").update({
                 "pin_hash": pin_hash,
@@ -390,6 +366,8 @@ Your money has been sent successfully.
             }).eq("telegram_chat_id", telegram_chat_id).execute()
             
             if result.data:
+                # PIN status replies and onboarding checks read the cached user row
+                invalidate_user(telegram_chat_id, result.data[0].get("id"))
                 return {"success": True, "message": "✅ Transaction PIN set successfully! You can now send money securely."}
             else:
                 return {"success": False, "error": "Failed to update PIN. Please try again."}
@@ -799,18 +777,7 @@ Net Movement: ₦{total_in - total_out:,.2f}
             # Get bank code if needed
             bank_code = None
             if bank_name:
-                # Use the same bank mapping from verify_account_name
-                bank_name_to_code = {
-                    "access bank": "044", "gtbank": "058", "uba": "033",
-                    "first bank": "011", "zenith bank": "057", "fidelity bank": "070",
-                    "opay": "999992", "moniepoint": "50515", "palmpay": "999991",
-                    "monie point": "50515", "moniepoint bank": "50515",
-                    "moniepoint microfinance bank": "50515", "moniepoint mfb": "50515",
-                    "kuda bank": "50211", "carbon": "565", "vfd bank": "566",
-                    "fcmb": "214", "sterling bank": "232", "stanbic ibtc": "221",
-                    "union bank": "032", "polaris bank": "076", "wema bank": "035"
-                }
-                bank_code = bank_name_to_code.get(bank_name.lower())
+                bank_code = bank_index.code_for(bank_name)
             
             beneficiary_data = {
                 "user_id": telegram_chat_id,
@@ -906,12 +873,9 @@ Net Movement: ₦{total_in - total_out:,.2f}
             if pin in weak_pins:
                 return {"success": False, "error": "Please choose a stronger PIN. Avoid sequences or repeated digits."}
             
-            # Hash the PIN using the same method as onboarding (pbkdf2_hmac with telegram_chat_id as salt)
-            pin_hash = hashlib.pbkdf2_hmac('sha256', 
-                                         pin.encode('utf-8'), 
-                                         str(telegram_chat_id).encode('utf-8'), 
-                                         100000)  # 100,000 iterations
-            pin_hash = pin_hash.hex()
+            # Hash the PIN the same way as onboarding (pbkdf2_hmac with telegram_chat_id as salt), off the event loop
+            pin_hash = await pin_hasher.hash(pin, telegram_chat_id)
+            pin_hasher.forget(telegram_chat_id)
             
             # Update user record
             result = self.supabase.table("users").update({
@@ -923,6 +887,8 @@ Net Movement: ₦{total_in - total_out:,.2f}
             }).eq("telegram_chat_id", telegram_chat_id).execute()
             
             if result.data:
+                # PIN status replies and onboarding checks read the cached user row
+                invalidate_user(telegram_chat_id, result.data[0].get("id"))
                 return {
                     "success": True,
                     "message": "✅ Transaction PIN set successfully! Your transfers are now secured with your personal PIN."
@@ -1031,14 +997,7 @@ async def sofi_verify_account(account_number: str, bank_name: str = None) -> str
         
         bank_code = None
         if bank_name:
-            bank_mappings = {
-                "opay": "999992", "gtbank": "058", "gtb": "058",
-                "access": "044", "access bank": "044", "first bank": "011",
-                "firstbank": "011", "uba": "033", "zenith": "057", "fidelity": "070",
-                "9psb": "120001", "9 psb": "120001", "9mobile psb": "120001",
-                "9mobile": "120001", "9payment service bank": "120001"
-            }
-            bank_code = bank_mappings.get(bank_name.lower())
+            bank_code = bank_index.code_for(bank_name)
         
         result = await service.verify_account_name(account_number, bank_code)
         
@@ -56,6 +56,45 @@ SOFI_MONEY_FUNCTIONS = [
             }
         }
     },
+    {
+        "type": "function",
+        "function": {
+            "name": "send_group_payout",
+            "description": "Send money to several Nigerian bank accounts at once (salaries, group splits). Use this instead of repeated send_money calls when the user pays more than one recipient. PIN entry is handled automatically with secure WhatsApp Flow - do NOT ask for PIN manually.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "payouts": {
+                        "type": "array",
+                        "description": "One entry per recipient (at most 100)",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "amount": {
+                                    "type": "number",
+                                    "description": "Amount to send in Naira (minimum ₦100)"
+                                },
+                                "account_number": {
+                                    "type": "string",
+                                    "description": "The recipient's account number (10 digits)"
+                                },
+                                "bank_name": {
+                                    "type": "string",
+                                    "description": "The recipient's bank name (e.g., 'Access Bank', 'Wema Bank')"
+                                }
+                            },
+                            "required": ["amount", "account_number", "bank_name"]
+                        }
+                    },
+                    "narration": {
+                        "type": "string",
+                        "description": "Reason for the payouts (optional)"
+                    }
+                },
+                "required": ["payouts"]
+            }
+        }
+    },
     {
         "type": "function", 
         "function": {
@@ -272,6 +311,7 @@ CORRECT RESPONSES:
 AVAILABLE FUNCTIONS:
 - verify_account_name() - Check recipient before transfer
 - send_money() - Execute transfers (PIN handled via WhatsApp Flow)
+- send_group_payout() - Pay several recipients at once (PIN handled via WhatsApp Flow)
 - check_balance() - Check wallet balance
 - get_user_beneficiaries() - Show saved contacts
 - save_beneficiary() - Save recipient for future transfers
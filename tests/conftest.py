@@ -0,0 +1,183 @@
+"""
+Shared test fixtures
+In-memory stand-in for the supabase-py client used by the caches and stores
+"""
+
+import os
+import re
+import copy
+import itertools
+
+import pytest
+
+# Modules that build their API clients at import need credentials to exist;
+# the tests never reach the real services
+os.environ.setdefault("PAYSTACK_SECRET_KEY", "sk_test_dummy")
+
+
+class FakeResult:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeQuery:
+    """Chainable query over one in-memory table (the subset of postgrest-py the code uses)"""
+
+    def __init__(self, db, table):
+        self.db = db
+        self.table = table
+        self.op = "select"
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+        self.filters = []
+        self.row_limit = None
+        self.ordering = None
+
+    # Operations
+    def select(self, *_columns, **_kwargs):
+        self.op = "select"
+        return self
+
+    def insert(self, payload, **_kwargs):
+        self.op, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict=None, ignore_duplicates=False, **_kwargs):
+        self.op, self.payload, self.on_conflict = "upsert", payload, on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload, **_kwargs):
+        self.op, self.payload = "update", payload
+        return self
+
+    def delete(self, **_kwargs):
+        self.op = "delete"
+        return self
+
+    # Filters
+    def eq(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) == str(value))
+        return self
+
+    def neq(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) != str(value))
+        return self
+
+    def in_(self, column, values):
+        wanted = {str(v) for v in values}
+        self.filters.append(lambda row: str(row.get(column)) in wanted)
+        return self
+
+    def gte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] >= value)
+        return self
+
+    def lte(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] <= value)
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row[column] < value)
+        return self
+
+    def or_(self, expression):
+        # Only "column.in.(a,b)" terms, as built by the user resolver
+        terms = []
+        for column, values in re.findall(r"(\w+)\.in\.\(([^)]*)\)", expression):
+            terms.append((column, {v.strip('"') for v in values.split(",")}))
+        self.filters.append(lambda row: any(str(row.get(c)) in vs for c, vs in terms))
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def order(self, column, desc=False):
+        self.ordering = (column, desc)
+        return self
+
+    def _matches(self, row):
+        return all(check(row) for check in self.filters)
+
+    def execute(self):
+        self.db.calls.append((self.table, self.op))
+        if self.table in self.db.failing:
+            raise self.db.failing[self.table]
+        rows = self.db.tables.setdefault(self.table, [])
+
+        if self.op == "select":
+            found = [copy.deepcopy(row) for row in rows if self._matches(row)]
+            if self.ordering:
+                found.sort(key=lambda row: row.get(self.ordering[0]), reverse=self.ordering[1])
+            return FakeResult(found[:self.row_limit] if self.row_limit is not None else found)
+
+        if self.op in ("insert", "upsert"):
+            payload = self.payload if isinstance(self.payload, list) else [self.payload]
+            written = []
+            for new in payload:
+                new = {"id": next(self.db.ids), **copy.deepcopy(new)}
+                if self.op == "upsert" and self.on_conflict:
+                    keys = self.on_conflict.split(",")
+                    existing = [row for row in rows if all(row.get(k) == new.get(k) for k in keys)]
+                    if existing and self.ignore_duplicates:
+                        continue
+                    if existing:
+                        new.pop("id")
+                        existing[0].update(new)
+                        written.append(copy.deepcopy(existing[0]))
+                        continue
+                rows.append(new)
+                written.append(copy.deepcopy(new))
+            return FakeResult(written)
+
+        if self.op == "update":
+            changed = []
+            for row in rows:
+                if self._matches(row):
+                    row.update(copy.deepcopy(self.payload))
+                    changed.append(copy.deepcopy(row))
+            return FakeResult(changed)
+
+        if self.op == "delete":
+            removed = [row for row in rows if self._matches(row)]
+            self.db.tables[self.table] = [row for row in rows if not self._matches(row)]
+            return FakeResult(removed)
+        raise AssertionError(f"unsupported operation {self.op}")
+
+
+class FakeRpc:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params
+
+    def execute(self):
+        self.db.calls.append(("rpc", self.name))
+        if self.name not in self.db.functions:
+            raise Exception(f"PGRST202: Could not find the function public.{self.name}")
+        return FakeResult(self.db.functions[self.name](**(self.params or {})))
+
+
+class FakeSupabase:
+    """Tables are lists of dicts; rpc functions are plain Python callables"""
+
+    def __init__(self):
+        self.tables = {}
+        self.functions = {}
+        self.failing = {}  # table -> exception raised by every query on it
+        self.calls = []
+        self.ids = itertools.count(1)
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params)
+
+    def count(self, table, op=None):
+        return sum(1 for t, o in self.calls if t == table and (op is None or o == op))
+
+
+@pytest.fixture
+def fake_supabase():
+    return FakeSupabase()
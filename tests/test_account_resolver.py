@@ -0,0 +1,168 @@
+"""
+ACCOUNT RESOLVER TESTS
+======================
+Cached /bank/resolve lookups against a stubbed transport: single flight, negative caching, TTLs and prefetch
+"""
+
+import threading
+import time
+
+import pytest
+import requests
+
+import paystack.account_resolver as resolver_module
+from paystack.account_resolver import AccountResolver
+
+
+class StubResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class StubTransport:
+    """GET /bank/resolve answered per account number; can hold every call until released"""
+
+    def __init__(self):
+        self.answers = {}  # account_number -> (status, body) or an exception
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        account_number = params["account_number"]
+        self.calls.append(account_number)
+        self.release.wait(5)
+        answer = self.answers.get(account_number, (200, {
+            "status": True, "data": {"account_number": account_number, "account_name": f"NAME {account_number}"},
+        }))
+        if isinstance(answer, Exception):
+            raise answer
+        return StubResponse(*answer)
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    stub = StubTransport()
+    monkeypatch.setattr(resolver_module, "paystack_transport", stub)
+    return stub
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(resolver_module.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def resolver(transport):
+    return AccountResolver(ttl=3600, negative_ttl=300, prefetch_limit=2)
+
+
+class TestSingleFlight:
+    """Concurrent lookups of one account share a single request"""
+
+    def test_concurrent_lookups_coalesce(self, resolver, transport):
+        transport.release.clear()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(resolver.resolve("0123456789", "058")))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while resolver.get_stats()["misses"] + resolver.get_stats()["coalesced"] < 5 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        transport.release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert transport.calls == ["0123456789"]
+        assert [r["data"]["account_name"] for r in results] == ["NAME 0123456789"] * 5
+        assert resolver.get_stats()["coalesced"] == 4
+        assert resolver.get_stats()["in_flight"] == 0
+
+    def test_callers_get_their_own_copy(self, resolver):
+        resolver.resolve("0123456789", "058")["data"]["account_name"] = "CHANGED"
+        assert resolver.resolve("0123456789", "058")["data"]["account_name"] == "NAME 0123456789"
+
+
+class TestNegativeCaching:
+    """Only a definite answer about the account is remembered"""
+
+    def test_definite_rejection_is_cached(self, resolver, transport):
+        transport.answers["0000000000"] = (422, {"status": False, "message": "Could not resolve account name"})
+        assert resolver.resolve("0000000000", "058")["error"] == "Could not resolve account name"
+        assert resolver.resolve("0000000000", "058")["success"] is False
+        assert transport.calls == ["0000000000"]
+        assert resolver.get_stats()["negative_hits"] == 1
+
+    @pytest.mark.parametrize("status", [401, 403, 408, 429, 500, 503])
+    def test_transient_answers_are_not_cached(self, resolver, transport, status):
+        transport.answers["0000000000"] = (status, {"status": False, "message": "try again"})
+        resolver.resolve("0000000000", "058")
+        resolver.resolve("0000000000", "058")
+        assert transport.calls == ["0000000000", "0000000000"]
+
+    def test_network_errors_are_not_cached(self, resolver, transport):
+        transport.answers["0000000000"] = requests.ConnectTimeout("connect timed out")
+        assert resolver.resolve("0000000000", "058")["success"] is False
+        del transport.answers["0000000000"]
+        assert resolver.resolve("0000000000", "058")["success"] is True
+        assert resolver.get_stats()["errors"] == 1
+
+
+class TestExpiry:
+    """Names live for the TTL, rejections for the shorter negative TTL"""
+
+    def test_names_expire_after_the_ttl(self, resolver, transport, clock):
+        resolver.resolve("0123456789", "058")
+        clock[0] += 3599
+        resolver.resolve("0123456789", "058")
+        assert len(transport.calls) == 1
+        clock[0] += 1
+        resolver.resolve("0123456789", "058")
+        assert len(transport.calls) == 2
+
+    def test_rejections_expire_after_the_negative_ttl(self, resolver, transport, clock):
+        transport.answers["0000000000"] = (400, {"status": False, "message": "Invalid account"})
+        resolver.resolve("0000000000", "058")
+        clock[0] += 300
+        resolver.resolve("0000000000", "058")
+        assert len(transport.calls) == 2
+
+    def test_least_recently_used_entries_are_evicted(self, transport):
+        resolver = AccountResolver(max_entries=2)
+        for account in ("0000000001", "0000000002", "0000000001", "0000000003"):
+            resolver.resolve(account, "058")
+        resolver.resolve("0000000001", "058")
+        resolver.resolve("0000000002", "058")
+        assert transport.calls == ["0000000001", "0000000002", "0000000003", "0000000002"]
+
+
+class TestPrefetch:
+    """Background lookups are capped and skip what is cached or in flight"""
+
+    def test_prefetch_is_capped_per_call(self, resolver, transport):
+        accounts = [(f"000000000{i}", "058") for i in range(4)]
+        assert resolver.prefetch(accounts) == 2
+        # Waits for the two in flight rather than fetching them again
+        for account_number, bank_code in accounts[:2]:
+            resolver.resolve(account_number, bank_code)
+        assert sorted(transport.calls) == ["0000000000", "0000000001"]
+
+        assert resolver.prefetch(accounts) == 2
+        for account_number, bank_code in accounts:
+            resolver.resolve(account_number, bank_code)
+        assert len(transport.calls) == 4
+        assert resolver.get_stats()["prefetched"] == 4
+
+    def test_incomplete_beneficiaries_are_skipped(self, resolver, transport):
+        beneficiaries = [{"account_number": "0123456789"}, "not a row", None,
+                         {"account_number": "0123456789", "bank_code": "058"}]
+        assert resolver.prefetch_beneficiaries(beneficiaries) == 1
+        resolver.resolve("0123456789", "058")
+        assert transport.calls == ["0123456789"]
@@ -0,0 +1,58 @@
+"""
+ADMIN METRICS TESTS
+===================
+Rollup reads: draining the write queue first, caching and the active-user sketch
+"""
+
+from datetime import date
+
+from utils.admin_metrics import HyperLogLog, MetricsRollup, summarize
+
+
+def install_drain(db, drained=3):
+    db.functions["drain_admin_metrics_queue"] = lambda: drained
+
+
+class TestDrainOnRead:
+    """Queued writes are folded in before a fresh read, at most once per TTL"""
+
+    def test_read_drains_first(self, fake_supabase):
+        install_drain(fake_supabase)
+        fake_supabase.tables["admin_metrics_totals"] = [
+            {"feature": "bank:credit", "status": "success", "transaction_count": 2, "volume": 300, "revenue": 0},
+        ]
+        metrics = MetricsRollup(supabase=fake_supabase, cache_ttl=60)
+
+        assert summarize(metrics.totals(), "bank")["volume"] == 300.0
+        assert fake_supabase.calls[:2] == [("rpc", "drain_admin_metrics_queue"), ("admin_metrics_totals", "select")]
+        assert metrics.get_stats()["drained_rows"] == 3
+
+    def test_drain_runs_once_per_ttl(self, fake_supabase):
+        install_drain(fake_supabase)
+        metrics = MetricsRollup(supabase=fake_supabase, cache_ttl=60)
+        metrics.totals()
+        metrics.daily(date(2026, 10, 1), date(2026, 10, 7))
+        assert fake_supabase.count("rpc", "drain_admin_metrics_queue") == 1
+
+    def test_missing_drain_does_not_block_reads(self, fake_supabase):
+        fake_supabase.tables["admin_metrics_totals"] = []
+        metrics = MetricsRollup(supabase=fake_supabase, cache_ttl=0)
+        assert metrics.totals() == []
+        assert metrics.get_stats()["drain_errors"] == 1
+
+
+class TestHyperLogLog:
+    """Distinct users estimated from merged daily sketches"""
+
+    def test_estimate_and_merge(self):
+        first, second = HyperLogLog(), HyperLogLog()
+        for i in range(600):
+            first.add(f"user-{i}")
+        for i in range(400, 1000):
+            second.add(f"user-{i}")
+        assert abs(first.merge(second).count() - 1000) < 50
+
+    def test_postgres_bytea_round_trip(self):
+        sketch = HyperLogLog()
+        sketch.add("user-1")
+        assert HyperLogLog.from_postgres("\\x" + bytes(sketch.registers).hex()).count() == 1
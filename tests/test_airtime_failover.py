@@ -0,0 +1,114 @@
+"""
+AIRTIME FAILOVER TESTS
+======================
+Purchases against stub provider endpoints: failover only when the request was not sent
+"""
+
+import os
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import utils.airtime_api as airtime_api
+from utils.airtime_endpoints import AirtimeEndpointMonitor
+
+
+def stub_provider(status=200, delay=0.0, drop=False):
+    """Local Clubkonnect stand-in; counts the purchase requests it receives"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server.hits += 1
+            if delay:
+                time.sleep(delay)
+            if drop:
+                # The request arrived; the connection dies before any answer
+                self.close_connection = True
+                return
+            body = b"ORDER_RECEIVED - transaction successful" if status == 200 else b"Gateway error"
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.hits = 0
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server
+
+
+def refused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def start(**kwargs):
+        server = stub_provider(**kwargs)
+        started.append(server)
+        return server
+
+    yield start
+    for server in started:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def buy(monkeypatch):
+    """buy_airtime against the given endpoints, in that order"""
+    monkeypatch.setattr(airtime_api, "NELLOBYTES_USERID", "test")
+    monkeypatch.setattr(airtime_api, "NELLOBYTES_APIKEY", "test")
+
+    def purchase(*endpoints):
+        monitor = AirtimeEndpointMonitor(list(endpoints))
+        monitor._prober_pid = os.getpid()  # no background probes
+        monkeypatch.setattr(airtime_api, "airtime_endpoints", monitor)
+        return airtime_api.AirtimeAPI().buy_airtime(100, "08012345678", "mtn")
+
+    return purchase
+
+
+class TestFailover:
+    """Requests that provably never reached the provider move to the next endpoint"""
+
+    def test_refused_connection(self, buy, servers):
+        healthy = servers()
+        assert buy(refused_url(), healthy.url)["success"] is True
+        assert healthy.hits == 1
+
+    @pytest.mark.parametrize("status", [502, 503])
+    def test_gateway_refusal(self, buy, servers, status):
+        gateway, healthy = servers(status=status), servers()
+        assert buy(gateway.url, healthy.url)["success"] is True
+        assert (gateway.hits, healthy.hits) == (1, 1)
+
+
+class TestNoFailover:
+    """Anything that may have reached the provider is not repeated elsewhere"""
+
+    def test_gateway_timeout(self, buy, servers):
+        gateway, healthy = servers(status=504), servers()
+        assert buy(gateway.url, healthy.url)["error_code"] == "API_ERROR"
+        assert healthy.hits == 0
+
+    def test_dropped_connection(self, buy, servers):
+        dropped, healthy = servers(drop=True), servers()
+        assert buy(dropped.url, healthy.url)["error_code"] == "CONNECTION_ERROR"
+        assert (dropped.hits, healthy.hits) == (1, 0)
+
+    def test_read_timeout(self, buy, servers, monkeypatch):
+        monkeypatch.setattr(airtime_api, "PURCHASE_TIMEOUT", (1, 0.2))
+        slow, healthy = servers(delay=0.5), servers()
+        assert buy(slow.url, healthy.url)["error_code"] == "TIMEOUT"
+        assert healthy.hits == 0
@@ -0,0 +1,145 @@
+"""
+ASSISTANT RUN DRIVER TESTS
+==========================
+Terminal stream events, the overall run deadline and exactly-once tool calls
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from utils.assistant_run_driver import AssistantRunDriver
+
+
+def event(name, **data):
+    return SimpleNamespace(event=name, data=SimpleNamespace(**data))
+
+
+class FakeStream:
+    """Yields the given events, then optionally fails like a dropped connection"""
+
+    def __init__(self, events, error=None):
+        self.events = events
+        self.error = error
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for item in self.events:
+            yield item
+        if self.error:
+            raise self.error
+
+
+class FakeRuns:
+    def __init__(self, stream, statuses, required_action=None, submit_error=None):
+        self.stream = stream
+        self.statuses = list(statuses)
+        self.required_action = required_action
+        self.submit_error = submit_error
+        self.retrieved = 0
+        self.submitted = []
+
+    async def create(self, stream=False, **_kwargs):
+        return self.stream
+
+    async def retrieve(self, thread_id, run_id):
+        self.retrieved += 1
+        status = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        return SimpleNamespace(id=run_id, status=status, required_action=self.required_action)
+
+    async def submit_tool_outputs(self, thread_id, run_id, tool_outputs, stream=False):
+        if stream and self.submit_error:
+            raise self.submit_error
+        self.submitted.append(tool_outputs)
+
+
+def make_driver(stream, statuses=("in_progress",), timeout=5.0, **runs_kwargs):
+    runs = FakeRuns(stream, statuses, **runs_kwargs)
+    messages = SimpleNamespace(list=lambda **_: _no_messages())
+    client = SimpleNamespace(beta=SimpleNamespace(threads=SimpleNamespace(runs=runs, messages=messages)))
+    return AssistantRunDriver(client=client, timeout=timeout), runs
+
+
+async def _no_messages():
+    return SimpleNamespace(data=[])
+
+
+async def no_tools(name, args):
+    raise AssertionError("no tool calls expected")
+
+
+def drive(driver, tool_executor=no_tools):
+    return asyncio.run(driver.run(thread_id="thread_1", assistant_id="asst_1", tool_executor=tool_executor))
+
+
+def send_money_action():
+    tool_call = SimpleNamespace(id="call_1", function=SimpleNamespace(
+        name="send_money", arguments='{"amount": 5000, "account_number": "0123456789"}'))
+    return SimpleNamespace(submit_tool_outputs=SimpleNamespace(tool_calls=[tool_call]))
+
+
+class TestStreamEvents:
+    """Only thread.run.<status> events end a run"""
+
+    def test_completed_run_event(self):
+        driver, _ = make_driver(FakeStream([
+            event("thread.run.created", id="run_1", status="queued"),
+            event("thread.message.completed", content=[SimpleNamespace(text=SimpleNamespace(value="Hi"))]),
+            event("thread.run.completed", id="run_1", status="completed"),
+        ]))
+        result = drive(driver)
+        assert (result.status, result.text, result.mode) == ("completed", "Hi", "stream")
+
+    def test_step_events_are_not_run_statuses(self):
+        # The stream ends after a completed step; the run itself has failed
+        driver, runs = make_driver(FakeStream([
+            event("thread.run.created", id="run_1", status="queued"),
+            event("thread.run.step.completed", id="step_1", status="completed"),
+        ]), statuses=("failed",))
+        result = drive(driver)
+        assert result.status == "failed"
+        assert result.mode == "poll"
+        assert runs.retrieved == 1
+
+
+class TestDeadline:
+    """The polling fallback shares the run's deadline"""
+
+    def test_poll_fallback_times_out(self):
+        driver, runs = make_driver(FakeStream(
+            [event("thread.run.created", id="run_1", status="queued")],
+            error=ConnectionError("stream dropped"),
+        ), statuses=("in_progress",), timeout=0.3)
+        result = drive(driver)
+        assert result.status == "timeout"
+        assert result.timings.total_ms < 1000
+        assert runs.retrieved > 0
+
+    def test_stream_failure_before_run_is_an_error(self):
+        driver, runs = make_driver(FakeStream([], error=ConnectionError("refused")))
+        assert drive(driver).status == "error"
+        assert runs.retrieved == 0
+
+
+class TestToolCallsRunOnce:
+    """A poller taking over a run never repeats a tool call the stream executed"""
+
+    def test_failed_submit_resubmits_stored_output(self):
+        action = send_money_action()
+        driver, runs = make_driver(FakeStream([
+            event("thread.run.created", id="run_1", status="queued"),
+            event("thread.run.requires_action", id="run_1", status="requires_action", required_action=action),
+        ]), statuses=("requires_action", "completed"), required_action=action,
+            submit_error=ConnectionError("submit dropped"))
+        transfers = []
+
+        async def send_money(name, args):
+            transfers.append(args["amount"])
+            return {"success": True, "reference": "ref_1"}
+
+        result = drive(driver, send_money)
+        assert result.status == "completed"
+        assert transfers == [5000]
+        assert runs.submitted == [[{"tool_call_id": "call_1", "output": result.tool_outputs["call_1"]}]]
+        assert '"ref_1"' in result.tool_outputs["call_1"]
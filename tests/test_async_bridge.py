@@ -0,0 +1,162 @@
+"""
+ASYNC BRIDGE TESTS
+==================
+The per-worker event loop, its blocking pool and the calls routed through them
+"""
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+
+import pytest
+
+from utils.async_bridge import AsyncBridge, run_async_isolated
+
+
+@pytest.fixture
+def bridge():
+    bridge = AsyncBridge(name="test-bridge", blocking_workers=4)
+    yield bridge
+    bridge.shutdown()
+
+
+async def blocking_tool(seconds):
+    """A tool coroutine that blocks internally, like send_money's sync Paystack calls"""
+    time.sleep(seconds)
+    return "sent"
+
+
+class TestIsolatedTools:
+    """A tool that blocks does not freeze the other coroutines on the loop"""
+
+    def test_loop_keeps_serving_while_a_tool_blocks(self, bridge):
+        async def scenario():
+            tool = asyncio.ensure_future(bridge.run_isolated(blocking_tool, 0.5))
+            started = time.perf_counter()
+            await asyncio.sleep(0.05)
+            ticked = time.perf_counter() - started
+            return await tool, ticked
+
+        result, ticked = bridge.run(scenario(), timeout=5)
+        assert result == "sent"
+        assert ticked < 0.3
+
+
+async def answer(value, delay=0.0):
+    await asyncio.sleep(delay)
+    return value
+
+
+async def fail():
+    raise ValueError("boom")
+
+
+class TestSubmitAndRun:
+    """Sync callers hand coroutines to the one loop thread"""
+
+    def test_submit_returns_a_thread_safe_future(self, bridge):
+        future = bridge.submit(answer(42))
+        assert isinstance(future, concurrent.futures.Future)
+        assert future.result(timeout=5) == 42
+        assert bridge.get_stats()["completed"] == 1
+
+    def test_coroutines_from_many_threads_share_one_loop(self, bridge):
+        async def loop_thread():
+            return threading.current_thread().name
+
+        with concurrent.futures.ThreadPoolExecutor(4) as callers:
+            names = set(callers.map(lambda _: bridge.run(loop_thread(), timeout=5), range(8)))
+        assert names == {"test-bridge"}
+        assert bridge.get_stats()["in_flight"] == 0
+
+    def test_run_raises_the_coroutines_error(self, bridge):
+        with pytest.raises(ValueError):
+            bridge.run(fail(), timeout=5)
+        assert bridge.get_stats()["failed"] == 1
+
+    def test_run_timeout_cancels_the_coroutine(self, bridge):
+        with pytest.raises(concurrent.futures.TimeoutError):
+            bridge.run(answer("late", delay=5), timeout=0.05)
+        deadline = time.monotonic() + 5
+        while bridge.get_stats()["in_flight"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert bridge.get_stats()["failed"] == 1
+
+    def test_run_from_the_loop_thread_is_refused(self, bridge):
+        async def nested():
+            inner = answer(1)
+            with pytest.raises(RuntimeError):
+                bridge.run(inner)
+            return "refused"
+
+        assert bridge.run(nested(), timeout=5) == "refused"
+
+
+class TestBlockingCalls:
+    """Blocking work runs on the bounded pool, not the loop thread"""
+
+    def test_run_blocking_uses_the_pool(self, bridge):
+        async def scenario():
+            started = time.perf_counter()
+            slow = asyncio.ensure_future(bridge.run_blocking(time.sleep, 0.3))
+            name = await bridge.run_blocking(lambda: threading.current_thread().name)
+            await asyncio.sleep(0.01)
+            ticked = time.perf_counter() - started
+            await slow
+            return name, ticked
+
+        name, ticked = bridge.run(scenario(), timeout=5)
+        assert name.startswith("test-bridge-blocking")
+        assert ticked < 0.2
+        assert bridge.get_stats()["blocking_calls"] == 2
+
+    def test_run_async_isolated_stays_on_the_calling_thread(self):
+        async def where():
+            return threading.current_thread()
+
+        assert run_async_isolated(where()) is threading.current_thread()
+
+
+class TestLifecycle:
+    """The loop restarts in a forked worker and stops on shutdown"""
+
+    def test_new_process_gets_its_own_loop(self, bridge):
+        bridge.run(answer(1), timeout=5)
+        parent_loop = bridge.loop
+
+        bridge._pid = -1  # as seen from a forked child
+        assert bridge.run(answer(2), timeout=5) == 2
+        assert bridge.loop is not parent_loop
+        assert bridge.get_stats()["completed"] == 1
+        parent_loop.call_soon_threadsafe(parent_loop.stop)
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+    def test_forked_child_runs_coroutines(self, bridge):
+        bridge.run(answer(1), timeout=5)
+        pid = os.fork()
+        if pid == 0:
+            try:
+                ok = bridge.run(answer("child"), timeout=5) == "child" and bridge._pid == os.getpid()
+            except BaseException:
+                ok = False
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+        assert bridge.run(answer("parent"), timeout=5) == "parent"
+
+    def test_shutdown_cancels_tasks_and_stops_the_thread(self, bridge):
+        pending = bridge.submit(answer("never", delay=30))
+        thread = bridge._thread
+        bridge.shutdown()
+
+        assert pending.cancelled()
+        assert not thread.is_alive()
+        assert bridge.get_stats()["running"] is False
+
+    def test_bridge_restarts_after_shutdown(self, bridge):
+        bridge.run(answer(1), timeout=5)
+        bridge.shutdown()
+        assert bridge.run(answer(2), timeout=5) == 2
+        assert bridge.get_stats()["running"] is True
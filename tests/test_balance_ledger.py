@@ -0,0 +1,120 @@
+"""
+BALANCE LEDGER TESTS
+====================
+Incremental balances, duplicate-free handler updates and confirmed write-backs
+"""
+
+import pytest
+
+import utils.balance_helper as balance_helper
+from utils.balance_ledger import BalanceLedger
+
+
+def tx(reference, amount, transaction_type="credit", created_at="2026-10-01T10:00:00", fee=0, inserted_at=None):
+    return {"user_id": "u1", "reference": reference, "amount": amount, "fee": fee,
+            "transaction_type": transaction_type, "status": "success", "created_at": created_at,
+            "inserted_at": inserted_at or created_at}
+
+
+@pytest.fixture
+def db(fake_supabase):
+    fake_supabase.tables["bank_transactions"] = [
+        tx("dep1", 5000, created_at="2026-10-01T10:00:00"),
+        tx("out1", 1000, "transfer_out", created_at="2026-10-02T10:00:00", fee=20),
+    ]
+    return fake_supabase
+
+
+@pytest.fixture
+def ledger(db):
+    return BalanceLedger(supabase=db, reconcile_interval=0)
+
+
+class TestReconcile:
+    """Full history once, then only rows after the watermark"""
+
+    def test_full_load_includes_fees(self, ledger):
+        assert ledger.get_balance("u1") == 3980
+
+    def test_later_reads_are_incremental(self, ledger, db):
+        ledger.get_balance("u1")
+        db.tables["bank_transactions"].append(tx("dep2", 500, created_at="2026-10-05T10:00:00"))
+        assert ledger.get_balance("u1") == 4480
+        assert ledger.get_stats()["full_loads"] == 1
+        # dep1 is before the overlap window and is not read again
+        assert ledger.get_stats()["rows_read"] == 4
+
+    def test_late_row_with_an_old_created_at_is_picked_up(self, ledger, db):
+        ledger.get_balance("u1")
+        db.tables["bank_transactions"].append(tx("dep2", 500, created_at="2026-10-05T10:00:00"))
+        assert ledger.get_balance("u1") == 4480
+        # A redelivered webhook keeps Paystack's payment time but is inserted now
+        db.tables["bank_transactions"].append(tx("dep3", 200, created_at="2026-09-01T10:00:00",
+                                                 inserted_at="2026-10-06T10:00:00"))
+        assert ledger.get_balance("u1") == 4680
+
+    def test_cached_reads_skip_the_database(self, db):
+        ledger = BalanceLedger(supabase=db, reconcile_interval=60)
+        ledger.get_balance("u1")
+        ledger.get_balance("u1")
+        assert db.count("bank_transactions") == 1
+
+
+class TestHandlers:
+    """apply() and a later reconcile never count the same reference twice"""
+
+    def test_apply_then_reconcile(self, ledger, db):
+        ledger.get_balance("u1")
+        assert ledger.apply("u1", "dep2", 500) == 4480
+        db.tables["bank_transactions"].append(tx("dep2", 500, created_at="2026-10-05T10:00:00"))
+        assert ledger.reconcile("u1") == 4480
+
+    def test_untracked_users_are_loaded_on_first_read(self, ledger):
+        assert ledger.apply("u2", "dep9", 100) is None
+
+
+class TestConfirmedBalance:
+    """Only balances backed by bank_transactions are written back"""
+
+    def test_confirmed_after_reconcile(self, ledger):
+        assert ledger.confirmed_balance("u1") == 3980
+
+    def test_unconfirmed_while_handler_row_is_missing(self, ledger, db):
+        ledger.get_balance("u1")
+        ledger.apply("u1", "dep2", 500)
+        assert ledger.confirmed_balance("u1") is None
+
+        db.tables["bank_transactions"].append(tx("dep2", 500, created_at="2026-10-05T10:00:00"))
+        assert ledger.confirmed_balance("u1") == 4480
+
+    def test_status_changes_are_seen_before_a_write_back(self, ledger, db):
+        assert ledger.get_balance("u1") == 3980
+        # transfer.failed: the debit is marked failed and the refund is recorded
+        db.tables["bank_transactions"][1]["status"] = "failed"
+        db.tables["bank_transactions"].append(tx("out1_refund", 1000, "transfer_refund",
+                                                 created_at="2026-10-03T10:00:00"))
+        assert ledger.get_balance("u1") == 3980  # incremental reads cannot see the status change
+        assert ledger.confirmed_balance("u1") == 5000
+        assert ledger.get_balance("u1") == 5000
+
+    def test_full_recompute_keeps_unconfirmed_handler_money(self, ledger):
+        ledger.get_balance("u1")
+        ledger.apply("u1", "dep2", 500)
+        assert ledger.confirmed_balance("u1") is None
+        assert ledger.get_balance("u1") == 4480
+
+    def test_zero_balance_account_is_written_back_when_confirmed(self, ledger, db, monkeypatch):
+        monkeypatch.setattr(balance_helper, "balance_ledger", ledger)
+        db.tables["virtual_accounts"] = [{"user_id": "u1", "balance": 0}]
+
+        assert balance_helper._account_balance(db, {"user_id": "u1", "balance": 0}) == 3980
+        assert db.tables["virtual_accounts"][0]["balance"] == 3980
+
+    def test_unconfirmed_balance_is_shown_but_not_written(self, ledger, db, monkeypatch):
+        monkeypatch.setattr(balance_helper, "balance_ledger", ledger)
+        db.tables["virtual_accounts"] = [{"user_id": "u1", "balance": 0}]
+        ledger.get_balance("u1")
+        ledger.apply("u1", "dep2", 500)
+
+        assert balance_helper._account_balance(db, {"user_id": "u1", "balance": 0}) == 4480
+        assert db.tables["virtual_accounts"][0]["balance"] == 0
@@ -0,0 +1,57 @@
+"""
+BANK INDEX TESTS
+================
+Bank resolution from codes, aliases, prefixes, mentions and misspellings
+"""
+
+import pytest
+
+from utils.bank_index import bank_index
+
+
+def code(text):
+    bank = bank_index.resolve(text)
+    return bank["code"] if bank else None
+
+
+class TestExactLookups:
+    """Codes and aliases in any spacing or case"""
+
+    @pytest.mark.parametrize("text, expected", [
+        ("058", "058"), ("gtb", "058"), ("GTBank Plc", "058"), ("first", "011"),
+        ("first bank", "011"), ("fcmb", "214"), ("zenith bank plc", "057"),
+    ])
+    def test_resolves(self, text, expected):
+        assert code(text) == expected
+
+    def test_unknown_codes_are_never_guessed(self):
+        assert code("999999999") is None
+
+
+class TestResolutionOrder:
+    """Longer matches win over a single contained word"""
+
+    @pytest.mark.parametrize("text, expected", [
+        ("first city", "214"), ("first city bank", "214"), ("first city monument", "214"),
+        ("my gtbank account", "058"), ("send to gtb", "058"), ("zen", "057"),
+    ])
+    def test_resolves(self, text, expected):
+        assert code(text) == expected
+
+
+class TestFuzzyMatching:
+    """Typos are tolerated only when the match is unambiguous"""
+
+    @pytest.mark.parametrize("text, expected", [
+        ("zenit", "057"), ("gt bnk", "058"), ("moniepont", "50515"), ("fidelty", "070"),
+    ])
+    def test_typos(self, text, expected):
+        assert code(text) == expected
+
+    @pytest.mark.parametrize("text", ["fast bank", "my bank", "the bank", "bank", "xyz"])
+    def test_generic_text_is_not_a_bank(self, text):
+        assert code(text) is None
+
+    def test_match_scores_exact_as_one(self):
+        bank, score = bank_index.match("Zenith")[0]
+        assert (bank["code"], score) == ("057", 1.0)
@@ -0,0 +1,214 @@
+"""
+BULK PAYOUT TESTS
+=================
+Wallet holds before submission, refunds for failed items and batch records
+"""
+
+import os
+
+import pytest
+
+import paystack.bulk_payouts as bulk_module
+from paystack.bulk_payouts import BulkPayoutPipeline, PayoutItem
+from paystack.recipient_registry import RecipientRegistry
+from utils.balance_ledger import BalanceLedger
+
+
+def install_reservation_rpcs(db):
+    """reserve/release/settle_payout_funds as the SQL functions behave"""
+    holds = db.tables.setdefault("payout_reservations", [])
+
+    def user(user_id):
+        return next((row for row in db.tables["users"] if row["id"] == user_id), None)
+
+    def reserve_payout_funds(p_items):
+        rows = []
+        for item in p_items:
+            payer = user(item["user_id"])
+            if payer and payer["wallet_balance"] >= item["amount"]:
+                payer["wallet_balance"] -= item["amount"]
+                holds.append({"reference": item["reference"], "user_id": item["user_id"],
+                              "amount": item["amount"], "status": "held"})
+                rows.append({"reference": item["reference"], "reserved": True, "balance": payer["wallet_balance"]})
+            else:
+                rows.append({"reference": item["reference"], "reserved": False,
+                             "balance": payer["wallet_balance"] if payer else None})
+        return rows
+
+    def release_payout_funds(p_references):
+        rows = []
+        for hold in holds:
+            if hold["reference"] in p_references and hold["status"] == "held":
+                hold["status"] = "released"
+                user(hold["user_id"])["wallet_balance"] += hold["amount"]
+                rows.append({"reference": hold["reference"], "balance": user(hold["user_id"])["wallet_balance"]})
+        return rows
+
+    def settle_payout_funds(p_references):
+        settled = [hold for hold in holds if hold["reference"] in p_references and hold["status"] == "held"]
+        for hold in settled:
+            hold["status"] = "settled"
+        return len(settled)
+
+    db.functions.update(reserve_payout_funds=reserve_payout_funds,
+                        release_payout_funds=release_payout_funds,
+                        settle_payout_funds=settle_payout_funds)
+
+
+class FakeTransferAPI:
+    """Paystack bulk endpoints; statuses and verify answers are set per reference"""
+
+    def __init__(self):
+        self.statuses = {}  # reference -> status in the bulk response; missing -> left out
+        self.bulk_error = None
+        self.bulk_status_code = None  # None -> no HTTP answer (timeout)
+        self.verified = {}  # reference -> Paystack's record; missing -> verify_error
+        self.verify_error = "Transfer not found"
+        self.transfer_requests = 0
+
+    def bulk_create_transfer_recipients(self, recipients):
+        return {"success": True, "data": {"success": [{
+            "recipient_code": f"RCP_{r['account_number']}",
+            "details": {"account_number": r["account_number"], "bank_code": r["bank_code"]},
+        } for r in recipients]}}
+
+    def initiate_bulk_transfer(self, transfers):
+        self.transfer_requests += 1
+        if self.bulk_error:
+            return {"success": False, "error": self.bulk_error, "status_code": self.bulk_status_code}
+        return {"success": True, "data": [
+            {"reference": t["reference"], "status": self.statuses.get(t["reference"], "pending"),
+             "transfer_code": f"TRF_{t['reference']}"}
+            for t in transfers if self.statuses.get(t["reference"], "pending") is not None
+        ]}
+
+    def verify_transfer(self, reference):
+        if reference in self.verified:
+            return {"success": True, "data": self.verified[reference]}
+        return {"success": False, "error": self.verify_error}
+
+
+@pytest.fixture
+def db(fake_supabase, monkeypatch):
+    fake_supabase.tables["users"] = [{"id": "u1", "wallet_balance": 5000.0}]
+    install_reservation_rpcs(fake_supabase)
+    registry = RecipientRegistry(supabase=fake_supabase)
+    registry._warm_pid = os.getpid()
+    monkeypatch.setattr(bulk_module, "recipient_registry", registry)
+    monkeypatch.setattr(bulk_module, "balance_ledger", BalanceLedger(supabase=fake_supabase))
+    return fake_supabase
+
+
+@pytest.fixture
+def api():
+    return FakeTransferAPI()
+
+
+@pytest.fixture
+def pipeline(db, api):
+    return BulkPayoutPipeline(transfer_api=api, supabase=db, fee_for=lambda amount: 10.0)
+
+
+def payouts(count, amount=1000.0):
+    return [PayoutItem(user_id="u1", account_number=f"000000000{i}", bank_code="058",
+                       amount=amount, name=f"PAYEE {i}") for i in range(count)]
+
+
+def wallet(db):
+    return db.tables["users"][0]["wallet_balance"]
+
+
+def holds(db, status):
+    return [row["reference"] for row in db.tables["payout_reservations"] if row["status"] == status]
+
+
+class TestReservation:
+    """amount + fee is held atomically before anything is sent"""
+
+    def test_batch_is_held_sent_and_recorded(self, pipeline, db):
+        items = payouts(2)
+        results = pipeline.run(items)
+
+        assert [r["status"] for r in results] == ["submitted", "submitted"]
+        assert wallet(db) == 2980.0
+        assert holds(db, "settled") == [item.reference for item in items]
+        rows = db.tables["bank_transactions"]
+        assert [(r["wallet_balance_before"], r["wallet_balance_after"]) for r in rows] == \
+               [(5000.0, 3990.0), (3990.0, 2980.0)]
+        # The hold is the debit; no absolute balance is written back
+        assert db.count("users", "update") == 0
+
+    def test_items_beyond_the_balance_are_rejected(self, pipeline, db, api):
+        db.tables["users"][0]["wallet_balance"] = 1500.0
+        results = pipeline.run(payouts(2))
+
+        assert [r["status"] for r in results] == ["submitted", "rejected"]
+        assert "Insufficient balance" in results[1]["error"]
+        assert wallet(db) == 490.0
+
+    def test_nothing_is_sent_without_the_reserve_rpc(self, pipeline, db, api):
+        del db.functions["reserve_payout_funds"]
+        results = pipeline.run(payouts(2))
+
+        assert {r["status"] for r in results} == {"rejected"}
+        assert api.transfer_requests == 0
+        assert wallet(db) == 5000.0
+
+
+class TestRefunds:
+    """Failed and rejected items get their hold back; unconfirmed ones keep it"""
+
+    def test_failed_item_is_refunded(self, pipeline, db, api):
+        items = payouts(2)
+        api.statuses[items[1].reference] = "failed"
+        results = pipeline.run(items)
+
+        assert [r["status"] for r in results] == ["submitted", "failed"]
+        assert wallet(db) == 3990.0
+        assert holds(db, "released") == [items[1].reference]
+        assert pipeline.get_stats()["refunded"] == 1
+        assert len(db.tables["bank_transactions"]) == 1
+
+    def test_rejected_chunk_is_refunded(self, pipeline, db, api):
+        api.bulk_error, api.bulk_status_code = "Insufficient Paystack balance", 400
+        results = pipeline.run(payouts(3))
+
+        assert {r["status"] for r in results} == {"failed"}
+        assert wallet(db) == 5000.0
+        assert "bank_transactions" not in db.tables
+        assert pipeline.get_stats()["verify_requests"] == 0
+
+    def test_ambiguous_chunk_failure_stays_held(self, pipeline, db, api):
+        api.bulk_error = "Read timed out"
+        items = payouts(3)
+        results = pipeline.run(items)
+
+        # Not found yet is not proof the chunk was turned away
+        assert {r["status"] for r in results} == {"unconfirmed"}
+        assert wallet(db) == 1970.0
+        assert holds(db, "held") == [item.reference for item in items]
+        assert pipeline.get_stats()["verify_requests"] == 3
+
+    def test_ambiguous_chunk_failure_is_settled_per_item(self, pipeline, db, api):
+        api.bulk_error, api.bulk_status_code = "Internal server error", 500
+        items = payouts(3)
+        api.verified[items[0].reference] = {"status": "pending", "transfer_code": "TRF_0"}
+        api.verified[items[2].reference] = {"status": "failed", "reason": "Account closed"}
+        results = pipeline.run(items)
+
+        assert [r["status"] for r in results] == ["submitted", "unconfirmed", "failed"]
+        assert results[0]["transfer_code"] == "TRF_0"
+        assert holds(db, "settled") == [items[0].reference]
+        assert holds(db, "held") == [items[1].reference]
+        assert holds(db, "released") == [items[2].reference]
+        assert wallet(db) == 2980.0
+
+    def test_unconfirmed_item_stays_held(self, pipeline, db, api):
+        items = payouts(1)
+        api.statuses[items[0].reference] = None  # left out of the response
+        api.verify_error = "Gateway timeout"
+        results = pipeline.run(items)
+
+        assert results[0]["status"] == "unconfirmed"
+        assert wallet(db) == 3990.0
+        assert holds(db, "held") == [items[0].reference]
@@ -0,0 +1,113 @@
+"""
+CRYPTO RATE FEED TESTS
+======================
+Snapshots from a swapped-in provider, staleness and fallback rates
+"""
+
+import time
+
+import pytest
+
+import crypto.rates as rates
+from crypto.rates import CryptoRateFeed, RateLimited, RateSnapshot
+
+
+class StubProvider:
+    """Rate source returning fixed NGN prices, or raising an error"""
+
+    def __init__(self, prices=None, error=None):
+        self.prices = prices or {"bitcoin": 150000000.0, "tether": 1650.0}
+        self.error = error
+        self.calls = 0
+
+    def fetch(self, crypto_ids):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return {crypto_id: price for crypto_id, price in self.prices.items() if crypto_id in crypto_ids}
+
+
+@pytest.fixture
+def running_feed(monkeypatch):
+    """Global feed replaced by one whose provider is offline"""
+    monkeypatch.setattr(rates, "MIN_REQUEST_INTERVAL", 0)
+    feed = CryptoRateFeed(provider=StubProvider(error=ConnectionError("offline")), refresh_interval=3600)
+    monkeypatch.setattr(rates, "rate_feed", feed)
+    return feed
+
+
+@pytest.fixture
+def feed(running_feed):
+    """The same feed without its refresher thread; tests call refresh() themselves"""
+    running_feed._ensure_running = lambda: None
+    return running_feed
+
+
+class TestFallback:
+    """Until a live fetch succeeds, only fallback rates exist"""
+
+    def test_fallback_snapshot_is_stale(self, feed):
+        snapshot = feed.snapshot()
+        assert (snapshot.source, snapshot.stale) == ("fallback", True)
+        assert rates.get_crypto_to_ngn_rate("BTC") == rates.FALLBACK_RATES["BTC"]
+
+    def test_live_only_refuses_fallback_rates(self, feed):
+        assert rates.get_crypto_to_ngn_rate("BTC", live_only=True) == 0
+
+    def test_unsupported_symbol(self, feed):
+        assert rates.get_crypto_to_ngn_rate("DOGE") == 0
+
+
+class TestLiveSnapshot:
+    """set_provider() swaps the source and refreshes in the background"""
+
+    def test_set_provider_refreshes(self, running_feed):
+        running_feed.set_provider(StubProvider())
+        snapshot = running_feed.snapshot(wait=2)
+
+        assert (snapshot.source, snapshot.stale) == ("live", False)
+        assert snapshot.rates == {"BTC": 150000000.0, "USDT": 1650.0}
+        assert rates.get_crypto_to_ngn_rate("BTC", live_only=True) == 150000000.0
+
+        report = rates.get_rate_snapshot(["btc", "eth"])
+        assert report["rates"] == {"BTC": 150000000.0}
+        assert report["stale"] is False and report["as_of"]
+
+    def test_old_snapshot_is_served_stale_and_revalidated(self, feed):
+        feed._snapshot = RateSnapshot({"BTC": 1.0}, time.time() - rates.CRYPTO_RATE_MAX_AGE - 1, "live")
+        snapshot = feed.snapshot()
+        assert snapshot.stale and snapshot.rates == {"BTC": 1.0}
+        assert feed.get_stats()["revalidations"] == 1
+
+    def test_max_age_refuses_an_old_live_rate(self, feed):
+        feed._snapshot = RateSnapshot({"BTC": 1.0}, time.time() - rates.CRYPTO_RATE_MAX_AGE - 1, "live")
+        assert rates.get_crypto_to_ngn_rate("BTC", live_only=True) == 1.0
+        assert rates.get_crypto_to_ngn_rate("BTC", live_only=True, max_age=rates.CRYPTO_RATE_MAX_AGE) == 0
+
+        feed._snapshot = RateSnapshot({"BTC": 2.0}, time.time(), "live")
+        assert rates.get_crypto_to_ngn_rate("BTC", live_only=True, max_age=rates.CRYPTO_RATE_MAX_AGE) == 2.0
+
+    def test_missing_coins_keep_their_last_rate(self, feed):
+        feed.provider = StubProvider()
+        assert feed.refresh()
+        feed.provider = StubProvider({"bitcoin": 160000000.0})
+        assert feed.refresh()
+        assert feed.snapshot().rates == {"BTC": 160000000.0, "USDT": 1650.0}
+
+
+class TestFailures:
+    """Failed refreshes keep the last snapshot and back off"""
+
+    def test_failure_keeps_last_live_rates(self, feed):
+        feed.provider = StubProvider()
+        feed.refresh()
+        feed.provider = StubProvider(error=ConnectionError("offline"))
+
+        assert feed.refresh() is False
+        assert feed.snapshot().rates["BTC"] == 150000000.0
+        assert feed.get_stats()["backoff_seconds"] > 0
+
+    def test_rate_limiting_is_counted(self, feed):
+        feed.provider = StubProvider(error=RateLimited("429"))
+        assert feed.refresh() is False
+        assert feed.get_stats()["rate_limited"] == 1
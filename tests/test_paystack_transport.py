@@ -0,0 +1,192 @@
+"""
+PAYSTACK TRANSPORT TESTS
+========================
+Retries, Retry-After, the circuit breaker and endpoint templates against a stubbed session
+"""
+
+import os
+import threading
+import time
+
+import pytest
+import requests
+
+import paystack.transport as transport_module
+from paystack.transport import PaystackTransport, PaystackUnavailable, endpoint_template
+
+
+def response(status=200, headers=None):
+    reply = requests.Response()
+    reply.status_code = status
+    reply.headers.update(headers or {})
+    return reply
+
+
+class StubSession:
+    """Answers requests from a script of responses and exceptions, in order"""
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.requests = []
+
+    def request(self, method, url, timeout=None, **kwargs):
+        self.requests.append((method, url, timeout))
+        outcome = self.outcomes.pop(0) if self.outcomes else response()
+        if callable(outcome):
+            outcome = outcome()
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays, recorded instead of slept (jitter pinned to its upper bound)"""
+    slept = []
+    monkeypatch.setattr(transport_module.time, "sleep", slept.append)
+    monkeypatch.setattr(transport_module.random, "uniform", lambda low, high: high)
+    return slept
+
+
+@pytest.fixture
+def transport(sleeps):
+    def build(*outcomes, **kwargs):
+        kwargs.setdefault("max_retries", 2)
+        paystack = PaystackTransport(**kwargs)
+        paystack._session, paystack._pid = StubSession(*outcomes), os.getpid()
+        return paystack
+    return build
+
+
+class TestRetries:
+    """Only calls that are safe to repeat are retried"""
+
+    def test_idempotent_get_is_retried(self, transport):
+        paystack = transport(response(502), response(503), response(200))
+        assert paystack.get("/bank").status_code == 200
+        assert len(paystack._session.requests) == 3
+        assert paystack.get_stats()["retries"] == 2
+
+    def test_retries_stop_at_the_limit(self, transport):
+        paystack = transport(response(500), response(500), response(500), response(200))
+        assert paystack.get("/balance").status_code == 500
+        assert len(paystack._session.requests) == 3
+
+    def test_plain_post_is_not_retried(self, transport):
+        paystack = transport(response(500), response(200))
+        assert paystack.post("/transfer", json={}).status_code == 500
+        assert len(paystack._session.requests) == 1
+
+    def test_post_with_idempotency_key_is_retried(self, transport):
+        paystack = transport(response(504), response(200))
+        assert paystack.post("/transfer", json={}, idempotency_key="ref-1").status_code == 200
+        assert len(paystack._session.requests) == 2
+
+    def test_post_read_timeout_is_not_retried(self, transport):
+        paystack = transport(requests.ReadTimeout("read timed out"), response(200))
+        with pytest.raises(requests.ReadTimeout):
+            paystack.post("/transfer", json={})
+        assert len(paystack._session.requests) == 1
+
+    def test_post_connect_timeout_is_retried(self, transport):
+        # The request never reached Paystack, so repeating it is safe
+        paystack = transport(requests.ConnectTimeout("connect timed out"), response(200))
+        assert paystack.post("/transfer", json={}).status_code == 200
+        assert len(paystack._session.requests) == 2
+
+    def test_client_errors_are_returned_not_retried(self, transport):
+        paystack = transport(response(400), response(200))
+        assert paystack.get("/bank/resolve").status_code == 400
+        assert len(paystack._session.requests) == 1
+
+
+class TestRetryAfter:
+    """A 429's Retry-After stretches the backoff, up to the cap"""
+
+    def test_retry_after_is_honoured(self, transport, sleeps):
+        paystack = transport(response(429, {"Retry-After": "1"}), response(200))
+        paystack.get("/bank")
+        assert sleeps == [1.0]
+
+    def test_retry_after_is_capped(self, transport, sleeps):
+        paystack = transport(response(429, {"Retry-After": "120"}), response(200))
+        paystack.get("/bank")
+        assert sleeps == [transport_module.BACKOFF_CAP]
+
+    def test_backoff_grows_per_attempt(self, transport, sleeps):
+        paystack = transport(response(503), response(503), response(200))
+        paystack.get("/bank")
+        assert sleeps == [transport_module.BACKOFF_BASE * 2, transport_module.BACKOFF_BASE * 4]
+
+
+class TestCircuitBreaker:
+    """Consecutive failures open the circuit; one probe closes it again"""
+
+    def tripped(self, transport, *outcomes):
+        paystack = transport(response(500), response(500), *outcomes,
+                             max_retries=0, breaker_failures=2, breaker_cooldown=30)
+        paystack.post("/transfer", json={})
+        paystack.post("/transfer", json={})
+        return paystack
+
+    def test_open_circuit_fails_fast(self, transport):
+        paystack = self.tripped(transport)
+        with pytest.raises(PaystackUnavailable):
+            paystack.get("/bank")
+        assert len(paystack._session.requests) == 2
+        assert paystack.get_stats()["breaker"] == "open"
+        assert paystack.get_stats()["short_circuited"] == 1
+
+    def test_half_open_lets_a_single_probe_through(self, transport):
+        probing, release = threading.Event(), threading.Event()
+
+        def slow_success():
+            probing.set()
+            release.wait(5)
+            return response(200)
+
+        paystack = self.tripped(transport, slow_success)
+        paystack._open_until = time.time() - 1  # cooldown over
+        assert paystack.get_stats()["breaker"] == "half-open"
+
+        probe = threading.Thread(target=paystack.get, args=("/balance",))
+        probe.start()
+        assert probing.wait(5)
+        with pytest.raises(PaystackUnavailable):
+            paystack.get("/balance")
+        release.set()
+        probe.join(5)
+
+        assert paystack.get_stats()["breaker"] == "closed"
+        assert paystack.get("/balance").status_code == 200
+        assert len(paystack._session.requests) == 4
+
+    def test_failed_probe_reopens_the_circuit(self, transport):
+        paystack = self.tripped(transport, response(503))
+        paystack._open_until = time.time() - 1
+        assert paystack.get("/balance").status_code == 503
+        assert paystack.get_stats()["breaker"] == "open"
+        assert paystack.get_stats()["breaker_trips"] == 2
+
+
+class TestEndpointTemplates:
+    """IDs fold into {id}; templates pick timeouts and histograms"""
+
+    @pytest.mark.parametrize("method, url, template", [
+        ("get", "https://api.paystack.co/transfer/verify/sofi_ref_123", "GET /transfer/verify/{id}"),
+        ("GET", "/bank/resolve?account_number=0123456789", "GET /bank/resolve"),
+        ("post", "https://api.paystack.co/transfer/bulk", "POST /transfer/bulk"),
+        ("DELETE", "/transferrecipient/RCP_abc", "DELETE /transferrecipient/{id}"),
+    ])
+    def test_templates(self, method, url, template):
+        assert endpoint_template(method, url) == template
+
+    def test_read_timeout_follows_the_endpoint(self, transport):
+        paystack = transport()
+        paystack.post("/transfer/bulk", json={})
+        paystack.get("/transfer/verify/ref-1")
+        (_, url, bulk_timeout), (_, _, verify_timeout) = paystack._session.requests
+        assert url == "https://api.paystack.co/transfer/bulk"
+        assert bulk_timeout == (transport_module.CONNECT_TIMEOUT, 60)
+        assert verify_timeout == (transport_module.CONNECT_TIMEOUT, transport_module.DEFAULT_READ_TIMEOUT)
+        assert set(paystack.get_stats()["endpoints"]) == {"POST /transfer/bulk", "GET /transfer/verify/{id}"}
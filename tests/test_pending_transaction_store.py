@@ -0,0 +1,96 @@
+"""
+PENDING TRANSACTION STORE TESTS
+===============================
+Single-use PIN tokens, expiry and the on-disk permissions of the shared store
+"""
+
+import os
+import stat
+import time
+
+import pytest
+
+from utils.pending_transaction_store import (
+    MemoryPendingStore, SQLitePendingStore, _prepare_private_file
+)
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@pytest.fixture
+def store():
+    return MemoryPendingStore()
+
+
+class TestTokens:
+    """A token is consumed at most once and never after it expires"""
+
+    def test_consume_once(self, store):
+        store.put_token("secret", "txn_1", time.time() + 60)
+        assert store.consume_token("secret") == "txn_1"
+        assert store.consume_token("secret") is None
+        assert store.get_token("secret")["used"] is True
+
+    def test_unknown_token(self, store):
+        assert store.consume_token("missing") is None
+        assert store.get_token("missing") is None
+
+    def test_expired_token_cannot_be_consumed(self, store):
+        store.put_token("secret", "txn_1", time.time() - 1)
+        assert store.get_token("secret") is None
+        assert store.consume_token("secret") is None
+
+
+class TestExpiry:
+    """Expired entries disappear from reads and are purged in expiry order"""
+
+    def test_expired_transaction_is_hidden(self, store):
+        store.put_transaction("txn_1", {"amount": 500}, time.time() - 1)
+        assert store.get_transaction("txn_1") is None
+
+    def test_purge_removes_only_expired_entries(self, store):
+        now = time.time()
+        store.put_transaction("live", {"amount": 500}, now + 60)
+        store.put_transaction("old", {}, now - 1)
+        store.put_token("old_token", "old", now - 1)
+
+        assert store.purge_expired() == 2
+        assert store.get_transaction("live") == {"amount": 500}
+        assert store.get_stats()["transactions"] == 1
+
+    def test_stored_again_with_later_expiry_survives_purge(self, store):
+        now = time.time()
+        store.put_transaction("txn_1", {"try": 1}, now - 1)
+        store.put_transaction("txn_1", {"try": 2}, now + 60)
+        store.purge_expired()
+        assert store.get_transaction("txn_1") == {"try": 2}
+
+
+class TestSQLiteStore:
+    """Shared by workers through one private file"""
+
+    def test_consume_once_across_workers(self, tmp_path):
+        path = str(tmp_path / "pending.sqlite3")
+        first, second = SQLitePendingStore(path), SQLitePendingStore(path)
+        first.put_token("secret", "txn_1", time.time() + 60)
+        assert second.consume_token("secret") == "txn_1"
+        assert first.consume_token("secret") is None
+
+    def test_file_is_created_private(self, tmp_path):
+        path = str(tmp_path / "pending.sqlite3")
+        SQLitePendingStore(path).put_transaction("txn_1", {}, time.time() + 60)
+        assert mode(path) == 0o600
+
+    def test_private_directory_is_created_0700(self, tmp_path):
+        path = tmp_path / "sofi-pending" / "pending.sqlite3"
+        _prepare_private_file(str(path), private_dir=True)
+        assert mode(path.parent) == 0o700
+
+    def test_shared_directory_is_refused(self, tmp_path):
+        directory = tmp_path / "sofi-pending"
+        directory.mkdir()
+        directory.chmod(0o777)
+        with pytest.raises(PermissionError):
+            _prepare_private_file(str(directory / "pending.sqlite3"), private_dir=True)
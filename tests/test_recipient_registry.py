@@ -0,0 +1,91 @@
+"""
+RECIPIENT REGISTRY TESTS
+========================
+Cached Paystack recipient codes, lazy warming and name-checked Paystack listings
+"""
+
+import os
+
+import pytest
+
+import paystack.paystack_transfer_api as transfer_api_module
+from paystack.paystack_transfer_api import PaystackTransferAPI
+from paystack.recipient_registry import RecipientRegistry, names_match
+
+
+class FakeTransferAPI:
+    """One page of Paystack's recipient list"""
+
+    def __init__(self, recipients):
+        self.recipients = recipients
+
+    def list_transfer_recipients(self, page=1, per_page=50):
+        return {"success": True, "data": self.recipients if page == 1 else []}
+
+
+def listed(code, account_number, name, bank_code="058"):
+    return {"recipient_code": code, "name": name, "active": True,
+            "details": {"account_number": account_number, "bank_code": bank_code}}
+
+
+@pytest.fixture
+def registry(fake_supabase):
+    fake_supabase.tables["paystack_transfer_recipients"] = [
+        {"bank_code": "058", "account_number": "0000000001", "recipient_code": "RCP_table",
+         "account_name": "ADA OBI", "updated_at": "2026-10-01"},
+    ]
+    registry = RecipientRegistry(supabase=fake_supabase)
+    registry.warm(FakeTransferAPI([
+        listed("RCP_listed", "0000000002", "JOHN CHUKWU DOE"),
+        listed("RCP_table_dup", "0000000001", "ADA OBI"),
+    ]))
+    return registry
+
+
+class TestNames:
+    def test_order_case_and_punctuation_are_ignored(self):
+        assert names_match("JOHN CHUKWU DOE", "Doe, John Chukwu")
+
+    def test_different_or_missing_names(self):
+        assert not names_match("JOHN DOE", "JANE DOE")
+        assert not names_match(None, "JOHN DOE")
+
+
+class TestWarmedCodes:
+    """Registry-table codes are trusted; Paystack-listed codes need a matching name"""
+
+    def test_table_code_is_used(self, registry):
+        assert registry.lookup("0000000001", "058") == "RCP_table"
+
+    def test_listed_code_needs_the_verified_name(self, registry, fake_supabase):
+        assert registry.lookup("0000000002", "058") is None
+        assert registry.lookup("0000000002", "058", account_name="JANE DOE") is None
+        assert registry.get_stats()["name_mismatches"] == 2
+
+        assert registry.lookup("0000000002", "058", account_name="John Chukwu Doe") == "RCP_listed"
+        saved = [row for row in fake_supabase.tables["paystack_transfer_recipients"]
+                 if row["account_number"] == "0000000002"]
+        assert saved[0]["recipient_code"] == "RCP_listed"
+        # Verified codes no longer need the name
+        assert registry.lookup("0000000002", "058") == "RCP_listed"
+
+    def test_invalidate_drops_listed_candidates(self, registry):
+        registry.invalidate("0000000002", "058")
+        assert registry.lookup("0000000002", "058", account_name="JOHN CHUKWU DOE") is None
+
+
+class TestLazyWarming:
+    """Warming starts with the first transfer, not when the API object is built"""
+
+    def test_warms_on_first_recipient_lookup(self, fake_supabase, monkeypatch):
+        registry = RecipientRegistry(supabase=fake_supabase)
+        monkeypatch.setattr(transfer_api_module, "recipient_registry", registry)
+        monkeypatch.setattr(RecipientRegistry, "warm", lambda self, api, pages=5: 0)
+
+        api = PaystackTransferAPI()
+        assert registry._warm_pid is None
+
+        monkeypatch.setattr(api, "create_transfer_recipient", lambda **kwargs: {
+            "success": True, "data": {"recipient_code": "RCP_new"}})
+        assert api.get_or_create_recipient("0000000003", "058", "ADA OBI")["data"]["recipient_code"] == "RCP_new"
+        assert registry._warm_pid == os.getpid()
@@ -0,0 +1,120 @@
+"""
+REVENUE EVENT LOG TESTS
+=======================
+Event ids, idempotent replay of the spool and the private spool directory
+"""
+
+import os
+import stat
+
+import pytest
+
+from utils.revenue_events import RevenueEventLog
+
+
+def install_summary_rpc(db, fail_once=False):
+    """apply_financial_summary_events as the SQL function behaves; optionally loses one answer"""
+    db.tables["sofi_financial_summary"] = [{"id": 1, "total_revenue": 0.0}]
+    journal = set()
+    state = {"fail": fail_once}
+
+    def apply_financial_summary_events(p_events):
+        summary = db.tables["sofi_financial_summary"][0]
+        for event in p_events:
+            if event["event_id"] in journal:
+                continue
+            journal.add(event["event_id"])
+            for column, delta in event["deltas"].items():
+                summary[column] = summary.get(column, 0.0) + delta
+        if state["fail"]:
+            state["fail"] = False
+            raise TimeoutError("read timed out")  # committed, but the answer was lost
+    db.functions["apply_financial_summary_events"] = apply_financial_summary_events
+
+
+def revenue(db):
+    return db.tables["sofi_financial_summary"][0]["total_revenue"]
+
+
+def crash(log):
+    """Drop the log's spool handles without flushing, as a killed worker would"""
+    for segment in log._sealed + ([log._active] if log._active else []):
+        segment.handle.close()
+    log._pid = None
+
+
+@pytest.fixture
+def spool(tmp_path):
+    return str(tmp_path / "spool")
+
+
+@pytest.fixture
+def new_log(fake_supabase, spool):
+    def build():
+        return RevenueEventLog(supabase=fake_supabase, spool_dir=spool, flush_interval=3600)
+    return build
+
+
+def sale(log, amount):
+    log.append("profits", {"amount": amount}, {"total_revenue": amount})
+
+
+class TestEventIds:
+    """Every event is written with its own id"""
+
+    def test_rows_carry_event_ids(self, new_log, fake_supabase):
+        install_summary_rpc(fake_supabase)
+        log = new_log()
+        sale(log, 10.0)
+        sale(log, 5.0)
+        assert log.flush() == 2
+
+        ids = [row["event_id"] for row in fake_supabase.tables["profits"]]
+        assert len(set(ids)) == 2 and all(ids)
+        assert revenue(fake_supabase) == 15.0
+
+
+class TestReplay:
+    """Events that did reach the database are not counted again"""
+
+    def test_spool_replayed_after_a_crash_counts_once(self, new_log, fake_supabase):
+        install_summary_rpc(fake_supabase)
+        log = new_log()
+        sale(log, 10.0)
+        sale(log, 5.0)
+        # Written, then killed before the segment was deleted
+        assert log._write_batch(list(log._buffer)) == []
+        crash(log)
+
+        replacement = new_log()
+        sale(replacement, 1.0)
+        assert replacement.get_stats()["recovered"] == 2
+        replacement.flush()
+
+        assert len(fake_supabase.tables["profits"]) == 3
+        assert revenue(fake_supabase) == 16.0
+
+    def test_summary_retried_after_a_lost_answer_counts_once(self, new_log, fake_supabase):
+        install_summary_rpc(fake_supabase, fail_once=True)
+        log = new_log()
+        sale(log, 10.0)
+
+        assert log.flush() == 0
+        assert log.get_stats()["buffered"] == 1
+        assert log.flush() == 1
+        assert revenue(fake_supabase) == 10.0
+        assert len(fake_supabase.tables["profits"]) == 1
+
+
+class TestSpoolDirectory:
+    """The spool holds accounting data and is kept private"""
+
+    def test_created_0700(self, new_log, spool):
+        new_log().append(None, summary={"total_revenue": 1.0})
+        assert stat.S_IMODE(os.stat(spool).st_mode) == 0o700
+
+    def test_existing_directory_is_tightened(self, new_log, spool):
+        os.makedirs(spool)
+        os.chmod(spool, 0o755)
+        new_log().append(None, summary={"total_revenue": 1.0})
+        assert stat.S_IMODE(os.stat(spool).st_mode) == 0o700
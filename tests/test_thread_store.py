@@ -0,0 +1,124 @@
+"""
+THREAD STORE TESTS
+==================
+Read-through thread IDs, idle expiry of persisted threads and write-behind
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils.thread_store import AssistantThreadStore
+from utils.user_resolver import UserResolver
+import utils.user_resolver as user_resolver_module
+
+DAY = 86400
+
+
+def days_ago(days):
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+@pytest.fixture
+def users(fake_supabase, monkeypatch):
+    fake_supabase.tables["users"] = [
+        {"id": "u1", "whatsapp_number": "+2348012345678",
+         "assistant_thread_id": "thread_old", "assistant_thread_used_at": days_ago(2)},
+    ]
+    monkeypatch.setattr(user_resolver_module, "get_supabase_client", lambda **_: fake_supabase)
+    return fake_supabase
+
+
+@pytest.fixture
+def store(users):
+    store = AssistantThreadStore(idle_expiry_seconds=30 * DAY, touch_interval=DAY,
+                                 resolver=UserResolver(), supabase=users)
+    store._ensure_flusher = lambda: None  # tests flush explicitly
+    return store
+
+
+def user_row(db):
+    return db.tables["users"][0]
+
+
+class TestReads:
+    """Misses read the thread columns directly; hits stay in memory"""
+
+    def test_loads_persisted_thread_once(self, store, users):
+        assert store.get("08012345678") == "thread_old"
+        assert store.get("+2348012345678") == "thread_old"
+        assert users.count("users", "select") == 1
+        assert store.get_stats()["db_hits"] == 1
+
+    def test_miss_ignores_the_cached_user_row(self, store, users):
+        store.resolver.resolve("08012345678")  # user cached before the thread changed
+        user_row(users)["assistant_thread_id"] = "thread_new"
+        assert store.get("08012345678") == "thread_new"
+
+    def test_persisted_idle_thread_expires(self, store, users):
+        user_row(users)["assistant_thread_used_at"] = days_ago(31)
+        assert store.get("08012345678") is None
+        assert store.get_stats()["expired"] == 1
+
+        store.flush()
+        assert user_row(users)["assistant_thread_id"] is None
+
+    def test_legacy_rows_fall_back_to_updated_at(self, store, users):
+        row = user_row(users)
+        row["assistant_thread_used_at"] = None
+        row["updated_at"] = days_ago(40)
+        assert store.get("08012345678") is None
+
+    def test_in_memory_idle_thread_expires(self, store):
+        store.get("08012345678")
+        store._cache["2348012345678"][1] = time.time() - 31 * DAY
+        store._cache["2348012345678"][2] = time.time() - 31 * DAY
+        assert store.get("08012345678") is None
+
+
+class TestWrites:
+    """New, dropped and used threads are written back by flush()"""
+
+    def test_created_thread_is_persisted(self, store, users):
+        user_row(users)["assistant_thread_id"] = None
+        thread_id = store.get_or_create("08012345678", lambda: "thread_created")
+
+        assert thread_id == "thread_created"
+        assert store.flush() == 1
+        assert user_row(users)["assistant_thread_id"] == "thread_created"
+        assert user_row(users)["assistant_thread_used_at"]
+
+    def test_discard_clears_the_stored_thread(self, store, users):
+        store.get("08012345678")
+        store.discard("08012345678", "thread_old")
+        assert store.get("08012345678") is None  # pending write wins over the stale row
+
+        store.flush()
+        assert user_row(users)["assistant_thread_id"] is None
+
+    def test_discard_of_a_replaced_thread_is_ignored(self, store):
+        store.set("08012345678", "thread_new")
+        store.discard("08012345678", "thread_old")
+        assert store.get("08012345678") == "thread_new"
+
+    def test_use_is_persisted_once_per_touch_interval(self, store, users):
+        store.get("08012345678")  # last use was two days ago: touch now
+        store.get("08012345678")
+        assert store.flush() == 1
+        used_at = datetime.fromisoformat(user_row(users)["assistant_thread_used_at"])
+        assert datetime.now(timezone.utc) - used_at < timedelta(minutes=1)
+
+        store.get("08012345678")
+        assert store.flush() == 0
+        assert store.get_stats()["touches"] == 1
+
+    def test_failed_writes_are_retried(self, store, users):
+        store.set("08012345678", "thread_new")
+        users.failing["users"] = RuntimeError("connection reset")
+        assert store.flush() == 0
+        assert store.get_stats()["pending_writes"] == 1
+
+        del users.failing["users"]
+        assert store.flush() == 1
+        assert user_row(users)["assistant_thread_id"] == "thread_new"
@@ -0,0 +1,141 @@
+"""
+USER MAILBOX TESTS
+==================
+Per-user ordering and coalescing of concurrent senders, across event loops
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.user_mailbox import UserMailbox
+
+
+class RecordingProcessor:
+    """Records batches; optionally holds the first one until released"""
+
+    def __init__(self, hold_first=False, fail_first=False):
+        self.batches = []
+        self.active = 0
+        self.overlapped = False
+        self.started = threading.Event()
+        self.release = threading.Event()
+        if not hold_first:
+            self.release.set()
+        self.fail_first = fail_first
+
+    async def __call__(self, key, payloads):
+        self.active += 1
+        self.overlapped |= self.active > 1
+        self.batches.append((key, list(payloads)))
+        self.started.set()
+        try:
+            if len(self.batches) == 1:
+                while not self.release.is_set():
+                    await asyncio.sleep(0.005)
+                if self.fail_first:
+                    raise RuntimeError("assistant unavailable")
+            return f"reply to {'+'.join(payloads)}"
+        finally:
+            self.active -= 1
+
+
+async def wait_for(condition, timeout=5):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition() and loop.time() < deadline:
+        await asyncio.sleep(0.005)
+
+
+@pytest.fixture
+def mailbox():
+    return UserMailbox()
+
+
+class TestOrderingAndCoalescing:
+    """One batch per user at a time; later messages fold into the next batch"""
+
+    def test_messages_during_a_run_fold_into_the_next_batch(self, mailbox):
+        processor = RecordingProcessor(hold_first=True)
+
+        async def scenario():
+            first = asyncio.ensure_future(mailbox.submit("u1", "m1", processor))
+            await wait_for(processor.started.is_set)
+            second = asyncio.ensure_future(mailbox.submit("u1", "m2", processor))
+            third = asyncio.ensure_future(mailbox.submit("u1", "m3", processor))
+            await wait_for(lambda: mailbox.get_stats()["messages"] == 3)
+            assert mailbox.is_busy("u1")
+            processor.release.set()
+            return await asyncio.gather(first, second, third)
+
+        results = asyncio.run(scenario())
+
+        assert processor.batches == [("u1", ["m1"]), ("u1", ["m2", "m3"])]
+        # Earlier senders get None; the batch's reply goes to its newest message
+        assert results == ["reply to m1", None, "reply to m2+m3"]
+        assert not processor.overlapped
+        assert mailbox.get_stats() == {"messages": 3, "batches": 2, "coalesced": 1, "errors": 0,
+                                       "active_mailboxes": 0}
+
+    def test_senders_on_different_event_loops(self, mailbox):
+        processor = RecordingProcessor(hold_first=True)
+        results = {}
+
+        def send(payload):
+            results[payload] = asyncio.run(mailbox.submit("u1", payload, processor))
+
+        first = threading.Thread(target=send, args=("m1",))
+        first.start()
+        assert processor.started.wait(5)
+        later = [threading.Thread(target=send, args=(payload,)) for payload in ("m2", "m3")]
+        for thread in later:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while mailbox.get_stats()["messages"] < 3 and time.monotonic() < deadline:
+            time.sleep(0.005)
+        processor.release.set()
+        for thread in [first, *later]:
+            thread.join(5)
+
+        assert processor.batches[0] == ("u1", ["m1"])
+        assert sorted(processor.batches[1][1]) == ["m2", "m3"]
+        newest = processor.batches[1][1][-1]
+        assert results[newest] == f"reply to {'+'.join(processor.batches[1][1])}"
+        assert [results[payload] for payload in processor.batches[1][1][:-1]] == [None]
+        assert not processor.overlapped
+
+    def test_users_do_not_wait_on_each_other(self, mailbox):
+        held = RecordingProcessor(hold_first=True)
+        free = RecordingProcessor()
+
+        async def scenario():
+            blocked = asyncio.ensure_future(mailbox.submit("u1", "slow", held))
+            await wait_for(held.started.is_set)
+            reply = await asyncio.wait_for(mailbox.submit("u2", "fast", free), 5)
+            held.release.set()
+            await blocked
+            return reply
+
+        assert asyncio.run(scenario()) == "reply to fast"
+
+
+class TestErrors:
+    """A failed batch fails its newest sender and the mailbox moves on"""
+
+    def test_failure_is_raised_to_the_newest_sender_only(self, mailbox):
+        processor = RecordingProcessor(hold_first=True, fail_first=True)
+
+        async def scenario():
+            first = asyncio.ensure_future(mailbox.submit("u1", "m1", processor))
+            await wait_for(processor.started.is_set)
+            second = asyncio.ensure_future(mailbox.submit("u1", "m2", processor))
+            await wait_for(lambda: mailbox.get_stats()["messages"] == 2)
+            processor.release.set()
+            return await asyncio.gather(first, second, return_exceptions=True)
+
+        first, second = asyncio.run(scenario())
+        assert isinstance(first, RuntimeError)
+        assert second == "reply to m2"
+        assert mailbox.get_stats()["errors"] == 1
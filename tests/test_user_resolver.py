@@ -0,0 +1,81 @@
+"""
+USER RESOLVER TESTS
+===================
+Cached WhatsApp identity lookups and their invalidation
+"""
+
+import pytest
+
+import utils.user_resolver as user_resolver_module
+from utils.user_resolver import UserResolver, normalize_phone_number, phone_number_variants
+
+
+@pytest.fixture
+def resolver(fake_supabase, monkeypatch):
+    fake_supabase.tables["users"] = [
+        {"id": "u1", "whatsapp_number": "+2348012345678", "pin_hash": None,
+         "account_number": "9012345678", "customer_code": "CUS_1"},
+        {"id": "u2", "phone": "08087654321"},
+    ]
+    monkeypatch.setattr(user_resolver_module, "get_supabase_client", lambda **_: fake_supabase)
+    return UserResolver()
+
+
+class TestNormalization:
+    """Phone number formats"""
+
+    def test_formats_normalize_to_234(self):
+        for number in ("+2348012345678", "2348012345678", "08012345678", "8012345678"):
+            assert normalize_phone_number(number) == "2348012345678"
+
+    def test_variants_cover_stored_formats(self):
+        assert set(phone_number_variants("08012345678")) == {
+            "08012345678", "2348012345678", "+2348012345678"}
+
+
+class TestUserResolver:
+    """One query per number, then cached until invalidated"""
+
+    def test_resolves_any_column_and_format(self, resolver):
+        assert resolver.resolve("08012345678")["id"] == "u1"
+        assert resolver.resolve("+2348087654321")["id"] == "u2"
+
+    def test_repeat_lookups_use_the_cache(self, resolver, fake_supabase):
+        resolver.resolve("08012345678")
+        resolver.resolve("+2348012345678")
+        assert fake_supabase.count("users", "select") == 1
+
+    def test_invalidate_by_phone_and_by_user_id(self, resolver, fake_supabase):
+        resolver.resolve("08012345678")
+        fake_supabase.tables["users"][0]["pin_hash"] = "set"
+
+        resolver.invalidate(user_id="u1")
+        assert resolver.resolve("08012345678")["pin_hash"] == "set"
+
+        fake_supabase.tables["users"][0]["pin_hash"] = "changed"
+        resolver.invalidate(phone_number="2348012345678")
+        assert resolver.resolve("08012345678")["pin_hash"] == "changed"
+        assert fake_supabase.count("users", "select") == 3
+
+    def test_unknown_numbers_are_cached_briefly(self, resolver, fake_supabase):
+        assert resolver.resolve("09000000000") is None
+        assert resolver.resolve("09000000000") is None
+        assert fake_supabase.count("users", "select") == 1
+
+    def test_users_mid_onboarding_are_cached_briefly(self, resolver, fake_supabase, monkeypatch):
+        clock = [1000.0]
+        monkeypatch.setattr(user_resolver_module.time, "time", lambda: clock[0])
+        assert resolver.resolve("08087654321")["id"] == "u2"
+        assert resolver.resolve("08012345678")["id"] == "u1"
+
+        # Another worker finishes onboarding; its invalidate_user() never reaches this one
+        fake_supabase.tables["users"][1].update(account_number="9087654321", customer_code="CUS_2")
+        clock[0] += user_resolver_module.NEGATIVE_TTL_SECONDS
+        assert resolver.resolve("08087654321")["account_number"] == "9087654321"
+        resolver.resolve("08012345678")
+        assert fake_supabase.count("users", "select") == 3
+
+    def test_force_refresh_skips_the_cache(self, resolver, fake_supabase):
+        resolver.resolve("08012345678")
+        resolver.resolve("08012345678", force_refresh=True)
+        assert fake_supabase.count("users", "select") == 2
@@ -0,0 +1,102 @@
+"""
+WEBHOOK JOURNAL TESTS
+=====================
+Paystack event claims and batched, exactly-once wallet credits
+"""
+
+import pytest
+
+from paystack.webhook_journal import CreditEvent, PaystackWebhookJournal, event_key
+
+
+def credit(reference, amount=1000.0, user_id="u1"):
+    return CreditEvent(event_key("charge.success", reference), reference, user_id, amount, "0123456789", {})
+
+
+def install_credit_rpc(db):
+    """apply_paystack_credits as the SQL function behaves: journal, record, increment"""
+    def apply_paystack_credits(p_credits):
+        rows = []
+        for item in p_credits:
+            journal = db.tables.setdefault("paystack_webhook_events", [])
+            if any(row["event_key"] == item["event_key"] for row in journal):
+                rows.append({"event_key": item["event_key"], "applied": False, "new_balance": None})
+                continue
+            journal.append({"event_key": item["event_key"]})
+            user = next(row for row in db.tables["users"] if row["id"] == item["user_id"])
+            user["wallet_balance"] += item["amount"]
+            rows.append({"event_key": item["event_key"], "applied": True, "new_balance": user["wallet_balance"]})
+        return rows
+    db.functions["apply_paystack_credits"] = apply_paystack_credits
+
+
+@pytest.fixture
+def db(fake_supabase):
+    fake_supabase.tables["users"] = [{"id": "u1", "wallet_balance": 500.0}]
+    return fake_supabase
+
+
+def wallet(db):
+    return db.tables["users"][0]["wallet_balance"]
+
+
+class TestClaims:
+    """Each non-credit event is processed once across workers"""
+
+    def test_second_claim_is_a_duplicate(self, db):
+        journal = PaystackWebhookJournal(supabase=db)
+        assert journal.claim("transfer.success", "ref1") is True
+        assert journal.claim("transfer.success", "ref1") is False
+        assert journal.is_known("transfer.success:ref1")
+
+    def test_claim_made_by_another_worker(self, db):
+        assert PaystackWebhookJournal(supabase=db).claim("transfer.success", "ref1") is True
+        assert PaystackWebhookJournal(supabase=db).claim("transfer.success", "ref1") is False
+
+    def test_released_claim_can_be_retried(self, db):
+        first = PaystackWebhookJournal(supabase=db)
+        first.claim("transfer.failed", "ref1")
+        first.release("transfer.failed", "ref1")
+        assert PaystackWebhookJournal(supabase=db).claim("transfer.failed", "ref1") is True
+
+    def test_missing_journal_table_deduplicates_in_process(self, db):
+        db.failing["paystack_webhook_events"] = RuntimeError("relation does not exist")
+        journal = PaystackWebhookJournal(supabase=db)
+        assert journal.claim("transfer.success", "ref1") is True
+        assert journal.claim("transfer.success", "ref1") is False
+
+
+class TestCredits:
+    """Credits are batched and applied exactly once"""
+
+    def test_burst_is_sent_as_one_batch(self, db):
+        install_credit_rpc(db)
+        journal = PaystackWebhookJournal(supabase=db, batch_window=0.05)
+        futures = [journal.submit_credit(credit(f"ref{i}")) for i in range(3)]
+        results = [future.result(timeout=2) for future in futures]
+
+        assert all(result.applied for result in results)
+        assert wallet(db) == 3500.0
+        assert db.count("rpc", "apply_paystack_credits") == 1
+        assert journal.get_stats()["batches"] == 1
+
+    def test_duplicate_deliveries_credit_once(self, db):
+        install_credit_rpc(db)
+        journal = PaystackWebhookJournal(supabase=db, batch_window=0.05)
+        first, second = journal.submit_credit(credit("ref1")), journal.submit_credit(credit("ref1"))
+        assert [first.result(timeout=2).applied, second.result(timeout=2).applied] == [True, False]
+
+        # A Paystack retry reaching another worker is rejected by the database
+        retry = PaystackWebhookJournal(supabase=db, batch_window=0).submit_credit(credit("ref1"))
+        assert retry.result(timeout=2).applied is False
+        assert wallet(db) == 1500.0
+
+    def test_falls_back_without_the_rpc(self, db):
+        journal = PaystackWebhookJournal(supabase=db, batch_window=0)
+        result = journal.submit_credit(credit("ref1")).result(timeout=2)
+
+        assert result == (True, 1500.0)
+        assert wallet(db) == 1500.0
+        assert db.tables["bank_transactions"][0]["reference"] == "ref1"
+        assert journal.get_stats()["atomic_rpc"] is False
+        assert journal.submit_credit(credit("ref1")).result(timeout=2).applied is False
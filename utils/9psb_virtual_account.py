@@ -6,10 +6,10 @@ Handles creation, lookup, and linking of virtual accounts to users.
 
 import os
 from utils.9psb_api import NINEPSBApi
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 
 # Initialize Supabase and 9PSB API (ensure your env variables are set)
-supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+supabase = get_supabase_client()
 ninepsb = NINEPSBApi(
     api_key=os.getenv("NINEPSB_API_KEY"),
     base_url=os.getenv("NINEPSB_BASE_URL")
@@ -3,13 +3,19 @@
 ===================================
 
 Connects Sofi AI to live Supabase data for real-time admin stats
+
+Today's figures and the user count are read from the admin metrics rollups
+(admin_metrics_rollup.sql, utils/admin_metrics.py) instead of today's rows;
+"today" is the current UTC day.
 """
 
 import os
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
-from supabase import create_client, Client
+from supabase import Client
+from utils.supabase_client import get_supabase_client
+from utils.admin_metrics import admin_metrics, summarize, today
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -21,7 +27,7 @@ class AdminDashboardConnector:
     def __init__(self):
         """Initialize Supabase connection"""
         try:
-            self.supabase: Client = create_client(
+            self.supabase: Client = get_supabase_client(
                 os.getenv("SUPABASE_URL"),
                 os.getenv("SUPABASE_KEY")
             )
@@ -29,39 +35,24 @@ class AdminDashboardConnector:
         except Exception as e:
             logger.error(f"❌ Failed to connect to Supabase: {e}")
             self.supabase = None
+        self.metrics = admin_metrics
+    
+    def _today_bank(self, transaction_type: str) -> Dict:
+        """Today's completed bank_transactions of one type, from the daily rollup"""
+        day = today()
+        return summarize(self.metrics.daily(day, day), f"bank:{transaction_type}", ["completed"])
     
     async def get_today_deposits(self) -> Dict:
         """Get today's deposit statistics"""
         try:
-            today = datetime.now().date()
-            
-            # Query virtual account funding (deposits)
-            response = self.supabase.table("bank_transactions").select(
-                "amount, transaction_type, created_at, status"
-            ).eq("transaction_type", "deposit").gte(
-                "created_at", f"{today}T00:00:00"
-            ).lt(
-                "created_at", f"{today}T23:59:59"
-            ).eq("status", "completed").execute()
+            # Virtual account funding (deposits)
+            deposits = self._today_bank("deposit")
             
-            if response.data:
-                deposits = response.data
-                total_amount = sum(float(d['amount']) for d in deposits)
-                total_count = len(deposits)
-                
-                return {
-                    "success": True,
-                    "count": total_count,
-                    "total_amount": total_amount,
-                    "deposits": deposits
-                }
-            else:
-                return {
-                    "success": True,
-                    "count": 0,
-                    "total_amount": 0.0,
-                    "deposits": []
-                }
+            return {
+                "success": True,
+                "count": deposits["transaction_count"],
+                "total_amount": deposits["volume"]
+            }
                 
         except Exception as e:
             logger.error(f"Error fetching today's deposits: {e}")
@@ -75,37 +66,14 @@ class AdminDashboardConnector:
     async def get_today_transfers(self) -> Dict:
         """Get today's transfer statistics"""
         try:
-            today = datetime.now().date()
+            transfers = self._today_bank("transfer")
             
-            response = self.supabase.table("bank_transactions").select(
-                "amount, transaction_type, created_at, status, transaction_fee"
-            ).eq("transaction_type", "transfer").gte(
-                "created_at", f"{today}T00:00:00"
-            ).lt(
-                "created_at", f"{today}T23:59:59"
-            ).eq("status", "completed").execute()
-            
-            if response.data:
-                transfers = response.data
-                total_amount = sum(float(t['amount']) for t in transfers)
-                total_fees = sum(float(t.get('transaction_fee', 0)) for t in transfers)
-                total_count = len(transfers)
-                
-                return {
-                    "success": True,
-                    "count": total_count,
-                    "total_amount": total_amount,
-                    "total_fees": total_fees,
-                    "transfers": transfers
-                }
-            else:
-                return {
-                    "success": True,
-                    "count": 0,
-                    "total_amount": 0.0,
-                    "total_fees": 0.0,
-                    "transfers": []
-                }
+            return {
+                "success": True,
+                "count": transfers["transaction_count"],
+                "total_amount": transfers["volume"],
+                "total_fees": transfers["revenue"]
+            }
                 
         except Exception as e:
             logger.error(f"Error fetching today's transfers: {e}")
@@ -119,37 +87,14 @@ class AdminDashboardConnector:
     async def get_today_airtime_purchases(self) -> Dict:
         """Get today's airtime purchases"""
         try:
-            today = datetime.now().date()
-            
-            response = self.supabase.table("bank_transactions").select(
-                "amount, transaction_type, created_at, status, transaction_fee"
-            ).eq("transaction_type", "airtime").gte(
-                "created_at", f"{today}T00:00:00"
-            ).lt(
-                "created_at", f"{today}T23:59:59"
-            ).eq("status", "completed").execute()
+            airtime = self._today_bank("airtime")
             
-            if response.data:
-                airtime = response.data
-                total_amount = sum(float(a['amount']) for a in airtime)
-                total_fees = sum(float(a.get('transaction_fee', 0)) for a in airtime)
-                total_count = len(airtime)
-                
-                return {
-                    "success": True,
-                    "count": total_count,
-                    "total_amount": total_amount,
-                    "total_fees": total_fees,
-                    "airtime": airtime
-                }
-            else:
-                return {
-                    "success": True,
-                    "count": 0,
-                    "total_amount": 0.0,
-                    "total_fees": 0.0,
-                    "airtime": []
-                }
+            return {
+                "success": True,
+                "count": airtime["transaction_count"],
+                "total_amount": airtime["volume"],
+                "total_fees": airtime["revenue"]
+            }
                 
         except Exception as e:
             logger.error(f"Error fetching today's airtime: {e}")
@@ -163,9 +108,7 @@ class AdminDashboardConnector:
     async def get_total_active_users(self) -> Dict:
         """Get total active users"""
         try:
-            response = self.supabase.table("users").select("id").execute()
-            
-            total_users = len(response.data) if response.data else 0
+            total_users = summarize(self.metrics.totals(), "signups")["transaction_count"]
             
             return {
                 "success": True,
@@ -0,0 +1,224 @@
+"""
+Sofi AI Admin Metrics
+Constant-time admin reports from pre-aggregated rollups
+
+The admin dashboards used to select every row of users, bank_transactions,
+transfer_charges, airtime_transactions, ... and add them up in Python, with
+three more queries per day for the daily growth table, so each report got
+slower as the business grew.
+
+admin_metrics_rollup.sql keeps the aggregates in the database instead:
+triggers on the source tables queue what each write contributes, and
+drain_admin_metrics_queue() folds the queue into per-day and all-time rows
+per feature and status (count, volume, revenue) and a daily HyperLogLog
+sketch of the users with a bank, airtime or crypto transaction. A report
+drains the queue, then reads the totals rows, the daily rows of its date
+range and the sketches of that range; how much history exists makes no
+difference. Reads are cached for ADMIN_METRICS_CACHE_TTL seconds, and
+backfill() rebuilds everything from history.
+
+Days are UTC dates, as bucketed by the triggers.
+"""
+
+import os
+import math
+import time
+import hashlib
+import logging
+import threading
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+ADMIN_METRICS_CACHE_TTL = float(os.getenv("ADMIN_METRICS_CACHE_TTL", "30"))
+DAILY_TABLE = "admin_metrics_daily"
+TOTALS_TABLE = "admin_metrics_totals"
+ACTIVE_USERS_TABLE = "admin_metrics_active_users"
+BACKFILL_FUNCTION = "backfill_admin_metrics"
+DRAIN_FUNCTION = "drain_admin_metrics_queue"
+
+HLL_PRECISION = 12
+HLL_REGISTERS = 1 << HLL_PRECISION
+_RANK_BITS = 64 - HLL_PRECISION
+
+
+class HyperLogLog:
+    """Distinct-count sketch, register-compatible with admin_metrics_hll_slot()"""
+    __slots__ = ("registers",)
+
+    def __init__(self, registers: bytes = None):
+        self.registers = bytearray(registers or bytes(HLL_REGISTERS))
+        if len(self.registers) != HLL_REGISTERS:
+            raise ValueError(f"expected {HLL_REGISTERS} registers, got {len(self.registers)}")
+
+    @classmethod
+    def from_postgres(cls, value: Optional[str]) -> "HyperLogLog":
+        """Registers as PostgREST returns a bytea column ('\\x00ff...')"""
+        if not value:
+            return cls()
+        return cls(bytes.fromhex(value[2:] if value.startswith("\\x") else value))
+
+    def add(self, item) -> None:
+        digest = int(hashlib.md5(str(item).encode("utf-8")).hexdigest()[:16], 16)
+        slot = digest >> _RANK_BITS
+        rank = _RANK_BITS + 1 - (digest & ((1 << _RANK_BITS) - 1)).bit_length()
+        if rank > self.registers[slot]:
+            self.registers[slot] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def count(self) -> int:
+        m = HLL_REGISTERS
+        estimate = (0.7213 / (1 + 1.079 / m)) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small sets
+        return int(round(estimate))
+
+
+def summarize(rows: Iterable[Dict], feature: str, statuses: Iterable[str] = None) -> Dict:
+    """
+    Add up rollup rows of one feature
+
+    Args:
+        rows: Rows from totals() or daily()
+        feature: Feature name; 'bank' also matches every 'bank:<transaction_type>'
+        statuses: Only count these statuses (all when None)
+    """
+    statuses = set(statuses) if statuses is not None else None
+    result = {"transaction_count": 0, "volume": 0.0, "revenue": 0.0}
+    for row in rows:
+        if row["feature"] != feature and not row["feature"].startswith(feature + ":"):
+            continue
+        if statuses is not None and row.get("status", "") not in statuses:
+            continue
+        result["transaction_count"] += int(row.get("transaction_count") or 0)
+        result["volume"] += float(row.get("volume") or 0)
+        result["revenue"] += float(row.get("revenue") or 0)
+    return result
+
+
+def today() -> date:
+    """The current rollup day (UTC)"""
+    return datetime.utcnow().date()
+
+
+class MetricsRollup:
+    """Reads of the admin metrics rollups, cached briefly"""
+
+    def __init__(self, supabase=None, cache_ttl: float = ADMIN_METRICS_CACHE_TTL):
+        self._supabase = supabase
+        self.cache_ttl = cache_ttl
+        self._cache: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+        self._drained_at = float("-inf")
+        self._stats = {"queries": 0, "cache_hits": 0, "errors": 0, "backfills": 0,
+                       "drains": 0, "drained_rows": 0, "drain_errors": 0}
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            from utils.supabase_client import get_supabase_client
+            self._supabase = get_supabase_client()
+        return self._supabase
+
+    def _cached(self, key: tuple, load):
+        now = time.monotonic()
+        with self._lock:
+            hit = self._cache.get(key)
+            if hit and now - hit[0] < self.cache_ttl:
+                self._stats["cache_hits"] += 1
+                return hit[1]
+        self._drain()
+        try:
+            value = load()
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            logger.error(f"❌ Admin metrics rollup read failed ({key[0]}): {e} - "
+                         f"is admin_metrics_rollup.sql installed?")
+            raise
+        with self._lock:
+            self._stats["queries"] += 1
+            self._cache[key] = (now, value)
+        return value
+
+    def _drain(self):
+        """Fold queued writes into the rollups before a fresh read (at most once per TTL)"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._drained_at < self.cache_ttl:
+                return
+            self._drained_at = now
+        try:
+            drained = self.supabase.rpc(DRAIN_FUNCTION, {}).execute().data
+        except Exception as e:
+            with self._lock:
+                self._stats["drain_errors"] += 1
+            logger.warning(f"⚠️ Admin metrics queue not drained ({e}) - report may lag recent writes")
+            return
+        with self._lock:
+            self._stats["drains"] += 1
+            self._stats["drained_rows"] += int(drained or 0)
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+
+    # =================== READS ===================
+
+    def totals(self) -> List[Dict]:
+        """All-time rows, one per (feature, status)"""
+        return self._cached(("totals",), lambda: self.supabase.table(TOTALS_TABLE)
+                            .select("feature, status, transaction_count, volume, revenue")
+                            .execute().data or [])
+
+    def daily(self, start: date, end: date) -> List[Dict]:
+        """Rows for the days from start to end (inclusive), one per (day, feature, status)"""
+        return self._cached(("daily", start, end), lambda: self.supabase.table(DAILY_TABLE)
+                            .select("day, feature, status, transaction_count, volume, revenue")
+                            .gte("day", start.isoformat()).lte("day", end.isoformat())
+                            .execute().data or [])
+
+    def active_users(self, start: date, end: date) -> int:
+        """Estimated distinct users with a transaction between start and end (inclusive)"""
+        def load():
+            rows = self.supabase.table(ACTIVE_USERS_TABLE).select("registers") \
+                .gte("day", start.isoformat()).lte("day", end.isoformat()).execute().data or []
+            sketch = HyperLogLog()
+            for row in rows:
+                sketch.merge(HyperLogLog.from_postgres(row["registers"]))
+            return sketch.count()
+
+        return self._cached(("active_users", start, end), load)
+
+    # =================== BACKFILL ===================
+
+    def backfill(self) -> List[Dict]:
+        """Rebuild the rollups from the source tables; returns the new totals"""
+        logger.info("♻️ Rebuilding admin metrics rollups from history")
+        self.supabase.rpc(BACKFILL_FUNCTION, {}).execute()
+        with self._lock:
+            self._stats["backfills"] += 1
+        self.invalidate()
+        return self.totals()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "cached_reads": len(self._cache), "cache_ttl": self.cache_ttl}
+
+
+# Global rollup reader
+admin_metrics = MetricsRollup()
+
+
+if __name__ == "__main__":
+    # python -m utils.admin_metrics  (for histories too large for an API call,
+    # run SELECT backfill_admin_metrics(); in the Supabase SQL editor instead)
+    logging.basicConfig(level=logging.INFO)
+    for row in sorted(admin_metrics.backfill(), key=lambda row: (row["feature"], row["status"])):
+        print(f"{row['feature']:24} {row['status'] or '-':12} {row['transaction_count']:>10} "
+              f"₦{float(row['volume']):>16,.2f} ₦{float(row['revenue']):>14,.2f}")
@@ -13,7 +13,7 @@ import logging
 from datetime import datetime, timedelta
 from decimal import Decimal
 from typing import Dict, List, Optional
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +22,7 @@ class AdminProfitManager:
     
     def __init__(self):
         """Initialize with Supabase connection and admin security"""
-        self.supabase = create_client(
+        self.supabase = get_supabase_client(
             os.getenv("SUPABASE_URL"),
             os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
         )
@@ -2,10 +2,14 @@
 
 import requests
 import os
+import time
 import logging
 import socket
 from typing import Dict, Optional
 from dotenv import load_dotenv
+from urllib3.exceptions import NewConnectionError
+
+from utils.airtime_endpoints import ALTERNATIVE_ENDPOINTS, airtime_endpoints
 
 # Load environment variables
 load_dotenv()
@@ -17,13 +21,23 @@ NELLOBYTES_USERID = os.getenv("NELLOBYTES_USERID")
 NELLOBYTES_APIKEY = os.getenv("NELLOBYTES_APIKEY")
 NELLOBYTES_BASE_URL = "https://clubkonnect.com"  # Updated to correct domain
 
-# Alternative endpoints for testing
-ALTERNATIVE_ENDPOINTS = [
-    "https://clubkonnect.com",
-    "https://www.clubkonnect.com",  
-    "http://clubkonnect.com",  # HTTP fallback
-    "http://www.clubkonnect.com",
-]
+PURCHASE_TIMEOUT = (3.05, 30)  # (connect, read): a dead endpoint is skipped in seconds
+# Gateway refusals that are safe to retry elsewhere with the same ref. A 504
+# is not among them: the gateway may have forwarded the purchase and only
+# timed out waiting for the answer.
+FAILOVER_STATUSES = frozenset({502, 503})
+
+
+def _not_sent(error: requests.RequestException) -> bool:
+    """True if the request failed before it was sent: connect timeout, DNS failure or refused connection"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.exceptions.ConnectionError) or isinstance(error, requests.exceptions.ProxyError):
+        return False
+    reason = error.args[0] if error.args else None
+    # requests wraps urllib3's MaxRetryError; NameResolutionError is a NewConnectionError
+    reason = getattr(reason, "reason", reason)
+    return isinstance(reason, NewConnectionError)
 
 class AirtimeAPI:
     """Handle airtime and data purchases via Nellobytes API"""
@@ -55,33 +69,47 @@ class AirtimeAPI:
             return False
     
     def get_working_endpoint(self) -> Optional[str]:
-        """Find a working endpoint from available alternatives"""
-        
-        # Use the corrected ALTERNATIVE_ENDPOINTS from the top of the file
-        # which now correctly point to clubkonnect.com
-        for endpoint in ALTERNATIVE_ENDPOINTS:
-            domain = endpoint.replace('https://', '').replace('http://', '')
-            
-            # Test DNS resolution first
-            if not self.test_dns_resolution(domain):
-                logger.debug(f"DNS resolution failed for {domain}")
-                continue
-                
-            # Test basic connectivity
-            if self.test_connection(endpoint):
-                logger.info(f"Using working endpoint: {endpoint}")
-                return endpoint
+        """Best endpoint from the background health monitor (no network call)"""
+        endpoint = airtime_endpoints.best()
+        if not endpoint:
+            logger.error("All Clubkonnect endpoints failed their health checks - service appears to be down")
+        return endpoint
+    
+    def _purchase_request(self, path: str, params: Dict) -> requests.Response:
+        """
+        GET a purchase API on the best endpoint, failing over to the next one
+        only when the request was provably not sent (connect timeout, DNS
+        failure, refused connection) or was refused with a 502/503
         
-        # If no endpoints work, log comprehensive error
-        logger.error("All Clubkonnect endpoints failed - service appears to be down")
-        logger.error("This indicates either:")
-        logger.error("1. Clubkonnect API is experiencing issues")
-        logger.error("2. Network connectivity problems")
-        logger.error("3. DNS server problems")
-        logger.error("4. API endpoint path may be incorrect")
+        The same ref goes to every endpoint, so the provider can reject a
+        repeat. Read timeouts, dropped connections and 504s are not failed
+        over: the purchase may have gone through.
         
-        return None
-
+        Raises:
+            requests.RequestException: The last endpoint's error
+        """
+        candidates = airtime_endpoints.candidates()
+        last_error = requests.exceptions.ConnectionError("All airtime endpoints are down")
+        for endpoint in candidates:
+            started = time.perf_counter()
+            try:
+                response = requests.get(f"{endpoint}{path}", params=params, timeout=PURCHASE_TIMEOUT)
+            except requests.exceptions.RequestException as e:
+                airtime_endpoints.report(endpoint, False, (time.perf_counter() - started) * 1000, str(e))
+                if not _not_sent(e):
+                    raise
+                logger.warning(f"Airtime endpoint {endpoint} unreachable, failing over: {e}")
+                last_error = e
+                continue
+            latency_ms = (time.perf_counter() - started) * 1000
+            if response.status_code in FAILOVER_STATUSES and endpoint != candidates[-1]:
+                airtime_endpoints.report(endpoint, False, latency_ms, f"HTTP {response.status_code}")
+                logger.warning(f"Airtime endpoint {endpoint} returned {response.status_code}, failing over")
+                continue
+            airtime_endpoints.report(endpoint, response.status_code < 500, latency_ms)
+            return response
+        raise last_error
+    
     def get_network_code(self, network_name: str) -> Optional[str]:
         """Get network code for Nellobytes API"""
         network_codes = {
@@ -121,9 +149,8 @@ class AirtimeAPI:
                     "error_code": "INVALID_NETWORK"
                 }
             
-            # Find working endpoint
-            working_endpoint = self.get_working_endpoint()
-            if not working_endpoint:
+            # Best endpoint known to be up (from the background health monitor)
+            if not self.get_working_endpoint():
                 return {
                     "success": False,
                     "message": "Airtime service is temporarily unavailable. Please try again later.",
@@ -136,8 +163,6 @@ class AirtimeAPI:
             elif phone_number.startswith("234"):
                 phone_number = "0" + phone_number[3:]
             
-            url = f"{working_endpoint}/airtime_api.php"
-            
             params = {
                 "userid": self.user_id,
                 "pass": self.api_key,
@@ -147,10 +172,10 @@ class AirtimeAPI:
                 "ref": f"SOFI{int(os.urandom(4).hex(), 16)}"  # Random reference
             }
             
-            logger.info(f"Purchasing ₦{amount} {network_code} airtime for {phone_number} via {working_endpoint}")
+            logger.info(f"Purchasing ₦{amount} {network_code} airtime for {phone_number}")
             
-            # Make request with enhanced error handling
-            response = requests.get(url, params=params, timeout=30)
+            # Make request on the best endpoint, failing over if it is unreachable
+            response = self._purchase_request("/airtime_api.php", params)
             
             if response.status_code == 200:
                 # Nellobytes returns plain text response
@@ -237,9 +262,8 @@ class AirtimeAPI:
                     "error_code": "INVALID_NETWORK"
                 }
             
-            # Find working endpoint
-            working_endpoint = self.get_working_endpoint()
-            if not working_endpoint:
+            # Best endpoint known to be up (from the background health monitor)
+            if not self.get_working_endpoint():
                 return {
                     "success": False,
                     "message": "Data service is temporarily unavailable. Please try again later.",
@@ -252,8 +276,6 @@ class AirtimeAPI:
             elif phone_number.startswith("234"):
                 phone_number = "0" + phone_number[3:]
             
-            url = f"{working_endpoint}/data_api.php"
-            
             params = {
                 "userid": self.user_id,
                 "pass": self.api_key,
@@ -263,9 +285,9 @@ class AirtimeAPI:
                 "ref": f"SOFI{int(os.urandom(4).hex(), 16)}"
             }
             
-            logger.info(f"Purchasing {data_plan} data for {phone_number} on {network_code} via {working_endpoint}")
+            logger.info(f"Purchasing {data_plan} data for {phone_number} on {network_code}")
             
-            response = requests.get(url, params=params, timeout=30)
+            response = self._purchase_request("/data_api.php", params)
             
             if response.status_code == 200:
                 response_text = response.text.strip()
@@ -0,0 +1,218 @@
+"""
+Sofi AI Airtime Endpoint Monitor
+Background health checks and ranking for the Clubkonnect (Nellobytes) endpoints
+
+Every airtime or data purchase used to call get_working_endpoint() first,
+which walked ALTERNATIVE_ENDPOINTS with a blocking DNS lookup and a
+requests.head(timeout=10) each, so a slow or dead mirror could add tens of
+seconds before the real API call.
+
+The monitor probes every endpoint from a background thread every
+AIRTIME_PROBE_INTERVAL seconds and ranks them by the recent window of
+outcomes: endpoints that failed their last DOWN_AFTER checks go last, then
+by error rate, then by median latency. Purchases feed their own outcomes
+back in, so a failing endpoint drops in the ranking before its next probe.
+Picking an endpoint never touches the network.
+
+Set AIRTIME_ENDPOINTS (comma separated) to point purchases at a local stub
+provider, as benchmark_airtime_endpoints.py does.
+"""
+
+import os
+import time
+import logging
+import statistics
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+AIRTIME_PROBE_INTERVAL = float(os.getenv("AIRTIME_PROBE_INTERVAL", "30"))
+PROBE_TIMEOUT = (3.05, 5)  # (connect, read) seconds per probe
+WINDOW = 20  # recent outcomes kept per endpoint
+DOWN_AFTER = 2  # consecutive failures that mark an endpoint down
+
+# Clubkonnect mirrors, in order of preference
+ALTERNATIVE_ENDPOINTS = [
+    "https://clubkonnect.com",
+    "https://www.clubkonnect.com",
+    "http://clubkonnect.com",  # HTTP fallback
+    "http://www.clubkonnect.com",
+]
+
+
+class _EndpointHealth:
+    __slots__ = ("outcomes", "consecutive_failures", "last_error", "last_checked")
+
+    def __init__(self):
+        self.outcomes: "deque[tuple]" = deque(maxlen=WINDOW)  # (ok, latency_ms)
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.last_checked = 0.0
+
+    def record(self, ok: bool, latency_ms: float, error: str = None):
+        self.outcomes.append((ok, latency_ms))
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+        self.last_error = None if ok else error
+        self.last_checked = time.time()
+
+    @property
+    def down(self) -> bool:
+        return self.consecutive_failures >= DOWN_AFTER
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(not ok for ok, _ in self.outcomes) / len(self.outcomes)
+
+    @property
+    def latency_ms(self) -> Optional[float]:
+        latencies = [latency for ok, latency in self.outcomes if ok]
+        return statistics.median(latencies) if latencies else None
+
+    def rank_key(self, position: int) -> tuple:
+        latency = self.latency_ms
+        # Unprobed endpoints keep their configured order, behind measured healthy ones
+        return (self.down, round(self.error_rate, 1), latency is None,
+                latency if latency is not None else 0.0, position)
+
+
+class AirtimeEndpointMonitor:
+    """Ranks provider endpoints from background probes and purchase outcomes"""
+
+    def __init__(self, endpoints: List[str], probe_interval: float = AIRTIME_PROBE_INTERVAL,
+                 probe_path: str = "/"):
+        self.endpoints = [endpoint.rstrip("/") for endpoint in endpoints]
+        self.probe_interval = probe_interval
+        self.probe_path = probe_path
+        self._health: Dict[str, _EndpointHealth] = {endpoint: _EndpointHealth() for endpoint in self.endpoints}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._prober_pid = None
+        self._stats = {"probes": 0, "probe_failures": 0, "reported": 0, "request_failures": 0}
+
+    # =================== RANKING ===================
+
+    def ranked(self) -> List[str]:
+        """All endpoints, best first (down ones last)"""
+        self._ensure_prober()
+        with self._lock:
+            return self._ranked_locked()
+
+    def _ranked_locked(self) -> List[str]:
+        order = sorted(enumerate(self.endpoints), key=lambda item: self._health[item[1]].rank_key(item[0]))
+        return [endpoint for _, endpoint in order]
+
+    def candidates(self) -> List[str]:
+        """Endpoints not known to be down, best first"""
+        ranked = self.ranked()
+        with self._lock:
+            return [endpoint for endpoint in ranked if not self._health[endpoint].down]
+
+    def best(self) -> Optional[str]:
+        """The best endpoint not known to be down, or None"""
+        candidates = self.candidates()
+        return candidates[0] if candidates else None
+
+    def report(self, endpoint: str, ok: bool, latency_ms: float, error: str = None):
+        """Outcome of a real request; a failure wakes the prober early"""
+        with self._lock:
+            health = self._health.get(endpoint.rstrip("/"))
+            if health is None:
+                return
+            health.record(ok, latency_ms, error)
+            self._stats["reported"] += 1
+            self._stats["request_failures"] += not ok
+        if not ok:
+            self._wake.set()
+
+    # =================== PROBER ===================
+
+    def _ensure_prober(self):
+        with self._lock:
+            if self._prober_pid == os.getpid():
+                return
+            self._prober_pid = os.getpid()
+        threading.Thread(target=self._run, name="airtime-endpoint-probe", daemon=True).start()
+
+    def _run(self):
+        while True:
+            self.probe_all()
+            self._wake.wait(self.probe_interval)
+            self._wake.clear()
+
+    def probe_all(self):
+        """Check every endpoint once (in parallel, so one hung host delays nothing)"""
+        threads = [threading.Thread(target=self.probe, args=(endpoint,), daemon=True)
+                   for endpoint in self.endpoints]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(sum(PROBE_TIMEOUT) + 1)
+
+    def probe(self, endpoint: str) -> bool:
+        """One HEAD request (DNS, connect and response); anything below 500 is healthy"""
+        started = time.perf_counter()
+        error = None
+        try:
+            response = requests.head(f"{endpoint}{self.probe_path}", timeout=PROBE_TIMEOUT,
+                                     allow_redirects=False)
+            ok = response.status_code < 500
+            if not ok:
+                error = f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            ok, error = False, str(e)
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            health = self._health[endpoint]
+            was_down = health.down
+            health.record(ok, latency_ms, error)
+            self._stats["probes"] += 1
+            self._stats["probe_failures"] += not ok
+            if health.down and not was_down:
+                logger.warning(f"⚠️ Airtime endpoint {endpoint} is down: {error}")
+            elif was_down and ok:
+                logger.info(f"✅ Airtime endpoint {endpoint} is back up")
+        return ok
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "prober_running": self._prober_pid == os.getpid(),
+                "ranking": self._ranked_locked(),
+                "endpoints": {
+                    endpoint: {
+                        "down": health.down,
+                        "error_rate": round(health.error_rate, 2),
+                        "latency_ms": round(health.latency_ms, 1) if health.latency_ms is not None else None,
+                        "last_error": health.last_error,
+                    }
+                    for endpoint, health in self._health.items()
+                },
+            }
+
+
+def _after_fork_in_child():
+    # The prober thread belongs to the parent; the next ranking restarts it
+    airtime_endpoints._lock = threading.Lock()
+    airtime_endpoints._wake = threading.Event()
+
+
+def _configured_endpoints() -> List[str]:
+    configured = os.getenv("AIRTIME_ENDPOINTS")
+    if configured:
+        return [endpoint.strip() for endpoint in configured.split(",") if endpoint.strip()]
+    return list(ALTERNATIVE_ENDPOINTS)
+
+
+# Global monitor
+airtime_endpoints = AirtimeEndpointMonitor(_configured_endpoints())
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,368 @@
+"""
+Sofi AI Assistant Run Driver
+Event-driven OpenAI Assistant runs with per-run latency breakdowns
+
+Runs are driven from the Assistants streaming events: tool calls execute the
+moment `thread.run.requires_action` arrives and the reply is taken from
+`thread.message.completed`, so no reply waits on a polling interval. When
+streaming is disabled or the stream breaks mid-run, an async poller with
+adaptive backoff (100ms growing to 1s) takes over without blocking the loop.
+Outputs are kept by tool_call id, so a poller that finds the run still
+waiting on calls the stream already executed resubmits them instead of
+running a tool (e.g. send_money) a second time.
+
+Every run reports where its time went:
+    queue  - run created until the model starts (queued -> in_progress)
+    model  - time the model spent generating
+    tool   - time spent executing our functions
+    submit - submitting tool outputs until the run resumes
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import threading
+import weakref
+from dataclasses import dataclass, field, asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled", "expired", "incomplete")
+# Run lifecycle events only; thread.run.step.* events carry step statuses
+TERMINAL_EVENTS = frozenset(f"thread.run.{status}" for status in TERMINAL_STATUSES)
+RUN_TIMEOUT_SECONDS = float(os.getenv("ASSISTANT_RUN_TIMEOUT", "30"))
+STREAMING_ENABLED = os.getenv("ASSISTANT_STREAMING", "true").lower() != "false"
+
+POLL_INITIAL_DELAY = 0.1
+POLL_MAX_DELAY = 1.0
+POLL_BACKOFF = 1.5
+
+# tool_executor(function_name, function_args) -> JSON-serializable result
+ToolExecutor = Callable[[str, Dict[str, Any]], Awaitable[Any]]
+
+
+@dataclass
+class RunTimings:
+    """Per-run latency breakdown in milliseconds"""
+    queue_ms: float = 0.0
+    model_ms: float = 0.0
+    tool_ms: float = 0.0
+    submit_ms: float = 0.0
+    total_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {k: round(v, 1) for k, v in asdict(self).items()}
+
+
+@dataclass
+class RunResult:
+    """Outcome of a driven run"""
+    status: str
+    run_id: Optional[str] = None
+    text: Optional[str] = None
+    function_results: Dict[str, Any] = field(default_factory=dict)
+    tool_outputs: Dict[str, str] = field(default_factory=dict)  # tool_call id -> submitted output
+    timings: RunTimings = field(default_factory=RunTimings)
+    mode: str = "stream"
+    run: Any = None
+
+    @property
+    def completed(self) -> bool:
+        return self.status == "completed"
+
+
+class _RunClock:
+    """Accumulates phase timings while a run is driven"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queue_started: Optional[float] = None
+        self.timings = RunTimings()
+
+    def run_queued(self):
+        if self.queue_started is None:
+            self.queue_started = time.perf_counter()
+
+    def run_in_progress(self):
+        if self.queue_started is not None and self.timings.queue_ms == 0.0:
+            self.timings.queue_ms = (time.perf_counter() - self.queue_started) * 1000
+
+    def add(self, phase: str, started: float):
+        elapsed = (time.perf_counter() - started) * 1000
+        setattr(self.timings, f"{phase}_ms", getattr(self.timings, f"{phase}_ms") + elapsed)
+
+    def finish(self) -> RunTimings:
+        t = self.timings
+        t.total_ms = (time.perf_counter() - self.started) * 1000
+        t.model_ms = max(0.0, t.total_ms - t.queue_ms - t.tool_ms - t.submit_ms)
+        return t
+
+
+class AssistantRunDriver:
+    """Creates and drives Assistant runs to completion"""
+
+    def __init__(self, api_key: str = None, use_streaming: bool = STREAMING_ENABLED,
+                 timeout: float = RUN_TIMEOUT_SECONDS, client: Any = None):
+        self._api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self._client = client  # fixed client for every loop (tests)
+        # httpx async pools are tied to the loop that opened them
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+        self.use_streaming = use_streaming
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._totals = {"runs": 0, "streamed": 0, "polled": 0, "failed": 0,
+                        "queue_ms": 0.0, "model_ms": 0.0, "tool_ms": 0.0,
+                        "submit_ms": 0.0, "total_ms": 0.0}
+
+    @property
+    def client(self):
+        """Async client (openai.AsyncOpenAI) for the running event loop"""
+        if self._client is not None:
+            return self._client
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._clients.get(loop)
+            if client is None:
+                # Imported on first use; the SDK takes about a second to load
+                from openai import AsyncOpenAI
+                client = AsyncOpenAI(api_key=self._api_key)
+                self._clients[loop] = client
+            return client
+
+    # =================== PUBLIC API ===================
+
+    async def run(self, thread_id: str, assistant_id: str, tool_executor: ToolExecutor,
+                  additional_messages: List[Dict[str, Any]] = None) -> RunResult:
+        """
+        Start a run on a thread and drive it to a terminal state
+
+        Args:
+            thread_id: Assistant thread
+            assistant_id: Assistant to run
+            tool_executor: Coroutine executing one function call
+            additional_messages: User messages added in the same request as the run
+        """
+        from openai import NotFoundError
+
+        clock = _RunClock()
+        result = RunResult(status="unknown")
+        create_kwargs = {"thread_id": thread_id, "assistant_id": assistant_id}
+        if additional_messages:
+            create_kwargs["additional_messages"] = additional_messages
+
+        try:
+            # One deadline covers the stream and any polling fallback
+            await asyncio.wait_for(
+                self._drive(create_kwargs, tool_executor, clock, result),
+                timeout=self.timeout,
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"⏰ Assistant run {result.run_id} timed out after {self.timeout}s")
+            result.status = "timeout"
+        except NotFoundError:
+            # Thread was deleted on OpenAI's side; callers start a new one
+            logger.warning(f"⚠️ Assistant thread {thread_id} no longer exists")
+            result.status = "thread_not_found"
+        except Exception as e:
+            logger.error(f"❌ Assistant run error on thread {thread_id}: {e}")
+            result.status = "error"
+
+        if result.completed and result.text is None:
+            result.text = await self._latest_reply(thread_id)
+
+        result.timings = clock.finish()
+        self._record(result)
+        logger.info(f"⏱️ Run {result.run_id} {result.status} via {result.mode}: {result.timings.to_dict()}")
+        return result
+
+    async def wait_for_run(self, thread_id: str, run_id: str,
+                           tool_executor: ToolExecutor = None) -> RunResult:
+        """Drive an already-created run with the adaptive poller"""
+        clock = _RunClock()
+        clock.run_queued()
+        result = RunResult(status="unknown", run_id=run_id, mode="poll")
+        try:
+            await asyncio.wait_for(
+                self._poll(thread_id, run_id, tool_executor, clock, result),
+                timeout=self.timeout,
+            )
+        except asyncio.TimeoutError:
+            result.status = "timeout"
+        except Exception as e:
+            logger.error(f"❌ Error waiting for run {run_id}: {e}")
+            result.status = "error"
+        result.timings = clock.finish()
+        self._record(result)
+        return result
+
+    async def _drive(self, create_kwargs: Dict, tool_executor: ToolExecutor,
+                     clock: _RunClock, result: RunResult):
+        thread_id = create_kwargs["thread_id"]
+        if self.use_streaming:
+            try:
+                await self._drive_stream(create_kwargs, tool_executor, clock, result)
+                return
+            except Exception as e:
+                if not result.run_id:
+                    raise
+                # Stream broke mid-run - keep driving the same run by polling
+                logger.warning(f"⚠️ Run stream for {result.run_id} failed ({e}); falling back to polling")
+                result.mode = "poll"
+                await self._poll(thread_id, result.run_id, tool_executor, clock, result)
+        else:
+            result.mode = "poll"
+            clock.run_queued()
+            run = await self.client.beta.threads.runs.create(**create_kwargs)
+            result.run_id = run.id
+            await self._poll(thread_id, run.id, tool_executor, clock, result)
+
+    # =================== STREAMING ===================
+
+    async def _drive_stream(self, create_kwargs: Dict, tool_executor: ToolExecutor,
+                            clock: _RunClock, result: RunResult):
+        thread_id = create_kwargs["thread_id"]
+        stream = await self.client.beta.threads.runs.create(stream=True, **create_kwargs)
+        submit_started: Optional[float] = None
+
+        while stream is not None:
+            next_stream = None
+            async for event in stream:
+                if submit_started is not None:
+                    clock.add("submit", submit_started)
+                    submit_started = None
+
+                name = event.event
+                data = event.data
+
+                if name in ("thread.run.created", "thread.run.queued"):
+                    result.run_id = data.id
+                    clock.run_queued()
+                elif name == "thread.run.in_progress":
+                    clock.run_in_progress()
+                elif name == "thread.message.completed":
+                    text = self._message_text(data)
+                    if text:
+                        result.text = text
+                elif name == "thread.run.requires_action":
+                    result.run = data
+                    tool_outputs = await self._execute_tools(data, tool_executor, clock, result)
+                    submit_started = time.perf_counter()
+                    next_stream = await self.client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=thread_id, run_id=data.id,
+                        tool_outputs=tool_outputs, stream=True,
+                    )
+                    break
+                elif name in TERMINAL_EVENTS:
+                    result.run = data
+                    result.status = data.status
+                elif name == "error":
+                    raise RuntimeError(f"Assistant stream error: {data}")
+            stream = next_stream
+
+        if result.status == "unknown":
+            raise RuntimeError("Assistant stream ended without a terminal run event")
+
+    # =================== POLLING FALLBACK ===================
+
+    async def _poll(self, thread_id: str, run_id: str, tool_executor: Optional[ToolExecutor],
+                    clock: _RunClock, result: RunResult):
+        delay = POLL_INITIAL_DELAY
+        while True:
+            run = await self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            result.run = run
+
+            if run.status == "in_progress":
+                clock.run_in_progress()
+            elif run.status in TERMINAL_STATUSES:
+                result.status = run.status
+                return
+            elif run.status == "requires_action":
+                if tool_executor is None:
+                    # Someone else owns this run; just wait for it
+                    pass
+                else:
+                    clock.run_in_progress()
+                    tool_outputs = await self._execute_tools(run, tool_executor, clock, result)
+                    submit_started = time.perf_counter()
+                    await self.client.beta.threads.runs.submit_tool_outputs(
+                        thread_id=thread_id, run_id=run_id, tool_outputs=tool_outputs,
+                    )
+                    clock.add("submit", submit_started)
+                    delay = POLL_INITIAL_DELAY
+                    continue
+
+            await asyncio.sleep(delay)
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+
+    # =================== HELPERS ===================
+
+    async def _execute_tools(self, run: Any, tool_executor: ToolExecutor,
+                             clock: _RunClock, result: RunResult) -> List[Dict[str, str]]:
+        """Execute every requested function call in order (each tool_call id only once)"""
+        tool_started = time.perf_counter()
+        tool_outputs = []
+        for tool_call in run.required_action.submit_tool_outputs.tool_calls:
+            if tool_call.id in result.tool_outputs:
+                logger.info(f"🔁 Resubmitting output of {tool_call.function.name} ({tool_call.id})")
+                tool_outputs.append({"tool_call_id": tool_call.id, "output": result.tool_outputs[tool_call.id]})
+                continue
+            function_name = tool_call.function.name
+            try:
+                function_args = json.loads(tool_call.function.arguments or "{}")
+                logger.info(f"🔧 Executing function: {function_name}")
+                output = await tool_executor(function_name, function_args)
+                result.function_results[function_name] = output
+            except Exception as e:
+                logger.error(f"❌ Error executing function {function_name}: {e}")
+                output = {"error": str(e)}
+            result.tool_outputs[tool_call.id] = json.dumps(output, default=str)
+            tool_outputs.append({
+                "tool_call_id": tool_call.id,
+                "output": result.tool_outputs[tool_call.id],
+            })
+        clock.add("tool", tool_started)
+        return tool_outputs
+
+    async def _latest_reply(self, thread_id: str) -> Optional[str]:
+        try:
+            messages = await self.client.beta.threads.messages.list(
+                thread_id=thread_id, order="desc", limit=1
+            )
+            if messages.data and messages.data[0].role == "assistant":
+                return self._message_text(messages.data[0])
+        except Exception as e:
+            logger.error(f"❌ Error fetching assistant reply: {e}")
+        return None
+
+    @staticmethod
+    def _message_text(message: Any) -> Optional[str]:
+        for part in getattr(message, "content", None) or []:
+            text = getattr(part, "text", None)
+            if text is not None and getattr(text, "value", None):
+                return text.value
+        return None
+
+    def _record(self, result: RunResult):
+        with self._lock:
+            self._totals["runs"] += 1
+            self._totals["streamed" if result.mode == "stream" else "polled"] += 1
+            if not result.completed:
+                self._totals["failed"] += 1
+            for phase, value in result.timings.to_dict().items():
+                self._totals[phase] += value
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Aggregate run counts and average latency per phase"""
+        with self._lock:
+            runs = self._totals["runs"]
+            stats = {k: self._totals[k] for k in ("runs", "streamed", "polled", "failed")}
+            for phase in ("queue_ms", "model_ms", "tool_ms", "submit_ms", "total_ms"):
+                stats[f"avg_{phase}"] = round(self._totals[phase] / runs, 1) if runs else 0.0
+            return stats
+
+
+# Global run driver shared by the assistant implementations
+run_driver = AssistantRunDriver()
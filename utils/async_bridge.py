@@ -0,0 +1,195 @@
+"""
+Sofi AI Async Bridge
+One long-lived event loop per worker process, shared by every sync caller
+
+Flask routes are synchronous. Calling asyncio.run() in each one built and tore
+down a fresh event loop per request, so nothing bound to a loop (HTTP
+sessions, async OpenAI clients, connection pools) outlived the request that
+created it. The bridge runs a single loop on a dedicated daemon thread per
+worker; routes hand coroutines to it with submit()/run() and block on the
+result, and the webhook queue's workers live on the same loop.
+
+Coroutines run on the bridge thread, so they must not call run() themselves
+(that would wait on the loop it is blocking); await the coroutine instead.
+Every coroutine of the worker shares that one thread, so blocking calls made
+from a coroutine (sync Supabase, requests, the sync OpenAI client) go through
+run_blocking(), which runs them on a bounded pool of ASYNC_BRIDGE_BLOCKING_WORKERS
+threads while the loop keeps serving other messages. Coroutines that block
+internally (the assistant's money tools: sync Supabase and Paystack calls,
+retry sleeps) go through run_isolated(), which gives each call its own
+short-lived loop on that pool, as asyncio.run() in a request thread used to.
+Routes whose handlers are built the same way (PIN confirmation, Paystack
+webhooks, onboarding) use run_async_isolated() and keep off the shared loop.
+"""
+
+import os
+import time
+import atexit
+import asyncio
+import logging
+import threading
+import functools
+import concurrent.futures
+from typing import Any, Callable, Coroutine, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+BLOCKING_WORKERS = int(os.getenv("ASYNC_BRIDGE_BLOCKING_WORKERS", "32"))
+
+
+class AsyncBridge:
+    """Per-process event loop thread with a thread-safe submit() bridge"""
+
+    def __init__(self, name: str = "async-bridge", blocking_workers: int = BLOCKING_WORKERS):
+        self.name = name
+        self.blocking_workers = blocking_workers
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._pid = None
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "blocking_calls": 0, "total_run_ms": 0.0}
+
+    # =================== LIFECYCLE ===================
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The running bridge loop, started on first use (and again after fork)"""
+        with self._lock:
+            if self._pid != os.getpid() or not (self._thread and self._thread.is_alive()):
+                self._start_locked()
+            return self._loop
+
+    def _start_locked(self):
+        # A forked child inherits the parent's loop object but not its thread
+        self._pid = os.getpid()
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "blocking_calls": 0, "total_run_ms": 0.0}
+        self._loop = asyncio.new_event_loop()
+        # Also the loop's default executor, so run_in_executor(None, ...) shares the bound
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.blocking_workers, thread_name_prefix=f"{self.name}-blocking"
+        )
+        self._loop.set_default_executor(self._executor)
+        ready = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run_loop, args=(self._loop, ready), name=self.name, daemon=True
+        )
+        self._thread.start()
+        ready.wait(timeout=5)
+        logger.info(f"🔁 Event loop bridge started in process {self._pid}")
+
+    @staticmethod
+    def _run_loop(loop: asyncio.AbstractEventLoop, ready: threading.Event):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(ready.set)
+        loop.run_forever()
+
+    def in_loop_thread(self) -> bool:
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def shutdown(self, timeout: float = 5):
+        """Cancel outstanding tasks and stop the loop thread"""
+        with self._lock:
+            if self._pid != os.getpid() or not (self._thread and self._thread.is_alive()):
+                return
+            loop, thread = self._loop, self._thread
+            self._thread = None
+
+        async def _cancel_tasks():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(_cancel_tasks(), loop).result(timeout=timeout)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=timeout)
+        self._executor.shutdown(wait=False)
+        logger.info("🔁 Event loop bridge stopped")
+
+    # =================== BRIDGE ===================
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Schedule a coroutine on the bridge loop from any thread"""
+        loop = self.loop
+        started = time.time()
+        with self._lock:
+            self._stats["submitted"] += 1
+        future = asyncio.run_coroutine_threadsafe(coro, loop)
+
+        def _done(f: concurrent.futures.Future):
+            with self._lock:
+                failed = f.cancelled() or f.exception() is not None
+                self._stats["failed" if failed else "completed"] += 1
+                self._stats["total_run_ms"] += (time.time() - started) * 1000
+
+        future.add_done_callback(_done)
+        return future
+
+    def run(self, coro: Coroutine, timeout: float = None) -> Any:
+        """
+        Run a coroutine on the bridge loop and wait for its result
+
+        Drop-in replacement for asyncio.run() in sync code. Raises
+        RuntimeError when called from the bridge thread itself.
+        """
+        if self.in_loop_thread():
+            coro.close()
+            raise RuntimeError("AsyncBridge.run() called from the bridge loop; await the coroutine instead")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    async def run_blocking(self, func: Callable, *args, **kwargs) -> Any:
+        """Await a blocking call on the bounded pool instead of stalling the running loop"""
+        with self._lock:
+            self._stats["blocking_calls"] += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
+
+    async def run_isolated(self, coro_func: Callable[..., Coroutine], *args, **kwargs) -> Any:
+        """Await a coroutine that blocks internally, on its own loop in the bounded pool"""
+        return await self.run_blocking(lambda: asyncio.run(coro_func(*args, **kwargs)))
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = self._pid == os.getpid() and bool(self._thread and self._thread.is_alive())
+            done = self._stats["completed"] + self._stats["failed"]
+            return {
+                "running": running,
+                "in_flight": self._stats["submitted"] - done,
+                **{k: v for k, v in self._stats.items() if not k.startswith("total_")},
+                "blocking_workers": self.blocking_workers,
+                "avg_run_ms": round(self._stats["total_run_ms"] / done, 2) if done else 0.0,
+            }
+
+
+# Global bridge (the loop thread starts lazily on first use)
+async_bridge = AsyncBridge()
+atexit.register(async_bridge.shutdown)
+
+
+def run_async(coro: Coroutine, timeout: float = None) -> Any:
+    """Run a coroutine on this worker's shared event loop (sync callers only)"""
+    return async_bridge.run(coro, timeout=timeout)
+
+
+def run_async_isolated(coro: Coroutine) -> Any:
+    """Run a coroutine that blocks internally on the calling thread's own loop (sync callers only)"""
+    return asyncio.run(coro)
+
+
+async def run_blocking(func: Callable, *args, **kwargs) -> Any:
+    """Call a blocking function from a coroutine without holding up the event loop"""
+    return await async_bridge.run_blocking(func, *args, **kwargs)
+
+
+async def run_isolated(coro_func: Callable[..., Coroutine], *args, **kwargs) -> Any:
+    """Call a coroutine function that makes blocking calls without holding up the event loop"""
+    return await async_bridge.run_isolated(coro_func, *args, **kwargs)
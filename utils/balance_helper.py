@@ -6,7 +6,9 @@ Provides clean balance checking functions that work with the existing system
 
 import logging
 import os
-from typing import Dict
+from typing import Dict, Optional
+
+from utils.balance_ledger import balance_ledger
 
 logger = logging.getLogger(__name__)
 
@@ -30,33 +32,13 @@ async def get_user_balance(chat_id: str, force_sync: bool = True) -> float:
             pass
         
         # Fallback to direct database query
-        from supabase import create_client
-        
-        client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        from utils.supabase_client import get_supabase_client
         
-        # Try telegram_chat_id first, then chat_id as fallback
-        result = client.table("virtual_accounts").select("balance, user_id").eq("telegram_chat_id", str(chat_id)).execute()
-        
-        if not result.data:
-            # Try with chat_id field as fallback
-            result = client.table("virtual_accounts").select("balance, user_id").eq("chat_id", str(chat_id)).execute()
+        client = get_supabase_client()
+        account = _find_virtual_account(client, chat_id, "balance, user_id")
         
-        if result.data:
-            current_balance = float(result.data[0].get("balance", 0))
-            user_id = result.data[0].get("user_id")
-            
-            if force_sync and user_id:
-                # Force sync balance from transactions if balance is 0
-                if current_balance == 0:
-                    synced_balance = await sync_balance_from_transactions(user_id)
-                    if synced_balance > 0:
-                        # Update the balance in virtual_accounts
-                        client.table("virtual_accounts").update({
-                            "balance": synced_balance
-                        }).eq("user_id", user_id).execute()
-                        return synced_balance
-            
-            return current_balance
+        if account:
+            return _account_balance(client, account, force_sync)
         else:
             logger.warning(f"No virtual account found for chat_id: {chat_id}")
             return 0.0
@@ -65,10 +47,46 @@ async def get_user_balance(chat_id: str, force_sync: bool = True) -> float:
         logger.error(f"Error getting user balance for {chat_id}: {e}")
         return 0.0
 
+def _find_virtual_account(client, chat_id: str, columns: str = "*") -> Optional[Dict]:
+    """Virtual account row by telegram_chat_id, falling back to chat_id"""
+    result = client.table("virtual_accounts").select(columns).eq("telegram_chat_id", str(chat_id)).execute()
+    
+    if not result.data:
+        # Try with chat_id field as fallback
+        result = client.table("virtual_accounts").select(columns).eq("chat_id", str(chat_id)).execute()
+    
+    return result.data[0] if result.data else None
+
+def _account_balance(client, account: Dict, force_sync: bool = True) -> float:
+    """Stored balance, or the ledger balance when the stored one reads 0"""
+    current_balance = float(account.get("balance", 0))
+    user_id = account.get("user_id")
+    
+    if force_sync and user_id and current_balance == 0:
+        try:
+            # Recomputed in full; None while handler-applied rows are unconfirmed
+            confirmed_balance = balance_ledger.confirmed_balance(user_id)
+            synced_balance = balance_ledger.get_balance(user_id)
+        except Exception as e:
+            logger.error(f"Error syncing balance from transactions for user {user_id}: {e}")
+            return current_balance
+        if confirmed_balance:
+            # Update the balance in virtual_accounts
+            client.table("virtual_accounts").update({
+                "balance": confirmed_balance
+            }).eq("user_id", user_id).execute()
+        if synced_balance > 0:
+            return synced_balance
+    
+    return current_balance
+
 async def sync_balance_from_transactions(user_id: str) -> float:
     """
     Calculate balance from transaction history
     
+    Reads only the transactions recorded since the ledger last saw this user
+    (see utils/balance_ledger.py).
+    
     Args:
         user_id: User ID
         
@@ -76,58 +94,42 @@ async def sync_balance_from_transactions(user_id: str) -> float:
         float: Calculated balance from transactions
     """
     try:
-        from supabase import create_client
-        
-        client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
-        
-        # Get all successful transactions for the user
-        credit_result = client.table("bank_transactions").select("amount").eq("user_id", user_id).eq("transaction_type", "credit").eq("status", "success").execute()
-        
-        debit_result = client.table("bank_transactions").select("amount").eq("user_id", user_id).eq("transaction_type", "debit").eq("status", "success").execute()
-        
-        total_credits = sum(float(tx.get("amount", 0)) for tx in credit_result.data)
-        total_debits = sum(float(tx.get("amount", 0)) for tx in debit_result.data)
-        
-        calculated_balance = total_credits - total_debits
-        
-        logger.info(f"Synced balance for user {user_id}: Credits={total_credits}, Debits={total_debits}, Balance={calculated_balance}")
-        
-        return max(0, calculated_balance)  # Never return negative balance
+        return balance_ledger.reconcile(user_id)
         
     except Exception as e:
         logger.error(f"Error syncing balance from transactions for user {user_id}: {e}")
         return 0.0
 
-async def check_virtual_account(chat_id: str) -> Dict:
+async def check_virtual_account(chat_id: str, sync_balance: bool = False) -> Dict:
     """
     Check virtual account details for a user
     
     Args:
         chat_id: Telegram chat ID
+        sync_balance: Resolve a 0 balance through the ledger, as get_user_balance does
         
     Returns:
         Dict: Virtual account information
     """
     try:
-        from supabase import create_client
+        from utils.supabase_client import get_supabase_client
         
-        client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        client = get_supabase_client()
         
         # Get virtual account details
-        result = client.table("virtual_accounts").select("*").eq("telegram_chat_id", str(chat_id)).execute()
+        account = _find_virtual_account(client, chat_id)
         
-        if not result.data:
-            # Try with chat_id field as fallback
-            result = client.table("virtual_accounts").select("*").eq("chat_id", str(chat_id)).execute()
-        
-        if result.data:
-            account = result.data[0]
+        if account:
+            if sync_balance:
+                balance = _account_balance(client, account)
+            else:
+                balance = float(account.get("balance", 0))
             return {
                 "success": True,
                 "account_number": account.get("account_number", "N/A"),
                 "account_name": account.get("account_name", "N/A"),
                 "bank_name": account.get("bank_name", "N/A"),
-                "balance": float(account.get("balance", 0)),
+                "balance": balance,
                 "user_id": account.get("user_id"),
                 "created_at": account.get("created_at")
             }
@@ -164,10 +166,10 @@ async def update_user_balance(chat_id: str, new_balance: float) -> bool:
         bool: Success status
     """
     try:
-        from supabase import create_client
+        from utils.supabase_client import get_supabase_client
         from datetime import datetime
         
-        client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        client = get_supabase_client()
         
         # Update balance
         result = client.table("virtual_accounts").update({
@@ -204,10 +206,11 @@ async def get_balance_with_formatting(chat_id: str) -> str:
         str: Formatted balance message
     """
     try:
-        balance = await get_user_balance(chat_id)
-        account_info = await check_virtual_account(chat_id)
+        # One account lookup serves both the balance and the details
+        account_info = await check_virtual_account(chat_id, sync_balance=True)
         
         if account_info["success"]:
+            balance = account_info["balance"]
             return f"""💰 **Your Sofi Wallet Balance**
 
 Current Balance: ₦{balance:,.2f}
@@ -219,6 +222,7 @@ Current Balance: ₦{balance:,.2f}
 
 💡 You can send money, buy airtime, or save with Sofi AI!"""
         else:
+            balance = await get_user_balance(chat_id)
             return f"""💰 **Your Sofi Wallet Balance**
 
 Current Balance: ₦{balance:,.2f}
@@ -0,0 +1,249 @@
+"""
+Sofi AI Balance Ledger
+Running wallet balances with a transaction watermark
+
+Re-deriving a balance used to mean downloading every successful credit and
+debit row a user ever made and summing them in Python, on every read that
+found a zero balance. The ledger keeps, per user, the running balance and the
+inserted_at of the last bank_transactions row folded into it:
+
+- Deposit and transfer handlers call apply() right after they move money, so
+  the worker that handled the payment sees it immediately.
+- Reconciliation reads only rows inserted at or after the watermark (minus a
+  short overlap for transactions that commit out of order) and skips
+  references already applied, so nothing counts twice. inserted_at is set by
+  the database (balance_ledger_watermark.sql); created_at is not usable here
+  because callers set it, e.g. to Paystack's original payment time on a
+  redelivered webhook.
+- Reads return the cached balance and reconcile at most once per
+  LEDGER_RECONCILE_INTERVAL, so their cost does not grow with history.
+
+A user's full history is read once per worker, the first time their balance
+is needed; every later read is incremental. Incremental reads only see new
+rows, not status changes to old ones (transfer.failed marks the debit row
+failed), so confirmed_balance() - the only value that may be written back -
+recomputes the history in full.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+LEDGER_MAX_USERS = int(os.getenv("LEDGER_MAX_USERS", "10000"))
+LEDGER_RECONCILE_INTERVAL = float(os.getenv("LEDGER_RECONCILE_INTERVAL", "10"))
+LEDGER_OVERLAP_SECONDS = 600  # re-read window behind the watermark
+LEDGER_SEEN_REFS = 4096  # hard cap on references remembered per user
+
+CREDIT_TYPES = ("credit",)
+DEBIT_TYPES = ("debit", "transfer_out")
+LEDGER_COLUMNS = "id, amount, fee, transaction_type, reference, inserted_at"
+
+
+def _row_key(row: Dict) -> str:
+    return row.get("reference") or f"id:{row.get('id')}"
+
+
+def _row_delta(row: Dict) -> float:
+    """Signed balance change of one successful bank_transactions row"""
+    amount = float(row.get("amount") or 0)
+    if row.get("transaction_type") in DEBIT_TYPES:
+        return -(amount + float(row.get("fee") or 0))
+    return amount
+
+
+def _overlap_start(watermark: str) -> str:
+    """Watermark moved back by the overlap window (unchanged if unparseable)"""
+    try:
+        moment = datetime.fromisoformat(watermark.replace("Z", "+00:00"))
+    except (AttributeError, ValueError):
+        return watermark
+    return (moment - timedelta(seconds=LEDGER_OVERLAP_SECONDS)).isoformat()
+
+
+class _LedgerEntry:
+    __slots__ = ("balance", "watermark", "seen", "unconfirmed", "reconciled_at")
+
+    def __init__(self):
+        self.balance = 0.0
+        self.watermark: Optional[str] = None  # inserted_at of the newest folded row
+        # Folded references -> inserted_at (None until reconciliation sees a handler's row)
+        self.seen: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        self.unconfirmed: Dict[str, float] = {}  # handler-applied references -> delta, until their row is read
+        self.reconciled_at = 0.0
+
+    def fold(self, key: str, delta: float, inserted_at: Optional[str] = None) -> bool:
+        if key in self.seen:
+            if inserted_at and self.seen[key] is None:
+                self.seen[key] = inserted_at
+                self.unconfirmed.pop(key, None)
+            return False
+        self.balance += delta
+        self.seen[key] = inserted_at
+        if inserted_at is None:
+            self.unconfirmed[key] = delta
+        while len(self.seen) > LEDGER_SEEN_REFS:
+            self.seen.popitem(last=False)
+        return True
+
+    def prune_seen(self):
+        """Forget references that fell behind the overlap window (never re-read)"""
+        if not self.watermark:
+            return
+        cutoff = _overlap_start(self.watermark)
+        for key in [key for key, inserted_at in self.seen.items() if inserted_at and inserted_at < cutoff]:
+            del self.seen[key]
+
+
+class BalanceLedger:
+    """Per-worker running balances advanced by handlers and watermark reads"""
+
+    def __init__(self, supabase=None, max_users: int = LEDGER_MAX_USERS,
+                 reconcile_interval: float = LEDGER_RECONCILE_INTERVAL):
+        self._supabase = supabase
+        self.max_users = max_users
+        self.reconcile_interval = reconcile_interval
+        self._entries: "OrderedDict[str, _LedgerEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"reads": 0, "full_loads": 0, "reconciles": 0,
+                       "rows_read": 0, "applied": 0, "duplicates": 0}
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            from utils.supabase_client import get_supabase_client
+            self._supabase = get_supabase_client()
+        return self._supabase
+
+    # =================== READS ===================
+
+    def get_balance(self, user_id: str) -> float:
+        """Current balance, reconciling only when the cached value is stale"""
+        user_id = str(user_id)
+        with self._lock:
+            self._stats["reads"] += 1
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+                if time.time() - entry.reconciled_at < self.reconcile_interval:
+                    return max(0.0, entry.balance)
+        return self.reconcile(user_id)
+
+    def reconcile(self, user_id: str, full: bool = False) -> float:
+        """
+        Fold in rows inserted after the watermark (the full history on first
+        sight, or when full is set)
+        """
+        user_id = str(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            watermark = entry.watermark if entry is not None and not full else None
+
+        query = self.supabase.table("bank_transactions").select(LEDGER_COLUMNS) \
+            .eq("user_id", user_id).eq("status", "success") \
+            .in_("transaction_type", list(CREDIT_TYPES + DEBIT_TYPES))
+        if watermark:
+            query = query.gte("inserted_at", _overlap_start(watermark))
+        rows = query.order("inserted_at").execute().data or []
+
+        with self._lock:
+            previous = self._entries.get(user_id)
+            if previous is None or watermark is None:
+                entry = self._entries[user_id] = _LedgerEntry()
+                self._evict_locked()
+            else:
+                entry = previous
+            self._entries.move_to_end(user_id)
+            self._stats["full_loads" if watermark is None else "reconciles"] += 1
+            self._stats["rows_read"] += len(rows)
+            self._fold_rows_locked(entry, rows)
+            if entry is not previous and previous is not None:
+                # Money handlers applied whose rows have not appeared yet
+                for key, delta in previous.unconfirmed.items():
+                    entry.fold(key, delta)
+            entry.reconciled_at = time.time()
+            return max(0.0, entry.balance)
+
+    def confirmed_balance(self, user_id: str) -> Optional[float]:
+        """
+        Recompute the balance in full and return it if bank_transactions backs all of it
+
+        Use this, not get_balance(), for any value written back to the
+        database: a cached read may be stale, an incremental one misses
+        status changes to rows it has already folded, and money a handler
+        applied before its bank_transactions row appears is not confirmed yet.
+
+        Returns:
+            The recomputed balance, or None while handler-applied rows are
+            still missing from bank_transactions
+        """
+        balance = self.reconcile(user_id, full=True)
+        with self._lock:
+            entry = self._entries.get(str(user_id))
+            if entry is None or entry.unconfirmed:
+                return None
+            return balance
+
+    def _fold_rows_locked(self, entry: _LedgerEntry, rows: Iterable[Dict]):
+        for row in rows:
+            inserted_at = str(row["inserted_at"]) if row.get("inserted_at") else None
+            if not entry.fold(_row_key(row), _row_delta(row), inserted_at):
+                self._stats["duplicates"] += 1
+            if inserted_at and (entry.watermark is None or inserted_at > entry.watermark):
+                entry.watermark = inserted_at
+        entry.prune_seen()
+
+    # =================== HANDLERS ===================
+
+    def apply(self, user_id: str, reference: str, amount: float,
+              transaction_type: str = "credit", fee: float = 0.0) -> Optional[float]:
+        """
+        Record money a handler has just moved
+
+        Only users already in the ledger are touched; anyone else is loaded
+        from bank_transactions (which then includes this row) on first read.
+
+        Returns:
+            The new balance, or None if the user is not tracked yet
+        """
+        row = {"reference": reference, "amount": amount,
+               "transaction_type": transaction_type, "fee": fee}
+        with self._lock:
+            entry = self._entries.get(str(user_id))
+            if entry is None:
+                return None
+            if entry.fold(_row_key(row), _row_delta(row)):
+                self._stats["applied"] += 1
+            else:
+                self._stats["duplicates"] += 1
+            return max(0.0, entry.balance)
+
+    def forget(self, user_id: str):
+        with self._lock:
+            self._entries.pop(str(user_id), None)
+
+    def _evict_locked(self):
+        while len(self._entries) > self.max_users:
+            self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "users": len(self._entries),
+                    "reconcile_interval": self.reconcile_interval}
+
+
+def _after_fork_in_child():
+    # The lock may have been held by another thread at fork time
+    balance_ledger._lock = threading.Lock()
+
+
+# Global ledger
+balance_ledger = BalanceLedger()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -10,6 +10,9 @@ import asyncio
 from typing import Dict, List, Optional, Any
 import requests
 from datetime import datetime
+from utils.bank_index import bank_index
+from paystack.account_resolver import account_resolver
+from utils.async_bridge import run_blocking
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -48,16 +51,9 @@ class BankAPI:
         try:
             logger.info(f"🔍 Verifying account {account_number} with bank code {bank_code}")
             
-            url = f"{self.paystack_base_url}/bank/resolve"
-            params = {
-                "account_number": account_number,
-                "bank_code": bank_code
-            }
-            
-            response = requests.get(url, headers=self._paystack_headers(), params=params)
-            result = response.json()
+            result = await account_resolver.aresolve(account_number, bank_code)
             
-            if response.status_code == 200 and result.get("status"):
+            if result["success"]:
                 account_name = result["data"]["account_name"]
                 logger.info(f"✅ Account verified: {account_name}")
                 
@@ -69,7 +65,7 @@ class BankAPI:
                     'provider': 'paystack'
                 }
             else:
-                error_msg = result.get("message", "Account verification failed")
+                error_msg = result.get("error") or "Account verification failed"
                 logger.error(f"❌ Account verification failed: {error_msg}")
                 return {
                     'success': False,
@@ -126,7 +122,8 @@ class BankAPI:
                 "currency": "NGN"
             }
             
-            recipient_response = requests.post(
+            recipient_response = await run_blocking(
+                requests.post,
                 f"{self.paystack_base_url}/transferrecipient",
                 headers=self._paystack_headers(),
                 json=recipient_data
@@ -149,7 +146,8 @@ class BankAPI:
                 "reference": reference or f"SOFI_{datetime.now().strftime('%Y%m%d%H%M%S')}"
             }
             
-            transfer_response = requests.post(
+            transfer_response = await run_blocking(
+                requests.post,
                 f"{self.paystack_base_url}/transfer",
                 headers=self._paystack_headers(),
                 json=transfer_data
@@ -187,51 +185,7 @@ class BankAPI:
     
     def _get_bank_code(self, bank_name: str) -> Optional[str]:
         """Convert bank name to Paystack bank code - INCLUDING OPAY"""
-        bank_codes = {
-            # Traditional Banks
-            "access": "044", "access bank": "044",
-            "gtb": "058", "gtbank": "058", "guaranty trust bank": "058",
-            "zenith": "057", "zenith bank": "057",
-            "uba": "033", "united bank for africa": "033",
-            "firstbank": "011", "first bank": "011", "first bank of nigeria": "011",
-            "union": "032", "union bank": "032",
-            "fidelity": "070", "fidelity bank": "070",
-            "sterling": "232", "sterling bank": "232",
-            "stanbic": "221", "stanbic ibtc": "221",
-            "wema": "035", "wema bank": "035",
-            "heritage": "030", "heritage bank": "030",
-            "keystone": "082", "keystone bank": "082",
-            "fcmb": "214", "first city monument bank": "214",
-            "unity": "215", "unity bank": "215",
-            "polaris": "076", "polaris bank": "076",
-            "citi": "023", "citibank": "023",
-            "ecobank": "050",
-            "standard chartered": "068",
-            
-            # Fintech & Digital Banks
-            "opay": "999992",  # ✅ FIXED: Was 999991, now correct 999992
-            "palmpay": "999991",  # ✅ CORRECT: PalmPay code
-            "kuda": "50211", "kuda bank": "50211",
-            "moniepoint": "50515", "moniepoint mfb": "50515",
-            "monie point": "50515", "moniepoint bank": "50515",
-            "moniepoint microfinance bank": "50515",
-            "moniepont": "50515",  # common typo
-            "moniepiont": "50515",  # common typo
-            "carbon": "565", "carbon microfinance bank": "565",
-            "rubies": "125", "rubies mfb": "125",
-            "sparkle": "51310", "sparkle microfinance bank": "51310",
-            "mint": "50304", "mint mfb": "50304",
-            "vfd": "566", "vfd microfinance bank": "566",
-            "taj": "302", "taj bank": "302",
-            "lotus": "303", "lotus bank": "303",
-            "coronation": "559", "coronation merchant bank": "559",
-            "rand": "305", "rand merchant bank": "305",
-            "9psb": "120001", "9 psb": "120001", "9mobile psb": "120001",
-            "9mobile": "120001", "9payment service bank": "120001",
-            "9mobile 9payment service bank": "120001"
-        }
-        
-        return bank_codes.get(bank_name.lower().strip())
+        return bank_index.code_for(bank_name)
     
     def get_bank_code(self, bank_name: str) -> Optional[str]:
         """Public method to get bank code - wrapper for _get_bank_code"""
@@ -240,23 +194,7 @@ class BankAPI:
     def verify_account(self, account_number: str, bank_code: str) -> Dict[str, Any]:
         """Synchronous wrapper for verify_account_name"""
         try:
-            # Check if we're already in an async context
-            import asyncio
-            try:
-                # If there's already a running loop, we can't use run_until_complete
-                loop = asyncio.get_running_loop()
-                logger.warning("Already in event loop - creating task instead")
-                # Create a future and set the result
-                import concurrent.futures
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(self._sync_verify_account_name, account_number, bank_code)
-                    result = future.result(timeout=30)
-            except RuntimeError:
-                # No running loop, safe to create new one
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                result = loop.run_until_complete(self.verify_account_name(account_number, bank_code))
-                loop.close()
+            result = self._sync_verify_account_name(account_number, bank_code)
             
             # Convert the result format to match expected format
             if result.get('success'):
@@ -282,25 +220,16 @@ class BankAPI:
     def _sync_verify_account_name(self, account_number: str, bank_code: str) -> Dict[str, Any]:
         """Synchronous version of verify_account_name for thread execution"""
         try:
-            response = requests.get(
-                f"{self.paystack_base_url}/bank/resolve",
-                headers=self._paystack_headers(),
-                params={
-                    "account_number": account_number,
-                    "bank_code": bank_code
-                }
-            )
+            result = account_resolver.resolve(account_number, bank_code)
             
-            if response.status_code == 200:
-                result = response.json()
-                if result.get("status") and "data" in result:
-                    account_data = result["data"]
-                    return {
-                        'success': True,
-                        'account_name': account_data.get('account_name'),
-                        'bank_name': account_data.get('bank_name', 'Unknown Bank'),
-                        'account_number': account_number
-                    }
+            if result["success"]:
+                account_data = result["data"]
+                return {
+                    'success': True,
+                    'account_name': account_data.get('account_name'),
+                    'bank_name': account_data.get('bank_name', 'Unknown Bank'),
+                    'account_number': account_number
+                }
             
             return {
                 'success': False,
@@ -317,7 +246,8 @@ class BankAPI:
     async def get_banks(self) -> List[Dict[str, Any]]:
         """Get list of banks supported by Paystack"""
         try:
-            response = requests.get(
+            response = await run_blocking(
+                requests.get,
                 f"{self.paystack_base_url}/bank",
                 headers=self._paystack_headers()
             )
@@ -336,7 +266,8 @@ class BankAPI:
     async def get_transaction_status(self, reference: str) -> Dict[str, Any]:
         """Get transaction status from Paystack"""
         try:
-            response = requests.get(
+            response = await run_blocking(
+                requests.get,
                 f"{self.paystack_base_url}/transaction/verify/{reference}",
                 headers=self._paystack_headers()
             )
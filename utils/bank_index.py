@@ -0,0 +1,325 @@
+"""
+🏦 SOFI AI BANK INDEX
+=====================
+
+One immutable index over utils.nigerian_banks, built once at import and used
+by every transfer, receipt and verification path:
+
+- O(1) lookups by bank code (including legacy/NIP codes) and by any alias
+  ("gtb", "GTBank Plc", "first bank of nigeria", "monie point")
+- a prefix trie for autocomplete ("zen" -> Zenith Bank)
+- ranked typo-tolerant matching ("zenit", "gt bnk", "moniepont")
+
+Names are compared in a compact form (lowercase, letters and digits only), so
+spacing and punctuation differences never matter.
+"""
+
+import re
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Optional, Tuple
+
+from utils.nigerian_banks import NIGERIAN_BANKS, BANK_ALIASES, BANK_CODE_ALIASES, POPULAR_BANKS
+
+# Trailing words dropped to derive short aliases ("zenith bank plc" -> "zenith")
+GENERIC_SUFFIXES = {
+    "bank", "banking", "plc", "limited", "ltd", "nigeria", "of", "company",
+    "microfinance", "mfb", "digital", "services", "fintech",
+}
+
+MIN_FUZZY_LENGTH = 3
+
+
+def _edit_budget(length: int) -> int:
+    """Typos tolerated for a name of this length; short names must match exactly"""
+    if length <= 4:
+        return 0
+    return 1 if length <= 8 else 2
+
+
+def _normalize(text: str) -> str:
+    """Lowercase, keep letters/digits/spaces, collapse whitespace"""
+    text = str(text or "").lower().replace("&", " and ")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text).split())
+
+
+def _compact(text: str) -> str:
+    return _normalize(text).replace(" ", "")
+
+
+def _strip_generic(normalized: str) -> str:
+    words = normalized.split()
+    while len(words) > 1 and words[-1] in GENERIC_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """Optimal string alignment distance, giving up once it exceeds limit"""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = current[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                current[j] = min(current[j], previous2[j - 2] + 1)
+            row_min = min(row_min, current[j])
+        if row_min > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class BankIndex:
+    """Read-only lookup structures over the bank table"""
+
+    def __init__(self, banks: Dict[str, Dict], aliases: Dict[str, str] = None,
+                 code_aliases: Dict[str, str] = None, popular: List[str] = None):
+        self._banks = MappingProxyType(dict(banks))
+
+        # Popular banks rank first, then table order
+        popular = [key for key in (popular or []) if key in banks]
+        order = popular + [key for key in banks if key not in popular]
+        self._rank = MappingProxyType({key: i for i, key in enumerate(order)})
+
+        by_code: Dict[str, str] = {}
+        for key, bank in banks.items():
+            by_code.setdefault(bank["code"], key)  # first entry owns a shared code
+        for code, key in (code_aliases or {}).items():
+            if key in banks:
+                by_code.setdefault(code, key)
+        self._by_code = MappingProxyType(by_code)
+
+        # Explicit aliases win, then keys, display names, full names, short forms
+        by_alias: Dict[str, str] = {}
+        for alias, key in (aliases or {}).items():
+            if key in banks:
+                by_alias.setdefault(_compact(alias), key)
+        for key in order:
+            bank = banks[key]
+            for text in (key, bank["name"], bank["full_name"]):
+                by_alias.setdefault(_compact(text), key)
+        for key in order:
+            bank = banks[key]
+            for text in (bank["name"], bank["full_name"]):
+                by_alias.setdefault(_compact(_strip_generic(_normalize(text))), key)
+        by_alias.pop("", None)
+        self._by_alias = MappingProxyType(by_alias)
+        self._max_alias_words = max(len(_normalize(a).split()) for a in list(aliases or {}) + [
+            text for bank in banks.values() for text in (bank["name"], bank["full_name"])
+        ])
+
+        # Fuzzy candidates bucketed by length: only lengths within the edit budget are compared
+        by_length: Dict[int, List[Tuple[str, frozenset, str]]] = {}
+        for alias, key in by_alias.items():
+            if len(alias) >= MIN_FUZZY_LENGTH:
+                by_length.setdefault(len(alias), []).append((alias, frozenset(alias), key))
+        self._fuzzy_by_length = MappingProxyType({n: tuple(items) for n, items in by_length.items()})
+        self._trie = self._build_trie(banks, by_alias)
+
+        self._resolve_cached = lru_cache(maxsize=4096)(self._resolve)
+
+    def _build_trie(self, banks: Dict[str, Dict], by_alias: Dict[str, str]) -> Dict:
+        """Prefix trie over compact aliases, single name words and codes"""
+        entries: Dict[str, set] = {}
+        for alias, key in by_alias.items():
+            entries.setdefault(alias, set()).add(key)
+        for key, bank in banks.items():
+            for text in (bank["name"], bank["full_name"]):
+                for word in _normalize(text).split():
+                    if len(word) >= 2 and word not in GENERIC_SUFFIXES:
+                        entries.setdefault(word, set()).add(key)
+        for code, key in self._by_code.items():
+            entries.setdefault(code.lower(), set()).add(key)
+
+        root: Dict = {}
+        for text, keys in entries.items():
+            node = root
+            for char in text:
+                node = node.setdefault(char, {})
+                node.setdefault("", set()).update(keys)
+        self._freeze_trie(root)
+        return root
+
+    def _freeze_trie(self, node: Dict):
+        for char, child in node.items():
+            if char == "":
+                continue
+            child[""] = tuple(sorted(child[""], key=self._rank.__getitem__))
+            self._freeze_trie(child)
+
+    # =================== EXACT LOOKUPS ===================
+
+    def get_by_code(self, bank_code) -> Optional[Dict]:
+        """Bank for a code (O(1))"""
+        key = self._by_code.get(str(bank_code or "").strip().upper())
+        return self._banks[key] if key else None
+
+    def get_by_alias(self, name: str) -> Optional[Dict]:
+        """Bank for an exact name or alias, ignoring case, spacing and suffixes (O(1))"""
+        key = self._alias_key(_normalize(name))
+        return self._banks[key] if key else None
+
+    def _alias_key(self, normalized: str) -> Optional[str]:
+        key = self._by_alias.get(normalized.replace(" ", ""))
+        if key is None:
+            key = self._by_alias.get(_strip_generic(normalized).replace(" ", ""))
+        return key
+
+    def display_name(self, bank_code, default: str = None) -> Optional[str]:
+        """Friendly bank name for a code"""
+        bank = self.get_by_code(bank_code)
+        return bank["name"] if bank else default
+
+    def code_for(self, name_or_code: str) -> Optional[str]:
+        """Bank code for a name, alias, misspelling or code"""
+        bank = self.resolve(name_or_code)
+        return bank["code"] if bank else None
+
+    # =================== RESOLUTION ===================
+
+    def resolve(self, name_or_code: str) -> Optional[Dict]:
+        """
+        Best bank for free text
+
+        Tries, in order: bank code, exact alias, unique prefix ("first city"),
+        an alias contained in the text as whole words ("my gtbank account"),
+        then the closest spelling of the name without generic words such as
+        "bank" - only when no other bank is equally close. Returns None rather
+        than guessing ("my bank", "fast bank").
+        """
+        if not name_or_code:
+            return None
+        key = self._resolve_cached(str(name_or_code).strip())
+        return self._banks[key] if key else None
+
+    def _resolve(self, text: str) -> Optional[str]:
+        code_key = self._by_code.get(text.upper())
+        if code_key:
+            return code_key
+        if text.isdigit():
+            return None  # Unknown code - never guess a bank for digits
+
+        normalized = _normalize(text)
+        if not normalized:
+            return None
+        alias_key = self._alias_key(normalized)
+        if alias_key:
+            return alias_key
+
+        # A longer prefix beats a single contained word ("first city" is FCMB, not First Bank)
+        core = _strip_generic(normalized).replace(" ", "")
+        for prefix in dict.fromkeys((normalized.replace(" ", ""), core)):
+            completions = self._complete_keys(prefix)
+            if len(completions) == 1:
+                return completions[0]
+
+        contained = self._contained_alias(normalized)
+        if contained:
+            return contained
+
+        matches = self._fuzzy(core, limit=2)
+        if not matches or (len(matches) > 1 and matches[1][1] == matches[0][1]):
+            return None  # No close spelling, or two banks equally close
+        return matches[0][0]
+
+    def find_in_text(self, text: str) -> Optional[Dict]:
+        """First bank mentioned in free text (OCR output, messages) by whole-word alias"""
+        key = self._contained_alias(_normalize(text))
+        return self._banks[key] if key else None
+
+    def _contained_alias(self, normalized: str) -> Optional[str]:
+        """Longest run of words in the text that is itself an alias"""
+        words = normalized.split()
+        for size in range(min(len(words), self._max_alias_words), 0, -1):
+            for start in range(len(words) - size + 1):
+                candidate = "".join(words[start:start + size])
+                if len(candidate) >= MIN_FUZZY_LENGTH and candidate in self._by_alias:
+                    return self._by_alias[candidate]
+        return None
+
+    # =================== AUTOCOMPLETE ===================
+
+    def _complete_keys(self, prefix: str) -> Tuple[str, ...]:
+        node = self._trie
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return ()
+        return node.get("", ())
+
+    def complete(self, prefix: str, limit: int = 10) -> List[Dict]:
+        """Banks whose name, alias, name word or code starts with prefix"""
+        compact = _compact(prefix)
+        if not compact:
+            return []
+        return [self._banks[key] for key in self._complete_keys(compact)[:limit]]
+
+    # =================== FUZZY MATCHING ===================
+
+    def _fuzzy(self, compact: str, limit: int = 5) -> List[Tuple[str, int]]:
+        """Bank keys ranked by edit distance to their closest alias"""
+        max_edits = _edit_budget(len(compact))
+        if len(compact) < MIN_FUZZY_LENGTH or not max_edits:
+            return []
+        chars = frozenset(compact)
+        best: Dict[str, int] = {}
+        for length in range(len(compact) - max_edits, len(compact) + max_edits + 1):
+            for alias, alias_chars, key in self._fuzzy_by_length.get(length, ()):
+                # Each edit changes the character set by at most two symbols
+                if len(chars ^ alias_chars) > 2 * max_edits:
+                    continue
+                distance = _edit_distance(compact, alias, max_edits)
+                if distance < best.get(key, max_edits + 1):
+                    best[key] = distance
+        ranked = sorted(best.items(), key=lambda item: (item[1], self._rank[item[0]]))
+        return ranked[:limit]
+
+    def match(self, query: str, limit: int = 5) -> List[Tuple[Dict, float]]:
+        """
+        Ranked candidates for a possibly misspelled bank name
+
+        Returns:
+            List of (bank, score) with score 1.0 for exact matches
+        """
+        normalized = _normalize(query)
+        if not normalized:
+            return []
+        exact = self.get_by_alias(normalized) or self.get_by_code(query)
+        if exact:
+            return [(exact, 1.0)]
+        compact = normalized.replace(" ", "")
+        return [
+            (self._banks[key], round(1 - distance / max(len(compact), 1), 3))
+            for key, distance in self._fuzzy(compact, limit)
+        ]
+
+    def search(self, query: str, limit: int = None) -> List[Dict]:
+        """Autocomplete results, falling back to close spellings"""
+        compact = _compact(query)
+        if not compact:
+            return []
+        keys = list(self._complete_keys(compact))
+        if not keys:
+            keys = [key for key, _ in self._fuzzy(compact, limit or 5)]
+        banks = [self._banks[key] for key in keys]
+        return banks[:limit] if limit else banks
+
+    # =================== INTROSPECTION ===================
+
+    def __len__(self) -> int:
+        return len(self._banks)
+
+    @property
+    def code_to_name(self) -> Dict[str, str]:
+        """Read-only code -> display name mapping"""
+        return MappingProxyType({code: self._banks[key]["name"] for code, key in self._by_code.items()})
+
+
+# Global index, built once at import
+bank_index = BankIndex(NIGERIAN_BANKS, BANK_ALIASES, BANK_CODE_ALIASES, POPULAR_BANKS)
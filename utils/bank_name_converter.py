@@ -4,83 +4,17 @@
 Converts bank codes to friendly bank names for better UX
 """
 
+from utils.bank_index import bank_index
+
 def get_bank_name_from_code(bank_code: str) -> str:
     """Convert bank code to friendly bank name"""
     
-    # Nigerian bank codes mapping
-    bank_codes = {
-        "044": "Access Bank",
-        "014": "Afribank",
-        "023": "Citibank",
-        "050": "EcoBank",
-        "011": "First Bank",
-        "214": "First City Monument Bank (FCMB)",
-        "070": "Fidelity Bank",
-        "058": "Guaranty Trust Bank (GTBank)",
-        "030": "Heritage Bank",
-        "301": "Jaiz Bank",
-        "082": "Keystone Bank",
-        "076": "Polaris Bank",
-        "221": "Stanbic IBTC Bank",
-        "068": "Standard Chartered Bank",
-        "232": "Sterling Bank",
-        "033": "United Bank for Africa (UBA)",
-        "032": "Union Bank",
-        "215": "Unity Bank",
-        "035": "Wema Bank",
-        "057": "Zenith Bank",
-        "039": "Stanbic IBTC Bank",
-        "232": "Sterling Bank",
-        "101": "ProvidusBank",
-        "100": "SunTrust Bank",
-        "102": "Titan Trust Bank",
-        "103": "Globus Bank",
-        "104": "PremiumTrust Bank",
-        "090": "VFD Microfinance Bank",
-        "50515": "Moniepoint MFB",
-        "999991": "PalmPay",
-        "999992": "OPay",
-        "999993": "Kuda Bank",
-        "50746": "Sparkle Microfinance Bank",
-        "51251": "Rubies Bank",
-        "090364": "Carbon",
-        "090416": "Eyowo",
-        "100029": "TAJBank",
-        "000": "Central Bank of Nigeria (CBN)",
-        
-        # Additional fintech and mobile money codes
-        "120001": "9mobile 9Payment Service Bank",
-        "120002": "Airtel Smartcash PSB",
-        "120003": "MTN MoMo PSB",
-        "070006": "Covenant Microfinance Bank",
-        "070007": "Finca Microfinance Bank",
-        "070008": "Page Microfinance Bank",
-        "070009": "Gateway Mortgage Bank",
-        "070010": "VFD Microfinance Bank",
-        "070011": "Eartholeum",
-        "070012": "Lagos Building Investment Company Plc",
-        "070013": "FFS Microfinance Bank",
-        "070014": "NIRSAL Microfinance Bank",
-        "070015": "Infinity MFB",
-        "070016": "SafeMFB",
-        "070017": "Daylight Microfinance Bank",
-        "070018": "Kredi Money MFB LTD",
-        "070019": "Mayfresh Mortgage Bank",
-        "070020": "Gowans Microfinance Bank",
-        "566": "NPF Microfinance Bank"
-    }
-    
     # Clean the bank code (remove spaces, convert to string)
     if bank_code:
         bank_code = str(bank_code).strip()
         
         # Return the friendly name if found, otherwise return the code with "Bank"
-        friendly_name = bank_codes.get(bank_code)
-        if friendly_name:
-            return friendly_name
-        else:
-            # For unknown codes, return the code with "Bank" suffix
-            return f"Bank ({bank_code})"
+        return bank_index.display_name(bank_code, default=f"Bank ({bank_code})")
     
     return "Unknown Bank"
 
@@ -80,10 +80,10 @@ Example: "Save as Mum" or "Save as John's account" """
                 return "Please provide a nickname. Example: 'Save as Mum'"
             
             # Get the most recent transfer request for this user
-            from supabase import create_client
+            from utils.supabase_client import get_supabase_client
             import os
             
-            supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+            supabase = get_supabase_client()
             
             recent_transfer = supabase.table("transfer_requests")\
                 .select("*")\
@@ -206,10 +206,10 @@ Just say the amount like "Send 5000" or "Transfer 1000" """
                 return ""
             
             # Get user data
-            from supabase import create_client
+            from utils.supabase_client import get_supabase_client
             import os
             
-            supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+            supabase = get_supabase_client()
             user_result = supabase.table("users").select("id").eq("telegram_chat_id", str(chat_id)).execute()
             
             if not user_result.data:
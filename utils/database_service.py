@@ -8,7 +8,8 @@ import json
 import logging
 from datetime import datetime
 from typing import Dict, Any, Optional, List
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
+from paystack.account_resolver import account_resolver
 import uuid
 
 logger = logging.getLogger(__name__)
@@ -17,7 +18,7 @@ class SofiDatabaseService:
     """Manages all Sofi AI database operations"""
     
     def __init__(self):
-        self.supabase = create_client(
+        self.supabase = get_supabase_client(
             os.getenv("SUPABASE_URL"),
             os.getenv("SUPABASE_KEY")
         )
@@ -159,7 +160,10 @@ class SofiDatabaseService:
         try:
             result = self.supabase.table("beneficiaries").select("*").eq("user_id", user_id).order("is_default", desc=True).order("created_at", desc=False).execute()
             
-            return result.data or []
+            beneficiaries = result.data or []
+            # Resolve saved accounts ahead of the transfer the user is likely to start
+            account_resolver.prefetch_beneficiaries(beneficiaries)
+            return beneficiaries
         except Exception as e:
             logger.error(f"❌ Error getting beneficiaries: {e}")
             return []
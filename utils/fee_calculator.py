@@ -33,7 +33,8 @@ import os
 import logging
 from datetime import datetime, date
 from typing import Dict, Optional, Tuple, Any
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
+from utils.revenue_events import revenue_events
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -41,7 +42,7 @@ load_dotenv()
 # Initialize Supabase client
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
+supabase = get_supabase_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
 
 logger = logging.getLogger(__name__)
 
@@ -400,7 +401,7 @@ class SofiFeeCalculator:
     
     def log_profit(self, source: str, amount: float, details: str = "") -> bool:
         """
-        Log profit to Supabase profits table
+        Log profit to Supabase profits table (write-behind, see utils/revenue_events.py)
         
         Args:
             source: Profit source ('deposit', 'transfer', 'crypto', etc.)
@@ -422,7 +423,8 @@ class SofiFeeCalculator:
                 'created_at': datetime.now().isoformat()
             }
             
-            supabase.table('profits').insert(profit_data).execute()
+            # Written behind the request, batched with other accounting rows
+            revenue_events.append('profits', profit_data)
             logger.info(f"Logged profit: {source} - ₦{amount:,.2f}")
             return True
             
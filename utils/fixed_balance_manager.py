@@ -6,7 +6,9 @@ Handles WhatsApp users correctly with proper field mapping and automatic onboard
 import logging
 import os
 from typing import Dict, Optional, Tuple
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
+from utils.balance_ledger import balance_ledger
+from utils.user_resolver import resolve_whatsapp_user
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +16,7 @@ class UserChannelManager:
     """Manages user identification across different channels (WhatsApp, Telegram)"""
     
     def __init__(self):
-        self.supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        self.supabase = get_supabase_client()
     
     async def resolve_user_info(self, channel: str, identifier: str) -> Optional[Dict]:
         """
@@ -30,14 +32,14 @@ class UserChannelManager:
         try:
             if channel == "whatsapp":
                 # WhatsApp uses phone number as identifier
-                # First check users table
-                user_result = self.supabase.table("users").select("*").eq("whatsapp_number", identifier).execute()
+                # Shared resolver: one query across all phone columns, cached
+                user = resolve_whatsapp_user(identifier)
                 
-                if user_result.data:
+                if user:
                     return {
                         "exists": True,
-                        "user_id": user_result.data[0]["id"],
-                        "user_data": user_result.data[0],
+                        "user_id": user["id"],
+                        "user_data": user,
                         "channel": "whatsapp",
                         "identifier": identifier
                     }
@@ -78,7 +80,7 @@ class FixedBalanceManager:
     """Fixed balance manager that uses correct field mappings"""
     
     def __init__(self):
-        self.supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        self.supabase = get_supabase_client()
         self.user_manager = UserChannelManager()
     
     async def get_user_balance(self, channel: str, identifier: str) -> Tuple[float, Optional[str]]:
@@ -106,12 +108,7 @@ class FixedBalanceManager:
             va_result = self.supabase.table("virtual_accounts").select("balance, account_number, account_name, bank_name").eq("user_id", user_id).execute()
             
             if va_result.data:
-                balance = float(va_result.data[0].get("balance", 0))
-                
-                # If balance is 0, sync from transactions
-                if balance == 0:
-                    balance = await self._sync_balance_from_transactions(user_id)
-                
+                balance = await self._account_balance(user_id, va_result.data[0])
                 return balance, str(user_id)
             else:
                 logger.warning(f"No virtual account found for user_id {user_id}")
@@ -152,8 +149,8 @@ class FixedBalanceManager:
             if va_result.data:
                 account = va_result.data[0]
                 
-                # Get current balance
-                balance, _ = await self.get_user_balance(channel, identifier)
+                # Current balance from the row we already have (no second user lookup)
+                balance = await self._account_balance(user_id, account)
                 
                 return {
                     "success": True,
@@ -179,21 +176,23 @@ class FixedBalanceManager:
                 "error": f"Error checking account: {str(e)}"
             }
     
+    async def _account_balance(self, user_id: str, account: Dict) -> float:
+        """Stored virtual account balance, synced from the ledger when it reads 0"""
+        balance = float(account.get("balance", 0))
+        if balance == 0:
+            balance = await self._sync_balance_from_transactions(user_id)
+        return balance
+    
     async def _sync_balance_from_transactions(self, user_id: str) -> float:
-        """Sync balance from transaction history"""
+        """Sync balance from transactions recorded since the ledger watermark"""
         try:
-            # Get all successful transactions
-            credit_result = self.supabase.table("bank_transactions").select("amount").eq("user_id", user_id).eq("transaction_type", "credit").eq("status", "success").execute()
-            
-            debit_result = self.supabase.table("bank_transactions").select("amount").eq("user_id", user_id).eq("transaction_type", "debit").eq("status", "success").execute()
-            
-            total_credits = sum(float(tx.get("amount", 0)) for tx in credit_result.data)
-            total_debits = sum(float(tx.get("amount", 0)) for tx in debit_result.data)
-            
-            calculated_balance = max(0, total_credits - total_debits)
+            # Reconciles first; None while handler-applied rows are unconfirmed
+            confirmed_balance = balance_ledger.confirmed_balance(user_id)
+            calculated_balance = balance_ledger.get_balance(user_id)
             
-            # Update virtual_accounts table with synced balance
-            self.supabase.table("virtual_accounts").update({"balance": calculated_balance}).eq("user_id", user_id).execute()
+            # Update virtual_accounts table only with a balance bank_transactions backs
+            if confirmed_balance:
+                self.supabase.table("virtual_accounts").update({"balance": confirmed_balance}).eq("user_id", user_id).execute()
             
             logger.info(f"Synced balance for user {user_id}: {calculated_balance}")
             return calculated_balance
@@ -0,0 +1,232 @@
+"""
+Sofi AI Flow Encryption
+Process-wide crypto engine for WhatsApp Flow data exchange
+
+Every /whatsapp-flow-webhook request carries an AES key wrapped with our RSA
+public key, the Flow payload encrypted under it (AES-GCM) and an IV; the reply
+must be AES-GCM encrypted with the same key and the bit-inverted IV. The old
+handler was rebuilt per request and re-parsed the PEM private key inside every
+decrypt, on top of the RSA-OAEP unwrap, and logged a dozen lines per call.
+
+The engine parses the key once per process. Each request's AESGCM context is
+built once and reused for the reply, so a round trip costs one RSA unwrap and
+two AEAD passes. FlowEncryption is the per-request handle main.py uses: it
+holds that request's context, so concurrent requests never share key material.
+"""
+
+import os
+import json
+import time
+import base64
+import logging
+import threading
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+logger = logging.getLogger(__name__)
+
+OAEP_SHA256 = padding.OAEP(mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                           algorithm=hashes.SHA256(), label=None)
+
+
+class FlowCryptoError(Exception):
+    """A Flow request could not be decrypted or its reply encrypted"""
+
+
+class FlowContext(NamedTuple):
+    """Key material of one Flow request, needed again to encrypt its reply"""
+    aes_key: bytes
+    aesgcm: AESGCM
+    iv: bytes
+
+
+def _flip_iv(iv: bytes) -> bytes:
+    # Meta requires the reply IV to be the request IV with every bit inverted
+    return bytes(byte ^ 0xFF for byte in iv)
+
+
+def _decrypt_legacy(aes_key: bytes, iv: bytes, data: bytes) -> Optional[bytes]:
+    """CBC (PKCS7) then CTR, for payloads that are not AES-GCM"""
+    if len(data) % 16 == 0 and data:
+        decryptor = Cipher(algorithms.AES(aes_key), modes.CBC(iv)).decryptor()
+        padded = decryptor.update(data) + decryptor.finalize()
+        pad = padded[-1]
+        if 0 < pad <= 16 and padded[-pad:] == bytes([pad]) * pad:
+            return padded[:-pad]
+    try:
+        decryptor = Cipher(algorithms.AES(aes_key), modes.CTR(iv)).decryptor()
+        return decryptor.update(data) + decryptor.finalize()
+    except ValueError:
+        return None
+
+
+class FlowCryptoEngine:
+    """RSA private key loaded once, with per-request AES-GCM contexts"""
+
+    def __init__(self, private_key_b64: Optional[str] = None):
+        self._private_key_b64 = private_key_b64
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._private_key = None
+        self.private_key_pem: Optional[str] = None
+        self._stats = {"decrypted": 0, "encrypted": 0, "failures": 0,
+                       "legacy_modes": 0, "total_decrypt_ms": 0.0, "total_encrypt_ms": 0.0}
+
+    # =================== KEY ===================
+
+    def _load(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            private_key_b64 = self._private_key_b64 or os.getenv('WHATSAPP_FLOW_PRIVATE_KEY')
+            if not private_key_b64:
+                logger.warning("⚠️ WHATSAPP_FLOW_PRIVATE_KEY not set - Flow encryption disabled")
+                return
+            try:
+                # Base64 encoded PEM
+                pem = base64.b64decode(private_key_b64).decode('utf-8')
+                self._private_key = serialization.load_pem_private_key(pem.encode(), password=None)
+                self.private_key_pem = pem
+                logger.info("✅ Flow private key loaded")
+            except Exception as e:
+                logger.error(f"❌ Failed to load Flow private key: {e}")
+
+    @property
+    def ready(self) -> bool:
+        self._load()
+        return self._private_key is not None
+
+    # =================== SINGLE REQUEST ===================
+
+    def decrypt(self, encrypted_flow_data: str, encrypted_aes_key: str,
+                initial_vector: str) -> Tuple[Dict[str, Any], FlowContext]:
+        """
+        Decrypt a Flow request
+
+        Returns:
+            The decrypted payload and the context to encrypt the reply with
+
+        Raises:
+            FlowCryptoError: The key is not configured or the payload is invalid
+        """
+        if not self.ready:
+            raise FlowCryptoError("Flow private key not configured")
+        started = time.perf_counter()
+        try:
+            data = base64.b64decode(encrypted_flow_data)
+            iv = base64.b64decode(initial_vector)
+            aes_key = self._private_key.decrypt(base64.b64decode(encrypted_aes_key), OAEP_SHA256)
+        except Exception as e:
+            self._count("failures")
+            raise FlowCryptoError(f"Could not unwrap Flow request: {e}") from e
+        if len(iv) != 16:
+            self._count("failures")
+            raise FlowCryptoError(f"IV length {len(iv)} is not 16 bytes")
+
+        context = FlowContext(aes_key, AESGCM(aes_key), iv)
+        try:
+            plaintext = context.aesgcm.decrypt(iv, data, None)
+        except Exception:
+            # Not AES-GCM: fall back to the modes the old handler also tried
+            plaintext = _decrypt_legacy(aes_key, iv, data)
+            self._count("legacy_modes")
+
+        try:
+            payload = json.loads(plaintext.decode('utf-8'))
+        except Exception as e:
+            self._count("failures")
+            raise FlowCryptoError(f"Decrypted Flow payload is not JSON: {e}") from e
+
+        with self._lock:
+            self._stats["decrypted"] += 1
+            self._stats["total_decrypt_ms"] += (time.perf_counter() - started) * 1000
+        return payload, context
+
+    def encrypt(self, response: Dict[str, Any], context: FlowContext) -> str:
+        """Encrypt a Flow reply with its request's key and the flipped IV (Base64)"""
+        started = time.perf_counter()
+        ciphertext = context.aesgcm.encrypt(_flip_iv(context.iv), json.dumps(response).encode('utf-8'), None)
+        with self._lock:
+            self._stats["encrypted"] += 1
+            self._stats["total_encrypt_ms"] += (time.perf_counter() - started) * 1000
+        return base64.b64encode(ciphertext).decode('utf-8')
+
+    # =================== BATCH ===================
+
+    def decrypt_batch(self, requests: Iterable[Dict[str, str]]) -> List[Optional[Tuple[Dict[str, Any], FlowContext]]]:
+        """
+        Decrypt several Flow request bodies (encrypted_flow_data,
+        encrypted_aes_key, initial_vector); failed items come back as None
+        """
+        results = []
+        for body in requests:
+            try:
+                results.append(self.decrypt(body['encrypted_flow_data'], body['encrypted_aes_key'],
+                                            body['initial_vector']))
+            except (FlowCryptoError, KeyError) as e:
+                logger.warning(f"⚠️ Flow request in batch not decrypted: {e}")
+                results.append(None)
+        return results
+
+    def encrypt_batch(self, replies: Iterable[Tuple[Dict[str, Any], FlowContext]]) -> List[str]:
+        """Encrypt several (response, context) pairs"""
+        return [self.encrypt(response, context) for response, context in replies]
+
+    # =================== METRICS ===================
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            decrypted, encrypted = self._stats["decrypted"], self._stats["encrypted"]
+            return {
+                "key_loaded": self._private_key is not None,
+                **{k: v for k, v in self._stats.items() if not k.startswith("total_")},
+                "avg_decrypt_ms": round(self._stats["total_decrypt_ms"] / decrypted, 3) if decrypted else 0.0,
+                "avg_encrypt_ms": round(self._stats["total_encrypt_ms"] / encrypted, 3) if encrypted else 0.0,
+            }
+
+
+# Global engine (the key is parsed on first use)
+flow_crypto = FlowCryptoEngine()
+
+
+class FlowEncryption:
+    """Per-request Flow handler over the shared engine (decrypt, then encrypt the reply)"""
+
+    def __init__(self, engine: FlowCryptoEngine = None):
+        self.engine = engine or flow_crypto
+        self._context: Optional[FlowContext] = None
+
+    @property
+    def private_key_pem(self) -> Optional[str]:
+        return self.engine.private_key_pem if self.engine.ready else None
+
+    def decrypt_request(self, encrypted_flow_data, encrypted_aes_key, initial_vector) -> Optional[Dict[str, Any]]:
+        """Decrypt incoming Flow request from Meta (None on failure)"""
+        try:
+            payload, self._context = self.engine.decrypt(encrypted_flow_data, encrypted_aes_key, initial_vector)
+            return payload
+        except FlowCryptoError as e:
+            logger.error(f"❌ Flow decryption error: {e}")
+            return None
+
+    def encrypt_response(self, response_data) -> Optional[str]:
+        """Encrypt Flow response for Meta with this request's key (None on failure)"""
+        if self._context is None:
+            logger.error("❌ No AES key available for response encryption")
+            return None
+        try:
+            return self.engine.encrypt(response_data, self._context)
+        except Exception as e:
+            logger.error(f"❌ Flow encryption error: {e}")
+            return None
@@ -10,10 +10,11 @@ import json
 import os
 import requests
 from datetime import datetime, timedelta
-from collections import defaultdict, deque
 from typing import Dict, List, Optional, Tuple
 import re
 from utils.security_monitor import security_monitor, AlertLevel
+from utils.rate_limit_engine import RateLimitEngine, RateLimitRule
+from utils.threat_classifier import threat_classifier, ThreatVerdict, PatternSet, GOOD_BOT_AGENTS
 
 logger = logging.getLogger(__name__)
 
@@ -81,48 +82,29 @@ class IPIntelligence:
         ]
         
         # Good bots (allowed)
-        self.good_bots = [
-            r'googlebot',
-            r'bingbot',
-            r'slurp',
-            r'facebookexternalhit',
-            r'twitterbot',
-            r'linkedinbot',
-            r'whatsapp',
-            r'telegrambot',
-            r'go-http-client',  # Common legitimate HTTP client
-            r'render\.com',     # Render health checks
-            r'uptimerobot',     # Uptime monitoring
-            r'pingdom',         # Pingdom monitoring
-            r'newrelic',        # New Relic monitoring
-            r'datadog',         # Datadog monitoring
-        ]
+        self.good_bots = list(GOOD_BOT_AGENTS)
+        
+        # Compiled once; user agent and path checks go through threat_classifier
+        self._whitelist = PatternSet(self.whitelist_patterns, re.IGNORECASE)
+        self._malicious = PatternSet(self.malicious_patterns, re.IGNORECASE)
+        self._hosting = PatternSet(self.hosting_patterns, re.IGNORECASE)
     
     def is_whitelisted_ip(self, ip: str) -> bool:
         """Check if IP is whitelisted"""
-        for pattern in self.whitelist_patterns:
-            if re.match(pattern, ip, re.IGNORECASE):
-                return True
-        return False
+        return self._whitelist.match(ip)
     
     def is_malicious_pattern(self, ip: str) -> bool:
         """Check if IP matches known malicious patterns"""
-        for pattern in self.malicious_patterns:
-            if re.match(pattern, ip, re.IGNORECASE):
-                return True
-        return False
+        return self._malicious.match(ip)
     
     def is_hosting_provider(self, hostname: str) -> bool:
         """Check if hostname suggests hosting provider"""
         if not hostname:
             return False
         
-        for pattern in self.hosting_patterns:
-            if re.search(pattern, hostname, re.IGNORECASE):
-                return True
-        return False
+        return self._hosting.search(hostname)
     
-    def analyze_user_agent(self, user_agent: str) -> Dict:
+    def analyze_user_agent(self, user_agent: str, verdict: ThreatVerdict = None) -> Dict:
         """Analyze user agent for bot detection"""
         result = {
             'is_bot': False,
@@ -138,45 +120,32 @@ class IPIntelligence:
             result['details']['reason'] = 'Empty user agent'
             return result
         
-        user_agent_lower = user_agent.lower()
+        verdict = verdict or threat_classifier.classify(user_agent, '')
         
         # Check for good bots first (highest priority)
-        for pattern in self.good_bots:
-            if re.search(pattern, user_agent_lower):
-                result['is_bot'] = True
-                result['is_good_bot'] = True
-                result['confidence'] = 0.9
-                result['details']['bot_type'] = pattern
-                result['details']['reason'] = f'Legitimate bot: {pattern}'
-                return result
+        if verdict.good_bot:
+            result['is_bot'] = True
+            result['is_good_bot'] = True
+            result['confidence'] = 0.9
+            result['details']['bot_type'] = verdict.good_bot
+            result['details']['reason'] = f'Legitimate bot: {verdict.good_bot}'
+            return result
         
         # Check for malicious bots (high threat)
-        malicious_patterns = [
-            r'scanner', r'exploit', r'hack', r'attack', r'penetration',
-            r'nikto', r'sqlmap', r'nmap', r'dirb', r'gobuster', r'masscan', r'zmap'
-        ]
-        
-        for pattern in malicious_patterns:
-            if re.search(pattern, user_agent_lower):
-                result['is_bot'] = True
-                result['is_malicious_bot'] = True
-                result['confidence'] = 0.95
-                result['details']['bot_type'] = pattern
-                result['details']['reason'] = f'Malicious bot: {pattern}'
-                return result
+        if verdict.malicious_bot:
+            result['is_bot'] = True
+            result['is_malicious_bot'] = True
+            result['confidence'] = 0.95
+            result['details']['bot_type'] = verdict.malicious_bot
+            result['details']['reason'] = f'Malicious bot: {verdict.malicious_bot}'
+            return result
         
         # Check for suspicious patterns (low threat - log only)
-        suspicious_patterns = [
-            r'java', r'python', r'php', r'ruby', r'node',
-            r'libwww', r'httpclient', r'okhttp', r'urllib', r'requests'
-        ]
-        
-        for pattern in suspicious_patterns:
-            if re.search(pattern, user_agent_lower):
-                result['is_bot'] = True
-                result['confidence'] = 0.4  # Lower confidence - don't block
-                result['details']['reason'] = f'Suspicious pattern: {pattern}'
-                return result
+        if verdict.suspicious_client:
+            result['is_bot'] = True
+            result['confidence'] = 0.4  # Lower confidence - don't block
+            result['details']['reason'] = f'Suspicious pattern: {verdict.suspicious_client}'
+            return result
         
         return result
     
@@ -304,8 +273,9 @@ class IPIntelligence:
             assessment['factors'].append('malicious_ip_pattern')
             return assessment
         
-        # Analyze user agent
-        ua_analysis = self.analyze_user_agent(user_agent)
+        # Analyze user agent (one memoized classification covers agent and path)
+        verdict = threat_classifier.classify(user_agent, path)
+        ua_analysis = self.analyze_user_agent(user_agent, verdict)
         assessment['details']['user_agent_analysis'] = ua_analysis
         
         if ua_analysis['is_malicious_bot']:
@@ -360,7 +330,7 @@ class IPIntelligence:
             assessment['factors'].append('tor_exit_node')
         
         # Path-based assessment
-        if self._is_suspicious_path(path):
+        if verdict.suspicious_path:
             assessment['threat_level'] = 'medium' if assessment['threat_level'] == 'low' else assessment['threat_level']
             assessment['confidence'] = max(assessment['confidence'], 0.6)
             assessment['factors'].append('suspicious_path')
@@ -377,30 +347,12 @@ class IPIntelligence:
     
     def _is_suspicious_path(self, path: str) -> bool:
         """Check if path indicates suspicious activity"""
-        suspicious_paths = [
-            r'/wp-admin', r'/wp-login', r'/wp-config', r'/wp-content',
-            r'/admin', r'/administrator', r'/login', r'/phpmyadmin',
-            r'/xmlrpc\.php', r'/wp-includes', r'/wp-json',
-            r'/\.env', r'/\.git', r'/\.svn', r'/\.htaccess',
-            r'/config\.php', r'/database\.php', r'/db\.php',
-            r'/backup', r'/sql', r'/dump', r'/export',
-            r'/shell', r'/cmd', r'/exec', r'/system',
-        ]
-        
-        for pattern in suspicious_paths:
-            if re.search(pattern, path, re.IGNORECASE):
-                return True
-        
-        return False
+        return threat_classifier.classify('', path).suspicious_path
 
 class RateLimiter:
     """Advanced rate limiting with IP tracking"""
     
     def __init__(self):
-        self.requests = defaultdict(deque)  # IP -> deque of timestamps
-        self.violations = defaultdict(int)  # IP -> violation count
-        self.blocked_until = defaultdict(float)  # IP -> timestamp when unblocked
-        
         # Rate limiting rules
         self.rules = {
             'requests_per_minute': 60,
@@ -411,51 +363,50 @@ class RateLimiter:
             'block_duration': 3600,  # 1 hour block
             'long_term_block_duration': 86400,  # 24 hour block
         }
+        
+        # Sliding-window counters per IP, checked shortest window first;
+        # idle IPs are forgotten after a day (and never while blocked)
+        self.engine = RateLimitEngine([
+            RateLimitRule('burst_requests', self.rules['burst_requests'], 10, '10 seconds'),
+            RateLimitRule('requests_per_minute', self.rules['requests_per_minute'], 60, '1 minute'),
+            RateLimitRule('requests_per_hour', self.rules['requests_per_hour'], 3600, '1 hour'),
+            RateLimitRule('requests_per_day', self.rules['requests_per_day'], 86400, '1 day'),
+        ], idle_ttl=86400)
     
     def is_rate_limited(self, ip: str) -> Tuple[bool, Dict]:
         """Check if IP is rate limited"""
         current_time = time.time()
         
         # Check if IP is currently blocked
-        if ip in self.blocked_until:
-            if current_time < self.blocked_until[ip]:
-                return True, {
-                    'blocked': True,
-                    'reason': 'rate_limit_violation',
-                    'unblocked_at': self.blocked_until[ip],
-                    'violations': self.violations[ip]
-                }
-            else:
-                # Block expired
-                del self.blocked_until[ip]
-        
-        # Clean old requests
-        self._cleanup_old_requests(ip, current_time)
-        
-        # Add current request
-        self.requests[ip].append(current_time)
+        unblocked_at = self.engine.blocked_until(ip, current_time)
+        if unblocked_at:
+            return True, {
+                'blocked': True,
+                'reason': 'rate_limit_violation',
+                'unblocked_at': unblocked_at,
+                'violations': self.engine.violations(ip)
+            }
         
-        # Check rate limits
-        violation_info = self._check_rate_limits(ip, current_time)
+        # Count this request and check rate limits
+        violation_info = self.engine.hit(ip, current_time)
         
-        if violation_info['violated']:
-            self.violations[ip] += 1
-            
+        if violation_info:
             # Determine block duration
-            if self.violations[ip] >= self.rules['violation_threshold']:
+            violations = self.engine.violations(ip) + 1
+            if violations >= self.rules['violation_threshold']:
                 block_duration = self.rules['long_term_block_duration']
             else:
                 block_duration = self.rules['block_duration']
             
-            self.blocked_until[ip] = current_time + block_duration
+            self.engine.block(ip, block_duration, current_time)
             
             # Log violation
-            logger.warning(f"🚫 Rate limit violation: IP {ip} blocked for {block_duration}s (violations: {self.violations[ip]})")
+            logger.warning(f"🚫 Rate limit violation: IP {ip} blocked for {block_duration}s (violations: {violations})")
             
             # Send security alert
             security_monitor.send_telegram_alert(
                 f"Rate limit violation: IP {ip} exceeded limits\n"
-                f"Violations: {self.violations[ip]}\n"
+                f"Violations: {violations}\n"
                 f"Blocked for: {block_duration}s",
                 AlertLevel.MEDIUM
             )
@@ -464,74 +415,8 @@ class RateLimiter:
         
         return False, {'blocked': False}
     
-    def _cleanup_old_requests(self, ip: str, current_time: float):
-        """Remove old requests from tracking"""
-        if ip not in self.requests:
-            return
-        
-        # Remove requests older than 24 hours
-        cutoff_time = current_time - 86400
-        
-        while self.requests[ip] and self.requests[ip][0] < cutoff_time:
-            self.requests[ip].popleft()
-    
-    def _check_rate_limits(self, ip: str, current_time: float) -> Dict:
-        """Check various rate limits"""
-        requests_queue = self.requests[ip]
-        
-        # Check burst requests (last 10 seconds)
-        burst_cutoff = current_time - 10
-        burst_requests = sum(1 for t in requests_queue if t > burst_cutoff)
-        
-        if burst_requests > self.rules['burst_requests']:
-            return {
-                'violated': True,
-                'rule': 'burst_requests',
-                'limit': self.rules['burst_requests'],
-                'actual': burst_requests,
-                'window': '10 seconds'
-            }
-        
-        # Check requests per minute
-        minute_cutoff = current_time - 60
-        minute_requests = sum(1 for t in requests_queue if t > minute_cutoff)
-        
-        if minute_requests > self.rules['requests_per_minute']:
-            return {
-                'violated': True,
-                'rule': 'requests_per_minute',
-                'limit': self.rules['requests_per_minute'],
-                'actual': minute_requests,
-                'window': '1 minute'
-            }
-        
-        # Check requests per hour
-        hour_cutoff = current_time - 3600
-        hour_requests = sum(1 for t in requests_queue if t > hour_cutoff)
-        
-        if hour_requests > self.rules['requests_per_hour']:
-            return {
-                'violated': True,
-                'rule': 'requests_per_hour',
-                'limit': self.rules['requests_per_hour'],
-                'actual': hour_requests,
-                'window': '1 hour'
-            }
-        
-        # Check requests per day
-        day_cutoff = current_time - 86400
-        day_requests = sum(1 for t in requests_queue if t > day_cutoff)
-        
-        if day_requests > self.rules['requests_per_day']:
-            return {
-                'violated': True,
-                'rule': 'requests_per_day',
-                'limit': self.rules['requests_per_day'],
-                'actual': day_requests,
-                'window': '1 day'
-            }
-        
-        return {'violated': False}
+    def get_stats(self) -> Dict:
+        return self.engine.get_stats()
 
 # Global instances
 ip_intelligence = IPIntelligence()
@@ -6,7 +6,7 @@ Bridges old beneficiary_manager calls to new Supabase service
 import logging
 from typing import Dict, Optional
 from utils.supabase_beneficiary_service import SupabaseBeneficiaryService
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 import os
 
 logger = logging.getLogger(__name__)
@@ -16,7 +16,7 @@ class LegacyBeneficiaryHandler:
     
     def __init__(self):
         self.beneficiary_service = SupabaseBeneficiaryService()
-        self.supabase = create_client(
+        self.supabase = get_supabase_client(
             os.getenv("SUPABASE_URL"),
             os.getenv("SUPABASE_KEY")
         )
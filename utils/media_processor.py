@@ -119,39 +119,11 @@ class MediaProcessor:
                         result["account_number"] = account_num
                         break
             
-            # Look for Nigerian bank names (comprehensive list)
-            nigerian_banks = {
-                "access": "Access Bank",
-                "gtbank": "GTBank", 
-                "gtb": "GTBank",
-                "guaranty trust": "GTBank",
-                "zenith": "Zenith Bank",
-                "first bank": "First Bank",
-                "firstbank": "First Bank",
-                "uba": "UBA",
-                "united bank": "UBA",
-                "opay": "Opay",
-                "kuda": "Kuda Bank",
-                "palmpay": "PalmPay",
-                "moniepoint": "Moniepoint",
-                "sterling": "Sterling Bank",
-                "fcmb": "FCMB",
-                "union bank": "Union Bank",
-                "ecobank": "Ecobank",
-                "wema": "Wema Bank",
-                "polaris": "Polaris Bank",
-                "providus": "Providus Bank",
-                "fidelity": "Fidelity Bank",
-                "keystone": "Keystone Bank",
-                "jaiz": "Jaiz Bank",
-                "stanbic": "Stanbic IBTC",
-                "citibank": "Citibank"
-            }
-            
-            for bank_key, bank_full_name in nigerian_banks.items():
-                if bank_key in text_content:
-                    result["bank"] = bank_full_name
-                    break
+            # Look for Nigerian bank names (shared bank index, whole-word aliases)
+            from utils.bank_index import bank_index
+            bank = bank_index.find_in_text(text_content)
+            if bank:
+                result["bank"] = bank["name"]
             
             # Look for account holder names (words in title case)
             if result["account_number"]:
@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv
-from supabase import create_client
+from utils.supabase_client import get_supabase_client as get_shared_supabase_client
 from typing import List, Dict
 from datetime import datetime
 
@@ -28,7 +28,7 @@ def get_supabase_client():
     """Get or create supabase client"""
     global supabase
     if supabase is None:
-        supabase = create_client(supabase_url, supabase_key)
+        supabase = get_shared_supabase_client(supabase_url, supabase_key)
     return supabase
 
 async def save_chat_message(chat_id: str, role: str, content: str) -> bool:
@@ -125,6 +125,72 @@ NIGERIAN_BANKS = {
         "full_name": "Standard Chartered Bank",
         "type": "international"
     },
+    "access_diamond": {
+        "name": "Access Bank (Diamond)",
+        "code": "063",
+        "full_name": "Access Bank (Diamond)",
+        "type": "commercial"
+    },
+    "jaiz": {
+        "name": "Jaiz Bank",
+        "code": "301",
+        "full_name": "Jaiz Bank Plc",
+        "type": "commercial"
+    },
+    "suntrust": {
+        "name": "SunTrust Bank",
+        "code": "100",
+        "full_name": "SunTrust Bank Nigeria Limited",
+        "type": "commercial"
+    },
+    "titan": {
+        "name": "Titan Trust Bank",
+        "code": "102",
+        "full_name": "Titan Trust Bank Limited",
+        "type": "commercial"
+    },
+    "globus": {
+        "name": "Globus Bank",
+        "code": "103",
+        "full_name": "Globus Bank Limited",
+        "type": "commercial"
+    },
+    "premiumtrust": {
+        "name": "PremiumTrust Bank",
+        "code": "104",
+        "full_name": "PremiumTrust Bank Limited",
+        "type": "commercial"
+    },
+    "taj": {
+        "name": "TAJ Bank",
+        "code": "302",
+        "full_name": "TAJ Bank Limited",
+        "type": "commercial"
+    },
+    "lotus": {
+        "name": "Lotus Bank",
+        "code": "303",
+        "full_name": "Lotus Bank Limited",
+        "type": "commercial"
+    },
+    "coronation": {
+        "name": "Coronation Bank",
+        "code": "559",
+        "full_name": "Coronation Merchant Bank",
+        "type": "merchant"
+    },
+    "rand": {
+        "name": "Rand Merchant Bank",
+        "code": "305",
+        "full_name": "Rand Merchant Bank Nigeria",
+        "type": "merchant"
+    },
+    "alpha_morgan": {
+        "name": "Alpha Morgan Bank",
+        "code": "108",
+        "full_name": "Alpha Morgan Bank Limited",
+        "type": "merchant"
+    },
     
     # FINTECH BANKS (Most Popular)
     "opay": {
@@ -187,6 +253,54 @@ NIGERIAN_BANKS = {
         "full_name": "Raven Bank Limited",
         "type": "fintech"
     },
+    "alat": {
+        "name": "Alat by Wema",
+        "code": "035A",
+        "full_name": "Alat by Wema",
+        "type": "fintech"
+    },
+    "gomoney": {
+        "name": "GoMoney",
+        "code": "100022",
+        "full_name": "GoMoney Nigeria",
+        "type": "fintech"
+    },
+    "eyowo": {
+        "name": "Eyowo",
+        "code": "50126",
+        "full_name": "Eyowo Microfinance Bank",
+        "type": "fintech"
+    },
+    "9psb": {
+        "name": "9PSB",
+        "code": "120001",
+        "full_name": "9mobile 9Payment Service Bank",
+        "type": "fintech"
+    },
+    "momo_psb": {
+        "name": "MTN MoMo PSB",
+        "code": "120003",
+        "full_name": "MTN MoMo Payment Service Bank",
+        "type": "fintech"
+    },
+    "smartcash_psb": {
+        "name": "Airtel SmartCash PSB",
+        "code": "120004",
+        "full_name": "Airtel SmartCash Payment Service Bank",
+        "type": "fintech"
+    },
+    "aella": {
+        "name": "Aella MFB",
+        "code": "50315",
+        "full_name": "Aella Microfinance Bank",
+        "type": "fintech"
+    },
+    "buypower": {
+        "name": "BuyPower MFB",
+        "code": "50645",
+        "full_name": "BuyPower Microfinance Bank",
+        "type": "fintech"
+    },
     
     # MICROFINANCE BANKS
     "lapo": {
@@ -362,75 +476,178 @@ NIGERIAN_BANKS = {
         "code": "51269",
         "full_name": "Trustfund Microfinance Bank",
         "type": "microfinance"
+    },
+    "aku": {
+        "name": "Aku MFB",
+        "code": "51336",
+        "full_name": "Aku Microfinance Bank",
+        "type": "microfinance"
+    },
+    "aramoko": {
+        "name": "Aramoko MFB",
+        "code": "50083",
+        "full_name": "Aramoko Microfinance Bank",
+        "type": "microfinance"
+    },
+    "assets": {
+        "name": "Assets MFB",
+        "code": "50092",
+        "full_name": "Assets Microfinance Bank",
+        "type": "microfinance"
+    },
+    "baobab": {
+        "name": "Baobab MFB",
+        "code": "MFB50992",
+        "full_name": "Baobab Microfinance Bank",
+        "type": "microfinance"
+    },
+    "bellbank": {
+        "name": "BellBank MFB",
+        "code": "51100",
+        "full_name": "BellBank Microfinance Bank",
+        "type": "microfinance"
+    },
+    "beststar": {
+        "name": "BestStar MFB",
+        "code": "50123",
+        "full_name": "BestStar Microfinance Bank",
+        "type": "microfinance"
+    },
+    "bowen": {
+        "name": "Bowen MFB",
+        "code": "50931",
+        "full_name": "Bowen Microfinance Bank",
+        "type": "microfinance"
+    },
+    "covenant": {
+        "name": "Covenant MFB",
+        "code": "070006",
+        "full_name": "Covenant Microfinance Bank",
+        "type": "microfinance"
+    },
+    "finca": {
+        "name": "Finca MFB",
+        "code": "070007",
+        "full_name": "Finca Microfinance Bank",
+        "type": "microfinance"
+    },
+    "nirsal": {
+        "name": "NIRSAL MFB",
+        "code": "070014",
+        "full_name": "NIRSAL Microfinance Bank",
+        "type": "microfinance"
+    },
+    "gowans": {
+        "name": "Gowans MFB",
+        "code": "070020",
+        "full_name": "Gowans Microfinance Bank",
+        "type": "microfinance"
+    },
+    
+    # MORTGAGE & DEVELOPMENT BANKS
+    "ag_mortgage": {
+        "name": "AG Mortgage Bank",
+        "code": "90077",
+        "full_name": "AG Mortgage Bank Plc",
+        "type": "mortgage"
+    },
+    "abbey": {
+        "name": "Abbey Mortgage Bank",
+        "code": "404",
+        "full_name": "Abbey Mortgage Bank Plc",
+        "type": "mortgage"
+    },
+    "aso": {
+        "name": "ASO Savings & Loans",
+        "code": "401",
+        "full_name": "ASO Savings and Loans Plc",
+        "type": "mortgage"
+    },
+    "gateway": {
+        "name": "Gateway Mortgage Bank",
+        "code": "070009",
+        "full_name": "Gateway Mortgage Bank",
+        "type": "mortgage"
+    },
+    "fmbn": {
+        "name": "Federal Mortgage Bank",
+        "code": "413",
+        "full_name": "Federal Mortgage Bank of Nigeria",
+        "type": "development"
+    },
+    "nexim": {
+        "name": "NEXIM Bank",
+        "code": "304",
+        "full_name": "Nigerian Export-Import Bank",
+        "type": "development"
     }
 }
 
-# Quick lookup functions
+# Common names and spellings customers use -> bank key
+BANK_ALIASES = {
+    "gt": "gtbank",
+    "gtb": "gtbank",
+    "guaranty": "gtbank",
+    "first": "firstbank",
+    "fbn": "firstbank",
+    "united": "uba",
+    "eco": "ecobank",
+    "ibtc": "stanbic",
+    "standard": "standard",
+    "chartered": "standard",
+    "citi": "citi",
+    "palm": "palmpay",
+    "fair": "fairmoney",
+    "monie": "moniepoint",
+    "monie point": "moniepoint",
+    "moniepont": "moniepoint",
+    "moniepiont": "moniepoint",
+    "diamond": "access_diamond",
+    "diamond bank": "access_diamond",
+    "alat": "alat",
+    "wema alat": "alat",
+    "9 psb": "9psb",
+    "9mobile": "9psb",
+    "9mobile psb": "9psb",
+    "9payment service bank": "9psb",
+    "momo": "momo_psb",
+    "mtn momo": "momo_psb",
+    "smartcash": "smartcash_psb",
+    "airtel smartcash": "smartcash_psb",
+    "rmb": "rand",
+    "boi": "fmbn",
+}
+
+# Other codes seen for the same bank (NIP codes, legacy codes) -> bank key
+BANK_CODE_ALIASES = {
+    "039": "stanbic",
+    "602": "accion",
+    "51204": "ab",
+    "090": "vfd",
+    "070010": "vfd",
+    "090364": "carbon",
+    "090416": "eyowo",
+    "999993": "kuda",
+    "100029": "taj",
+    "070008": "page",
+    "070013": "ffs",
+    "070015": "infinity",
+    "070016": "safe",
+    "070017": "daylight",
+    "070018": "kredi",
+    "070019": "mayfresh",
+}
+
+# Quick lookup functions (served by the shared index in utils.bank_index)
 def get_bank_by_name(bank_name):
-    """Get bank info by name (case insensitive, partial match)"""
-    bank_name = bank_name.lower().strip()
-    
-    # Direct key match
-    if bank_name in NIGERIAN_BANKS:
-        return NIGERIAN_BANKS[bank_name]
-    
-    # Search by bank name
-    for key, bank in NIGERIAN_BANKS.items():
-        if bank_name in bank["name"].lower() or bank_name in bank["full_name"].lower():
-            return bank
-    
-    # Search by common aliases
-    aliases = {
-        "gt": "gtbank",
-        "guaranty": "gtbank", 
-        "first": "firstbank",
-        "fbn": "firstbank",
-        "access": "access",
-        "zenith": "zenith",
-        "uba": "uba",
-        "united": "uba",
-        "wema": "wema",
-        "sterling": "sterling",
-        "union": "union",
-        "fcmb": "fcmb",
-        "fidelity": "fidelity",
-        "eco": "ecobank",
-        "ecobank": "ecobank",
-        "heritage": "heritage",
-        "stanbic": "stanbic",
-        "ibtc": "stanbic",
-        "standard": "standard",
-        "chartered": "standard",
-        "polaris": "polaris",
-        "keystone": "keystone",
-        "providus": "providus",
-        "unity": "unity",
-        "citi": "citi",
-        "citibank": "citi",
-        "kuda": "kuda",
-        "carbon": "carbon",
-        "palmpay": "palmpay",
-        "palm": "palmpay",
-        "opay": "opay",
-        "vfd": "vfd",
-        "mint": "mint",
-        "fairmoney": "fairmoney",
-        "fair": "fairmoney",
-        "moniepoint": "moniepoint",
-        "monie": "moniepoint"
-    }
-    
-    if bank_name in aliases:
-        return NIGERIAN_BANKS[aliases[bank_name]]
-    
-    return None
+    """Get bank info by name (case insensitive, alias and typo tolerant)"""
+    from utils.bank_index import bank_index
+    return bank_index.resolve(bank_name)
 
 def get_bank_by_code(bank_code):
     """Get bank info by bank code"""
-    for bank in NIGERIAN_BANKS.values():
-        if bank["code"] == str(bank_code):
-            return bank
-    return None
+    from utils.bank_index import bank_index
+    return bank_index.get_by_code(bank_code)
 
 def get_all_banks():
     """Get all banks as a list"""
@@ -441,17 +658,9 @@ def get_banks_by_type(bank_type):
     return [bank for bank in NIGERIAN_BANKS.values() if bank["type"] == bank_type]
 
 def search_banks(query):
-    """Search banks by name or code"""
-    query = query.lower().strip()
-    results = []
-    
-    for bank in NIGERIAN_BANKS.values():
-        if (query in bank["name"].lower() or 
-            query in bank["full_name"].lower() or 
-            query in bank["code"]):
-            results.append(bank)
-    
-    return results
+    """Search banks by name prefix, code prefix or close spelling"""
+    from utils.bank_index import bank_index
+    return bank_index.search(query)
 
 # Popular banks for quick suggestions
 POPULAR_BANKS = [
@@ -168,35 +168,63 @@ class NigerianExpressionsDatabase:
                 "guy", "padi", "paddy", "person", "friend", "mate"
             ]
         }
+        self._compile_rewriter()
+    
+    def _compile_rewriter(self):
+        """
+        Build one regex that matches every amount and expression in a single pass
+        
+        Expressions are tried longest first so multi-word phrases win over the
+        single words inside them ("account don finish" before "don"), and the
+        first category that defines an expression supplies its translation.
+        """
+        self._replacements: Dict[str, Tuple[str, int]] = {}  # expression -> (english, order)
+        for category, expressions in self.expressions.items():
+            for nigerian_expr, english_expr in expressions.items():
+                if nigerian_expr not in self._replacements:
+                    self._replacements[nigerian_expr] = (english_expr, len(self._replacements))
+        
+        alternation = "|".join(
+            re.escape(expr) for expr in sorted(self._replacements, key=len, reverse=True)
+        )
+        self._rewriter = re.compile(
+            r'\b(?:(?P<number>\d+(?:\.\d+)?)(?P<unit>[km])|(?P<expr>' + alternation + r'))\b'
+        )
+        self._unit_multipliers = {"k": 1000, "m": 1000000}
+        self._unit_labels = {"k": "k_amounts", "m": "m_amounts"}
     
     def enhance_message(self, message: str) -> Dict[str, any]:
         """
         Enhance a message by translating Nigerian expressions to standard English
         
+        Amounts (5k, 2.5m) and expressions are rewritten in one left-to-right
+        pass; replacement text is never rewritten again.
+        
         Returns:
             Dict with enhanced_message, urgency_level, relationship_context, etc.
         """
         original_message = message
-        enhanced = message.lower()
         
-        # Track what was enhanced
-        enhancements = []
+        # Track what was enhanced (amount types first, then expressions in table order)
+        amount_types = set()
+        expressions_seen = set()
         
-        # Step 1: Replace amount patterns (5k -> 5000 naira)
-        for pattern_type, patterns in self.amount_patterns.items():
-            for pattern, replacement_func in patterns.items():
-                if re.search(pattern, enhanced):
-                    enhanced = re.sub(pattern, replacement_func, enhanced)
-                    enhancements.append(f"Amount pattern: {pattern_type}")
+        def rewrite(match):
+            if match.group("expr") is not None:
+                expressions_seen.add(match.group("expr"))
+                return self._replacements[match.group("expr")][0]
+            unit = match.group("unit")
+            amount_types.add(self._unit_labels[unit])
+            return f"{int(float(match.group('number')) * self._unit_multipliers[unit])} naira"
         
-        # Step 2: Replace Nigerian expressions with English equivalents
-        for category, expressions in self.expressions.items():
-            for nigerian_expr, english_expr in expressions.items():
-                if nigerian_expr in enhanced:
-                    enhanced = enhanced.replace(nigerian_expr, english_expr)
-                    enhancements.append(f"Expression: {nigerian_expr} -> {english_expr}")
+        enhanced = self._rewriter.sub(rewrite, message.lower())
+        
+        enhancements = [f"Amount pattern: {pattern_type}"
+                        for pattern_type in self.amount_patterns if pattern_type in amount_types]
+        enhancements += [f"Expression: {expr} -> {self._replacements[expr][0]}"
+                         for expr in sorted(expressions_seen, key=lambda e: self._replacements[e][1])]
         
-        # Step 3: Detect context
+        # Detect context
         urgency_level = self._detect_urgency(original_message)
         relationship_context = self._detect_relationship(original_message)
         
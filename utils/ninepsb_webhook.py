@@ -10,12 +10,12 @@ import hashlib
 import hmac
 from datetime import datetime
 from flask import request, jsonify
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 
 # Initialize Supabase
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase = get_supabase_client(SUPABASE_URL, SUPABASE_KEY)
 
 def verify_9psb_webhook_signature(payload, signature, secret):
     """
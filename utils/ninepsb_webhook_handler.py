@@ -6,14 +6,14 @@ import hmac
 import logging
 from datetime import datetime
 from flask import request, jsonify
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 import os
 
 logger = logging.getLogger(__name__)
 
 class NINEPSBWebhookHandler:
     def __init__(self):
-        self.supabase = create_client(
+        self.supabase = get_supabase_client(
             os.getenv("SUPABASE_URL"),
             os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
         )
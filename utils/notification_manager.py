@@ -15,7 +15,7 @@ from typing import Dict, Optional
 from datetime import datetime
 import requests
 from dotenv import load_dotenv
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -25,7 +25,7 @@ class NotificationManager:
     
     def __init__(self):
         self.bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
-        self.supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        self.supabase = get_supabase_client()
         self.telegram_api_url = f"https://api.telegram.org/bot{self.bot_token}"
     
     async def send_deposit_notification(self, user_id: str, amount: float, balance: float, 
@@ -14,7 +14,7 @@ import logging
 from datetime import datetime
 from typing import Dict, Optional, List
 import requests
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 from dotenv import load_dotenv
 import sys
 from beautiful_receipt_generator import receipt_generator
@@ -24,7 +24,7 @@ load_dotenv()
 # Initialize Supabase client
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
+supabase = get_supabase_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
 
 logger = logging.getLogger(__name__)
 
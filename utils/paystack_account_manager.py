@@ -17,7 +17,9 @@ logger = logging.getLogger(__name__)
 print("🔍 Loading PaystackVirtualAccountManager module...")
 
 try:
-    from supabase import create_client, Client
+    from supabase import Client
+    from utils.supabase_client import get_supabase_client
+    from utils.user_resolver import invalidate_user
     import requests
     import traceback
     print("✅ All imports successful")
@@ -38,7 +40,7 @@ class PaystackVirtualAccountManager:
         self.paystack_secret_key = os.environ.get("PAYSTACK_SECRET_KEY")
         
         # Initialize Supabase client
-        self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
+        self.supabase: Client = get_supabase_client(self.supabase_url, self.supabase_key)
         
         # Initialize Paystack integration
         try:
@@ -218,6 +220,7 @@ class PaystackVirtualAccountManager:
                 }
                 
                 result = self.supabase.table('users').update(update_data).eq('id', user_id).execute()
+                invalidate_user(user_id=user_id)
                 
                 return {
                     'success': True,
@@ -287,6 +290,7 @@ class PaystackVirtualAccountManager:
             
             # Update user in Supabase
             result = self.supabase.table('users').update(update_data).eq('id', user_id).execute()
+            invalidate_user(user_id=user_id)
             
             if not result.data:
                 logger.error(f"❌ Failed to update user with Paystack details")
@@ -0,0 +1,305 @@
+"""
+🔐 PENDING TRANSACTION STORE
+
+Shared storage for transfers awaiting PIN verification and their single-use
+secure tokens.
+
+The PIN page and /api/verify-pin can land on any gunicorn worker, so state
+created by one worker has to be visible to all of them:
+
+- SQLitePendingStore: one local SQLite file (WAL mode) shared by every worker
+  on the host. Token consumption is a single conditional UPDATE, so exactly
+  one request can ever use a token, whichever worker it hits.
+- MemoryPendingStore: per-process dicts, for tests and single-process runs.
+
+Both evict expired entries in expiry order (a heap in memory, an index on
+expires_at in SQLite), so cleanup never scans live entries. Tokens are stored
+as SHA-256 digests; the raw bearer token never touches disk.
+
+Pending transfers hold account numbers and amounts, so the SQLite file is
+created 0600. Without PENDING_STORE_PATH it lives in a per-user 0700 directory
+under the system temp dir, and a directory there that another user could have
+planted (wrong owner or group/world access) is refused.
+"""
+
+import os
+import json
+import stat
+import time
+import heapq
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING_STORE_BACKEND = os.getenv("PENDING_STORE_BACKEND", "sqlite")
+DEFAULT_PENDING_STORE_PATH = os.path.join(
+    tempfile.gettempdir(), f"sofi-pending-{os.getuid()}", "pending_transactions.sqlite3"
+)
+PENDING_STORE_PATH = os.getenv("PENDING_STORE_PATH") or DEFAULT_PENDING_STORE_PATH
+PURGE_INTERVAL = 30  # seconds between opportunistic expiry sweeps
+
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _prepare_private_file(path: str, private_dir: bool):
+    """Create the store file 0600 (its WAL files inherit the mode) before SQLite opens it"""
+    directory = os.path.dirname(os.path.abspath(path))
+    if private_dir:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.lstat(directory)
+        # lstat: a symlink is not a directory we created
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise PermissionError(f"{directory} is not a private directory owned by this user")
+    else:
+        os.makedirs(directory, exist_ok=True)
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    os.chmod(path, 0o600)
+
+
+def _token_record(transaction_id: str, created_at: float, expires_at: float, used: bool) -> Dict:
+    """Token metadata in the shape SecurePinVerification has always used"""
+    return {
+        'transaction_id': transaction_id,
+        'created_at': datetime.fromtimestamp(created_at),
+        'expires_at': datetime.fromtimestamp(expires_at),
+        'used': bool(used)
+    }
+
+
+class PendingTransactionStore:
+    """Interface for pending transaction and secure token storage"""
+
+    def put_transaction(self, transaction_id: str, data: Dict, expires_at: float):
+        raise NotImplementedError
+
+    def get_transaction(self, transaction_id: str) -> Optional[Dict]:
+        """Unexpired transaction data, or None"""
+        raise NotImplementedError
+
+    def delete_transaction(self, transaction_id: str) -> bool:
+        raise NotImplementedError
+
+    def put_token(self, token: str, transaction_id: str, expires_at: float):
+        raise NotImplementedError
+
+    def get_token(self, token: str) -> Optional[Dict]:
+        """Unexpired token metadata (transaction_id, created_at, expires_at, used), or None"""
+        raise NotImplementedError
+
+    def consume_token(self, token: str) -> Optional[str]:
+        """
+        Atomically mark an unexpired, unused token as used
+
+        Returns:
+            The token's transaction ID, or None if the token is unknown,
+            expired or was already used
+        """
+        raise NotImplementedError
+
+    def purge_expired(self) -> int:
+        """Drop expired transactions and tokens; returns how many were removed"""
+        raise NotImplementedError
+
+    def get_stats(self) -> Dict:
+        raise NotImplementedError
+
+
+class MemoryPendingStore(PendingTransactionStore):
+    """Per-process store with heap-ordered expiry (tests, single worker)"""
+
+    def __init__(self):
+        self._transactions: Dict[str, tuple] = {}  # id -> (data, expires_at)
+        self._tokens: Dict[str, list] = {}  # sha256 -> [transaction_id, created_at, expires_at, used]
+        self._expiry_heap = []  # (expires_at, kind, key)
+        self._lock = threading.Lock()
+
+    def put_transaction(self, transaction_id: str, data: Dict, expires_at: float):
+        with self._lock:
+            self._purge_locked(time.time())
+            self._transactions[transaction_id] = (data, expires_at)
+            heapq.heappush(self._expiry_heap, (expires_at, "transaction", transaction_id))
+
+    def get_transaction(self, transaction_id: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._transactions.get(transaction_id)
+            if not entry or entry[1] <= time.time():
+                return None
+            return entry[0]
+
+    def delete_transaction(self, transaction_id: str) -> bool:
+        with self._lock:
+            return self._transactions.pop(transaction_id, None) is not None
+
+    def put_token(self, token: str, transaction_id: str, expires_at: float):
+        key = _token_key(token)
+        with self._lock:
+            self._tokens[key] = [transaction_id, time.time(), expires_at, False]
+            heapq.heappush(self._expiry_heap, (expires_at, "token", key))
+
+    def get_token(self, token: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._tokens.get(_token_key(token))
+            if not entry or entry[2] <= time.time():
+                return None
+            return _token_record(*entry)
+
+    def consume_token(self, token: str) -> Optional[str]:
+        with self._lock:
+            entry = self._tokens.get(_token_key(token))
+            if not entry or entry[3] or entry[2] <= time.time():
+                return None
+            entry[3] = True
+            return entry[0]
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            return self._purge_locked(time.time())
+
+    def _purge_locked(self, now: float) -> int:
+        removed = 0
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, kind, key = heapq.heappop(self._expiry_heap)
+            entries = self._transactions if kind == "transaction" else self._tokens
+            entry = entries.get(key)
+            # Skip heap entries for keys stored again with a later expiry
+            if entry is not None and (entry[1] if kind == "transaction" else entry[2]) == expires_at:
+                del entries[key]
+                removed += 1
+        return removed
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "backend": "memory",
+                "transactions": len(self._transactions),
+                "tokens": len(self._tokens),
+            }
+
+
+class SQLitePendingStore(PendingTransactionStore):
+    """Host-wide store in a local SQLite file, shared by all gunicorn workers"""
+
+    def __init__(self, path: str = PENDING_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._last_purge = 0.0
+        _prepare_private_file(path, private_dir=path == DEFAULT_PENDING_STORE_PATH)
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pending_transactions ("
+                " transaction_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS pending_transactions_expiry ON pending_transactions (expires_at)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pin_tokens ("
+                " token_hash TEXT PRIMARY KEY, transaction_id TEXT NOT NULL,"
+                " created_at REAL NOT NULL, expires_at REAL NOT NULL, used INTEGER NOT NULL DEFAULT 0)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pin_tokens_expiry ON pin_tokens (expires_at)")
+        logger.info(f"💾 Pending transaction store at {self.path}")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One autocommit connection per thread, reopened after fork"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def put_transaction(self, transaction_id: str, data: Dict, expires_at: float):
+        self._maybe_purge()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO pending_transactions (transaction_id, data, expires_at) VALUES (?, ?, ?)",
+            (transaction_id, json.dumps(data, default=str), expires_at)
+        )
+
+    def get_transaction(self, transaction_id: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            "SELECT data FROM pending_transactions WHERE transaction_id = ? AND expires_at > ?",
+            (transaction_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete_transaction(self, transaction_id: str) -> bool:
+        cursor = self._connection().execute(
+            "DELETE FROM pending_transactions WHERE transaction_id = ?", (transaction_id,)
+        )
+        return cursor.rowcount > 0
+
+    def put_token(self, token: str, transaction_id: str, expires_at: float):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO pin_tokens (token_hash, transaction_id, created_at, expires_at, used)"
+            " VALUES (?, ?, ?, ?, 0)",
+            (_token_key(token), transaction_id, time.time(), expires_at)
+        )
+
+    def get_token(self, token: str) -> Optional[Dict]:
+        row = self._connection().execute(
+            "SELECT transaction_id, created_at, expires_at, used FROM pin_tokens"
+            " WHERE token_hash = ? AND expires_at > ?",
+            (_token_key(token), time.time())
+        ).fetchone()
+        return _token_record(*row) if row else None
+
+    def consume_token(self, token: str) -> Optional[str]:
+        key = _token_key(token)
+        conn = self._connection()
+        # The conditional UPDATE is the single point of truth: only one caller
+        # across all workers can flip used from 0 to 1
+        cursor = conn.execute(
+            "UPDATE pin_tokens SET used = 1 WHERE token_hash = ? AND used = 0 AND expires_at > ?",
+            (key, time.time())
+        )
+        if cursor.rowcount != 1:
+            return None
+        row = conn.execute("SELECT transaction_id FROM pin_tokens WHERE token_hash = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        self._last_purge = now
+        conn = self._connection()
+        removed = conn.execute("DELETE FROM pending_transactions WHERE expires_at <= ?", (now,)).rowcount
+        removed += conn.execute("DELETE FROM pin_tokens WHERE expires_at <= ?", (now,)).rowcount
+        return removed
+
+    def _maybe_purge(self):
+        if time.time() - self._last_purge >= PURGE_INTERVAL:
+            try:
+                self.purge_expired()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Pending store purge failed: {e}")
+
+    def get_stats(self) -> Dict:
+        conn = self._connection()
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "transactions": conn.execute("SELECT COUNT(*) FROM pending_transactions").fetchone()[0],
+            "tokens": conn.execute("SELECT COUNT(*) FROM pin_tokens").fetchone()[0],
+        }
+
+
+def create_pending_store(backend: str = None) -> PendingTransactionStore:
+    """Store selected by PENDING_STORE_BACKEND ("sqlite" or "memory")"""
+    backend = (backend or PENDING_STORE_BACKEND).lower()
+    if backend == "memory":
+        return MemoryPendingStore()
+    try:
+        return SQLitePendingStore()
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"❌ SQLite pending store unavailable ({e}); falling back to per-worker memory")
+        return MemoryPendingStore()
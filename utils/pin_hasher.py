@@ -0,0 +1,180 @@
+"""
+Sofi AI PIN Hasher
+Off-event-loop PIN hashing and verification with an attempt throttle
+
+PINs are hashed with PBKDF2-HMAC-SHA256 (100,000 iterations, the user's chat
+ID as salt), which costs tens of milliseconds of CPU. Running that inside an
+async handler freezes every other coroutine on the loop, so hashing runs on a
+small bounded thread pool instead (hashlib releases the GIL while deriving).
+
+Before any hashing, a per-user throttle rejects users locked out by repeated
+failures. A correct PIN is remembered briefly as a keyed digest, so a
+confirmation retried within a few minutes skips the derivation; the entry is
+tied to the stored hash and dies as soon as the PIN changes.
+"""
+
+import os
+import hmac
+import time
+import asyncio
+import hashlib
+import logging
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+PIN_HASH_ITERATIONS = 100000
+PIN_HASH_WORKERS = int(os.getenv("PIN_HASH_WORKERS", "2"))
+MAX_PIN_FAILURES = 3
+PIN_LOCKOUT_SECONDS = 15 * 60
+VERIFIED_PIN_TTL = float(os.getenv("VERIFIED_PIN_TTL", "300"))
+VERIFIED_PIN_MAX_ENTRIES = 10000
+
+
+def hash_pin(pin: str, salt: str) -> str:
+    """PBKDF2 hash of a PIN, hex encoded (same scheme as onboarding)"""
+    return hashlib.pbkdf2_hmac('sha256',
+                               str(pin).encode('utf-8'),
+                               str(salt).encode('utf-8'),
+                               PIN_HASH_ITERATIONS).hex()
+
+
+class PinHasher:
+    """Bounded hashing pool, failed-attempt throttle and verified-PIN cache"""
+
+    def __init__(self, max_workers: int = PIN_HASH_WORKERS,
+                 max_failures: int = MAX_PIN_FAILURES,
+                 lockout_seconds: float = PIN_LOCKOUT_SECONDS,
+                 verified_ttl: float = VERIFIED_PIN_TTL):
+        self.max_workers = max_workers
+        self.max_failures = max_failures
+        self.lockout_seconds = lockout_seconds
+        self.verified_ttl = verified_ttl
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pid = None
+        self._failures: Dict[str, list] = {}  # user -> [failed count, locked until]
+        self._verified: "OrderedDict[str, tuple]" = OrderedDict()  # user -> (stored hash, digest, expires)
+        self._secret = secrets.token_bytes(32)  # Cache digests are useless outside this process
+        self._stats = {"hashes": 0, "verified": 0, "rejected": 0, "throttled": 0, "cache_hits": 0}
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="pin-hash")
+                self._pid = os.getpid()
+            return self._executor
+
+    # =================== HASHING ===================
+
+    async def hash(self, pin: str, salt: str) -> str:
+        """Hash a PIN on the pool without blocking the event loop"""
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self._get_executor(), hash_pin, pin, salt)
+        with self._lock:
+            self._stats["hashes"] += 1
+        return result
+
+    async def verify(self, user_key: str, pin: str, salt: str, stored_hash: str) -> bool:
+        """
+        Check a PIN against its stored hash
+
+        Locked users are rejected before any hashing; call locked_for() first
+        to tell them why. Failures count towards the lockout, a success
+        clears it.
+        """
+        user_key = str(user_key)
+        if self.locked_for(user_key):
+            with self._lock:
+                self._stats["throttled"] += 1
+            return False
+
+        digest = self._digest(salt, pin)
+        if self._is_recently_verified(user_key, stored_hash, digest):
+            self.record_attempt(user_key, True)
+            return True
+
+        valid = hmac.compare_digest(await self.hash(pin, salt), str(stored_hash))
+        self.record_attempt(user_key, valid)
+        if valid:
+            self._remember_verified(user_key, stored_hash, digest)
+        return valid
+
+    # =================== THROTTLE ===================
+
+    def locked_for(self, user_key: str) -> int:
+        """Seconds until the user may try again (0 when not locked)"""
+        with self._lock:
+            entry = self._failures.get(str(user_key))
+            if not entry or not entry[1]:
+                return 0
+            remaining = entry[1] - time.time()
+            if remaining <= 0:
+                del self._failures[str(user_key)]
+                return 0
+            return int(remaining) + 1
+
+    def record_attempt(self, user_key: str, success: bool):
+        """Count a failed attempt (locking after max_failures) or clear on success"""
+        user_key = str(user_key)
+        with self._lock:
+            if success:
+                self._failures.pop(user_key, None)
+                self._stats["verified"] += 1
+                return
+            self._stats["rejected"] += 1
+            entry = self._failures.setdefault(user_key, [0, 0.0])
+            entry[0] += 1
+            if entry[0] >= self.max_failures:
+                entry[1] = time.time() + self.lockout_seconds
+                logger.warning(f"🔒 PIN attempts locked for {user_key} ({entry[0]} failures)")
+
+    # =================== VERIFIED CACHE ===================
+
+    def _digest(self, salt: str, pin: str) -> bytes:
+        return hmac.new(self._secret, f"{salt}:{pin}".encode('utf-8'), hashlib.sha256).digest()
+
+    def _is_recently_verified(self, user_key: str, stored_hash: str, digest: bytes) -> bool:
+        with self._lock:
+            entry = self._verified.get(user_key)
+            if not entry:
+                return False
+            cached_hash, cached_digest, expires = entry
+            if expires <= time.time() or cached_hash != stored_hash:
+                del self._verified[user_key]
+                return False
+            if not hmac.compare_digest(cached_digest, digest):
+                return False
+            self._stats["cache_hits"] += 1
+            return True
+
+    def _remember_verified(self, user_key: str, stored_hash: str, digest: bytes):
+        with self._lock:
+            self._verified[user_key] = (stored_hash, digest, time.time() + self.verified_ttl)
+            self._verified.move_to_end(user_key)
+            while len(self._verified) > VERIFIED_PIN_MAX_ENTRIES:
+                self._verified.popitem(last=False)
+
+    def forget(self, user_key: str):
+        """Drop a user's cached verification and failures (e.g. after a PIN change)"""
+        with self._lock:
+            self._verified.pop(str(user_key), None)
+            self._failures.pop(str(user_key), None)
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "workers": self.max_workers,
+                "locked_users": sum(1 for _, until in self._failures.values() if until > time.time()),
+                "cached_verifications": len(self._verified),
+            }
+
+
+# Global PIN hasher
+pin_hasher = PinHasher()
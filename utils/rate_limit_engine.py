@@ -0,0 +1,266 @@
+"""
+SOFI AI RATE LIMIT ENGINE
+=========================
+Constant-time, constant-memory rate limiting per key (usually an IP)
+
+Each rule is a sliding window approximated with two fixed buckets: the count
+for the current window plus the previous window's count weighted by how much
+of it still overlaps the sliding window. A check touches a handful of integers
+per rule, never a list of timestamps, so cost and memory per IP stay flat no
+matter how long the window is (10 seconds or 24 hours).
+
+Idle keys are evicted in least-recently-seen order and timed blocks expire
+from a heap, both driven by one background sweeper thread per process instead
+of a sleeping thread per block.
+"""
+
+import os
+import time
+import heapq
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = float(os.getenv("RATE_LIMIT_SWEEP_INTERVAL", "30"))
+MAX_TRACKED_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+class RateLimitRule(NamedTuple):
+    name: str
+    limit: int
+    window: float  # seconds
+    label: str = ""
+
+
+class _KeyState:
+    __slots__ = ("last_seen", "buckets", "blocked_until", "violations")
+
+    def __init__(self, rule_count: int, now: float):
+        self.last_seen = now
+        # Flat [window index, current count, previous count] triple per rule
+        self.buckets = [0, 0, 0] * rule_count
+        self.blocked_until = 0.0
+        self.violations = 0
+
+
+class RateLimitEngine:
+    """Sliding-window counters for many keys and several windows at once"""
+
+    def __init__(self, rules: List[RateLimitRule], idle_ttl: float = None,
+                 max_keys: int = MAX_TRACKED_KEYS):
+        self.rules = list(rules)
+        self.idle_ttl = idle_ttl if idle_ttl is not None else max(rule.window for rule in self.rules)
+        self.max_keys = max_keys
+        self._keys: "OrderedDict[str, _KeyState]" = OrderedDict()  # least recently seen first
+        self._lock = threading.Lock()
+        self._stats = {"checks": 0, "limited": 0, "evicted": 0}
+        register_expiry(self.expire)
+
+    def hit(self, key: str, now: float = None, limits: Dict[str, int] = None) -> Optional[Dict]:
+        """
+        Count one request for key and check every rule
+
+        Args:
+            key: Client key (IP address)
+            now: Current time (defaults to time.time())
+            limits: Optional per-call overrides of rule limits by rule name
+
+        Returns:
+            Violation info for the first rule exceeded, or None
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            self._stats["checks"] += 1
+            state = self._touch(key, now)
+            violation = None
+            for i, rule in enumerate(self.rules):
+                count = self._count(rule, state.buckets, 3 * i, now)
+                limit = limits.get(rule.name, rule.limit) if limits else rule.limit
+                if violation is None and count > limit:
+                    violation = {
+                        'violated': True,
+                        'rule': rule.name,
+                        'limit': limit,
+                        'actual': count,
+                        'window': rule.label or f"{int(rule.window)} seconds",
+                    }
+            if violation:
+                self._stats["limited"] += 1
+            return violation
+
+    def _count(self, rule: RateLimitRule, buckets: list, at: int, now: float) -> int:
+        """Advance the bucket pair, record the request and return the window estimate"""
+        index = int(now // rule.window)
+        if index != buckets[at]:
+            buckets[at + 2] = buckets[at + 1] if index == buckets[at] + 1 else 0
+            buckets[at + 1] = 0
+            buckets[at] = index
+        buckets[at + 1] += 1
+        overlap = 1.0 - (now % rule.window) / rule.window
+        return int(buckets[at + 2] * overlap) + buckets[at + 1]
+
+    def _touch(self, key: str, now: float) -> _KeyState:
+        state = self._keys.get(key)
+        if state is None:
+            state = _KeyState(len(self.rules), now)
+            self._keys[key] = state
+            if len(self._keys) > self.max_keys:
+                self._evict_oldest(now)
+        else:
+            self._keys.move_to_end(key)
+        state.last_seen = now
+        return state
+
+    def _evict_oldest(self, now: float):
+        """Drop the least recently seen key that is not blocked (caller holds the lock)"""
+        for key, state in self._keys.items():
+            if state.blocked_until <= now:
+                del self._keys[key]
+                self._stats["evicted"] += 1
+                return
+
+    # =================== BLOCKS ===================
+
+    def blocked_until(self, key: str, now: float = None) -> float:
+        """Unblock timestamp if key is blocked right now, else 0"""
+        now = time.time() if now is None else now
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None or state.blocked_until <= now:
+                return 0.0
+            return state.blocked_until
+
+    def block(self, key: str, duration: float, now: float = None) -> int:
+        """Block key for duration seconds; returns its violation count"""
+        now = time.time() if now is None else now
+        with self._lock:
+            state = self._touch(key, now)
+            state.violations += 1
+            state.blocked_until = now + duration
+            return state.violations
+
+    def violations(self, key: str) -> int:
+        with self._lock:
+            state = self._keys.get(key)
+            return state.violations if state else 0
+
+    # =================== EXPIRY ===================
+
+    def expire(self, now: float = None) -> int:
+        """Evict keys idle longer than idle_ttl whose blocks have lapsed"""
+        now = time.time() if now is None else now
+        cutoff = now - self.idle_ttl
+        with self._lock:
+            idle = []
+            for key, state in self._keys.items():
+                if state.last_seen >= cutoff:
+                    break  # Everything after this was seen more recently
+                if state.blocked_until <= now:  # Blocked keys wait for their block to lapse
+                    idle.append(key)
+            for key in idle:
+                del self._keys[key]
+            evicted = len(idle)
+            self._stats["evicted"] += evicted
+        return evicted
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "tracked_keys": len(self._keys)}
+
+
+class ExpiringBlocklist:
+    """Set of blocked keys where timed entries expire from a heap"""
+
+    def __init__(self):
+        self._blocked: Dict[str, float] = {}  # key -> unblock time (inf = until removed)
+        self._heap: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+        register_expiry(self.expire)
+
+    def add(self, key: str, ttl: float = None):
+        """Block key, for ttl seconds or until discarded"""
+        until = time.time() + ttl if ttl else float("inf")
+        with self._lock:
+            self._blocked[key] = until
+            if ttl:
+                heapq.heappush(self._heap, (until, key))
+
+    def discard(self, key: str):
+        with self._lock:
+            self._blocked.pop(key, None)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            until = self._blocked.get(key)
+        return until is not None and until > time.time()
+
+    def __len__(self) -> int:
+        return len(self._blocked)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._blocked))
+
+    def expire(self, now: float = None) -> int:
+        """Remove blocks whose time has passed (O(log n) each)"""
+        now = time.time() if now is None else now
+        expired = 0
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                until, key = heapq.heappop(self._heap)
+                # Skip stale heap entries for keys re-blocked or discarded since
+                if self._blocked.get(key) == until:
+                    del self._blocked[key]
+                    expired += 1
+                    logger.info(f"🔓 IP unblocked: {key}")
+        return expired
+
+
+# =================== SHARED SWEEPER ===================
+
+_expiry_callbacks: List[Callable[[float], int]] = []
+_sweeper_lock = threading.Lock()
+_sweeper_pid = None
+
+
+def register_expiry(callback: Callable[[float], int]):
+    """Run callback(now) periodically on the process-wide sweeper thread"""
+    with _sweeper_lock:
+        _expiry_callbacks.append(callback)
+    _ensure_sweeper()
+
+
+def _ensure_sweeper():
+    global _sweeper_pid
+    with _sweeper_lock:
+        if _sweeper_pid == os.getpid():
+            return
+        _sweeper_pid = os.getpid()
+        threading.Thread(target=_sweep_forever, name="rate-limit-sweeper", daemon=True).start()
+
+
+def _sweep_forever():
+    while True:
+        time.sleep(SWEEP_INTERVAL)
+        now = time.time()
+        with _sweeper_lock:
+            callbacks = list(_expiry_callbacks)
+        for callback in callbacks:
+            try:
+                callback(now)
+            except Exception as e:
+                logger.error(f"❌ Rate limit expiry failed: {e}")
+
+
+def _after_fork_in_child():
+    # Threads do not survive fork (and the lock may have been held mid-sweep)
+    global _sweeper_lock
+    _sweeper_lock = threading.Lock()
+    _ensure_sweeper()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
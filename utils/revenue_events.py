@@ -0,0 +1,390 @@
+"""
+Sofi AI Revenue Event Log
+Write-behind buffer for profit, fee and sales accounting rows
+
+Transfers, deposits, airtime and crypto trades used to insert their
+accounting row (profits, transfer_charges, airtime_sales, ...) synchronously,
+inside the request that moved the money, and a personal withdrawal did a
+read-modify-write of sofi_financial_summary.
+
+Now a request appends an event and returns. Each event is one row for an
+accounting table plus the deltas it adds to sofi_financial_summary:
+
+- Events are appended to a local spool file (REVENUE_SPOOL_DIR, kept 0700)
+  before append() returns, so a restart loses nothing: the next worker
+  adopts spool segments no live process holds a lock on and replays them.
+- A flusher thread inserts the buffer every REVENUE_FLUSH_INTERVAL seconds,
+  or as soon as REVENUE_FLUSH_SIZE events are waiting, with one batched
+  insert per table; a segment is deleted once all its events are written.
+- The summary deltas of a flush are applied in one atomic increment
+  (apply_financial_summary_events, see revenue_event_log.sql), and a
+  running per-worker total is kept for get_stats().
+- Every event carries an event_id. Rows are upserted on it and the summary
+  function journals it, so replaying a segment after a crash, or retrying a
+  write that did commit, never counts an event twice.
+"""
+
+import os
+import json
+import stat
+import time
+import uuid
+import atexit
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows development machines: one process, no locking needed
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+REVENUE_FLUSH_SIZE = int(os.getenv("REVENUE_FLUSH_SIZE", "200"))
+REVENUE_FLUSH_INTERVAL = float(os.getenv("REVENUE_FLUSH_INTERVAL", "5"))
+REVENUE_SPOOL_DIR = os.getenv("REVENUE_SPOOL_DIR") or os.path.join(tempfile.gettempdir(), "sofi_revenue_spool")
+SUMMARY_TABLE = "sofi_financial_summary"
+SUMMARY_FUNCTION = "apply_financial_summary_events"
+
+
+def _merge(into: Dict[str, float], deltas: Optional[Dict[str, float]]):
+    for column, delta in (deltas or {}).items():
+        into[column] = into.get(column, 0.0) + float(delta)
+
+
+def _new_event_id() -> str:
+    return uuid.uuid4().hex
+
+
+def _prepare_spool_dir(directory: str):
+    """Create the spool directory 0700; refuse one owned by another user"""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):
+        return
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f"{directory} is not a directory owned by this user")
+    if info.st_mode & 0o077:
+        os.chmod(directory, 0o700)
+
+
+class _Segment:
+    """A spool file this worker owns (locked for as long as it is open)"""
+    __slots__ = ("path", "handle")
+
+    def __init__(self, path: str, handle):
+        self.path = path
+        self.handle = handle
+
+    @classmethod
+    def create(cls, directory: str) -> "_Segment":
+        path = os.path.join(directory, f"revenue-{os.getpid()}-{time.time_ns()}.jsonl")
+        handle = open(path, "a+", encoding="utf-8")
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return cls(path, handle)
+
+    @classmethod
+    def adopt(cls, path: str) -> Optional["_Segment"]:
+        """Take over a segment whose owner is gone (None if a live process holds it)"""
+        try:
+            handle = open(path, "a+", encoding="utf-8")
+        except OSError:
+            return None
+        if fcntl:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                handle.close()
+                return None
+        return cls(path, handle)
+
+    def write(self, event: Dict):
+        self.handle.write(json.dumps(event, default=str) + "\n")
+        self.handle.flush()
+
+    def read(self) -> List[Dict]:
+        self.handle.seek(0)
+        events = []
+        for line in self.handle:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a crash mid-write
+            event.setdefault("event_id", _new_event_id())  # spooled before events had ids
+            events.append(event)
+        return events
+
+    def delete(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.handle.close()
+
+
+class RevenueEventLog:
+    """Append-only accounting events, flushed in batches by size or time"""
+
+    def __init__(self, supabase=None, spool_dir: str = REVENUE_SPOOL_DIR,
+                 flush_size: int = REVENUE_FLUSH_SIZE, flush_interval: float = REVENUE_FLUSH_INTERVAL):
+        self._supabase = supabase
+        self.spool_dir = spool_dir
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pid = None
+        self._buffer: List[Dict] = []
+        self._active: Optional[_Segment] = None
+        self._sealed: List[_Segment] = []  # segments whose events are all in the buffer
+        self._summary_rpc = True
+        self._plain_tables = set()  # tables without the event_id column
+        self._totals: Dict[str, float] = {}
+        self._stats = {"appended": 0, "flushes": 0, "rows_written": 0, "write_errors": 0,
+                       "recovered": 0, "spool_errors": 0}
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            from utils.supabase_client import get_supabase_client
+            self._supabase = get_supabase_client()
+        return self._supabase
+
+    # =================== SPOOL ===================
+
+    def _ensure_started_locked(self):
+        """Open this worker's spool and flusher (again after a fork)"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        # Handles inherited from a parent process: closing ours keeps the parent's locks
+        for segment in self._sealed + ([self._active] if self._active else []):
+            segment.handle.close()
+        self._buffer, self._sealed, self._active = [], [], None
+        try:
+            _prepare_spool_dir(self.spool_dir)
+            for name in sorted(os.listdir(self.spool_dir)):
+                if not name.startswith("revenue-") or not name.endswith(".jsonl"):
+                    continue
+                segment = _Segment.adopt(os.path.join(self.spool_dir, name))
+                if segment is not None:
+                    recovered = segment.read()
+                    self._buffer.extend(recovered)
+                    self._sealed.append(segment)
+                    self._stats["recovered"] += len(recovered)
+            self._active = _Segment.create(self.spool_dir)
+        except OSError as e:
+            self._stats["spool_errors"] += 1
+            logger.error(f"❌ Revenue spool unavailable ({e}) - events are kept in memory only")
+        if self._stats["recovered"]:
+            logger.info(f"♻️ Recovered {self._stats['recovered']} unwritten revenue events from the spool")
+        threading.Thread(target=self._flush_loop, name="revenue-flush", daemon=True).start()
+
+    def _write_locked(self, event: Dict):
+        if self._active is None:
+            return
+        try:
+            self._active.write(event)
+        except (OSError, ValueError) as e:
+            self._stats["spool_errors"] += 1
+            logger.error(f"❌ Could not spool revenue event: {e}")
+
+    # =================== APPEND ===================
+
+    def append(self, table: Optional[str], row: Optional[Dict] = None,
+               summary: Optional[Dict[str, float]] = None):
+        """
+        Record an accounting event without waiting for the database
+
+        Args:
+            table: Table the row goes to (None for a summary-only event)
+            row: The row to insert
+            summary: Amounts to add to sofi_financial_summary columns
+        """
+        event = {"event_id": _new_event_id(), "table": table, "row": row, "summary": summary or {}}
+        with self._lock:
+            self._ensure_started_locked()
+            self._buffer.append(event)
+            self._write_locked(event)
+            self._stats["appended"] += 1
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    def pending_summary(self) -> Dict[str, float]:
+        """Summary deltas appended but not yet applied by a flush"""
+        pending: Dict[str, float] = {}
+        with self._lock:
+            for event in self._buffer:
+                _merge(pending, event.get("summary"))
+        return pending
+
+    # =================== FLUSH ===================
+
+    def _flush_loop(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write everything buffered; returns how many events were written"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._buffer or self._pid != os.getpid():
+                    return 0
+                batch, self._buffer = self._buffer, []
+                sealed = self._sealed + ([self._active] if self._active else [])
+                self._sealed = []
+                try:
+                    self._active = _Segment.create(self.spool_dir)
+                except OSError as e:
+                    self._active = None
+                    self._stats["spool_errors"] += 1
+                    logger.error(f"❌ Could not open a new revenue spool segment: {e}")
+            # Appends made from here on go to the new segment and the new buffer
+
+            failed = self._write_batch(batch)
+
+            with self._lock:
+                self._stats["flushes"] += 1
+                if failed:
+                    # Keep only the unwritten events, in a fresh segment, ahead of newer ones
+                    try:
+                        retry = _Segment.create(self.spool_dir)
+                        for event in failed:
+                            retry.write(event)
+                        self._sealed.insert(0, retry)
+                    except OSError as e:
+                        self._stats["spool_errors"] += 1
+                        logger.error(f"❌ Could not spool unwritten revenue events: {e}")
+                    self._buffer[:0] = failed
+                for segment in sealed:
+                    segment.delete()
+            return len(batch) - len(failed)
+
+    def _write_batch(self, batch: List[Dict]) -> List[Dict]:
+        """One upsert per table, then one summary increment; returns unwritten events"""
+        by_table: Dict[str, List[Dict]] = {}
+        for event in batch:
+            if event.get("table") and event.get("row") is not None:
+                by_table.setdefault(event["table"], []).append(event)
+
+        failed: List[Dict] = []
+        failed_tables = set()
+        for table, events in by_table.items():
+            try:
+                self._insert_rows(table, events)
+                with self._lock:
+                    self._stats["rows_written"] += len(events)
+            except Exception as e:
+                failed_tables.add(table)
+                failed.extend(events)
+                with self._lock:
+                    self._stats["write_errors"] += 1
+                logger.error(f"❌ Revenue rows for {table} not written ({len(events)} kept for retry): {e}")
+
+        # Summary deltas count once their row is in (or when they have no row)
+        summarized = [event for event in batch
+                      if event.get("summary") and event.get("table") not in failed_tables]
+        if summarized:
+            try:
+                deltas = self._apply_summary(summarized)
+                with self._lock:
+                    _merge(self._totals, deltas)
+            except Exception as e:
+                logger.error(f"❌ Financial summary not updated (kept for retry): {e}")
+                # Same ids, so a summary that did commit is not applied again
+                failed.extend({"event_id": event["event_id"], "table": None, "row": None,
+                               "summary": event["summary"]} for event in summarized)
+        return failed
+
+    def _insert_rows(self, table: str, events: List[Dict]):
+        """Rows keyed by event_id; a replayed event is skipped by the database"""
+        if table not in self._plain_tables:
+            try:
+                self.supabase.table(table).upsert(
+                    [{**event["row"], "event_id": event["event_id"]} for event in events],
+                    on_conflict="event_id", ignore_duplicates=True,
+                ).execute()
+                return
+            except Exception as e:
+                if "event_id" not in str(e) and "42P10" not in str(e):  # no column / no unique index
+                    raise
+                self._plain_tables.add(table)
+                logger.warning(f"⚠️ {table}.event_id missing - run revenue_event_log.sql; "
+                               f"replayed events may be inserted twice")
+        self.supabase.table(table).insert([event["row"] for event in events]).execute()
+
+    def _apply_summary(self, events: List[Dict]) -> Dict[str, float]:
+        """Apply the events' deltas once per event_id; returns the deltas sent"""
+        deltas: Dict[str, float] = {}
+        for event in events:
+            _merge(deltas, event.get("summary"))
+        deltas = {column: round(delta, 8) for column, delta in deltas.items() if delta}
+        if not deltas:
+            return deltas
+        if self._summary_rpc:
+            try:
+                self.supabase.rpc(SUMMARY_FUNCTION, {"p_events": [
+                    {"event_id": event["event_id"], "deltas": event["summary"]} for event in events
+                ]}).execute()
+                return deltas
+            except Exception as e:
+                if "function" not in str(e).lower() and "PGRST202" not in str(e):
+                    raise
+                self._summary_rpc = False
+                logger.warning(f"⚠️ {SUMMARY_FUNCTION} not installed - run revenue_event_log.sql; "
+                               f"updating {SUMMARY_TABLE} with one read-modify-write per flush")
+
+        summary = self.supabase.table(SUMMARY_TABLE).select("*").limit(1).execute().data
+        if not summary:
+            raise RuntimeError(f"{SUMMARY_TABLE} has no row")
+        current = summary[0]
+        update = {column: float(current.get(column) or 0) + delta for column, delta in deltas.items()}
+        update["last_updated"] = datetime.now().isoformat()
+        self.supabase.table(SUMMARY_TABLE).update(update).eq("id", current["id"]).execute()
+        return deltas
+
+    def shutdown(self, timeout: float = 10):
+        """Flush what is buffered before the worker exits (the spool keeps the rest)"""
+        if self._pid != os.getpid():
+            return
+        done = threading.Event()
+
+        def _final_flush():
+            try:
+                self.flush()
+            finally:
+                done.set()
+
+        threading.Thread(target=_final_flush, name="revenue-final-flush", daemon=True).start()
+        if not done.wait(timeout):
+            logger.warning("⚠️ Revenue flush timed out at shutdown - events stay in the spool")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {**self._stats, "buffered": len(self._buffer),
+                    "spool_segments": len(self._sealed) + (1 if self._active else 0),
+                    "summary_totals": {column: round(total, 2) for column, total in self._totals.items()}}
+
+
+def _after_fork_in_child():
+    # The flusher and segment locks belong to the parent; the next append restarts them
+    revenue_events._lock = threading.Lock()
+    revenue_events._flush_lock = threading.Lock()
+    revenue_events._wake = threading.Event()
+
+
+# Global event log
+revenue_events = RevenueEventLog()
+
+atexit.register(revenue_events.shutdown)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
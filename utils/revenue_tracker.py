@@ -8,6 +8,9 @@ This module handles all revenue tracking and fee collection:
 2. Deposit fees (₦10 per bank deposit)
 3. Crypto trading profits (₦500-1000 markup)
 4. Airtime/Data profits (markup on cost price)
+
+Rows are written behind the request through utils/revenue_events.py, which
+also keeps sofi_financial_summary up to date from the same events.
 """
 
 import logging
@@ -15,6 +18,8 @@ from datetime import datetime
 from typing import Dict, Optional
 import uuid
 
+from utils.revenue_events import revenue_events
+
 logger = logging.getLogger(__name__)
 
 # Revenue Configuration
@@ -51,14 +56,13 @@ class RevenueTracker:
                 "timestamp": datetime.now().isoformat()
             }
             
-            result = self.client.table("transfer_charges").insert(fee_data).execute()
-            
-            if result.data:
-                logger.info(f"Transfer fee logged: ₦{TRANSFER_FEE} for transfer {monnify_reference}")
-                return True
-            else:
-                logger.error(f"Failed to log transfer fee: {result}")
-                return False
+            revenue_events.append("transfer_charges", fee_data, {
+                "total_transfer_fee_collected": TRANSFER_FEE,
+                "total_transfer_revenue": TRANSFER_FEE,
+                "total_revenue": TRANSFER_FEE,
+            })
+            logger.info(f"Transfer fee logged: ₦{TRANSFER_FEE} for transfer {monnify_reference}")
+            return True
                 
         except Exception as e:
             logger.error(f"Error logging transfer fee: {str(e)}")
@@ -78,14 +82,12 @@ class RevenueTracker:
                 "timestamp": datetime.now().isoformat()
             }
             
-            result = self.client.table("deposit_fees").insert(fee_data).execute()
-            
-            if result.data:
-                logger.info(f"Deposit fee logged: ₦{DEPOSIT_FEE} for deposit {monnify_reference}")
-                return True
-            else:
-                logger.error(f"Failed to log deposit fee: {result}")
-                return False
+            revenue_events.append("deposit_fees", fee_data, {
+                "total_deposit_fee_collected": DEPOSIT_FEE,
+                "total_revenue": DEPOSIT_FEE,
+            })
+            logger.info(f"Deposit fee logged: ₦{DEPOSIT_FEE} for deposit {monnify_reference}")
+            return True
                 
         except Exception as e:
             logger.error(f"Error logging deposit fee: {str(e)}")
@@ -117,14 +119,16 @@ class RevenueTracker:
                 "timestamp": datetime.now().isoformat()
             }
             
-            result = self.client.table("crypto_trades").insert(trade_data).execute()
-            
-            if result.data:
-                logger.info(f"Crypto trade logged: {crypto_amount} {crypto_type} → ₦{naira_equivalent} (Profit: ₦{profit_markup})")
-                return True
-            else:
-                logger.error(f"Failed to log crypto trade: {result}")
-                return False
+            summary = {
+                "total_crypto_profit": profit_markup,
+                "total_crypto_naira_paid": naira_equivalent,
+                "total_revenue": profit_markup,
+            }
+            if crypto_type in ("USDT", "BTC"):
+                summary[f"total_crypto_received_{crypto_type.lower()}"] = crypto_amount
+            revenue_events.append("crypto_trades", trade_data, summary)
+            logger.info(f"Crypto trade logged: {crypto_amount} {crypto_type} → ₦{naira_equivalent} (Profit: ₦{profit_markup})")
+            return True
                 
         except Exception as e:
             logger.error(f"Error logging crypto trade: {str(e)}")
@@ -151,15 +155,14 @@ class RevenueTracker:
                 "timestamp": datetime.now().isoformat()
             }
             
-            result = self.client.table("airtime_sales").insert(airtime_data).execute()
-            
-            if result.data:
-                profit = sale_price - cost_price
-                logger.info(f"Airtime sale logged: ₦{amount_sold} {network} (Profit: ₦{profit:.2f})")
-                return True
-            else:
-                logger.error(f"Failed to log airtime sale: {result}")
-                return False
+            profit = sale_price - cost_price
+            revenue_events.append("airtime_sales", airtime_data, {
+                "total_airtime_revenue": profit,
+                "total_airtime_amount_sold": amount_sold,
+                "total_revenue": profit,
+            })
+            logger.info(f"Airtime sale logged: ₦{amount_sold} {network} (Profit: ₦{profit:.2f})")
+            return True
                 
         except Exception as e:
             logger.error(f"Error logging airtime sale: {str(e)}")
@@ -187,15 +190,14 @@ class RevenueTracker:
                 "timestamp": datetime.now().isoformat()
             }
             
-            result = self.client.table("data_sales").insert(data_data).execute()
-            
-            if result.data:
-                profit = sale_price - cost_price
-                logger.info(f"Data sale logged: {bundle_size} {network} (Profit: ₦{profit:.2f})")
-                return True
-            else:
-                logger.error(f"Failed to log data sale: {result}")
-                return False
+            profit = sale_price - cost_price
+            revenue_events.append("data_sales", data_data, {
+                "total_data_revenue": profit,
+                "total_data_amount_sold": amount_sold,
+                "total_revenue": profit,
+            })
+            logger.info(f"Data sale logged: {bundle_size} {network} (Profit: ₦{profit:.2f})")
+            return True
                 
         except Exception as e:
             logger.error(f"Error logging data sale: {str(e)}")
@@ -207,7 +209,10 @@ class RevenueTracker:
             result = self.client.table("sofi_financial_summary").select("*").execute()
             
             if result.data:
-                summary = result.data[0]
+                summary = dict(result.data[0])
+                # Include this worker's events that are not flushed yet
+                for column, delta in revenue_events.pending_summary().items():
+                    summary[column] = float(summary.get(column) or 0) + delta
                 return {
                     "total_revenue": float(summary.get("total_revenue", 0)),
                     "crypto_profit": float(summary.get("total_crypto_profit", 0)),
@@ -232,18 +237,10 @@ class RevenueTracker:
     def log_personal_withdrawal(self, amount: float, description: str = "Personal withdrawal") -> bool:
         """Log when ThankGod withdraws profit"""
         try:
-            # Update the personal withdrawal total
-            result = self.client.table("sofi_financial_summary").update({
-                "total_personal_withdrawal": self.client.table("sofi_financial_summary").select("total_personal_withdrawal").execute().data[0]["total_personal_withdrawal"] + amount,
-                "last_updated": datetime.now().isoformat()
-            }).execute()
-            
-            if result.data:
-                logger.info(f"Personal withdrawal logged: ₦{amount} - {description}")
-                return True
-            else:
-                logger.error(f"Failed to log personal withdrawal: {result}")
-                return False
+            # Added to the personal withdrawal total by the next summary increment
+            revenue_events.append(None, summary={"total_personal_withdrawal": amount})
+            logger.info(f"Personal withdrawal logged: ₦{amount} - {description}")
+            return True
                 
         except Exception as e:
             logger.error(f"Error logging personal withdrawal: {str(e)}")
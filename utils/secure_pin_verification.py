@@ -15,29 +15,37 @@ Flow:
 import logging
 import asyncio
 import uuid
+import time
 import hashlib
 import secrets
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+from datetime import datetime
+from typing import Dict, Optional, Tuple
 from utils.conversation_state import conversation_state
 from utils.bank_api import BankAPI
+from utils.bank_index import bank_index
+from utils.pending_transaction_store import PendingTransactionStore, create_pending_store
+from utils.balance_ledger import balance_ledger
+from utils.pin_hasher import pin_hasher
 from utils.permanent_memory import (
     verify_user_pin, track_pin_attempt, is_user_locked,
     check_sufficient_balance, validate_transaction_limits
 )
 from utils.notification_service import notification_service
+from utils.async_bridge import run_blocking
+from paystack.bulk_payouts import bulk_payouts, PayoutItem
 from beautiful_receipt_generator import SofiReceiptGenerator
 
 logger = logging.getLogger(__name__)
 
+PIN_VERIFICATION_TTL = 15 * 60  # seconds a transfer and its token stay valid
+
 class SecurePinVerification:
     """Handles secure PIN verification for transfers using web app with token-based security"""
     
-    def __init__(self):
+    def __init__(self, store: PendingTransactionStore = None):
         self.bank_api = BankAPI()
-        self.pending_transactions = {}  # Store pending transactions by txn_id
-        self.secure_tokens = {}  # Store secure tokens mapping to txn_id
-        self.used_tokens = set()  # Track used tokens to prevent replay
+        # Pending transactions and secure tokens, shared by every worker
+        self.store = store or create_pending_store()
         
     def _generate_secure_token(self, transaction_id: str) -> str:
         """Generate a secure token for the transaction"""
@@ -45,12 +53,7 @@ class SecurePinVerification:
         token = secrets.token_urlsafe(32)  # 256-bit security
         
         # Create mapping from token to transaction
-        self.secure_tokens[token] = {
-            'transaction_id': transaction_id,
-            'created_at': datetime.now(),
-            'expires_at': datetime.now() + timedelta(minutes=15),
-            'used': False
-        }
+        self.store.put_token(token, transaction_id, time.time() + PIN_VERIFICATION_TTL)
         
         logger.info(f"🔑 Generated secure token for transaction {transaction_id}")
         return token
@@ -58,10 +61,11 @@ class SecurePinVerification:
     def store_pending_transaction(self, transaction_id: str, transaction_data: Dict) -> str:
         """Store transaction data for PIN verification and return secure token"""
         # Add expiry time (15 minutes)
-        transaction_data['expires_at'] = datetime.now() + timedelta(minutes=15)
-        transaction_data['created_at'] = datetime.now()
+        expires_at = time.time() + PIN_VERIFICATION_TTL
+        transaction_data['expires_at'] = datetime.fromtimestamp(expires_at).isoformat()
+        transaction_data['created_at'] = datetime.now().isoformat()
         
-        self.pending_transactions[transaction_id] = transaction_data
+        self.store.put_transaction(transaction_id, transaction_data, expires_at)
         
         # Generate secure token
         secure_token = self._generate_secure_token(transaction_id)
@@ -71,18 +75,11 @@ class SecurePinVerification:
         
     def get_pending_transaction_by_token(self, secure_token: str) -> Optional[Dict]:
         """Get pending transaction data using secure token"""
-        # Check if token exists and is valid
-        token_data = self.secure_tokens.get(secure_token)
+        # Check if token exists and is valid (expired tokens are never returned)
+        token_data = self.store.get_token(secure_token)
         
         if not token_data:
-            logger.warning(f"❌ Invalid token attempt: {secure_token[:10]}...")
-            return None
-            
-        # Check if token is expired
-        if datetime.now() > token_data['expires_at']:
-            logger.warning(f"⏰ Expired token attempt: {secure_token[:10]}...")
-            # Clean up expired token
-            del self.secure_tokens[secure_token]
+            logger.warning(f"❌ Invalid or expired token attempt: {secure_token[:10]}...")
             return None
             
         # Check if token was already used (prevent replay attacks)
@@ -92,66 +89,54 @@ class SecurePinVerification:
             
         # Get the actual transaction
         transaction_id = token_data['transaction_id']
-        transaction = self.pending_transactions.get(transaction_id)
+        transaction = self.store.get_transaction(transaction_id)
         
         if not transaction:
-            logger.warning(f"❌ Transaction not found for token: {secure_token[:10]}...")
-            return None
-            
-        # Check if transaction is expired
-        if datetime.now() > transaction['expires_at']:
-            logger.warning(f"⏰ Expired transaction: {transaction_id}")
-            # Clean up expired transaction
-            del self.pending_transactions[transaction_id]
+            logger.warning(f"❌ Transaction not found or expired for token: {secure_token[:10]}...")
             return None
             
         logger.info(f"✅ Valid token access for transaction: {transaction_id}")
         return transaction
         
+    def consume_token(self, secure_token: str) -> Optional[Tuple[str, Dict]]:
+        """
+        Use a secure token exactly once
+        
+        Returns:
+            (transaction_id, transaction) for the first caller on any worker;
+            None if the token is invalid, expired or already used
+        """
+        transaction_id = self.store.consume_token(secure_token)
+        if not transaction_id:
+            logger.warning(f"🔄 Invalid, expired or already used token: {secure_token[:10]}...")
+            return None
+        
+        transaction = self.store.get_transaction(transaction_id)
+        if not transaction:
+            logger.warning(f"⏰ Expired transaction: {transaction_id}")
+            return None
+        
+        logger.info(f"🔒 Token consumed: {secure_token[:10]}...")
+        return transaction_id, transaction
+        
     def mark_token_as_used(self, secure_token: str):
         """Mark a token as used to prevent replay attacks"""
-        token_data = self.secure_tokens.get(secure_token)
-        if token_data:
-            token_data['used'] = True
-            self.used_tokens.add(secure_token)
+        if self.store.consume_token(secure_token):
             logger.info(f"🔒 Token marked as used: {secure_token[:10]}...")
             
+    def cancel_pending_transaction(self, transaction_id: str) -> bool:
+        """Drop a pending transaction (its tokens then resolve to nothing)"""
+        return self.store.delete_transaction(transaction_id)
+            
     def cleanup_expired_data(self):
         """Clean up expired transactions and tokens"""
-        now = datetime.now()
-        
-        # Clean expired transactions
-        expired_txns = [
-            txn_id for txn_id, txn_data in self.pending_transactions.items()
-            if now > txn_data['expires_at']
-        ]
-        for txn_id in expired_txns:
-            del self.pending_transactions[txn_id]
-            
-        # Clean expired tokens
-        expired_tokens = [
-            token for token, token_data in self.secure_tokens.items()
-            if now > token_data['expires_at']
-        ]
-        for token in expired_tokens:
-            del self.secure_tokens[token]
-            
-        if expired_txns or expired_tokens:
-            logger.info(f"🧹 Cleaned up {len(expired_txns)} expired transactions and {len(expired_tokens)} expired tokens")
+        removed = self.store.purge_expired()
+        if removed:
+            logger.info(f"🧹 Cleaned up {removed} expired transactions and tokens")
         
     def get_pending_transaction(self, transaction_id: str) -> Optional[Dict]:
         """Get pending transaction data (legacy method for backward compatibility)"""
-        transaction = self.pending_transactions.get(transaction_id)
-        
-        if not transaction:
-            return None
-            
-        # Check if expired
-        if datetime.now() > transaction['expires_at']:
-            del self.pending_transactions[transaction_id]
-            return None
-            
-        return transaction
+        return self.store.get_transaction(transaction_id)
         
     async def verify_pin_and_process_transfer(self, transaction_id: str, pin: str) -> Dict:
         """
@@ -173,6 +158,9 @@ class SecurePinVerification:
                     'error': 'Transaction not found or expired'
                 }
             
+            if transaction.get('type') == 'bulk_payout':
+                return await self._verify_pin_and_process_payout(transaction_id, transaction, pin)
+            
             chat_id = transaction['chat_id']
             user_data = transaction['user_data']
             transfer_data = transaction['transfer_data']
@@ -212,22 +200,9 @@ class SecurePinVerification:
             if not user_id:
                 return {'success': False, 'error': 'User ID not found'}
             
-            # Check if user is locked
-            if await is_user_locked(str(user_id)):
-                return {
-                    'success': False,
-                    'error': 'Account temporarily locked due to too many failed PIN attempts'
-                }
-            
-            # Verify PIN
-            pin_valid = await verify_user_pin(str(user_id), pin.strip())
-            await track_pin_attempt(str(user_id), pin_valid)
-            
-            if not pin_valid:
-                return {
-                    'success': False,
-                    'error': 'Invalid PIN'
-                }
+            pin_error = await self._check_pin(str(user_id), pin)
+            if pin_error:
+                return pin_error
             
             # Step 3: Process transfer
             result = await self._process_secure_transfer(
@@ -235,8 +210,7 @@ class SecurePinVerification:
             )
             
             # Clean up pending transaction
-            if transaction_id in self.pending_transactions:
-                del self.pending_transactions[transaction_id]
+            self.store.delete_transaction(transaction_id)
                 
             return result
             
@@ -247,6 +221,83 @@ class SecurePinVerification:
                 'error': 'Transfer processing failed'
             }
     
+    async def _check_pin(self, user_id: str, pin: str) -> Optional[Dict]:
+        """Lockout check and PIN verification; returns the error result, or None if the PIN is valid"""
+        # Check if user is locked (local throttle first: no database call, no hashing)
+        if pin_hasher.locked_for(user_id) or await is_user_locked(user_id):
+            return {
+                'success': False,
+                'error': 'Account temporarily locked due to too many failed PIN attempts'
+            }
+        
+        pin_valid = await verify_user_pin(user_id, pin.strip())
+        pin_hasher.record_attempt(user_id, pin_valid)
+        await track_pin_attempt(user_id, pin_valid)
+        
+        if not pin_valid:
+            return {
+                'success': False,
+                'error': 'Invalid PIN'
+            }
+        return None
+    
+    async def _verify_pin_and_process_payout(self, transaction_id: str, transaction: Dict, pin: str) -> Dict:
+        """
+        Send a PIN-approved group payout (stored by send_group_payout) through
+        the bulk payout pipeline
+        
+        The references were fixed when the payout was stored, so a batch that
+        is somehow submitted twice is refused by Paystack the second time.
+        """
+        chat_id = transaction['chat_id']
+        user_id = (transaction.get('user_data') or {}).get('id')
+        payouts = transaction.get('payouts') or []
+        if not user_id:
+            return {'success': False, 'error': 'User ID not found'}
+        if not payouts:
+            return {'success': False, 'error': 'No payouts in this transaction'}
+        
+        pin_error = await self._check_pin(str(user_id), pin)
+        if pin_error:
+            return pin_error
+        
+        await self._send_pin_approved_message(chat_id)
+        self.store.delete_transaction(transaction_id)
+        
+        items = [PayoutItem(
+            user_id=str(user_id),
+            account_number=payout['account_number'],
+            bank_code=payout['bank_code'],
+            amount=float(payout['amount']),
+            name=payout.get('recipient_name'),
+            reason=transaction.get('narration') or 'Payout',
+            reference=payout['reference'],
+        ) for payout in payouts]
+        results = await run_blocking(bulk_payouts.run, items)
+        
+        sent = [r for r in results if r['status'] == 'submitted']
+        held = [r for r in results if r['status'] == 'unconfirmed']
+        lines = [f"💸 *Group payout:* {len(sent)} of {len(results)} sent"]
+        for r in results:
+            icon = {'submitted': '✅', 'unconfirmed': '⏳'}.get(r['status'], '❌')
+            line = f"{icon} ₦{r['amount']:,.0f} to {r['account_name'] or r['account_number']}"
+            if r['status'] not in ('submitted', 'unconfirmed') and r['error']:
+                line += f" - {r['error']}"
+            lines.append(line)
+        if held:
+            lines.append("⏳ Pending payouts stay reserved on your wallet until Paystack confirms them.")
+        await notification_service.send_telegram_message(chat_id, "\n".join(lines), "Markdown")
+        
+        logger.info(f"💸 Group payout {transaction_id}: {len(sent)}/{len(results)} submitted")
+        result = {
+            'success': bool(sent),
+            'transaction_id': transaction_id,
+            'results': results
+        }
+        if not sent:
+            result['error'] = 'No payout could be sent' if not held else 'Payouts are pending confirmation'
+        return result
+    
     async def _send_pin_approved_message(self, chat_id: str):
         """Send PIN approved message immediately"""
         message = "✅ *PIN Verified.* Transfer in progress..."
@@ -412,25 +463,7 @@ class SecurePinVerification:
     
     def _get_bank_display_name(self, bank_code: str) -> str:
         """Convert bank code to display name"""
-        bank_names = {
-            "035": "Wema Bank",
-            "044": "Access Bank", 
-            "058": "GTBank",
-            "057": "Zenith Bank",
-            "033": "UBA",
-            "011": "First Bank",
-            "032": "Union Bank",
-            "070": "Fidelity Bank",
-            "232": "Sterling Bank",
-            "221": "Stanbic IBTC",
-            "999992": "Opay",
-            "999991": "PalmPay",
-            "50211": "Kuda Bank",
-            "50515": "Moniepoint MFB",
-            "565": "Carbon",
-            "214": "FCMB"
-        }
-        return bank_names.get(bank_code, f"Bank ({bank_code})")
+        return bank_index.display_name(bank_code, default=f"Bank ({bank_code})")
     
     async def _send_transfer_receipt(self, chat_id: str, user_data: Dict, 
                                    transfer_data: Dict, amount: float, 
@@ -480,10 +513,10 @@ class SecurePinVerification:
         3. Balance reflects actual transfer
         """
         try:
-            from supabase import create_client
+            from utils.supabase_client import get_supabase_client
             import os
             
-            supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+            supabase = get_supabase_client()
             
             # 🔥 CRITICAL FIX 1: Validate transfer_data before database operations
             required_db_fields = ['account_number', 'recipient_name']
@@ -576,6 +609,8 @@ class SecurePinVerification:
             
             transaction_insert = supabase.table("bank_transactions").insert(transaction_record).execute()
             
+            balance_ledger.apply(user_id, transaction_id, amount, "transfer_out", fee)
+            
             if transaction_insert.data:
                 logger.info(f"✅ Transaction logged successfully: {transaction_id}")
             else:
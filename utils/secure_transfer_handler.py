@@ -211,9 +211,9 @@ class SecureTransferHandler:
     async def get_virtual_account(self, chat_id: str) -> Dict:
         """Get user's virtual account details for funding instructions"""
         try:
-            from supabase import create_client
+            from utils.supabase_client import get_supabase_client
             
-            client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+            client = get_supabase_client()
             result = client.table("virtual_accounts").select("*").eq("whatsapp_number", str(chat_id)).execute()
             
             if result.data:
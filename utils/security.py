@@ -16,13 +16,11 @@ import os
 from collections import defaultdict
 from utils.ip_intelligence import analyze_request_threat, check_rate_limit, is_ip_whitelisted
 from utils.security_monitor import security_monitor, AlertLevel
+from utils.rate_limit_engine import RateLimitEngine, RateLimitRule, ExpiringBlocklist
 import ipaddress
 
 logger = logging.getLogger(__name__)
 
-# Rate limiting storage (in production, use Redis or database)
-rate_limit_storage = defaultdict(list)
-blocked_ips = set()
 suspicious_activity = defaultdict(int)
 
 # Security configuration
@@ -91,6 +89,13 @@ SECURITY_CONFIG = {
     }
 }
 
+# Rate limiting state: one sliding-window counter per IP and a blocklist whose
+# timed entries expire in the background (in production, use Redis or database)
+legacy_rate_limits = RateLimitEngine([
+    RateLimitRule('requests_per_minute', SECURITY_CONFIG['rate_limit']['requests_per_minute'], 60, '1 minute'),
+])
+blocked_ips = ExpiringBlocklist()
+
 class SecurityMiddleware:
     """Main security middleware class"""
     
@@ -268,34 +273,16 @@ class SecurityMiddleware:
         else:
             max_requests = SECURITY_CONFIG['rate_limit']['requests_per_minute']
         
-        # Clean old requests (older than 1 minute)
-        rate_limit_storage[client_ip] = [
-            timestamp for timestamp in rate_limit_storage[client_ip]
-            if current_time - timestamp < 60
-        ]
-        
-        # Check rate limit
-        if len(rate_limit_storage[client_ip]) >= max_requests:
-            # Block IP temporarily
-            blocked_ips.add(client_ip)
+        # Record this request and check the per-path limit
+        violation = legacy_rate_limits.hit(client_ip, current_time, {'requests_per_minute': max_requests})
+        if violation:
+            # Block IP temporarily; the shared sweeper lifts the block
+            blocked_ips.add(client_ip, SECURITY_CONFIG['rate_limit']['block_duration'])
             suspicious_activity[client_ip] += 1
             
-            logger.warning(f"🚫 Rate limit exceeded for IP: {client_ip} ({len(rate_limit_storage[client_ip])} requests)")
-            
-            # Auto-unblock after configured duration
-            def unblock_ip():
-                time.sleep(SECURITY_CONFIG['rate_limit']['block_duration'])
-                blocked_ips.discard(client_ip)
-                logger.info(f"🔓 IP unblocked: {client_ip}")
-            
-            # In production, use a proper task queue
-            import threading
-            threading.Thread(target=unblock_ip, daemon=True).start()
+            logger.warning(f"🚫 Rate limit exceeded for IP: {client_ip} ({violation['actual']} requests)")
             
             abort(429)  # Too Many Requests
-        
-        # Record this request
-        rate_limit_storage[client_ip].append(current_time)
     
     def block_suspicious_paths(self):
         """Block suspicious paths"""
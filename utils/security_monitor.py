@@ -14,10 +14,11 @@ from collections import defaultdict, deque
 import threading
 import requests
 import hashlib
-import re
 from dataclasses import dataclass, asdict
 from enum import Enum
 
+from utils.threat_classifier import threat_classifier
+
 # ⚡ IMPORT PERFORMANCE CONFIG for fast mode
 try:
     from .performance_config import (
@@ -450,73 +451,31 @@ Stay secure! 🔒
         if self.is_ip_whitelisted(ip):
             return None
         
-        # Skip security checks entirely for WhatsApp Flow webhook endpoints
-        whatsapp_webhook_paths = [
-            '/whatsapp-flow-webhook',
-            '/api/paystack/webhook',
-            '/paystack-webhook',
-            '/whatsapp-webhook'
-        ]
+        # Every pattern check below comes from one memoized classification
+        verdict = threat_classifier.classify(user_agent, path)
         
-        for webhook_path in whatsapp_webhook_paths:
-            if path.startswith(webhook_path):
-                # Always allow WhatsApp/Meta webhooks through
-                logger.info(f"✅ Allowing WhatsApp/Meta webhook: {ip} -> {path}")
-                return None
+        # Skip security checks entirely for WhatsApp Flow webhook endpoints
+        if verdict.webhook_path:
+            # Always allow WhatsApp/Meta webhooks through
+            logger.info(f"✅ Allowing WhatsApp/Meta webhook: {ip} -> {path}")
+            return None
         
         # Skip security checks for trusted bots on /verify-pin route
-        if path.startswith('/verify-pin'):
-            trusted_bots = [
-                r'TelegramBot', r'TwitterBot', r'facebookexternalhit', r'WhatsApp',
-                r'Slackbot', r'LinkedInBot', r'DiscordBot', r'MetaBot'
-            ]
-            
-            for trusted_pattern in trusted_bots:
-                if re.search(trusted_pattern, user_agent, re.IGNORECASE):
-                    return None
+        if path.startswith('/verify-pin') and verdict.trusted_bot:
+            return None
         
         # Check for WordPress/CMS attacks
-        wp_patterns = [
-            r'/wp-admin', r'/wp-login', r'/wp-config', r'/wp-content',
-            r'/wordpress', r'/setup-config\.php', r'/wp-includes',
-            r'/admin', r'/administrator', r'/wp-admin\.php'
-        ]
+        if verdict.cms_attack:
+            severity = AlertLevel.HIGH
+            details['attack_type'] = 'WordPress/CMS Attack'
+            details['pattern_matched'] = verdict.cms_attack
         
-        for pattern in wp_patterns:
-            if re.search(pattern, path, re.IGNORECASE):
-                severity = AlertLevel.HIGH
-                details['attack_type'] = 'WordPress/CMS Attack'
-                details['pattern_matched'] = pattern
-                break
-        
-        # Check for suspicious user agents (but whitelist legitimate bots first)
-        trusted_bots = [
-            r'TelegramBot', r'TwitterBot', r'facebookexternalhit', r'WhatsApp',
-            r'Slackbot', r'LinkedInBot', r'DiscordBot', r'MetaBot'
-        ]
-        
-        # Check if it's a trusted bot first
-        is_trusted_bot = False
-        for trusted_pattern in trusted_bots:
-            if re.search(trusted_pattern, user_agent, re.IGNORECASE):
-                is_trusted_bot = True
-                break
-        
-        # Only check for suspicious agents if not a trusted bot
-        if not is_trusted_bot:
-            suspicious_agents = [
-                r'python-requests', r'curl', r'wget', r'bot', r'crawler', r'spider',
-                r'scanner', r'exploit', r'hack', r'attack', r'penetration',
-                r'nikto', r'sqlmap', r'nmap', r'dirb', r'gobuster'
-            ]
-            
-            for agent_pattern in suspicious_agents:
-                if re.search(agent_pattern, user_agent, re.IGNORECASE):
-                    if severity == AlertLevel.LOW:
-                        severity = AlertLevel.MEDIUM
-                    details['suspicious_agent'] = True
-                    details['agent_pattern'] = agent_pattern
-                    break
+        # Check for suspicious user agents (trusted bots are never flagged)
+        if verdict.suspicious_agent:
+            if severity == AlertLevel.LOW:
+                severity = AlertLevel.MEDIUM
+            details['suspicious_agent'] = True
+            details['agent_pattern'] = verdict.suspicious_agent
         
         # Check for high-frequency requests (simple rate limiting detection)
         self.suspicious_ips[ip] += 1
@@ -526,18 +485,10 @@ Stay secure! 🔒
             details['request_count'] = self.suspicious_ips[ip]
         
         # Check for database/config file access
-        dangerous_paths = [
-            r'\.env', r'config\.php', r'database\.php', r'db\.php',
-            r'phpmyadmin', r'mysql', r'adminer',
-            r'\.git', r'\.svn', r'\.htaccess', r'\.htpasswd'
-        ]
-        
-        for danger_pattern in dangerous_paths:
-            if re.search(danger_pattern, path, re.IGNORECASE):
-                severity = AlertLevel.CRITICAL
-                details['attack_type'] = 'Sensitive File Access'
-                details['pattern_matched'] = danger_pattern
-                break
+        if verdict.dangerous_path:
+            severity = AlertLevel.CRITICAL
+            details['attack_type'] = 'Sensitive File Access'
+            details['pattern_matched'] = verdict.dangerous_path
         
         # Only return event if suspicious activity detected
         if severity != AlertLevel.LOW or details:
@@ -6,7 +6,7 @@ Like ChatGPT/Siri but for Nigerian fintech
 
 import os
 from dotenv import load_dotenv
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta
 import json
@@ -21,7 +21,7 @@ class SharpMemory:
     def __init__(self):
         supabase_url = os.getenv("SUPABASE_URL")
         supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
-        self.supabase = create_client(supabase_url, supabase_key)
+        self.supabase = get_supabase_client(supabase_url, supabase_key)
     
     # ============ DATE & TIME AWARENESS ============
     
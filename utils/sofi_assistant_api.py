@@ -7,8 +7,10 @@ import os
 import logging
 from typing import Dict, Any, Optional
 from openai import OpenAI
-import json
-import time
+from utils.user_mailbox import user_mailbox
+from utils.assistant_run_driver import run_driver
+from utils.thread_store import thread_store
+from utils.async_bridge import run_blocking, run_isolated
 
 logger = logging.getLogger(__name__)
 
@@ -20,26 +22,23 @@ class SofiAssistantManager:
         self.assistant_id = os.getenv("OPENAI_ASSISTANT_ID")  # Get from environment variable
         if not self.assistant_id:
             raise ValueError("OPENAI_ASSISTANT_ID environment variable is required")
-        self.user_threads = {}  # Store thread IDs for each user
         
     def get_or_create_thread(self, phone_number: str) -> str:
         """Get existing thread or create new one for user"""
         try:
-            if phone_number not in self.user_threads:
-                logger.info(f"🧵 Creating new thread for user {phone_number}")
-                thread = self.client.beta.threads.create()
-                self.user_threads[phone_number] = thread.id
-                logger.info(f"✅ Thread created: {thread.id}")
-            else:
-                logger.info(f"🧵 Using existing thread for {phone_number}: {self.user_threads[phone_number]}")
-                
-            return self.user_threads[phone_number]
+            return thread_store.get_or_create(
+                phone_number, lambda: self.client.beta.threads.create().id
+            )
         except Exception as e:
             logger.error(f"❌ Error creating/getting thread for {phone_number}: {e}")
             raise
     
-    async def send_message_to_assistant(self, phone_number: str, message: str) -> str:
-        """Send message to Sofi Assistant with auto-onboarding check"""
+    async def send_message_to_assistant(self, phone_number: str, message: str) -> Optional[str]:
+        """Send message to Sofi Assistant with auto-onboarding check
+
+        Returns None when the message was coalesced into a run answered
+        through a later message from the same user.
+        """
         try:
             logger.info(f"🤖 Sending message to Sofi Assistant: {phone_number} -> {message}")
             
@@ -56,125 +55,57 @@ class SofiAssistantManager:
                 logger.info(f"🆕 New WhatsApp user {phone_number} - sending onboarding")
                 return user_status["message"]
             
-            # 🎯 STEP 2: Existing user - process with Assistant API
-            # Get or create thread for this user
-            thread_id = self.get_or_create_thread(phone_number)
-            
-            # Add user message to thread
-            logger.info(f"📝 Adding message to thread {thread_id}")
-            self.client.beta.threads.messages.create(
-                thread_id=thread_id,
-                role="user",
-                content=message
-            )
-            
-            # Run the assistant
-            logger.info(f"🚀 Running Sofi Assistant on thread {thread_id}")
-            run = self.client.beta.threads.runs.create(
-                thread_id=thread_id,
-                assistant_id=self.assistant_id
-            )
-            
-            # Wait for completion
-            logger.info(f"⏳ Waiting for assistant response... Run ID: {run.id}")
-            run = await self.wait_for_run_completion(thread_id, run.id)
-            
-            if run.status == "completed":
-                # Get the assistant's response
-                messages = self.client.beta.threads.messages.list(
-                    thread_id=thread_id,
-                    order="desc",
-                    limit=1
-                )
-                
-                if messages.data:
-                    response = messages.data[0].content[0].text.value
-                    logger.info(f"✅ Sofi Assistant response received for {phone_number}")
-                    return response
-                else:
-                    logger.error(f"❌ No response from assistant for {phone_number}")
-                    return "I'm having trouble processing your request. Please try again."
-            else:
-                logger.error(f"❌ Assistant run failed with status: {run.status}")
-                return "I'm having trouble processing your request. Please try again."
+            # 🎯 STEP 2: Existing user - queue on the user's mailbox so runs on
+            # the thread are serialized; returns None if coalesced into a later run
+            return await user_mailbox.submit(phone_number, message, self._run_assistant_batch)
                 
         except Exception as e:
             logger.error(f"❌ Error in assistant conversation for {phone_number}: {e}")
             return "I'm having trouble right now. Please try again in a moment."
     
-    async def wait_for_run_completion(self, thread_id: str, run_id: str, max_wait: int = 30) -> Any:
-        """Wait for assistant run to complete"""
-        start_time = time.time()
+    async def _run_assistant_batch(self, phone_number: str, messages: list) -> str:
+        """Answer the queued messages with one streamed run on the user's thread"""
+        # Get or create thread for this user (a store read and maybe an API call)
+        thread_id = await run_blocking(self.get_or_create_thread, phone_number)
         
-        while time.time() - start_time < max_wait:
-            try:
-                run = self.client.beta.threads.runs.retrieve(
-                    thread_id=thread_id,
-                    run_id=run_id
-                )
-                
-                if run.status in ["completed", "failed", "cancelled", "expired"]:
-                    logger.info(f"🏁 Assistant run finished with status: {run.status}")
-                    return run
-                elif run.status == "requires_action":
-                    logger.info(f"🔧 Assistant requires action - handling tool calls")
-                    run = await self.handle_tool_calls(thread_id, run)
-                    if run.status in ["completed", "failed", "cancelled", "expired"]:
-                        return run
-                else:
-                    logger.info(f"⏳ Assistant still running... Status: {run.status}")
-                    time.sleep(1)
-                    
-            except Exception as e:
-                logger.error(f"❌ Error checking run status: {e}")
-                time.sleep(1)
+        # Messages ride along with the run request instead of one call each
+        logger.info(f"🚀 Running Sofi Assistant on thread {thread_id} with {len(messages)} message(s)")
+        run_kwargs = dict(
+            assistant_id=self.assistant_id,
+            tool_executor=lambda name, args: run_isolated(self.execute_function, name, args, phone_number),
+            additional_messages=[{"role": "user", "content": message} for message in messages],
+        )
+        result = await run_driver.run(thread_id=thread_id, **run_kwargs)
         
-        logger.error(f"⏰ Assistant run timed out after {max_wait} seconds")
-        return run
+        if result.status == "thread_not_found":
+            # Stored thread was deleted by OpenAI - start a new conversation
+            thread_store.discard(phone_number, thread_id)
+            thread_id = await run_blocking(self.get_or_create_thread, phone_number)
+            result = await run_driver.run(thread_id=thread_id, **run_kwargs)
+        
+        if result.completed and result.text:
+            logger.info(f"✅ Sofi Assistant response received for {phone_number} in {result.timings.total_ms:.0f}ms")
+            return result.text
+        
+        logger.error(f"❌ Assistant run ended with status: {result.status}")
+        return "I'm having trouble processing your request. Please try again."
     
-    async def handle_tool_calls(self, thread_id: str, run: Any) -> Any:
-        """Handle function calls from the assistant"""
-        try:
-            if run.required_action and run.required_action.submit_tool_outputs:
-                tool_calls = run.required_action.submit_tool_outputs.tool_calls
-                tool_outputs = []
-                
-                logger.info(f"🛠️ Processing {len(tool_calls)} tool calls")
-                
-                for tool_call in tool_calls:
-                    function_name = tool_call.function.name
-                    function_args = json.loads(tool_call.function.arguments)
-                    
-                    logger.info(f"🔧 Executing function: {function_name}")
-                    
-                    # Set current phone number context for function execution
-                    self._current_phone_number = getattr(self, '_current_phone_number', '')
-                    
-                    # Execute the function (now properly async)
-                    result = await self.execute_function(function_name, function_args)
-                    
-                    tool_outputs.append({
-                        "tool_call_id": tool_call.id,
-                        "output": json.dumps(result)
-                    })
-                
-                # Submit tool outputs
-                run = self.client.beta.threads.runs.submit_tool_outputs(
-                    thread_id=thread_id,
-                    run_id=run.id,
-                    tool_outputs=tool_outputs
-                )
-                
-                logger.info(f"✅ Tool outputs submitted, continuing run...")
-                return await self.wait_for_run_completion(thread_id, run.id)
-                
-        except Exception as e:
-            logger.error(f"❌ Error handling tool calls: {e}")
-            
-        return run
+    async def wait_for_run_completion(self, thread_id: str, run_id: str, max_wait: int = 30) -> Any:
+        """Wait for an existing assistant run to finish, executing tool calls as they come"""
+        phone_number = getattr(self, '_current_phone_number', '')
+        result = await run_driver.wait_for_run(
+            thread_id,
+            run_id,
+            tool_executor=lambda name, args: run_isolated(self.execute_function, name, args, phone_number),
+        )
+        logger.info(f"🏁 Assistant run finished with status: {result.status}")
+        return result.run
     
-    async def execute_function(self, function_name: str, function_args: Dict[str, Any]) -> Dict[str, Any]:
-        """Execute a function call from the assistant"""
+    async def execute_function(self, function_name: str, function_args: Dict[str, Any],
+                               phone_number: str = None) -> Dict[str, Any]:
+        """Execute a function call from the assistant for the given user"""
+        if phone_number is None:
+            phone_number = getattr(self, '_current_phone_number', '')
         try:
             logger.info(f"⚡ Executing function: {function_name} with args: {function_args}")
             
@@ -182,22 +113,29 @@ class SofiAssistantManager:
             if function_name == "check_balance":
                 from functions.balance_functions import check_balance
                 # Properly await the async function instead of using asyncio.run()
-                phone_number = function_args.get("whatsapp_number", function_args.get("chat_id", ""))
-                result = await check_balance(phone_number)
+                result = await check_balance(
+                    function_args.get("whatsapp_number", function_args.get("chat_id", phone_number))
+                )
                 return result
             elif function_name == "send_money":
                 from functions.transfer_functions import send_money
                 # Fix parameter mapping - send_money expects chat_id as first parameter
-                # Get phone number from context (need to pass it from the call)
-                phone_number = getattr(self, '_current_phone_number', function_args.get("chat_id", ""))
                 result = await send_money(
-                    chat_id=phone_number,
+                    chat_id=phone_number or function_args.get("chat_id", ""),
                     amount=function_args.get("amount"),
                     account_number=function_args.get("account_number"),
                     bank_name=function_args.get("bank_name"),
                     narration=function_args.get("narration", "Transfer via Sofi AI")
                 )
                 return result
+            elif function_name == "send_group_payout":
+                from functions.transfer_functions import send_group_payout
+                result = await send_group_payout(
+                    chat_id=phone_number or function_args.get("chat_id", ""),
+                    payouts=function_args.get("payouts") or [],
+                    narration=function_args.get("narration")
+                )
+                return result
             elif function_name == "verify_account_name":
                 # Use the verify_account_name function from main.py
                 from main import verify_account_name
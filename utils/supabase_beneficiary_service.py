@@ -5,7 +5,9 @@ Database Compatible Beneficiary Service for Sofi AI
 import os
 import logging
 from typing import List, Dict, Optional, Any, Union
-from supabase import create_client, Client
+from supabase import Client
+from utils.supabase_client import get_supabase_client
+from paystack.account_resolver import account_resolver
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -22,7 +24,7 @@ class SupabaseBeneficiaryService:
         if not self.supabase_url or not self.supabase_key:
             raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY environment variables")
         
-        self.client: Client = create_client(self.supabase_url, self.supabase_key)
+        self.client: Client = get_supabase_client(self.supabase_url, self.supabase_key)
         logger.info("Supabase beneficiary service initialized")
 
     def _convert_user_id(self, user_id: Union[str, int]) -> int:
@@ -49,6 +51,9 @@ class SupabaseBeneficiaryService:
             
             beneficiaries = result.data if result.data else []
             logger.info(f"Found {len(beneficiaries)} beneficiaries for user {user_id_int}")
+            
+            # Resolve saved accounts ahead of the transfer the user is likely to start
+            account_resolver.prefetch_beneficiaries(beneficiaries)
             return beneficiaries
             
         except Exception as e:
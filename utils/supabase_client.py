@@ -0,0 +1,162 @@
+"""
+Sofi AI Supabase Client Registry
+Process-wide pool of Supabase clients shared by every module
+
+Creating a client per call repeats TLS handshakes and allocates a fresh
+HTTP session each time. The registry hands out one client per
+(url, key) pair, backed by a keep-alive httpx pool, and rebuilds itself
+after a fork so gunicorn workers never share sockets with the master.
+"""
+
+import os
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from dotenv import load_dotenv
+from supabase import create_client, Client
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Pool limits (override via environment)
+MAX_CLIENTS = int(os.getenv("SUPABASE_MAX_CLIENTS", "8"))
+MAX_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_CONNECTIONS", "20"))
+MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("SUPABASE_POOL_MAX_KEEPALIVE", "10"))
+KEEPALIVE_EXPIRY = float(os.getenv("SUPABASE_POOL_KEEPALIVE_EXPIRY", "30"))
+REQUEST_TIMEOUT = float(os.getenv("SUPABASE_REQUEST_TIMEOUT", "30"))
+
+
+class SupabaseClientRegistry:
+    """Thread-safe, fork-aware registry of pooled Supabase clients"""
+
+    def __init__(self, max_clients: int = MAX_CLIENTS):
+        self.max_clients = max(1, max_clients)
+        self._lock = threading.Lock()
+        self._clients: "OrderedDict[Tuple[str, str], Tuple[Client, Any]]" = OrderedDict()
+        self._pid = os.getpid()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "fork_resets": 0}
+
+    def get_client(self, url: str, key: str) -> Client:
+        """Return the shared client for (url, key), creating it on first use"""
+        if not url or not key:
+            raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
+
+        with self._lock:
+            self._check_fork()
+            cache_key = (url, key)
+            entry = self._clients.get(cache_key)
+            if entry is not None:
+                self._clients.move_to_end(cache_key)
+                self._stats["hits"] += 1
+                return entry[0]
+
+            self._stats["misses"] += 1
+            client, http_client = self._build_client(url, key)
+            self._clients[cache_key] = (client, http_client)
+
+            while len(self._clients) > self.max_clients:
+                _, (_, old_http) = self._clients.popitem(last=False)
+                self._stats["evictions"] += 1
+                self._close_http(old_http)
+
+            return client
+
+    def _build_client(self, url: str, key: str) -> Tuple[Client, Any]:
+        """Create a Supabase client backed by its own keep-alive pool"""
+        try:
+            import httpx
+            from supabase.lib.client_options import SyncClientOptions
+
+            # Postgrest mutates base_url/headers on the session, so each
+            # client gets a dedicated httpx pool rather than a shared one
+            http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=MAX_CONNECTIONS,
+                    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=KEEPALIVE_EXPIRY,
+                ),
+                timeout=REQUEST_TIMEOUT,
+            )
+            options = SyncClientOptions(httpx_client=http_client)
+            return create_client(url, key, options=options), http_client
+        except (ImportError, TypeError) as e:
+            # Older supabase releases do not accept a custom httpx client
+            logger.debug(f"Pooled httpx client unavailable, using default session: {e}")
+            return create_client(url, key), None
+
+    def _check_fork(self):
+        """Drop clients inherited from a parent process (caller holds the lock)"""
+        pid = os.getpid()
+        if pid != self._pid:
+            # Sockets belong to the parent - forget them without closing
+            self._clients.clear()
+            self._pid = pid
+            self._stats["fork_resets"] += 1
+
+    def _reset_after_fork(self):
+        """os.register_at_fork hook: reinitialise state in the child"""
+        self._lock = threading.Lock()
+        self._check_fork()
+
+    @staticmethod
+    def _close_http(http_client):
+        if http_client is None:
+            return
+        try:
+            http_client.close()
+        except Exception as e:
+            logger.debug(f"Error closing Supabase HTTP pool: {e}")
+
+    def clear(self):
+        """Close and drop every pooled client"""
+        with self._lock:
+            for _, http_client in self._clients.values():
+                self._close_http(http_client)
+            self._clients.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss metrics for the registry"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "clients": len(self._clients),
+                "max_clients": self.max_clients,
+                "max_connections_per_client": MAX_CONNECTIONS,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+                "pid": self._pid,
+            }
+
+
+# Global registry instance
+supabase_registry = SupabaseClientRegistry()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=supabase_registry._reset_after_fork)
+
+
+def get_supabase_client(url: Optional[str] = None, key: Optional[str] = None,
+                        service_role: bool = False) -> Client:
+    """Get the shared Supabase client
+
+    Args:
+        url: Supabase URL (defaults to SUPABASE_URL)
+        key: API key (defaults to SUPABASE_KEY, or the service role key
+            when service_role is True)
+        service_role: Prefer SUPABASE_SERVICE_ROLE_KEY over SUPABASE_KEY
+    """
+    url = url or os.getenv("SUPABASE_URL")
+    if not key:
+        if service_role:
+            key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
+        else:
+            key = os.getenv("SUPABASE_KEY")
+    return supabase_registry.get_client(url, key)
+
+
+def get_supabase_registry_stats() -> Dict[str, Any]:
+    """Get registry hit/miss metrics"""
+    return supabase_registry.get_stats()
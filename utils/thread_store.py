@@ -0,0 +1,299 @@
+"""
+Sofi AI Assistant Thread Store
+One read-through / write-behind store for users' OpenAI Assistant thread IDs
+
+Thread IDs live in the users.assistant_thread_id column so conversations
+survive restarts and are shared by every gunicorn worker. Reads go through a
+bounded in-memory LRU; a miss selects the thread columns of the user's row
+directly rather than trusting a cached copy of it. New or dropped thread IDs
+are written back to Supabase by a single background flusher so the message
+path never waits on the update.
+
+Threads idle longer than THREAD_IDLE_EXPIRY_DAYS are dropped (OpenAI deletes
+inactive threads). Last use is persisted in users.assistant_thread_used_at
+(assistant_thread_store.sql), at most once per THREAD_STORE_TOUCH_INTERVAL
+per thread, so the expiry also applies to threads loaded after a restart.
+Callers discard a thread explicitly when OpenAI reports it no longer exists.
+"""
+
+import os
+import time
+import atexit
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+MAX_ENTRIES = int(os.getenv("THREAD_STORE_MAX_ENTRIES", "10000"))
+IDLE_EXPIRY_SECONDS = float(os.getenv("THREAD_IDLE_EXPIRY_DAYS", "50")) * 86400
+FLUSH_INTERVAL = float(os.getenv("THREAD_STORE_FLUSH_INTERVAL", "1.0"))
+TOUCH_INTERVAL = float(os.getenv("THREAD_STORE_TOUCH_INTERVAL", "86400"))
+
+THREAD_COLUMNS = "id, assistant_thread_id, assistant_thread_used_at, updated_at"
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds from a Postgres timestamp string (naive values are UTC)"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _format_timestamp(epoch: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat() if epoch else None
+
+
+class AssistantThreadStore:
+    """Bounded LRU of thread IDs backed by users.assistant_thread_id"""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES,
+                 idle_expiry_seconds: float = IDLE_EXPIRY_SECONDS,
+                 flush_interval: float = FLUSH_INTERVAL,
+                 touch_interval: float = TOUCH_INTERVAL,
+                 resolver=None, supabase=None):
+        self.max_entries = max_entries
+        self.idle_expiry_seconds = idle_expiry_seconds
+        self.flush_interval = flush_interval
+        self.touch_interval = touch_interval
+        self._resolver = resolver
+        self._supabase = supabase
+        self._lock = threading.Lock()
+        # key -> [thread_id, last_used, last_used as persisted]
+        self._cache: "OrderedDict[str, list]" = OrderedDict()
+        self._pending: Dict[str, Dict[str, Any]] = {}  # key -> users columns to write
+        self._wakeup = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._pid = None
+        self._stats = {"hits": 0, "misses": 0, "db_hits": 0, "created": 0,
+                       "expired": 0, "discarded": 0, "evictions": 0,
+                       "writes": 0, "touches": 0, "write_failures": 0}
+
+    @property
+    def resolver(self):
+        if self._resolver is None:
+            from utils.user_resolver import user_resolver
+            self._resolver = user_resolver
+        return self._resolver
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            from utils.supabase_client import get_supabase_client
+            self._supabase = get_supabase_client(service_role=True)
+        return self._supabase
+
+    @staticmethod
+    def _key(user_key: str) -> str:
+        from utils.user_resolver import normalize_phone_number
+        return normalize_phone_number(user_key) or str(user_key)
+
+    # =================== READS ===================
+
+    def get(self, user_key: str) -> Optional[str]:
+        """Cached thread ID for a user, reading through to Supabase on a miss"""
+        key = self._key(user_key)
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                idle = now - entry[1] > self.idle_expiry_seconds
+                self._stats["misses" if idle else "hits"] += 1
+                if not idle:
+                    self._cache.move_to_end(key)
+            else:
+                self._stats["misses"] += 1
+                pending = self._pending.get(key, {})
+
+        if entry is not None:
+            if idle:
+                self._expire(key)
+                return None
+            self._touch(key, entry, now)
+            return entry[0]
+
+        if "assistant_thread_id" in pending:
+            # Written locally but not flushed yet
+            thread_id, used_at = pending["assistant_thread_id"], now
+            if not thread_id:
+                return None
+        else:
+            loaded = self._load(user_key)
+            if not loaded:
+                return None
+            thread_id, used_at = loaded
+            with self._lock:
+                self._stats["db_hits"] += 1
+
+        if now - used_at > self.idle_expiry_seconds:
+            self._expire(key)
+            return None
+
+        self._touch(key, self._remember(key, thread_id, used_at), now)
+        return thread_id
+
+    def get_or_create(self, user_key: str, create_thread: Callable[[], str]) -> str:
+        """
+        Get a user's thread ID, creating and storing a new thread if none exists
+
+        Args:
+            user_key: WhatsApp number or chat ID
+            create_thread: Creates an OpenAI thread and returns its ID
+        """
+        thread_id = self.get(user_key)
+        if thread_id:
+            return thread_id
+
+        thread_id = create_thread()
+        with self._lock:
+            self._stats["created"] += 1
+        self.set(user_key, thread_id)
+        logger.info(f"🧵 Created thread {thread_id} for {user_key}")
+        return thread_id
+
+    def _load(self, user_key: str) -> Optional[Tuple[str, float]]:
+        """Thread ID and last use from the user's row (not the cached user)"""
+        try:
+            user = self.resolver.query(user_key, THREAD_COLUMNS)
+        except Exception as e:
+            logger.error(f"❌ Error loading thread ID for {user_key}: {e}")
+            return None
+        if not user or not user.get("assistant_thread_id"):
+            return None
+        # Rows written before last use was tracked fall back to updated_at;
+        # with neither the thread is treated as expired
+        used_at = (_parse_timestamp(user.get("assistant_thread_used_at"))
+                   or _parse_timestamp(user.get("updated_at")) or 0.0)
+        return user["assistant_thread_id"], used_at
+
+    # =================== WRITES ===================
+
+    def set(self, user_key: str, thread_id: str):
+        """Store a thread ID now and persist it in the background"""
+        key = self._key(user_key)
+        now = time.time()
+        self._remember(key, thread_id, now)
+        self._schedule(key, {"assistant_thread_id": thread_id,
+                             "assistant_thread_used_at": _format_timestamp(now)})
+
+    def discard(self, user_key: str, thread_id: str = None):
+        """Drop a stale thread (e.g. OpenAI returned 404) so the next call creates one"""
+        key = self._key(user_key)
+        with self._lock:
+            entry = self._cache.get(key)
+            if thread_id and entry and entry[0] != thread_id:
+                return  # Already replaced
+            self._cache.pop(key, None)
+            self._stats["discarded"] += 1
+        logger.info(f"🧵 Discarded stale thread {thread_id} for {user_key}")
+        self._schedule(key, {"assistant_thread_id": None, "assistant_thread_used_at": None})
+
+    def _expire(self, key: str):
+        # OpenAI will have deleted it; start a fresh conversation
+        with self._lock:
+            self._cache.pop(key, None)
+            self._stats["expired"] += 1
+        self._schedule(key, {"assistant_thread_id": None, "assistant_thread_used_at": None})
+
+    def _touch(self, key: str, entry: list, now: float):
+        """Mark a thread used, persisting the time once per touch interval"""
+        with self._lock:
+            entry[1] = now
+            if now - entry[2] < self.touch_interval:
+                return
+            entry[2] = now
+        self._schedule(key, {"assistant_thread_used_at": _format_timestamp(now)})
+
+    def _remember(self, key: str, thread_id: str, used_at: float) -> list:
+        entry = [thread_id, used_at, used_at]
+        with self._lock:
+            self._cache[key] = entry
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+                self._stats["evictions"] += 1
+        return entry
+
+    def _schedule(self, key: str, fields: Dict[str, Any]):
+        self._ensure_flusher()
+        with self._lock:
+            self._pending.setdefault(key, {}).update(fields)
+        self._wakeup.set()
+
+    def _ensure_flusher(self):
+        with self._lock:
+            if self._pid == os.getpid() and self._flusher and self._flusher.is_alive():
+                return
+            if self._pid is not None and self._pid != os.getpid():
+                # Forked worker: the parent's pending writes are the parent's job
+                self._pending.clear()
+            self._pid = os.getpid()
+            self._flusher = threading.Thread(target=self._flush_loop, name="thread-store-flush", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            self._wakeup.wait()
+            # Short delay so bursts of writes go out together
+            time.sleep(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Write pending thread IDs to Supabase; returns the number of rows written"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+
+        written = touched = 0
+        for key, fields in batch.items():
+            changes_thread = "assistant_thread_id" in fields
+            try:
+                user = self.resolver.resolve(key)
+                if not user:
+                    continue  # Not a registered user; keep the thread in memory only
+                update = dict(fields)
+                if changes_thread:
+                    update["updated_at"] = datetime.utcnow().isoformat()
+                self.supabase.table("users").update(update).eq("id", user["id"]).execute()
+                if changes_thread:
+                    self.resolver.invalidate(phone_number=key)
+                    written += 1
+                else:
+                    touched += 1
+            except Exception as e:
+                logger.error(f"❌ Error persisting thread ID for {key}: {e}")
+                with self._lock:
+                    self._stats["write_failures"] += 1
+                    # Retry on the next flush; values scheduled since then win
+                    self._pending[key] = {**fields, **self._pending.get(key, {})}
+
+        with self._lock:
+            self._stats["writes"] += written
+            self._stats["touches"] += touched
+        return written + touched
+
+    # =================== METRICS ===================
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+                "pending_writes": len(self._pending),
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Global thread store shared by both assistant implementations
+thread_store = AssistantThreadStore()
+atexit.register(thread_store.flush)
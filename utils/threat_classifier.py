@@ -0,0 +1,197 @@
+"""
+SOFI AI REQUEST THREAT CLASSIFIER
+=================================
+Precompiled user-agent and path classification for the security middleware
+
+Every pattern list used by IPIntelligence and SecurityMonitor lives here and
+is compiled once at import into one alternation per category, so a clean
+request costs a single regex scan per category. Only when a category matches
+are its patterns tried one by one, to report the same (first listed) pattern
+the old per-pattern loops reported.
+
+Verdicts are memoized per (user agent, path), since the same clients hit the
+same routes over and over.
+"""
+
+import re
+import time
+import threading
+from collections import deque
+from functools import lru_cache
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+VERDICT_CACHE_SIZE = 4096
+
+# =================== PATTERN TABLES ===================
+
+# IPIntelligence: matched against the lowercased user agent
+GOOD_BOT_AGENTS = (
+    r'googlebot',
+    r'bingbot',
+    r'slurp',
+    r'facebookexternalhit',
+    r'twitterbot',
+    r'linkedinbot',
+    r'whatsapp',
+    r'telegrambot',
+    r'go-http-client',  # Common legitimate HTTP client
+    r'render\.com',     # Render health checks
+    r'uptimerobot',     # Uptime monitoring
+    r'pingdom',         # Pingdom monitoring
+    r'newrelic',        # New Relic monitoring
+    r'datadog',         # Datadog monitoring
+)
+
+MALICIOUS_BOT_AGENTS = (
+    r'scanner', r'exploit', r'hack', r'attack', r'penetration',
+    r'nikto', r'sqlmap', r'nmap', r'dirb', r'gobuster', r'masscan', r'zmap'
+)
+
+SUSPICIOUS_CLIENT_AGENTS = (
+    r'java', r'python', r'php', r'ruby', r'node',
+    r'libwww', r'httpclient', r'okhttp', r'urllib', r'requests'
+)
+
+SUSPICIOUS_PATHS = (
+    r'/wp-admin', r'/wp-login', r'/wp-config', r'/wp-content',
+    r'/admin', r'/administrator', r'/login', r'/phpmyadmin',
+    r'/xmlrpc\.php', r'/wp-includes', r'/wp-json',
+    r'/\.env', r'/\.git', r'/\.svn', r'/\.htaccess',
+    r'/config\.php', r'/database\.php', r'/db\.php',
+    r'/backup', r'/sql', r'/dump', r'/export',
+    r'/shell', r'/cmd', r'/exec', r'/system',
+)
+
+# SecurityMonitor: matched case-insensitively
+TRUSTED_BOT_AGENTS = (
+    r'TelegramBot', r'TwitterBot', r'facebookexternalhit', r'WhatsApp',
+    r'Slackbot', r'LinkedInBot', r'DiscordBot', r'MetaBot'
+)
+
+SUSPICIOUS_AGENTS = (
+    r'python-requests', r'curl', r'wget', r'bot', r'crawler', r'spider',
+    r'scanner', r'exploit', r'hack', r'attack', r'penetration',
+    r'nikto', r'sqlmap', r'nmap', r'dirb', r'gobuster'
+)
+
+CMS_ATTACK_PATHS = (
+    r'/wp-admin', r'/wp-login', r'/wp-config', r'/wp-content',
+    r'/wordpress', r'/setup-config\.php', r'/wp-includes',
+    r'/admin', r'/administrator', r'/wp-admin\.php'
+)
+
+DANGEROUS_PATHS = (
+    r'\.env', r'config\.php', r'database\.php', r'db\.php',
+    r'phpmyadmin', r'mysql', r'adminer',
+    r'\.git', r'\.svn', r'\.htaccess', r'\.htpasswd'
+)
+
+# Meta/WhatsApp and Paystack webhooks skip monitoring entirely
+WEBHOOK_PATH_PREFIXES = (
+    '/whatsapp-flow-webhook',
+    '/api/paystack/webhook',
+    '/paystack-webhook',
+    '/whatsapp-webhook'
+)
+
+
+class PatternSet:
+    """One category of patterns: a combined alternation plus the ordered originals"""
+
+    def __init__(self, patterns: Sequence[str], flags: int = 0):
+        self.patterns = tuple(patterns)
+        self._any = re.compile("|".join(f"(?:{p})" for p in self.patterns), flags)
+        self._each = tuple((p, re.compile(p, flags)) for p in self.patterns)
+
+    def search(self, text: str) -> bool:
+        return self._any.search(text) is not None
+
+    def match(self, text: str) -> bool:
+        return self._any.match(text) is not None
+
+    def first(self, text: str) -> Optional[str]:
+        """First listed pattern found in text (one scan when nothing matches)"""
+        if not self._any.search(text):
+            return None
+        for pattern, compiled in self._each:
+            if compiled.search(text):
+                return pattern
+        return None
+
+
+class ThreatVerdict(NamedTuple):
+    """Everything the middleware needs to know about a (user agent, path) pair"""
+    good_bot: Optional[str]
+    malicious_bot: Optional[str]
+    suspicious_client: Optional[str]
+    suspicious_path: bool
+    webhook_path: bool
+    trusted_bot: bool
+    suspicious_agent: Optional[str]
+    cms_attack: Optional[str]
+    dangerous_path: Optional[str]
+
+
+class ThreatClassifier:
+    """Classifies requests by user agent and path, memoizing verdicts"""
+
+    def __init__(self, cache_size: int = VERDICT_CACHE_SIZE):
+        self.good_bots = PatternSet(GOOD_BOT_AGENTS)
+        self.malicious_bots = PatternSet(MALICIOUS_BOT_AGENTS)
+        self.suspicious_clients = PatternSet(SUSPICIOUS_CLIENT_AGENTS)
+        self.suspicious_paths = PatternSet(SUSPICIOUS_PATHS, re.IGNORECASE)
+        self.trusted_bots = PatternSet(TRUSTED_BOT_AGENTS, re.IGNORECASE)
+        self.suspicious_agents = PatternSet(SUSPICIOUS_AGENTS, re.IGNORECASE)
+        self.cms_attacks = PatternSet(CMS_ATTACK_PATHS, re.IGNORECASE)
+        self.dangerous_paths = PatternSet(DANGEROUS_PATHS, re.IGNORECASE)
+
+        self._classify_cached = lru_cache(maxsize=cache_size)(self._classify)
+        self._lock = threading.Lock()
+        self._timings = deque(maxlen=1000)  # microseconds per recent classification
+        self._calls = 0
+
+    def classify(self, user_agent: str, path: str) -> ThreatVerdict:
+        """Verdict for a request, computed once per distinct (user agent, path)"""
+        started = time.perf_counter()
+        verdict = self._classify_cached(user_agent or "", path or "")
+        elapsed_us = (time.perf_counter() - started) * 1e6
+        with self._lock:
+            self._calls += 1
+            self._timings.append(elapsed_us)
+        return verdict
+
+    def _classify(self, user_agent: str, path: str) -> ThreatVerdict:
+        agent_lower = user_agent.lower()
+        trusted_bot = self.trusted_bots.search(user_agent)
+        return ThreatVerdict(
+            good_bot=self.good_bots.first(agent_lower),
+            malicious_bot=self.malicious_bots.first(agent_lower),
+            suspicious_client=self.suspicious_clients.first(agent_lower),
+            suspicious_path=self.suspicious_paths.search(path),
+            webhook_path=path.startswith(WEBHOOK_PATH_PREFIXES),
+            trusted_bot=trusted_bot,
+            suspicious_agent=None if trusted_bot else self.suspicious_agents.first(user_agent),
+            cms_attack=self.cms_attacks.first(path),
+            dangerous_path=self.dangerous_paths.first(path),
+        )
+
+    def get_stats(self) -> Dict:
+        info = self._classify_cached.cache_info()
+        with self._lock:
+            timings = sorted(self._timings)
+            calls = self._calls
+        lookups = info.hits + info.misses
+        return {
+            "classifications": calls,
+            "cache_hits": info.hits,
+            "cache_misses": info.misses,
+            "cache_size": info.currsize,
+            "hit_rate": round(info.hits / lookups, 4) if lookups else 0.0,
+            "p50_us": round(timings[len(timings) // 2], 2) if timings else 0.0,
+            "p99_us": round(timings[int(len(timings) * 0.99)], 2) if timings else 0.0,
+            "max_us": round(timings[-1], 2) if timings else 0.0,
+        }
+
+
+# Global classifier, compiled once at import
+threat_classifier = ThreatClassifier()
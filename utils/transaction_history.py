@@ -13,7 +13,7 @@ import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 import os
 from dotenv import load_dotenv
 
@@ -40,7 +40,7 @@ class IntelligentTransactionHistory:
     def __init__(self):
         self.supabase = None
         if SUPABASE_URL and SUPABASE_KEY:
-            self.supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+            self.supabase = get_supabase_client(SUPABASE_URL, SUPABASE_KEY)
     
     def parse_history_query(self, message: str) -> Optional[TransactionQuery]:
         """
@@ -1,5 +1,5 @@
 import openai
-from supabase import create_client
+from utils.supabase_client import get_supabase_client as get_shared_supabase_client
 from dotenv import load_dotenv
 import os
 import logging
@@ -14,7 +14,7 @@ supabase = None
 def get_supabase_client():
     global supabase
     if supabase is None:
-        supabase = create_client(supabase_url, supabase_key)
+        supabase = get_shared_supabase_client(supabase_url, supabase_key)
     return supabase
 
 openai.api_key = os.getenv("OPENAI_API_KEY")
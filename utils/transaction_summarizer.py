@@ -9,7 +9,7 @@ Includes beneficiary spending patterns and smart financial insights.
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 import os
 
 logger = logging.getLogger(__name__)
@@ -20,7 +20,7 @@ class TransactionSummarizer:
     def __init__(self):
         self.supabase = None
         if os.getenv("SUPABASE_URL") and os.getenv("SUPABASE_KEY"):
-            self.supabase = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+            self.supabase = get_supabase_client()
     
     async def get_2_month_summary(self, chat_id: str, user_data: Dict = None) -> str:
         """Generate a comprehensive 2-month transaction summary"""
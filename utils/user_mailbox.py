@@ -0,0 +1,136 @@
+"""
+Sofi AI Per-User Mailbox
+Serializes each user's messages into their Assistant thread in arrival order
+
+OpenAI rejects a new message while a run is active on the thread. Instead of
+detecting and cancelling active runs, every message for a phone number goes
+through that number's mailbox: one batch is processed at a time, and messages
+that arrive while a run is in flight are coalesced into the next run. Different
+users never wait on each other, so throughput comes from parallelism across
+users.
+
+State is guarded by a threading lock and results travel through
+concurrent.futures, so callers may come from different event loops
+(webhook workers, the async bridge serving route handlers).
+"""
+
+import asyncio
+import logging
+import threading
+import concurrent.futures
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# processor(key, payloads) -> result for the whole batch
+BatchProcessor = Callable[[str, List[Any]], Awaitable[Any]]
+
+
+class _Envelope:
+    """One queued message plus the futures its sender waits on"""
+
+    __slots__ = ("payload", "result", "turn")
+
+    def __init__(self, payload: Any):
+        self.payload = payload
+        self.result = concurrent.futures.Future()  # batch result (last message only)
+        self.turn = concurrent.futures.Future()    # set when this sender must drain
+
+
+class _Mailbox:
+    __slots__ = ("pending", "draining")
+
+    def __init__(self):
+        self.pending = deque()
+        self.draining = False
+
+
+class UserMailbox:
+    """Registry of per-user mailboxes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boxes: Dict[str, _Mailbox] = {}
+        self._stats = {"messages": 0, "batches": 0, "coalesced": 0, "errors": 0}
+
+    async def submit(self, key: str, payload: Any, processor: BatchProcessor) -> Any:
+        """
+        Queue a message for a user and wait until it has been processed
+
+        Returns:
+            The processor result if this message closed its batch, or None
+            if it was coalesced into a batch answered via a later message
+        """
+        envelope = _Envelope(payload)
+        with self._lock:
+            self._stats["messages"] += 1
+            box = self._boxes.setdefault(key, _Mailbox())
+            box.pending.append(envelope)
+            if not box.draining:
+                box.draining = True
+                envelope.turn.set_result(True)
+
+        result_future = asyncio.wrap_future(envelope.result)
+        turn_future = asyncio.wrap_future(envelope.turn)
+        await asyncio.wait({result_future, turn_future}, return_when=asyncio.FIRST_COMPLETED)
+
+        if not result_future.done():
+            # Our turn: process everything queued so far as one batch
+            turn_future.cancel()
+            await self._drain_once(key, box, processor)
+        else:
+            turn_future.cancel()
+
+        return await result_future
+
+    async def _drain_once(self, key: str, box: _Mailbox, processor: BatchProcessor):
+        """Process one coalesced batch, then hand the mailbox to the next sender"""
+        with self._lock:
+            batch = list(box.pending)
+            box.pending.clear()
+            self._stats["batches"] += 1
+            self._stats["coalesced"] += len(batch) - 1
+
+        if len(batch) > 1:
+            logger.info(f"📬 Coalescing {len(batch)} messages for {key} into one run")
+
+        result, error = None, None
+        try:
+            result = await processor(key, [envelope.payload for envelope in batch])
+        except Exception as e:
+            error = e
+            self._stats["errors"] += 1
+            logger.error(f"❌ Mailbox processing failed for {key}: {e}")
+        finally:
+            self._hand_off(key, box)
+
+            # The reply belongs to the newest message; earlier senders get None
+            for envelope in batch[:-1]:
+                envelope.result.set_result(None)
+            if error is not None:
+                batch[-1].result.set_exception(error)
+            else:
+                batch[-1].result.set_result(result)
+
+    def _hand_off(self, key: str, box: _Mailbox):
+        with self._lock:
+            if box.pending:
+                box.pending[0].turn.set_result(True)
+            else:
+                box.draining = False
+                if self._boxes.get(key) is box:
+                    del self._boxes[key]
+
+    def is_busy(self, key: str) -> bool:
+        with self._lock:
+            box = self._boxes.get(key)
+            return bool(box and box.draining)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._stats, "active_mailboxes": len(self._boxes)}
+
+
+# Global mailbox registry shared by both assistant implementations
+user_mailbox = UserMailbox()
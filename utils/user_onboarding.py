@@ -13,20 +13,21 @@ import os
 import logging
 from datetime import datetime
 from typing import Dict, Optional, Tuple
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 from dotenv import load_dotenv
 
 # Import our modules
 from paystack.paystack_service import PaystackService
 from utils.notification_service import notification_service
 from utils.fee_calculator import fee_calculator
+from utils.pin_hasher import pin_hasher
 
 load_dotenv()
 
 # Initialize Supabase client
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
+supabase = get_supabase_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
 
 logger = logging.getLogger(__name__)
 
@@ -128,18 +129,11 @@ class SofiUserOnboarding:
                         'error': 'PIN confirmation does not match'
                     }
             
-            # Import hashlib for PIN hashing
-            import hashlib
-            
             # Hash PIN if provided
             pin_hash = None
             if pin:
-                # Create a secure hash of the PIN with a salt (using telegram_id as the salt)
-                pin_hash = hashlib.pbkdf2_hmac('sha256', 
-                                             pin.encode('utf-8'), 
-                                             telegram_id.encode('utf-8'), 
-                                             100000)  # 100,000 iterations
-                pin_hash = pin_hash.hex()
+                # Create a secure hash of the PIN with a salt (using telegram_id as the salt), off the event loop
+                pin_hash = await pin_hasher.hash(pin, telegram_id)
                 logger.info(f"PIN securely hashed for user {full_name}")
             
             # Check if user already exists
@@ -0,0 +1,223 @@
+"""
+Sofi AI User Resolver
+Single-query WhatsApp identity lookup with an in-process TTL + LRU cache
+
+Users are stored with their WhatsApp number in one of three columns
+(whatsapp_phone, whatsapp_number, phone) and in several formats
+(+234..., 234..., 080...). Instead of querying each column in turn, the
+resolver issues one OR query over every normalized format and caches the
+row under the normalized number. Onboarding and flow handlers call
+invalidate_user() whenever they change a user record.
+
+invalidate_user() only reaches the worker it runs in, so rows that are
+still being onboarded (no account_number or customer_code yet) are cached
+only as long as misses are: another worker sees the finished account within
+NEGATIVE_TTL_SECONDS instead of treating the user as new for minutes.
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from utils.supabase_client import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+# Column precedence matches the original lookup order
+IDENTITY_COLUMNS = ("whatsapp_phone", "whatsapp_number", "phone")
+
+# A user counts as onboarded once every one of these is set
+ONBOARDED_COLUMNS = ("account_number", "customer_code")
+
+DEFAULT_TTL_SECONDS = 300
+NEGATIVE_TTL_SECONDS = 15
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def normalize_phone_number(phone_number: str) -> str:
+    """Normalize a Nigerian phone number to 234XXXXXXXXXX form"""
+    digits = re.sub(r"\D", "", str(phone_number or ""))
+    if not digits:
+        return ""
+    if digits.startswith("234"):
+        return digits
+    if digits.startswith("0") and len(digits) == 11:
+        return "234" + digits[1:]
+    if len(digits) == 10:
+        return "234" + digits
+    return digits
+
+
+def phone_number_variants(phone_number: str) -> List[str]:
+    """All stored formats a phone number may appear under"""
+    raw = str(phone_number or "").strip()
+    normalized = normalize_phone_number(raw)
+    variants = [raw, normalized, f"+{normalized}"]
+    if normalized.startswith("234") and len(normalized) == 13:
+        variants.append("0" + normalized[3:])
+    # Preserve order, drop duplicates and empties
+    return [v for v in dict.fromkeys(variants) if v and v != "+"]
+
+
+class UserResolver:
+    """Resolves WhatsApp numbers to user rows with one round trip"""
+
+    def __init__(self, ttl_seconds: int = DEFAULT_TTL_SECONDS,
+                 negative_ttl_seconds: int = NEGATIVE_TTL_SECONDS,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._user_index: Dict[str, str] = {}  # user_id -> normalized number
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "queries": 0, "invalidations": 0, "evictions": 0}
+
+    def resolve(self, phone_number: str, force_refresh: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Get the user row for a WhatsApp number
+
+        Args:
+            phone_number: WhatsApp number in any supported format
+            force_refresh: Skip the cache and query Supabase
+
+        Returns:
+            User row dict, or None if no user matches
+        """
+        key = normalize_phone_number(phone_number)
+        if not key:
+            return None
+
+        if not force_refresh:
+            cached = self._get_cached(key)
+            if cached is not None:
+                return cached[0]
+
+        user = self._query_user(phone_number)
+        self._store(key, user)
+        return user
+
+    def _get_cached(self, key: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            user, expires_at = entry
+            if time.time() >= expires_at:
+                self._drop(key)
+                self._stats["misses"] += 1
+                return None
+            self._cache.move_to_end(key)
+            self._stats["hits"] += 1
+            return (user,)
+
+    def query(self, phone_number: str, columns: str = "*") -> Optional[Dict[str, Any]]:
+        """
+        Read columns of a user's row straight from Supabase, bypassing the cache
+
+        Args:
+            phone_number: WhatsApp number in any supported format
+            columns: Comma-separated columns to select
+        """
+        if not normalize_phone_number(phone_number):
+            return None
+        return self._query_user(phone_number, columns)
+
+    def _query_user(self, phone_number: str, columns: str = "*") -> Optional[Dict[str, Any]]:
+        """One OR query across every identity column and number format"""
+        variants = phone_number_variants(phone_number)
+        quoted = ",".join(f'"{v}"' for v in variants)
+        or_filter = ",".join(f"{column}.in.({quoted})" for column in IDENTITY_COLUMNS)
+        if columns != "*":
+            # Identity columns pick the best match among duplicate rows
+            columns = ", ".join([columns, *IDENTITY_COLUMNS])
+
+        supabase = get_supabase_client(service_role=True)
+        with self._lock:
+            self._stats["queries"] += 1
+        result = supabase.table("users").select(columns).or_(or_filter).execute()
+
+        rows = result.data or []
+        if not rows:
+            return None
+        return self._pick_best_match(rows, variants)
+
+    @staticmethod
+    def _pick_best_match(rows: List[Dict], variants: List[str]) -> Dict[str, Any]:
+        """Prefer rows matched on the higher-precedence identity column"""
+        wanted = set(variants)
+        for column in IDENTITY_COLUMNS:
+            for row in rows:
+                if str(row.get(column) or "") in wanted:
+                    return row
+        return rows[0]
+
+    def _store(self, key: str, user: Optional[Dict[str, Any]]):
+        onboarded = bool(user) and all(user.get(column) for column in ONBOARDED_COLUMNS)
+        ttl = self.ttl_seconds if onboarded else self.negative_ttl_seconds
+        with self._lock:
+            self._drop(key)
+            self._cache[key] = (user, time.time() + ttl)
+            if user and user.get("id"):
+                self._user_index[str(user["id"])] = key
+            while len(self._cache) > self.max_entries:
+                old_key, (old_user, _) = self._cache.popitem(last=False)
+                self._unindex(old_key, old_user)
+                self._stats["evictions"] += 1
+
+    def _drop(self, key: str):
+        """Remove a cache entry (caller holds the lock)"""
+        entry = self._cache.pop(key, None)
+        if entry is not None:
+            self._unindex(key, entry[0])
+
+    def _unindex(self, key: str, user: Optional[Dict[str, Any]]):
+        user_id = str(user["id"]) if user and user.get("id") else None
+        if user_id and self._user_index.get(user_id) == key:
+            del self._user_index[user_id]
+
+    def invalidate(self, phone_number: str = None, user_id: str = None):
+        """Drop cached entries after a user record changes"""
+        with self._lock:
+            if phone_number:
+                key = normalize_phone_number(phone_number)
+                if key:
+                    self._drop(key)
+            if user_id:
+                key = self._user_index.pop(str(user_id), None)
+                if key:
+                    self._cache.pop(key, None)
+            self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._user_index.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else 0.0,
+            }
+
+
+# Global resolver instance
+user_resolver = UserResolver()
+
+
+def resolve_whatsapp_user(phone_number: str, force_refresh: bool = False) -> Optional[Dict[str, Any]]:
+    """Get the user row for a WhatsApp number (cached)"""
+    return user_resolver.resolve(phone_number, force_refresh=force_refresh)
+
+
+def invalidate_user(phone_number: str = None, user_id: str = None):
+    """Invalidate cached identity lookups for a changed user record"""
+    user_resolver.invalidate(phone_number=phone_number, user_id=user_id)
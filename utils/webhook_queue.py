@@ -0,0 +1,225 @@
+"""
+Sofi AI Webhook Ingestion Queue
+Acknowledge webhooks immediately and process messages on a bounded worker pool
+
+Webhook routes parse the payload, enqueue the message and return 200 straight
+away. A fixed pool of asyncio workers on the worker's shared event loop
+(utils/async_bridge.py) drains the queue. When the queue is full the route gets a rejection back and answers
+503 so Meta redelivers later, instead of spawning another thread.
+"""
+
+import os
+import time
+import atexit
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+from utils.async_bridge import async_bridge
+
+logger = logging.getLogger(__name__)
+
+QUEUE_MAX_SIZE = int(os.getenv("WEBHOOK_QUEUE_MAX_SIZE", "500"))
+QUEUE_WORKERS = int(os.getenv("WEBHOOK_QUEUE_WORKERS", "8"))
+ENQUEUE_TIMEOUT = float(os.getenv("WEBHOOK_ENQUEUE_TIMEOUT", "0.5"))
+DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "25"))
+DEDUPE_WINDOW = 2000  # recently seen message IDs kept for retry suppression
+
+
+class WebhookIngestionQueue:
+    """Bounded in-process queue drained by a fixed pool of asyncio workers"""
+
+    def __init__(self, max_size: int = QUEUE_MAX_SIZE, workers: int = QUEUE_WORKERS):
+        self.max_size = max_size
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._accepting = False
+        self._seen_ids: "OrderedDict[str, None]" = OrderedDict()
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self._stats = {
+            "enqueued": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "duplicates": 0,
+            "max_depth": 0,
+            "total_wait_ms": 0.0,
+            "total_run_ms": 0.0,
+        }
+
+    # =================== LIFECYCLE ===================
+
+    def start(self):
+        """Start the workers on the shared loop (idempotent, fork-aware)"""
+        with self._lock:
+            if self._pid == os.getpid() and self._worker_tasks:
+                return
+            # Fresh process (or first start): never reuse a parent's queue
+            self._pid = os.getpid()
+            self._seen_ids.clear()
+            self._reset_stats()
+            self._loop = async_bridge.loop
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="webhook-sync"
+            )
+            asyncio.run_coroutine_threadsafe(self._start_workers(), self._loop).result(timeout=5)
+            self._accepting = True
+            logger.info(f"📥 Webhook queue started: {self.workers} workers, max depth {self.max_size}")
+
+    async def _start_workers(self):
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(i)) for i in range(self.workers)
+        ]
+
+    def shutdown(self, timeout: float = DRAIN_TIMEOUT) -> bool:
+        """Stop accepting work, drain the queue, then stop the workers"""
+        with self._lock:
+            if not self._worker_tasks or self._pid != os.getpid() or not self._loop.is_running():
+                return True
+            self._accepting = False
+
+        drained = True
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._queue.join(), self._loop)
+            future.result(timeout=timeout)
+        except FutureTimeoutError:
+            drained = False
+            logger.warning(f"⚠️ Webhook queue drain timed out with {self._queue.qsize()} messages left")
+        except Exception as e:
+            drained = False
+            logger.error(f"❌ Error draining webhook queue: {e}")
+
+        async def _stop_workers():
+            for task in self._worker_tasks:
+                task.cancel()
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(_stop_workers(), self._loop).result(timeout=5)
+        except Exception:
+            pass
+        # The loop itself belongs to the bridge and keeps running
+        self._worker_tasks = []
+        self._executor.shutdown(wait=False)
+        logger.info(f"📥 Webhook queue stopped (drained={drained})")
+        return drained
+
+    # =================== PRODUCER SIDE ===================
+
+    def enqueue(self, handler: Callable, *args, dedupe_key: str = None, **kwargs) -> bool:
+        """
+        Put a message on the queue from a (sync) Flask route
+
+        Args:
+            handler: Coroutine function or plain callable processing the message
+            dedupe_key: Optional message ID; redeliveries of a seen ID are dropped
+
+        Returns:
+            True if the message was accepted (or already seen), False if the
+            queue is full or shutting down and the caller should ask for a retry
+        """
+        self.start()
+        if not self._accepting:
+            self._stats["rejected"] += 1
+            return False
+
+        if dedupe_key and self._seen_before(dedupe_key):
+            self._stats["duplicates"] += 1
+            logger.info(f"🔁 Duplicate webhook delivery ignored: {dedupe_key}")
+            return True
+
+        item = (handler, args, kwargs, time.time())
+        future = asyncio.run_coroutine_threadsafe(self._queue.put(item), self._loop)
+        try:
+            future.result(timeout=ENQUEUE_TIMEOUT)
+        except FutureTimeoutError:
+            future.cancel()
+            self._stats["rejected"] += 1
+            if dedupe_key:
+                self._forget(dedupe_key)
+            logger.warning(f"⚠️ Webhook queue full ({self._queue.qsize()}/{self.max_size}) - rejecting message")
+            return False
+
+        self._stats["enqueued"] += 1
+        self._stats["max_depth"] = max(self._stats["max_depth"], self._queue.qsize())
+        return True
+
+    def _seen_before(self, key: str) -> bool:
+        with self._lock:
+            if key in self._seen_ids:
+                return True
+            self._seen_ids[key] = None
+            while len(self._seen_ids) > DEDUPE_WINDOW:
+                self._seen_ids.popitem(last=False)
+            return False
+
+    def _forget(self, key: str):
+        with self._lock:
+            self._seen_ids.pop(key, None)
+
+    # =================== CONSUMER SIDE ===================
+
+    async def _worker(self, worker_id: int):
+        while True:
+            handler, args, kwargs, enqueued_at = await self._queue.get()
+            started = time.time()
+            self._stats["total_wait_ms"] += (started - enqueued_at) * 1000
+            try:
+                if asyncio.iscoroutinefunction(handler):
+                    await handler(*args, **kwargs)
+                else:
+                    # Sync handlers run on the bounded executor, never a new thread
+                    await self._loop.run_in_executor(
+                        self._executor, lambda: handler(*args, **kwargs)
+                    )
+                self._stats["processed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["failed"] += 1
+                logger.error(f"❌ Webhook worker {worker_id} failed: {e}")
+            finally:
+                self._stats["total_run_ms"] += (time.time() - started) * 1000
+                self._queue.task_done()
+
+    # =================== METRICS ===================
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Queue depth and throughput metrics"""
+        depth = self._queue.qsize() if self._queue is not None and self._pid == os.getpid() else 0
+        done = self._stats["processed"] + self._stats["failed"]
+        return {
+            "depth": depth,
+            "max_size": self.max_size,
+            "workers": self.workers,
+            "accepting": self._accepting,
+            **{k: v for k, v in self._stats.items() if not k.startswith("total_")},
+            "avg_wait_ms": round(self._stats["total_wait_ms"] / done, 2) if done else 0.0,
+            "avg_run_ms": round(self._stats["total_run_ms"] / done, 2) if done else 0.0,
+        }
+
+
+# Global queue instance (workers start lazily on first enqueue)
+webhook_queue = WebhookIngestionQueue()
+atexit.register(webhook_queue.shutdown)
+
+
+def enqueue_webhook_message(handler: Callable, *args, dedupe_key: str = None, **kwargs) -> bool:
+    """Enqueue a parsed webhook message for background processing"""
+    return webhook_queue.enqueue(handler, *args, dedupe_key=dedupe_key, **kwargs)
+
+
+def get_webhook_queue_stats() -> Dict[str, Any]:
+    """Get webhook queue depth metrics"""
+    return webhook_queue.get_stats()
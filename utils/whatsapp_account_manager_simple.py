@@ -8,7 +8,8 @@ import os
 import logging
 from datetime import datetime
 from typing import Dict, Optional, Any
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
+from utils.user_resolver import invalidate_user
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,7 +17,7 @@ load_dotenv()
 # Initialize Supabase client
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
+supabase = get_supabase_client(SUPABASE_URL, SUPABASE_KEY) if SUPABASE_URL and SUPABASE_KEY else None
 
 logger = logging.getLogger(__name__)
 
@@ -179,6 +180,7 @@ class WhatsAppAccountManager:
             # Insert user into Supabase
             logger.info(f"💾 Saving WhatsApp user to Supabase: {whatsapp_number}")
             result = supabase.table("users").insert(user_record).execute()
+            invalidate_user(whatsapp_number)
             
             if not result.data:
                 return {
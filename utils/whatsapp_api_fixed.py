@@ -1,22 +1,42 @@
 """
 WhatsApp API Helper for Read Receipts and Typing Indicators
 Fixed implementation using Meta's official typing indicator API
+
+Replies are pipelined: begin_reply() sends the read receipt and typing
+indicator the moment a message is picked up, while the answer is still being
+generated, and the reply goes out as soon as it exists. An optional minimum
+typing time (WHATSAPP_MIN_TYPING_SECONDS) is measured from arrival, so it only
+delays replies that were ready sooner than that.
 """
 
 import logging
 import requests
 import time
 import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import partial
 from typing import Optional
 import os
 
+from utils.async_bridge import async_bridge
+
 logger = logging.getLogger(__name__)
 
+MIN_TYPING_SECONDS = float(os.getenv("WHATSAPP_MIN_TYPING_SECONDS", "0"))
+MAX_TYPING_SECONDS = 20  # Meta hides the typing indicator after 25 seconds
+ACK_WAIT_TIMEOUT = 10  # seconds a reply waits for its read receipt to land
+MAX_PENDING_REPLIES = 1000
+
 class WhatsAppAPI:
     def __init__(self):
         self.access_token = os.getenv("WHATSAPP_ACCESS_TOKEN")
         self.phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
         self.base_url = f"https://graph.facebook.com/v18.0/{self.phone_number_id}"
+        # message_id -> (arrival time, read receipt future)
+        self._pending_replies: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
         
         if not self.access_token or not self.phone_number_id:
             logger.error("❌ WhatsApp credentials not configured")
@@ -28,6 +48,65 @@ class WhatsAppAPI:
             "Content-Type": "application/json"
         }
     
+    async def _post(self, payload: dict, timeout: float) -> requests.Response:
+        """POST to the messages endpoint without blocking the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, partial(
+            requests.post, f"{self.base_url}/messages",
+            headers=self._get_headers(), json=payload, timeout=timeout
+        ))
+    
+    # =================== REPLY PIPELINE ===================
+    
+    def begin_reply(self, message_id: Optional[str]):
+        """
+        Show the read receipt and typing indicator for an incoming message now
+        
+        Safe to call from any thread and more than once per message; the
+        answer can be generated while the indicator request is in flight.
+        """
+        if not message_id:
+            return
+        with self._lock:
+            if message_id in self._pending_replies:
+                return
+            # Placeholder first so a concurrent call cannot send a second receipt
+            self._pending_replies[message_id] = (time.monotonic(), None)
+            while len(self._pending_replies) > MAX_PENDING_REPLIES:
+                self._pending_replies.popitem(last=False)
+        future = async_bridge.submit(self.mark_message_as_read_with_typing(message_id))
+        with self._lock:
+            if message_id in self._pending_replies:
+                self._pending_replies[message_id] = (self._pending_replies[message_id][0], future)
+    
+    async def reply_ready(self, message_id: Optional[str], min_typing: Optional[float] = None):
+        """
+        Wait until a reply to message_id may be sent
+        
+        The read receipt must land first (otherwise the typing indicator would
+        reappear after the reply); then only what is left of the minimum
+        typing time since arrival is waited out.
+        """
+        if not message_id:
+            return
+        with self._lock:
+            arrived_at, future = self._pending_replies.get(message_id, (None, None))
+        if arrived_at is None:
+            return
+        if isinstance(future, Future):
+            try:
+                await asyncio.wait_for(asyncio.wrap_future(future), ACK_WAIT_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"⚠️ Read receipt for {message_id} not confirmed: {e}")
+        floor = MIN_TYPING_SECONDS if min_typing is None else min_typing
+        remaining = min(floor, MAX_TYPING_SECONDS) - (time.monotonic() - arrived_at)
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+    
+    def end_reply(self, message_id: Optional[str]):
+        """Forget a message once its reply has been sent"""
+        with self._lock:
+            self._pending_replies.pop(message_id, None)
+    
     async def mark_message_as_read_with_typing(self, message_id: str) -> bool:
         """
         Mark a WhatsApp message as read AND show typing indicator (Meta's official API)
@@ -50,12 +129,7 @@ class WhatsAppAPI:
                 }
             }
             
-            response = requests.post(
-                f"{self.base_url}/messages",
-                headers=self._get_headers(),
-                json=payload,
-                timeout=10
-            )
+            response = await self._post(payload, timeout=10)
             
             if response.status_code == 200:
                 logger.info(f"✅ Message {message_id} marked as read with typing indicator shown")
@@ -70,7 +144,7 @@ class WhatsAppAPI:
     
     async def send_message_with_read_and_typing(self, phone_number: str, message: str, 
                                                message_id_to_read: Optional[str] = None,
-                                               typing_duration: float = 2.0) -> bool:
+                                               typing_duration: Optional[float] = None) -> bool:
         """
         Send a message with proper read receipt and typing using Meta's official API
         
@@ -78,21 +152,25 @@ class WhatsAppAPI:
             phone_number (str): Recipient's phone number
             message (str): Message to send
             message_id_to_read (str, optional): Message ID to mark as read with typing
-            typing_duration (float): How long to wait before sending actual message
+                (already done if begin_reply() was called for it)
+            typing_duration (float, optional): Minimum time the typing indicator
+                stays visible, counted from when the message was picked up
+                (defaults to WHATSAPP_MIN_TYPING_SECONDS)
             
         Returns:
             bool: True if successful, False otherwise
         """
         try:
-            # Step 1: Mark incoming message as read with typing indicator (Meta's official way)
-            if message_id_to_read:
-                await self.mark_message_as_read_with_typing(message_id_to_read)
+            # Step 1: Read receipt + typing indicator (a no-op if the pipeline already sent it)
+            self.begin_reply(message_id_to_read)
             
-            # Step 2: Wait to simulate processing time (typing indicator shows for up to 25 seconds)
-            await asyncio.sleep(min(typing_duration, 20))  # Max 20 seconds to be safe
+            # Step 2: Wait for the receipt and whatever is left of the typing floor
+            await self.reply_ready(message_id_to_read, typing_duration)
             
             # Step 3: Send the actual message (this dismisses the typing indicator)
-            return await self.send_text_message(phone_number, message)
+            sent = await self.send_text_message(phone_number, message)
+            self.end_reply(message_id_to_read)
+            return sent
             
         except Exception as e:
             logger.error(f"❌ Error in send_message_with_read_and_typing: {e}")
@@ -122,12 +200,7 @@ class WhatsAppAPI:
                 }
             }
             
-            response = requests.post(
-                f"{self.base_url}/messages",
-                headers=self._get_headers(),
-                json=payload,
-                timeout=15
-            )
+            response = await self._post(payload, timeout=15)
             
             if response.status_code == 200:
                 logger.info(f"✅ Message sent successfully to {phone_number}")
@@ -161,12 +234,7 @@ class WhatsAppAPI:
                 "interactive": flow_data
             }
             
-            response = requests.post(
-                f"{self.base_url}/messages",
-                headers=self._get_headers(),
-                json=payload,
-                timeout=10
-            )
+            response = await self._post(payload, timeout=10)
             
             if response.status_code == 200:
                 logger.info(f"✅ WhatsApp Flow sent successfully to {phone_number}")
@@ -201,12 +269,7 @@ class WhatsAppAPI:
                 "interactive": interactive_data
             }
             
-            response = requests.post(
-                f"{self.base_url}/messages",
-                headers=self._get_headers(),
-                json=payload,
-                timeout=10
-            )
+            response = await self._post(payload, timeout=10)
             
             if response.status_code == 200:
                 logger.info(f"✅ Interactive button message sent successfully to {phone_number}")
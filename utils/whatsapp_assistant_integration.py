@@ -7,7 +7,8 @@ import logging
 import asyncio
 from datetime import datetime, timezone
 import requests
-from supabase import create_client, Client
+from supabase import Client
+from utils.supabase_client import get_supabase_client
 from assistant import get_assistant
 
 # Setup logging
@@ -16,7 +17,7 @@ logger = logging.getLogger(__name__)
 # Initialize Supabase
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+supabase: Client = get_supabase_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
 
 # WhatsApp API credentials
 WHATSAPP_ACCESS_TOKEN = os.getenv("WHATSAPP_ACCESS_TOKEN")
@@ -7,7 +7,7 @@ import os
 import logging
 from typing import Dict, Any, Optional, List
 from datetime import datetime
-from supabase import create_client
+from utils.supabase_client import get_supabase_client
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +22,7 @@ class WhatsAppDatabaseService:
         if not supabase_url or not supabase_key:
             raise ValueError("Missing Supabase credentials")
         
-        self.supabase = create_client(supabase_url, supabase_key)
+        self.supabase = get_supabase_client(supabase_url, supabase_key)
         logger.info("✅ WhatsApp Database Service initialized")
     
     def has_processed_event(self, event_id: str) -> bool:
@@ -8,6 +8,7 @@ import os
 import json
 import requests
 from datetime import datetime
+from utils.user_resolver import invalidate_user
 
 def send_whatsapp_onboarding_link(phone_number, user_name=None):
     """
@@ -368,11 +369,11 @@ def store_whatsapp_user_in_database(whatsapp_phone, user_data, account_number, a
     Store WhatsApp user in Supabase database
     """
     try:
-        from supabase import create_client
+        from utils.supabase_client import get_supabase_client
         
         supabase_url = os.getenv("SUPABASE_URL")
         supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY")
-        supabase = create_client(supabase_url, supabase_key)
+        supabase = get_supabase_client(supabase_url, supabase_key)
         
         user_record = {
             "full_name": user_data['full_name'],
@@ -388,6 +389,7 @@ def store_whatsapp_user_in_database(whatsapp_phone, user_data, account_number, a
         }
         
         result = supabase.table("users").insert(user_record).execute()
+        invalidate_user(whatsapp_phone)
         print(f"✅ WhatsApp user stored in database: {whatsapp_phone}")
         return True
         
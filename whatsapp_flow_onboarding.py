@@ -11,7 +11,9 @@ import uuid
 from datetime import datetime
 from typing import Dict, Any, Optional
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
+from utils.supabase_client import get_supabase_client
+from utils.user_resolver import invalidate_user
 
 # Load environment variables
 load_dotenv()
@@ -32,7 +34,7 @@ class WhatsAppFlowOnboarding:
         # Supabase client
         supabase_url = os.getenv('SUPABASE_URL')
         supabase_key = os.getenv('SUPABASE_KEY')
-        self.supabase = create_client(supabase_url, supabase_key)
+        self.supabase = get_supabase_client(supabase_url, supabase_key)
         
         # Validate configuration
         self._validate_config()
@@ -329,6 +331,7 @@ class WhatsAppFlowOnboarding:
             }
             
             result = self.supabase.table("users").insert(user_record).execute()
+            invalidate_user(user_data["whatsapp_number"])
             
             if result.data:
                 # Create virtual account
@@ -13,7 +13,8 @@ import logging
 from datetime import datetime, timedelta
 from typing import Optional, Dict, Any
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import Client
+from utils.supabase_client import get_supabase_client
 
 # Load environment variables
 load_dotenv()
@@ -38,7 +39,7 @@ class WhatsAppOnboardingManager:
         # Supabase client
         supabase_url = os.getenv('SUPABASE_URL')
         supabase_key = os.getenv('SUPABASE_KEY')
-        self.supabase = create_client(supabase_url, supabase_key)
+        self.supabase = get_supabase_client(supabase_url, supabase_key)
         
         # Validate configuration
         self._validate_config()